@@ -93,6 +93,25 @@ def register_archive_routes(app, ctx):
         path = _config_path()
         path.write_text(json.dumps(config, ensure_ascii=False, indent=2), encoding="utf-8")
 
+    def _schedule_pdf_prerender(archive_name: str, raw_dir: Path) -> None:
+        """Ставит в фон рендер первых страниц и миниатюр загруженных PDF."""
+        try:
+            from converters.pdf_image_cache import load_image_cache_config, schedule_prerender
+        except ImportError:
+            return
+        config = load_image_cache_config()
+        if not config.prerender_on_upload:
+            return
+        pdf_files = sorted(raw_dir.glob("*.pdf"))
+        if not pdf_files:
+            return
+        try:
+            queued = schedule_prerender(pdf_files, config)
+        except Exception as e:
+            logger.warning("SYSTEM prerender schedule failed name=%s error=%s", archive_name, e)
+            return
+        logger.info("SYSTEM prerender queued name=%s pdf_count=%s tasks=%s", archive_name, len(pdf_files), queued)
+
     def _get_latest_issue_dir(base: Path) -> str | None:
         candidates = []
         if not base or not base.exists() or not base.is_dir():
@@ -149,6 +168,22 @@ def register_archive_routes(app, ctx):
             }
         })
 
+    @app.route("/api/llm-cache/stats")
+    def llm_cache_stats():
+        """Счетчики кэша ответов LLM (для мониторинга)."""
+        try:
+            from services.llm_cache import get_llm_cache_stats
+            from services.llm_rate_limit import get_rate_limit_stats
+            from services.llm_scheduler import get_scheduler_stats
+            from services.llm_singleflight import get_single_flight_stats
+        except ImportError:
+            return jsonify({"success": False, "error": "Кэш LLM недоступен"}), 500
+        stats = get_llm_cache_stats()
+        stats["scheduler"] = get_scheduler_stats()
+        stats["single_flight"] = get_single_flight_stats()
+        stats["rate_limit"] = get_rate_limit_stats()
+        return jsonify({"success": True, "stats": stats})
+
     @app.route("/settings-save", methods=["POST"])
     def settings_save():
         data = request.get_json(silent=True) or {}
@@ -296,6 +331,7 @@ def register_archive_routes(app, ctx):
                 "archive": archive_stem,
             },
         )
+        _schedule_pdf_prerender(archive_stem, raw_dir)
         return jsonify({
             "success": True,
             "message": "Архив загружен.",
@@ -394,7 +430,7 @@ def register_archive_routes(app, ctx):
 
         def worker():
             try:
-                from services.gpt_extraction import extract_metadata_from_pdf
+                from services.archive_pipeline import process_pdfs_pipelined
                 from config import get_config
             except Exception as e:
                 with progress_lock:
@@ -426,35 +462,28 @@ def register_archive_routes(app, ctx):
                             "message": "В архиве не найдено PDF файлов."
                         })
                     return
-                for idx, pdf_path in enumerate(pdf_files, 1):
-                    with progress_lock:
-                        progress_state["processed"] = idx - 1
-                        progress_state["message"] = f"Обработка: {pdf_path.name}"
-                    save_issue_state(
-                        session_input_dir,
-                        archive_name,
-                        {
-                            "status": "running",
-                            "processed": idx - 1,
-                            "total": total,
-                            "message": f"Обработка: {pdf_path.name}",
-                            "archive": archive_name,
-                        },
-                    )
-                    extract_metadata_from_pdf(pdf_path, config=config, json_output_dir=json_dir)
+
+                def on_progress(processed: int, total: int, message: str) -> None:
+                    # Вызывается из одного координирующего потока конвейера:
+                    # processed — число завершенных статей, а не номер текущей
                     with progress_lock:
-                        progress_state["processed"] = idx
+                        progress_state["processed"] = processed
+                        progress_state["message"] = message
                     save_issue_state(
                         session_input_dir,
                         archive_name,
                         {
                             "status": "running",
-                            "processed": idx,
+                            "processed": processed,
                             "total": total,
-                            "message": "Обработка в процессе",
+                            "message": message,
                             "archive": archive_name,
                         },
                     )
+
+                process_pdfs_pipelined(
+                    pdf_files, json_dir, config=config, on_progress=on_progress, session_id=session_id
+                )
                 logger.info(
                     "SYSTEM process archive done name=%s processed=%s",
                     archive_name,
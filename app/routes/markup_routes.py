@@ -7,7 +7,9 @@ import time
 from pathlib import Path
 from html import unescape
 
-from flask import render_template_string, jsonify, request, abort, send_file, current_app
+from flask import (
+    Response, render_template_string, jsonify, request, abort, send_file, current_app, stream_with_context
+)
 
 from app.app_dependencies import (
     METADATA_MARKUP_AVAILABLE,
@@ -23,7 +25,11 @@ from app.app_dependencies import (
 )
 from app.app_helpers import convert_file_to_html, merge_doi_url_in_html, save_issue_state, is_json_processed
 from app.web_templates import VIEWER_TEMPLATE, MARKUP_TEMPLATE
-from app.session_utils import get_session_input_dir
+from app.session_utils import get_session_id, get_session_input_dir
+from services.llm_scheduler import INTERACTIVE, llm_priority, with_llm_priority
+
+# Интервал событий progress в потоковых ответах ИИ, сек
+_SSE_PROGRESS_INTERVAL_SEC = 5
 
 def _norm_empty(val):
     """Пустые поля и прочерки (—, –, -) → пустая строка, не подставляем «—»."""
@@ -44,6 +50,107 @@ def _normalize_issn_value(value: str | None) -> str:
     return f"{raw[:4]}-{raw[4:]}"
 
 
+# Номер записи списка литературы в начале строки: "1. ", "12) ", "[3] "
+_RE_REFERENCE_NUMBER = re.compile(r"^\s*(?:\[(\d{1,3})\]|(\d{1,3})([.)]))\s+")
+
+
+def _starts_reference_entry(line: str) -> bool:
+    return bool(
+        re.match(r"^(?:\[\d{1,3}\]|\d{1,3}[.)])\s+", line)
+        or re.match(r"^[A-ZА-ЯЁ][A-Za-zА-Яа-яЁё'’.-]+\s+(?:18|19|20)\d{2}\s*[—–-]\s*", line)
+    )
+
+
+def _estimate_reference_candidates(text: str) -> int:
+    t = str(text or "")
+    numbered = len(re.findall(r"(?:^|\n)\s*(?:\[\d{1,3}\]|\d{1,3}[.)])\s+", t))
+    year_dash = len(re.findall(r"\b[A-ZА-ЯЁ][A-Za-zА-Яа-яЁё'’.-]+\s+(?:18|19|20)\d{2}\s*[—–-]\s*", t))
+    return max(numbered, year_dash)
+
+
+def _join_reference_line(cur: str, line: str) -> str:
+    """Присоединяет строку-продолжение к записи: перенос слова, разрыв дефиса или ссылки."""
+    last = cur.rsplit(" ", 1)[-1]
+    in_link = bool(re.search(r"https?://|doi\.org/|\b10\.\d{4,9}/", last, re.IGNORECASE))
+    if cur.endswith("-") and not cur.endswith(" -"):
+        first = line.split(" ", 1)[0]
+        if (
+            not in_link
+            and re.search(r"[A-Za-zА-Яа-яЁё]-$", cur)
+            and re.match(r"[a-zа-яё]", line)
+            and "-" not in first
+        ):
+            return cur[:-1] + line  # перенос слова: "библио-" + "графия"
+        return cur + line  # дефис остается: диапазон страниц, DOI, "Ростов-" + "на-Дону"
+    if in_link and cur.endswith("/"):
+        return cur + line
+    return f"{cur} {line}"
+
+
+def _split_reference_lines(lines: list[str]) -> list[str]:
+    """
+    Консервативный разбор списка литературы без LLM: запись начинается с
+    номера или "Автор 2001 —", остальные строки (в том числе DOI и URL)
+    приклеиваются к текущей записи с учетом переносов.
+    """
+    entries: list[str] = []
+    cur = ""
+    for raw_line in lines:
+        ln = re.sub(r"\s+", " ", str(raw_line or "")).strip()
+        if not ln:
+            continue
+        is_cont = bool(
+            re.match(r"^(doi\s*:|https?://|doi\.org/|10\.\d{4,9}/)", ln, re.IGNORECASE)
+            or re.search(r"(doi\s*:|url\s*:)\s*$", cur, re.IGNORECASE)
+        )
+        if not cur:
+            cur = ln
+        elif is_cont or not _starts_reference_entry(ln):
+            cur = _join_reference_line(cur, ln)
+        else:
+            entries.append(cur)
+            cur = ln
+    if cur:
+        entries.append(cur)
+    return entries
+
+
+def _deterministic_references(text: str) -> tuple[list[str], float]:
+    """
+    Разбор списка литературы без LLM и уверенность в нем [0..1].
+
+    Записи делит тот же разбор, что и запасной путь (_split_reference_lines).
+    Уверенность ненулевая, только если каждая запись начинается с номера
+    одного вида ("1." / "1)" / "[1]") и номера идут подряд; тогда это оценка
+    references_quality_score, умноженная на согласие числа записей с
+    _estimate_reference_candidates. Номер, перенесенный в начало строки
+    внутри записи, ломает последовательность, ненумерованная строка-начало
+    записи дает запись без номера — такие списки уходят в LLM.
+
+    Returns:
+        (записи без номеров — как по правилам промпта, уверенность)
+    """
+    lines = [ln.strip() for ln in str(text or "").splitlines() if ln.strip()]
+    entries = _split_reference_lines(lines)
+    if not entries:
+        return [], 0.0
+    matches = [_RE_REFERENCE_NUMBER.match(entry) for entry in entries]
+    if not all(matches):
+        return entries, 0.0
+    styles = {m.group(3) or "[]" for m in matches}
+    numbers = [int(m.group(1) or m.group(2)) for m in matches]
+    if len(styles) != 1 or any(b != a + 1 for a, b in zip(numbers, numbers[1:])):
+        return entries, 0.0
+    entries = [entry[m.end():].strip() for entry, m in zip(entries, matches)]
+    try:
+        from converters.pdf_to_html import references_quality_score
+    except Exception:
+        return entries, 0.0
+    estimated = _estimate_reference_candidates(text)
+    agreement = min(len(entries), estimated) / max(len(entries), estimated) if estimated else 0.0
+    return entries, references_quality_score(entries) * agreement
+
+
 def register_markup_routes(app, ctx):
     json_input_dir = ctx.get("json_input_dir")
     words_input_dir = ctx.get("words_input_dir")
@@ -795,358 +902,439 @@ def register_markup_routes(app, ctx):
             return jsonify(error=error_msg, details=error_details), 500
     
 
-    @app.route("/process-references-ai", methods=["POST"])
-    def process_references_ai():
-        """Обрабатывает список литературы с помощью ИИ прямо в веб-форме."""
+    class _AIRequestError(Exception):
+        """Ошибка входных данных запроса к ИИ (HTTP статус — status)."""
+
+        def __init__(self, message: str, status: int = 400):
+            super().__init__(message)
+            self.status = status
+
+    def _gpt_config():
+        """
+        Конфигурация для services.gpt_extraction: объект config.py (ключи через
+        точку и get_path), а не словарь из config.json — иначе не находятся
+        каталог кэша ответов и блокировки одинаковых запросов.
+        """
         try:
-            request_start = time.time()
-            data = request.get_json()
-            field_id = data.get("field_id")  # "references_ru" или "references_en"
-            raw_text = data.get("text", "")
-            
-            if not raw_text or not raw_text.strip():
-                return jsonify(success=False, error="Текст для обработки пуст"), 400
-            
-            # Определяем язык
-            language = "RUS" if field_id == "references_ru" else "ENG"
-            
-            # Загружаем конфигурацию
-            config = None
+            from config import get_config
+            return get_config()
+        except Exception:
+            return None
+
+    def _sse_event(event: str, payload: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def _sse_response(events):
+        return Response(
+            stream_with_context(events),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    def _iter_references_ai(data: dict):
+        """
+        Обработка списка литературы с помощью ИИ по чанкам. Генератор событий
+        (имя, данные): "start", "chunk" для каждого готового чанка (в порядке
+        готовности), "progress" пока чанки не готовы, "done" с итоговым текстом.
+        """
+        request_start = time.time()
+        field_id = data.get("field_id")  # "references_ru" или "references_en"
+        raw_text = data.get("text", "")
+        
+        if not raw_text or not raw_text.strip():
+            raise _AIRequestError("Текст для обработки пуст", 400)
+        
+        # Определяем язык
+        language = "RUS" if field_id == "references_ru" else "ENG"
+        
+        # Загружаем конфигурацию
+        config = None
+        try:
+            config_path = Path("config.json")
+            if config_path.exists():
+                with open(config_path, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+        except Exception:
+            pass
+        
+        model = config.get("gpt_extraction", {}).get("model", "gpt-4o-mini") if config else "gpt-4o-mini"
+
+        # Настройки чанкинга: чанки упаковываются до бюджета токенов на запрос
+        # (services.token_budget), а не по числу строк и символов
+        from services.token_budget import count_tokens, get_token_budget_config, pack_lines, split_text_by_tokens
+
+        budget_cfg = get_token_budget_config()
+        references_cfg = (config or {}).get("references_ai", {})
+        try:
+            chunk_tokens = int(references_cfg.get("chunk_tokens", budget_cfg.references_chunk_tokens))
+        except Exception:
+            chunk_tokens = budget_cfg.references_chunk_tokens
+        if chunk_tokens < 100:
+            chunk_tokens = budget_cfg.references_chunk_tokens
+
+        # Прежние ключи чанкинга: max_chunk_chars переводится в токены по
+        # прежней оценке (4 символа на токен), chunk_size ограничивает число строк
+        max_chunk_lines = 0
+        try:
+            max_chunk_chars = int(references_cfg.get("max_chunk_chars", 0) or 0)
+            if max_chunk_chars > 1000:
+                chunk_tokens = min(chunk_tokens, max_chunk_chars // 4)
+            max_chunk_lines = max(0, int(references_cfg.get("chunk_size", 0) or 0))
+        except Exception:
+            pass
+
+        # Railway: более строгие лимиты - уменьшаем чанки
+        if os.getenv("RAILWAY_ENVIRONMENT") or os.getenv("RAILWAY_PROJECT_ID"):
+            chunk_tokens = min(chunk_tokens, budget_cfg.references_chunk_tokens_railway)
+            current_app.logger.info(
+                "SYSTEM references ai railway limits chunk_tokens=%s",
+                chunk_tokens,
+            )
+
+        def _normalize_ref_item(item: str) -> str:
+            return re.sub(r"\s+", " ", str(item or "")).strip()
+
+        def _dedupe_references(items: list[str]) -> list[str]:
+            out: list[str] = []
+            seen: set[str] = set()
+            for raw in items or []:
+                s = _normalize_ref_item(raw)
+                if not s:
+                    continue
+                s_for_doi = re.sub(r"[\u00AD\u200B-\u200F\u2060\uFEFF]", "", s)
+                s_for_doi = re.sub(r"\s*([/-])\s*", r"\1", s_for_doi)
+                doi_m = re.search(r"\b(?:doi:\s*)?(10\.\d{4,9}/[^\s,;]+)", s_for_doi, re.IGNORECASE)
+                url_m = re.search(r"\bhttps?://[^\s)]+", s, re.IGNORECASE)
+                if doi_m:
+                    key = f"doi:{doi_m.group(1).lower()}"
+                elif url_m:
+                    key = f"url:{url_m.group(0).lower()}"
+                else:
+                    key = "txt:" + re.sub(r"[^\w]+", " ", s.lower()).strip()
+                if key in seen:
+                    continue
+                seen.add(key)
+                out.append(s)
+            return out
+
+        def _fallback_references(text: str) -> list[str]:
+            raw = str(text or "").strip()
+            if not raw:
+                return []
+
+            # 1) Дет. нормализатор из PDF-конвертера (если доступен)
             try:
-                config_path = Path("config.json")
-                if config_path.exists():
-                    with open(config_path, "r", encoding="utf-8") as f:
-                        config = json.load(f)
+                from converters.pdf_to_html import normalize_references_block  # type: ignore
+                lines = [ln.strip() for ln in raw.splitlines() if ln.strip()]
+                header = "Литература" if language == "RUS" else "References"
+                entries, _score = normalize_references_block([header, *lines])
+                if entries:
+                    return _dedupe_references(entries)
             except Exception:
                 pass
-            
-            # Настройки чанкинга
-            references_cfg = (config or {}).get("references_ai", {})
-            chunk_size = references_cfg.get("chunk_size", 25)
-            max_chunk_chars = references_cfg.get("max_chunk_chars", 8000)
-            try:
-                chunk_size = int(chunk_size)
-            except Exception:
-                chunk_size = 25
-            if chunk_size <= 0:
-                chunk_size = 25
-            try:
-                max_chunk_chars = int(max_chunk_chars)
-            except Exception:
-                max_chunk_chars = 8000
-            if max_chunk_chars <= 1000:
-                max_chunk_chars = 8000
-
-            # Railway: более строгие лимиты - уменьшаем чанки
-            if os.getenv("RAILWAY_ENVIRONMENT") or os.getenv("RAILWAY_PROJECT_ID"):
-                chunk_size = min(chunk_size, 5)
-                max_chunk_chars = min(max_chunk_chars, 3000)
-                current_app.logger.info(
-                    "SYSTEM references ai railway limits chunk_size=%s max_chunk_chars=%s",
-                    chunk_size,
-                    max_chunk_chars,
+
+            # 2) Консервативный fallback без LLM
+            lines = [ln.strip() for ln in raw.splitlines() if ln.strip()]
+            return _dedupe_references(_split_reference_lines(lines or [raw]))
+
+        # Быстрый путь: уверенно разобранные без LLM чанки не отправляются в GPT
+        fast_path = bool(references_cfg.get("deterministic_first", True))
+        try:
+            fast_path_confidence = float(references_cfg.get("deterministic_confidence", 0.8))
+        except Exception:
+            fast_path_confidence = 0.8
+
+        def _chunk_references(text: str, max_tokens: int) -> list[str]:
+            lines = [line.strip() for line in text.splitlines() if line.strip()]
+            if len(lines) >= 2:
+                # Граница чанка — перед началом записи, чтобы запись не делилась
+                # между чанками (не дальше удвоенного бюджета)
+                return pack_lines(
+                    lines, max_tokens, model, can_break=_starts_reference_entry, max_lines=max_chunk_lines
                 )
+            # fallback: очень длинная строка без переводов
+            return split_text_by_tokens(text, max_tokens, model)
+
+        chunks = _chunk_references(raw_text, chunk_tokens)
+        current_app.logger.info(
+            "USER references ai start field=%s chunks=%s chars=%s",
+            field_id,
+            len(chunks),
+            len(raw_text),
+        )
+        yield "start", {"field_id": field_id, "chunks": len(chunks), "chars": len(raw_text)}
+
+        # Получаем промпт из prompts.py
+        try:
+            from prompts import Prompts
+            base_prompt = Prompts.get_references_prompt(language)
+        except Exception as e:
+            raise _AIRequestError("Prompts module unavailable.", 500)
 
-            def _normalize_ref_item(item: str) -> str:
-                return re.sub(r"\s+", " ", str(item or "")).strip()
+        # Используем GPT для обработки
+        from services.gpt_extraction import extract_metadata_with_gpt
 
-            def _dedupe_references(items: list[str]) -> list[str]:
-                out: list[str] = []
-                seen: set[str] = set()
-                for raw in items or []:
-                    s = _normalize_ref_item(raw)
-                    if not s:
-                        continue
-                    s_for_doi = re.sub(r"[\u00AD\u200B-\u200F\u2060\uFEFF]", "", s)
-                    s_for_doi = re.sub(r"\s*([/-])\s*", r"\1", s_for_doi)
-                    doi_m = re.search(r"\b(?:doi:\s*)?(10\.\d{4,9}/[^\s,;]+)", s_for_doi, re.IGNORECASE)
-                    url_m = re.search(r"\bhttps?://[^\s)]+", s, re.IGNORECASE)
-                    if doi_m:
-                        key = f"doi:{doi_m.group(1).lower()}"
-                    elif url_m:
-                        key = f"url:{url_m.group(0).lower()}"
-                    else:
-                        key = "txt:" + re.sub(r"[^\w]+", " ", s.lower()).strip()
-                    if key in seen:
-                        continue
-                    seen.add(key)
-                    out.append(s)
-                return out
+        api_key = config.get("gpt_extraction", {}).get("api_key") if config else None
+        gpt_config = _gpt_config()
 
-            def _estimate_reference_candidates(text: str) -> int:
-                t = str(text or "")
-                numbered = len(re.findall(r"(?:^|\n)\s*(?:\[\d{1,3}\]|\d{1,3}[.)])\s+", t))
-                year_dash = len(re.findall(r"\b[A-ZА-ЯЁ][A-Za-zА-Яа-яЁё'’.-]+\s+(?:18|19|20)\d{2}\s*[—–-]\s*", t))
-                return max(numbered, year_dash)
+        def _build_prompt(template: str, text: str) -> str:
+            if "{references_text}" in template:
+                return template.replace("{references_text}", text)
+            return f"{template}\n\n{text}"
 
-            def _fallback_references(text: str) -> list[str]:
-                raw = str(text or "").strip()
-                if not raw:
-                    return []
+        def _looks_like_token_error(err: Exception) -> bool:
+            msg = str(err).lower()
+            return "token" in msg or "context" in msg or "too large" in msg
 
-                # 1) Дет. нормализатор из PDF-конвертера (если доступен)
-                try:
-                    from converters.pdf_to_html import normalize_references_block  # type: ignore
-                    lines = [ln.strip() for ln in raw.splitlines() if ln.strip()]
-                    header = "Литература" if language == "RUS" else "References"
-                    entries, _score = normalize_references_block([header, *lines])
-                    if entries:
-                        return _dedupe_references(entries)
-                except Exception:
-                    pass
 
-                # 2) Консервативный fallback без LLM
-                lines = [ln.strip() for ln in raw.splitlines() if ln.strip()]
-                if not lines:
-                    lines = [raw]
-
-                entries: list[str] = []
-                cur = ""
-                for ln in lines:
-                    is_cont = bool(
-                        re.match(r"^(doi\s*:|https?://|doi\.org/|10\.\d{4,9}/)", ln, re.IGNORECASE)
-                        or re.search(r"(doi\s*:|url\s*:)\s*$", cur, re.IGNORECASE)
-                    )
-                    starts_new = bool(
-                        re.match(r"^(?:\[\d{1,3}\]|\d{1,3}[.)])\s+", ln)
-                        or re.match(r"^[A-ZА-ЯЁ][A-Za-zА-Яа-яЁё'’.-]+\s+(?:18|19|20)\d{2}\s*[—–-]\s*", ln)
-                    )
-                    if not cur:
-                        cur = ln
-                    elif is_cont or not starts_new:
-                        cur = f"{cur} {ln}".strip()
-                    else:
-                        entries.append(cur)
-                        cur = ln
-                if cur:
-                    entries.append(cur)
-                return _dedupe_references(entries)
-
-            def _chunk_references(text: str) -> list[str]:
-                lines = [line.strip() for line in text.splitlines() if line.strip()]
-                if len(lines) >= 2:
-                    if len(lines) <= chunk_size:
-                        return ["\n".join(lines)]
-                    return [
-                        "\n".join(lines[i:i + chunk_size])
-                        for i in range(0, len(lines), chunk_size)
-                    ]
-                # fallback: очень длинная строка без переводов
-                text = text.strip()
-                if len(text) <= max_chunk_chars:
-                    return [text]
-                chunks = []
-                while text:
-                    if len(text) <= max_chunk_chars:
-                        chunks.append(text)
-                        break
-                    cut = text.rfind(".", 0, max_chunk_chars)
-                    if cut < int(max_chunk_chars * 0.6):
-                        cut = max_chunk_chars
-                    chunks.append(text[:cut].strip())
-                    text = text[cut:].lstrip()
-                return chunks
-
-            chunks = _chunk_references(raw_text)
+        def _run_chunk(chunk_text: str, chunk_index: int, retry_count: int = 0) -> list[str]:
+            chunk_start = time.time()
             current_app.logger.info(
-                "USER references ai start field=%s chunks=%s chars=%s",
+                "SYSTEM references ai chunk start field=%s chunk=%s size=%s model=%s retry=%s",
                 field_id,
-                len(chunks),
-                len(raw_text),
+                chunk_index,
+                len(chunk_text),
+                model,
+                retry_count,
             )
+            prompt = _build_prompt(base_prompt, chunk_text)
 
-            # Получаем промпт из prompts.py
-            try:
-                from prompts import Prompts
-                base_prompt = Prompts.get_references_prompt(language)
-            except Exception as e:
-                return jsonify(success=False, error="Prompts module unavailable."), 500
+            # Размер промпта в токенах модели
+            estimated_tokens = max(1, count_tokens(prompt, model))
+            current_app.logger.info(
+                "SYSTEM references ai prompt size chars=%s est_tokens=%s",
+                len(prompt),
+                estimated_tokens,
+            )
 
-            # Используем GPT для обработки
-            from services.gpt_extraction import extract_metadata_with_gpt
+            # Если слишком большой, просим внешний разбиение
+            if estimated_tokens > 15000:
+                raise Exception("Prompt too large; needs splitting")
 
-            model = config.get("gpt_extraction", {}).get("model", "gpt-4o-mini") if config else "gpt-4o-mini"
-            api_key = config.get("gpt_extraction", {}).get("api_key") if config else None
+            # На повторах чуть уменьшаем температуру
+            temp = max(0.1, 0.3 - (retry_count * 0.1))
+            result = extract_metadata_with_gpt(
+                prompt,
+                model=model,
+                temperature=temp,
+                api_key=api_key,
+                raw_prompt=True,
+                config=gpt_config,
+            )
 
-            def _build_prompt(template: str, text: str) -> str:
-                if "{references_text}" in template:
-                    return template.replace("{references_text}", text)
-                return f"{template}\n\n{text}"
+            # Извлекаем нормализованный список
+            references = []
+            if isinstance(result, dict) and "references" in result:
+                references = result["references"]
+            elif isinstance(result, list):
+                references = result
+            else:
+                # Пытаемся извлечь из текста ответа
+                response_text = str(result)
+                # Ищем JSON в ответе
+                import re
+                json_match = re.search(r'\{.*"references".*\}', response_text, re.DOTALL)
+                if json_match:
+                    try:
+                        parsed = json.loads(json_match.group(0))
+                        references = parsed.get("references", [])
+                    except Exception:
+                        pass
+                
+                # Если не нашли JSON, разбиваем по строкам
+                if not references:
+                    references = [
+                        line.strip()
+                        for line in response_text.split("\n")
+                        if line.strip() and not line.strip().startswith("{") and not line.strip().startswith("}")
+                    ]
 
-            def _looks_like_token_error(err: Exception) -> bool:
-                msg = str(err).lower()
-                return "token" in msg or "context" in msg or "too large" in msg
+            if not isinstance(references, list):
+                references = [str(references)]
 
-            def _split_lines_further(text: str, target: int) -> list[str]:
-                lines = [line.strip() for line in text.splitlines() if line.strip()]
-                if not lines:
-                    return []
-                if len(lines) <= target:
-                    return ["\n".join(lines)]
-                return [
-                    "\n".join(lines[i:i + target])
-                    for i in range(0, len(lines), target)
-                ]
-
-            def _run_chunk(chunk_text: str, chunk_index: int, retry_count: int = 0) -> list[str]:
-                chunk_start = time.time()
-                current_app.logger.info(
-                    "SYSTEM references ai chunk start field=%s chunk=%s size=%s model=%s retry=%s",
-                    field_id,
-                    chunk_index,
-                    len(chunk_text),
-                    model,
-                    retry_count,
-                )
-                prompt = _build_prompt(base_prompt, chunk_text)
-
-                # Быстрая оценка размера промпта (токены ~ символы/4)
-                estimated_tokens = max(1, len(prompt) // 4)
-                current_app.logger.info(
-                    "SYSTEM references ai prompt size chars=%s est_tokens=%s",
-                    len(prompt),
-                    estimated_tokens,
-                )
+            cleaned = [r for r in references if str(r).strip()]
+            cleaned = _dedupe_references(cleaned)
 
-                # Если слишком большой, просим внешний разбиение
-                if estimated_tokens > 15000:
-                    raise Exception("Prompt too large; needs splitting")
-
-                # На повторах чуть уменьшаем температуру
-                temp = max(0.1, 0.3 - (retry_count * 0.1))
-                result = extract_metadata_with_gpt(
-                    prompt,
-                    model=model,
-                    temperature=temp,
-                    api_key=api_key,
-                    raw_prompt=True,
-                    config=config,
-                )
-
-                # Извлекаем нормализованный список
-                references = []
-                if isinstance(result, dict) and "references" in result:
-                    references = result["references"]
-                elif isinstance(result, list):
-                    references = result
-                else:
-                    # Пытаемся извлечь из текста ответа
-                    response_text = str(result)
-                    # Ищем JSON в ответе
-                    import re
-                    json_match = re.search(r'\{.*"references".*\}', response_text, re.DOTALL)
-                    if json_match:
-                        try:
-                            parsed = json.loads(json_match.group(0))
-                            references = parsed.get("references", [])
-                        except Exception:
-                            pass
-                    
-                    # Если не нашли JSON, разбиваем по строкам
-                    if not references:
-                        references = [
-                            line.strip()
-                            for line in response_text.split("\n")
-                            if line.strip() and not line.strip().startswith("{") and not line.strip().startswith("}")
-                        ]
-
-                if not isinstance(references, list):
-                    references = [str(references)]
-
-                cleaned = [r for r in references if str(r).strip()]
-                cleaned = _dedupe_references(cleaned)
-
-                # Если LLM вернул пусто/явно мало — fallback на детерминированный разбор чанка
-                estimated = _estimate_reference_candidates(chunk_text)
-                if not cleaned or (len(cleaned) <= 1 and estimated >= 2):
-                    fb = _fallback_references(chunk_text)
-                    if fb:
-                        current_app.logger.info(
-                            "SYSTEM references ai chunk fallback used field=%s chunk=%s llm_count=%s fb_count=%s est=%s",
-                            field_id,
-                            chunk_index,
-                            len(cleaned),
-                            len(fb),
-                            estimated,
-                        )
-                        cleaned = fb
+            # Если LLM вернул пусто/явно мало — fallback на детерминированный разбор чанка
+            estimated = _estimate_reference_candidates(chunk_text)
+            if not cleaned or (len(cleaned) <= 1 and estimated >= 2):
+                fb = _fallback_references(chunk_text)
+                if fb:
+                    current_app.logger.info(
+                        "SYSTEM references ai chunk fallback used field=%s chunk=%s llm_count=%s fb_count=%s est=%s",
+                        field_id,
+                        chunk_index,
+                        len(cleaned),
+                        len(fb),
+                        estimated,
+                    )
+                    cleaned = fb
 
-                elapsed = time.time() - chunk_start
-                current_app.logger.info(
-                    "SYSTEM references ai chunk done field=%s chunk=%s elapsed=%.2fs count=%s",
+            elapsed = time.time() - chunk_start
+            current_app.logger.info(
+                "SYSTEM references ai chunk done field=%s chunk=%s elapsed=%.2fs count=%s",
+                field_id,
+                chunk_index,
+                elapsed,
+                len(cleaned),
+            )
+            if elapsed > 20:
+                current_app.logger.warning(
+                    "SYSTEM references ai slow chunk field=%s chunk=%s elapsed=%.2fs",
                     field_id,
                     chunk_index,
                     elapsed,
-                    len(cleaned),
                 )
-                if elapsed > 20:
-                    current_app.logger.warning(
-                        "SYSTEM references ai slow chunk field=%s chunk=%s elapsed=%.2fs",
-                        field_id,
-                        chunk_index,
-                        elapsed,
-                    )
-                return cleaned
-
-            all_references = []
-            max_prompt_chars = int(references_cfg.get("max_prompt_chars", 20000))
-            for idx, chunk in enumerate(chunks, start=1):
-                if len(chunk) > max_prompt_chars:
-                    current_app.logger.warning(
-                        "SYSTEM references ai chunk too large; splitting field=%s chunk=%s size=%s",
+            return cleaned
+
+        max_prompt_chars = int(references_cfg.get("max_prompt_chars", 20000))
+
+        def _process_chunk(chunk: str, idx: int) -> tuple[list[str], float, bool]:
+            """
+            Один чанк: сначала детерминированный разбор (без LLM при уверенности
+            не ниже deterministic_confidence), иначе GPT; при необходимости чанк
+            дробится, при ошибке токенов — повтор мельче.
+
+            Returns:
+                (источники, время, True — разобран без LLM)
+            """
+            chunk_start = time.time()
+            if fast_path:
+                entries, confidence = _deterministic_references(chunk)
+                if confidence >= fast_path_confidence:
+                    current_app.logger.info(
+                        "SYSTEM references ai chunk deterministic field=%s chunk=%s count=%s confidence=%.2f",
                         field_id,
                         idx,
-                        len(chunk),
+                        len(entries),
+                        confidence,
                     )
-                    sub_chunks = _split_lines_further(chunk, max(5, chunk_size // 2))
-                else:
-                    sub_chunks = [chunk]
+                    return _dedupe_references(entries), time.time() - chunk_start, True
+            if len(chunk) > max_prompt_chars:
+                current_app.logger.warning(
+                    "SYSTEM references ai chunk too large; splitting field=%s chunk=%s size=%s",
+                    field_id,
+                    idx,
+                    len(chunk),
+                )
+                sub_chunks = _chunk_references(chunk, max(100, chunk_tokens // 2))
+            else:
+                sub_chunks = [chunk]
 
-                for sub_idx, sub in enumerate(sub_chunks, start=1):
-                    try:
-                        refs = _run_chunk(sub, idx, retry_count=0)
-                        all_references.extend(refs)
-                    except Exception as exc:
-                        if _looks_like_token_error(exc):
-                            current_app.logger.warning(
-                                "SYSTEM references ai token error; retrying smaller field=%s chunk=%s size=%s",
-                                field_id,
-                                idx,
-                                len(sub),
-                            )
-                            smaller = _split_lines_further(sub, max(3, chunk_size // 3))
-                            for sub2 in smaller:
-                                refs2 = _run_chunk(sub2, idx, retry_count=1)
-                                all_references.extend(refs2)
-                        else:
-                            raise
-
-                # Небольшая пауза на Railway, чтобы избегать rate-limit
-                if os.getenv("RAILWAY_ENVIRONMENT") or os.getenv("RAILWAY_PROJECT_ID"):
-                    time.sleep(0)
-
-            # Объединяем в строку с переносами
-            all_references = _dedupe_references(all_references)
-            if not all_references:
-                # Финальная страховка на весь исходный текст
-                all_references = _fallback_references(raw_text)
-            normalized_text = "\n".join(all_references)
-            total_elapsed = time.time() - request_start
-            current_app.logger.info(
-                "SYSTEM references ai done field=%s count=%s total_time=%.2fs",
-                field_id,
-                len(all_references),
-                total_elapsed,
-            )
-            
-            return jsonify(
-                success=True,
-                text=normalized_text,
-                count=len(all_references),
-                chunks=len(chunks),
-                processing_time=round(total_elapsed, 2),
-            )
-            
+            chunk_references: list[str] = []
+            for sub in sub_chunks:
+                try:
+                    chunk_references.extend(_run_chunk(sub, idx, retry_count=0))
+                except Exception as exc:
+                    if _looks_like_token_error(exc):
+                        current_app.logger.warning(
+                            "SYSTEM references ai token error; retrying smaller field=%s chunk=%s size=%s",
+                            field_id,
+                            idx,
+                            len(sub),
+                        )
+                        smaller = _chunk_references(sub, max(100, chunk_tokens // 3))
+                        for sub2 in smaller:
+                            chunk_references.extend(_run_chunk(sub2, idx, retry_count=1))
+                    else:
+                        raise
+            return chunk_references, time.time() - chunk_start, False
+
+        # Чанки обрабатываются параллельно (не больше max_parallel_chunks запросов),
+        # результат каждого отдается событием "chunk" сразу по готовности, итог
+        # собирается в исходном порядке. Частоту запросов к API ограничивает
+        # services.llm_rate_limit.
+        try:
+            max_parallel = int(references_cfg.get("max_parallel_chunks", 4))
+        except Exception:
+            max_parallel = 4
+        max_parallel = max(1, min(max_parallel, len(chunks)))
+        chunk_results: list[list[str]] = [[] for _ in chunks]
+        deterministic_chunks = 0
+
+        def _chunk_event(idx: int, refs: list[str], elapsed: float, completed: int, deterministic: bool) -> dict:
+            chunk_results[idx - 1] = refs
+            return {
+                "index": idx,
+                "references": refs,
+                "count": len(refs),
+                "deterministic": deterministic,
+                "completed": completed,
+                "total": len(chunks),
+                "chunk_time": round(elapsed, 2),
+                "elapsed": round(time.time() - request_start, 2),
+            }
+
+        import contextvars
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="references-ai") as pool:
+            # Копия контекста: потокам нужны контекст Flask и класс приоритета LLM
+            futures = {
+                pool.submit(contextvars.copy_context().run, _process_chunk, chunk, idx): idx
+                for idx, chunk in enumerate(chunks, start=1)
+            }
+            pending = set(futures)
+            completed = 0
+            try:
+                while pending:
+                    done, pending = wait(pending, timeout=_SSE_PROGRESS_INTERVAL_SEC, return_when=FIRST_COMPLETED)
+                    if not done:
+                        yield "progress", {
+                            "completed": completed,
+                            "total": len(chunks),
+                            "elapsed": round(time.time() - request_start, 2),
+                        }
+                    for future in sorted(done, key=futures.get):
+                        refs, elapsed, deterministic = future.result()
+                        completed += 1
+                        deterministic_chunks += int(deterministic)
+                        yield "chunk", _chunk_event(futures[future], refs, elapsed, completed, deterministic)
+            except BaseException:
+                # Ошибка чанка или клиент закрыл поток: не начинаем оставшиеся
+                for future in futures:
+                    future.cancel()
+                raise
+
+        # Объединяем в строку с переносами (дубликаты на стыках чанков — один раз в конце)
+        all_references = _dedupe_references(
+            [ref for chunk_refs in chunk_results for ref in chunk_refs]
+        )
+        if not all_references:
+            # Финальная страховка на весь исходный текст
+            all_references = _fallback_references(raw_text)
+        normalized_text = "\n".join(all_references)
+        total_elapsed = time.time() - request_start
+        current_app.logger.info(
+            "SYSTEM references ai done field=%s count=%s deterministic_chunks=%s/%s total_time=%.2fs",
+            field_id,
+            len(all_references),
+            deterministic_chunks,
+            len(chunks),
+            total_elapsed,
+        )
+        
+        yield "done", {
+            "text": normalized_text,
+            "count": len(all_references),
+            "chunks": len(chunks),
+            "deterministic_chunks": deterministic_chunks,
+            "processing_time": round(total_elapsed, 2),
+        }
+
+    @app.route("/process-references-ai", methods=["POST"])
+    @with_llm_priority(INTERACTIVE, get_session_id)
+    def process_references_ai():
+        """Обрабатывает список литературы с помощью ИИ прямо в веб-форме."""
+        request_start = time.time()
+        try:
+            result: dict = {}
+            for event, payload in _iter_references_ai(request.get_json(silent=True) or {}):
+                if event == "done":
+                    result = payload
+            return jsonify(success=True, **result)
+        except _AIRequestError as e:
+            return jsonify(success=False, error=str(e)), e.status
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
@@ -1162,106 +1350,181 @@ def register_markup_routes(app, ctx):
             current_app.logger.exception("SYSTEM references ai error: %s", e)
             return jsonify(success=False, error=str(e), details=error_details), 500
 
-    @app.route("/process-annotation-ai", methods=["POST"])
-    def process_annotation_ai():
-        """Очищает аннотацию от технических артефактов с помощью ИИ без изменения смысла."""
-        try:
-            data = request.get_json(silent=True) or {}
-            field_id = str(data.get("field_id") or "").strip()
-            raw_text = str(data.get("text") or "")
+    @app.route("/process-references-ai/stream", methods=["POST"])
+    def process_references_ai_stream():
+        """
+        Потоковый вариант /process-references-ai (Server-Sent Events): события
+        start, chunk (нормализованные источники чанка сразу по готовности),
+        progress с временем ожидания, done (итоговый текст) или error.
+        """
+        data = request.get_json(silent=True) or {}
+        session_id = get_session_id()
 
-            if field_id not in {"annotation", "annotation_en"}:
-                return jsonify(success=False, error="Некорректный field_id."), 400
-            if not raw_text.strip():
-                return jsonify(success=False, error="Текст для обработки пуст."), 400
+        def generate():
+            request_start = time.time()
+            with llm_priority(INTERACTIVE, session_id):
+                try:
+                    for event, payload in _iter_references_ai(data):
+                        yield _sse_event(event, payload)
+                except _AIRequestError as e:
+                    yield _sse_event("error", {"error": str(e), "status": e.status})
+                except Exception as e:
+                    current_app.logger.exception(
+                        "SYSTEM references ai stream error after %.2fs: %s",
+                        time.time() - request_start,
+                        e,
+                    )
+                    yield _sse_event("error", {"error": str(e), "status": 500})
 
-            config = None
-            try:
-                config_path = Path("config.json")
-                if config_path.exists():
-                    with open(config_path, "r", encoding="utf-8") as f:
-                        config = json.load(f)
-            except Exception:
-                config = None
-
-            model = (config or {}).get("gpt_extraction", {}).get("model", "gpt-4o-mini")
-            api_key = (config or {}).get("gpt_extraction", {}).get("api_key")
-
-            prompt = (
-                "Ты инструмент очистки текста. Твоя единственная задача — убрать технические "
-                "артефакты и привести специальные символы к читаемому формату.\n\n"
-                "СТРОГО ЗАПРЕЩЕНО:\n"
-                "- менять слова, термины, аббревиатуры\n"
-                "- переформулировать предложения\n"
-                "- исправлять грамматику или стиль\n"
-                "- добавлять или убирать смысловые части\n"
-                "- менять порядок предложений\n"
-                "- переводить текст\n\n"
-                "РАЗРЕШЕНО только:\n\n"
-                "1. Артефакты копирования из PDF:\n"
-                "- склеить слово, разорванное переносом: \"ис-\\nследование\" → \"исследование\"\n"
-                "- убрать мягкие переносы (­)\n"
-                "- убрать лишние переводы строк внутри одного абзаца\n"
-                "- схлопнуть множественные пробелы в один\n"
-                "- убрать табуляции\n"
-                "- убрать префикс в самом начале: \"Аннотация.\", \"Abstract:\", \"Резюме.\" — только если это первое слово\n"
-                "- сохранить абзацы (двойной перенос = граница абзаца)\n\n"
-                "2. Индексы и степени:\n"
-                "- нижний индекс оборачивать в <sub>...</sub>: \"H2O\" → \"H<sub>2</sub>O\"\n"
-                "- верхний индекс оборачивать в <sup>...</sup>: \"м2\" → \"м<sup>2</sup>\"\n"
-                "- диапазоны индексов: \"CO2, NO2\" — каждый индекс отдельно\n"
-                "- если индекс неоднозначен — оставить как есть, не угадывать\n\n"
-                "3. Формулы:\n"
-                "- простые inline-формулы приводить к читаемому Unicode-тексту:\n"
-                "  \"a^2 + b^2 = c^2\" → \"a² + b² = c²\"\n"
-                "  \"x_1 + x_2\" → \"x₁ + x₂\"\n"
-                "- дроби в тексте: \"1/2\" оставить как есть, не трогать\n"
-                "- сложные многострочные формулы (интегралы, матрицы) — оставить как есть,\n"
-                "  не пытаться интерпретировать\n"
-                "- греческие буквы прописью → символ: \"alpha\" → \"α\", \"beta\" → \"β\",\n"
-                "  \"mu\" → \"μ\", \"delta\" → \"Δ\" и т.д. — только если контекст научный\n"
-                "  и написание прописью явно означает символ\n\n"
-                "4. Спецсимволы:\n"
-                "- градус: \"36.6 C\" → \"36.6°C\"\n"
-                "- плюс-минус: \"+/-\" → \"±\"\n"
-                "- умножение: \"5 x 10^3\" → \"5×10³\"\n"
-                "- стрелки: \"->\" → \"→\", \"<-\" → \"←\"\n\n"
-                "Верни ТОЛЬКО очищенный текст. Без объяснений, без комментариев,\n"
-                "без кавычек вокруг текста.\n\n"
-                "Текст для очистки:\n"
-                f"{raw_text}"
-            )
+        return _sse_response(generate())
 
-            from services.gpt_extraction import extract_metadata_with_gpt
+    def _clean_annotation_ai(data: dict) -> str:
+        """Очищает аннотацию с помощью ИИ. Returns: очищенный текст."""
+        field_id = str(data.get("field_id") or "").strip()
+        raw_text = str(data.get("text") or "")
 
-            result = extract_metadata_with_gpt(
-                prompt,
-                model=model,
-                temperature=0.0,
-                api_key=api_key,
-                raw_prompt=True,
-                config=config,
-            )
+        if field_id not in {"annotation", "annotation_en"}:
+            raise _AIRequestError("Некорректный field_id.", 400)
+        if not raw_text.strip():
+            raise _AIRequestError("Текст для обработки пуст.", 400)
 
-            cleaned = ""
-            if isinstance(result, dict):
-                cleaned = str(result.get("text") or result.get("cleaned_text") or "").strip()
-                if not cleaned:
-                    for value in result.values():
-                        if isinstance(value, str) and value.strip():
-                            cleaned = value.strip()
-                            break
-            else:
-                cleaned = str(result or "").strip()
+        config = None
+        try:
+            config_path = Path("config.json")
+            if config_path.exists():
+                with open(config_path, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+        except Exception:
+            config = None
 
+        model = (config or {}).get("gpt_extraction", {}).get("model", "gpt-4o-mini")
+        api_key = (config or {}).get("gpt_extraction", {}).get("api_key")
+
+        prompt = (
+            "Ты инструмент очистки текста. Твоя единственная задача — убрать технические "
+            "артефакты и привести специальные символы к читаемому формату.\n\n"
+            "СТРОГО ЗАПРЕЩЕНО:\n"
+            "- менять слова, термины, аббревиатуры\n"
+            "- переформулировать предложения\n"
+            "- исправлять грамматику или стиль\n"
+            "- добавлять или убирать смысловые части\n"
+            "- менять порядок предложений\n"
+            "- переводить текст\n\n"
+            "РАЗРЕШЕНО только:\n\n"
+            "1. Артефакты копирования из PDF:\n"
+            "- склеить слово, разорванное переносом: \"ис-\\nследование\" → \"исследование\"\n"
+            "- убрать мягкие переносы (­)\n"
+            "- убрать лишние переводы строк внутри одного абзаца\n"
+            "- схлопнуть множественные пробелы в один\n"
+            "- убрать табуляции\n"
+            "- убрать префикс в самом начале: \"Аннотация.\", \"Abstract:\", \"Резюме.\" — только если это первое слово\n"
+            "- сохранить абзацы (двойной перенос = граница абзаца)\n\n"
+            "2. Индексы и степени:\n"
+            "- нижний индекс оборачивать в <sub>...</sub>: \"H2O\" → \"H<sub>2</sub>O\"\n"
+            "- верхний индекс оборачивать в <sup>...</sup>: \"м2\" → \"м<sup>2</sup>\"\n"
+            "- диапазоны индексов: \"CO2, NO2\" — каждый индекс отдельно\n"
+            "- если индекс неоднозначен — оставить как есть, не угадывать\n\n"
+            "3. Формулы:\n"
+            "- простые inline-формулы приводить к читаемому Unicode-тексту:\n"
+            "  \"a^2 + b^2 = c^2\" → \"a² + b² = c²\"\n"
+            "  \"x_1 + x_2\" → \"x₁ + x₂\"\n"
+            "- дроби в тексте: \"1/2\" оставить как есть, не трогать\n"
+            "- сложные многострочные формулы (интегралы, матрицы) — оставить как есть,\n"
+            "  не пытаться интерпретировать\n"
+            "- греческие буквы прописью → символ: \"alpha\" → \"α\", \"beta\" → \"β\",\n"
+            "  \"mu\" → \"μ\", \"delta\" → \"Δ\" и т.д. — только если контекст научный\n"
+            "  и написание прописью явно означает символ\n\n"
+            "4. Спецсимволы:\n"
+            "- градус: \"36.6 C\" → \"36.6°C\"\n"
+            "- плюс-минус: \"+/-\" → \"±\"\n"
+            "- умножение: \"5 x 10^3\" → \"5×10³\"\n"
+            "- стрелки: \"->\" → \"→\", \"<-\" → \"←\"\n\n"
+            "Верни ТОЛЬКО очищенный текст. Без объяснений, без комментариев,\n"
+            "без кавычек вокруг текста.\n\n"
+            "Текст для очистки:\n"
+            f"{raw_text}"
+        )
+
+        from services.gpt_extraction import extract_metadata_with_gpt
+
+        result = extract_metadata_with_gpt(
+            prompt,
+            model=model,
+            temperature=0.0,
+            api_key=api_key,
+            raw_prompt=True,
+            config=_gpt_config(),
+        )
+
+        cleaned = ""
+        if isinstance(result, dict):
+            cleaned = str(result.get("text") or result.get("cleaned_text") or "").strip()
             if not cleaned:
-                return jsonify(success=False, error="ИИ не вернул очищенный текст."), 500
+                for value in result.values():
+                    if isinstance(value, str) and value.strip():
+                        cleaned = value.strip()
+                        break
+        else:
+            cleaned = str(result or "").strip()
+
+        if not cleaned:
+            raise _AIRequestError("ИИ не вернул очищенный текст.", 500)
 
+        return cleaned
+
+    @app.route("/process-annotation-ai", methods=["POST"])
+    @with_llm_priority(INTERACTIVE, get_session_id)
+    def process_annotation_ai():
+        """Очищает аннотацию от технических артефактов с помощью ИИ без изменения смысла."""
+        try:
+            cleaned = _clean_annotation_ai(request.get_json(silent=True) or {})
             return jsonify(success=True, text=cleaned)
+        except _AIRequestError as e:
+            return jsonify(success=False, error=str(e)), e.status
         except Exception as e:
             current_app.logger.exception("SYSTEM annotation ai error: %s", e)
             return jsonify(success=False, error=str(e)), 500
 
+    @app.route("/process-annotation-ai/stream", methods=["POST"])
+    def process_annotation_ai_stream():
+        """
+        Потоковый вариант /process-annotation-ai (Server-Sent Events): start,
+        progress раз в несколько секунд, пока ИИ обрабатывает текст, затем
+        done с очищенным текстом или error.
+        """
+        data = request.get_json(silent=True) or {}
+        session_id = get_session_id()
+
+        def generate():
+            import contextvars
+            from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+            request_start = time.time()
+            yield _sse_event("start", {"field_id": str(data.get("field_id") or "")})
+            with llm_priority(INTERACTIVE, session_id):
+                pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="annotation-ai")
+                try:
+                    future = pool.submit(contextvars.copy_context().run, _clean_annotation_ai, data)
+                    while True:
+                        try:
+                            cleaned = future.result(timeout=_SSE_PROGRESS_INTERVAL_SEC)
+                            break
+                        except FutureTimeoutError:
+                            yield _sse_event("progress", {"elapsed": round(time.time() - request_start, 2)})
+                    yield _sse_event("done", {
+                        "text": cleaned,
+                        "processing_time": round(time.time() - request_start, 2),
+                    })
+                except _AIRequestError as e:
+                    yield _sse_event("error", {"error": str(e), "status": e.status})
+                except Exception as e:
+                    current_app.logger.exception("SYSTEM annotation ai stream error: %s", e)
+                    yield _sse_event("error", {"error": str(e), "status": 500})
+                finally:
+                    pool.shutdown(wait=False)
+
+        return _sse_response(generate())
+
     @app.route("/crossref-update", methods=["POST"])
     def crossref_update():
         data = request.get_json(silent=True) or {}
@@ -4,15 +4,21 @@ import io
 import json
 import re
 from dataclasses import dataclass
-from enum import Enum
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from flask import render_template_string, jsonify, request, send_file, abort
+from flask import render_template_string, jsonify, request, send_file, abort, make_response
 
 from app.app_dependencies import PDF_TO_HTML_AVAILABLE, extract_text_from_pdf
 from app.app_helpers import get_source_files
 from app.session_utils import get_session_input_dir
+from converters.pdf_layout_engine import CharArray, gap_summary
+from converters.text_quality import (
+    Language,
+    LanguageDetector,
+    TextQualityAnalyzer,
+    is_garbled_text as _is_garbled_text,
+)
 
 
 def _split_merged_words(text: str) -> str:
@@ -140,72 +146,27 @@ def _find_annotation_block(page, lang: str, options: dict) -> tuple[float, float
     return start_top, end_bottom
 
 
-def _is_garbled_text(text: str, lang: str | None = None) -> bool:
+def _ocr_extract_text(
+    page, bbox: tuple[float, float, float, float], lang: str, page_mode: bool | None = None
+) -> str | None:
     """
-    Грубая эвристика: определяет, что текст "каша".
-    Основано на:
-    - средней длине слова
-    - наличии заглавных букв внутри слова
-    - доле слов без гласных
+    OCR fallback. Требует установленный pytesseract и Tesseract OCR.
+    Страницы из кэша разметки распознаются через пул процессов с дисковым
+    кэшем (converters.pdf_ocr); page_mode — распознать страницу целиком.
     """
-    if not text:
-        return False
-
-    words = [w for w in re.split(r"\s+", text) if w]
-    if not words:
-        return False
-
-    avg_len = sum(len(w) for w in words) / len(words)
-    if avg_len > 15:
-        return True
-
-    vowels_ru = set("аеёиоуыэюя")
-    vowels_en = set("aeiouy")
-
-    internal_caps = 0
-    mixed_case = 0
-    no_vowel = 0
-    low_vowel = 0
-
-    for w in words:
-        if len(w) > 3 and any(c.isupper() for c in w[1:]):
-            internal_caps += 1
-        if len(w) > 3 and any(c.isupper() for c in w[1:]) and any(c.islower() for c in w[1:]):
-            mixed_case += 1
-
-        lw = w.lower()
-        has_ru = any(c in vowels_ru for c in lw)
-        has_en = any(c in vowels_en for c in lw)
-        if not (has_ru or has_en):
-            no_vowel += 1
-        else:
-            vcount = sum(1 for c in lw if c in vowels_ru or c in vowels_en)
-            if len(lw) >= 5 and (vcount / len(lw)) < 0.2:
-                low_vowel += 1
-
-    caps_ratio = internal_caps / len(words)
-    mixed_ratio = mixed_case / len(words)
-    no_vowel_ratio = no_vowel / len(words)
-
-    if caps_ratio > 0.05:
-        return True
-    if mixed_ratio > 0.05:
-        return True
-    if no_vowel_ratio > 0.3:
-        return True
-    if (low_vowel / len(words)) > 0.3:
-        return True
-
-    if lang == "ru" and no_vowel_ratio > 0.25:
-        return True
-    if lang == "en" and no_vowel_ratio > 0.3:
-        return True
-
-    return False
-
+    source_path = getattr(page, "source_path", None)
+    if source_path is not None:
+        from converters.pdf_ocr import ocr_region
+
+        return ocr_region(
+            source_path,
+            page.page_number - 1,
+            bbox,
+            page.bbox,
+            lang,
+            page_mode=page_mode,
+        )
 
-def _ocr_extract_text(page, bbox: tuple[float, float, float, float], lang: str) -> str | None:
-    """OCR fallback. Требует установленный pytesseract и Tesseract OCR."""
     try:
         import pytesseract  # type: ignore
     except Exception:
@@ -270,15 +231,6 @@ def _normalize_extracted_text(text: str, field_id: str | None, options: dict) ->
     return cleaned
 
 
-class Language(Enum):
-    """Язык текста."""
-
-    RUSSIAN = "ru"
-    ENGLISH = "en"
-    MIXED = "mixed"
-    UNKNOWN = "unknown"
-
-
 @dataclass
 class BBox:
     """Прямоугольная область в PDF."""
@@ -324,6 +276,7 @@ class ExtractionOptions:
     use_ocr_if_garbled: bool = False
     force_ocr: bool = False
     ocr_lang: Optional[str] = None
+    ocr_page_mode: Optional[bool] = None  # None — из config.py (pdf_ocr.page_mode)
     fix_hyphenation: bool = True
     strip_prefix: bool = True
     join_lines: Optional[bool] = None
@@ -332,18 +285,24 @@ class ExtractionOptions:
     padding_x: float = 5.0
     padding_y: float = 3.0
     line_tolerance: float = 5.0
+    # Все стратегии извлечения из одной кластеризации символов (иначе — extract_text на каждую)
+    single_pass: bool = True
+    # Кандидат с оценкой качества ниже порога принимается без проверки остальных (None — проверять все)
+    early_accept_score: Optional[float] = 1.0
 
     @classmethod
     def from_dict(cls, data: Optional[Dict[str, Any]]) -> "ExtractionOptions":
         """Создает из словаря."""
         if not data:
             return cls()
+        accept_score = data.get("early_accept_score", 1.0)
         return cls(
             merge_by_field=bool(data.get("merge_by_field", False)),
             annotation_by_heading=bool(data.get("annotation_by_heading", True)),
             use_ocr_if_garbled=bool(data.get("use_ocr_if_garbled", False)),
             force_ocr=bool(data.get("force_ocr", False)),
             ocr_lang=data.get("ocr_lang"),
+            ocr_page_mode=None if data.get("ocr_page_mode") is None else bool(data.get("ocr_page_mode")),
             fix_hyphenation=bool(data.get("fix_hyphenation", True)),
             strip_prefix=bool(data.get("strip_prefix", True)),
             join_lines=data.get("join_lines"),
@@ -352,107 +311,11 @@ class ExtractionOptions:
             padding_x=float(data.get("padding_x", 5.0)),
             padding_y=float(data.get("padding_y", 3.0)),
             line_tolerance=float(data.get("line_tolerance", 5.0)),
+            single_pass=bool(data.get("single_pass", True)),
+            early_accept_score=None if accept_score is None else float(accept_score),
         )
 
 
-class LanguageDetector:
-    """Определение языка текста."""
-
-    @staticmethod
-    def detect(text: str) -> Language:
-        """Определяет основной язык текста."""
-        if not text:
-            return Language.UNKNOWN
-
-        cyrillic_count = sum(1 for c in text if 0x0400 <= ord(c) <= 0x04FF)
-        latin_count = sum(1 for c in text if c.isalpha() and ord(c) < 0x0400)
-
-        if cyrillic_count == 0 and latin_count == 0:
-            return Language.UNKNOWN
-
-        if cyrillic_count > 0 and latin_count > 0:
-            return Language.RUSSIAN if cyrillic_count > latin_count else Language.ENGLISH
-
-        if cyrillic_count > 0:
-            return Language.RUSSIAN
-        if latin_count > 0:
-            return Language.ENGLISH
-
-        return Language.UNKNOWN
-
-    @staticmethod
-    def has_cyrillic(text: str) -> bool:
-        """Проверяет наличие кириллицы."""
-        return any(0x0400 <= ord(c) <= 0x04FF for c in text)
-
-    @staticmethod
-    def has_latin(text: str) -> bool:
-        """Проверяет наличие латиницы."""
-        return any(c.isalpha() and ord(c) < 0x0400 for c in text)
-
-
-class TextQualityAnalyzer:
-    """Анализ качества извлеченного текста."""
-
-    IDEAL_WORD_LENGTH = {
-        Language.RUSSIAN: 6.5,
-        Language.ENGLISH: 5.5,
-        Language.MIXED: 6.0,
-        Language.UNKNOWN: 6.0,
-    }
-
-    MIN_WORD_LENGTH = 3.0
-    MAX_WORD_LENGTH = 15.0
-
-    @staticmethod
-    def calculate_average_word_length(text: str) -> float:
-        """Вычисляет среднюю длину слова."""
-        if not text:
-            return float("inf")
-
-        words = text.split()
-        if not words:
-            return float("inf")
-
-        return sum(len(w) for w in words) / len(words)
-
-    @staticmethod
-    def calculate_short_words_ratio(text: str, threshold: int = 2) -> float:
-        """Вычисляет долю коротких слов."""
-        if not text:
-            return 1.0
-
-        words = text.split()
-        if not words:
-            return 1.0
-
-        short_count = sum(1 for w in words if len(w) <= threshold)
-        return short_count / len(words)
-
-    @classmethod
-    def calculate_quality_score(cls, text: str, language: Language) -> float:
-        """
-        Вычисляет оценку качества текста.
-        Меньше = лучше. 0 = идеально.
-        """
-        if not text or text == "(Текст не найден)":
-            return float("inf")
-
-        avg_length = cls.calculate_average_word_length(text)
-        ideal_length = cls.IDEAL_WORD_LENGTH.get(language, 6.0)
-
-        if cls.MIN_WORD_LENGTH <= avg_length <= cls.MAX_WORD_LENGTH:
-            score = abs(avg_length - ideal_length)
-        else:
-            score = 50.0 + abs(avg_length - ideal_length)
-
-        short_ratio = cls.calculate_short_words_ratio(text)
-        if short_ratio > 0.3:
-            score += short_ratio * 20
-
-        return score
-
-
 class CharacterGapAnalyzer:
     """Анализ расстояний между символами для определения оптимального x_tolerance."""
 
@@ -469,61 +332,50 @@ class CharacterGapAnalyzer:
         suggested_space_threshold: Optional[float]
 
     @classmethod
-    def analyze_gaps(cls, chars: List[Dict[str, Any]]) -> Optional["CharacterGapAnalyzer.GapStatistics"]:
-        """Анализирует расстояния между символами."""
-        if not chars or len(chars) < 2:
+    def analyze_gaps(cls, chars: Any) -> Optional["CharacterGapAnalyzer.GapStatistics"]:
+        """Анализирует расстояния между символами (список словарей или CharArray)."""
+        if chars is None or len(chars) < 2:
             return None
 
         gaps = cls._extract_gaps(chars)
-        if not gaps:
+        summary = gap_summary(gaps)
+        if summary is None:
             return None
 
-        gaps_sorted = sorted(gaps)
-        n = len(gaps_sorted)
-
         stats = cls.GapStatistics(
-            median=gaps_sorted[n // 2],
-            p75=gaps_sorted[int(n * 0.75)],
-            p90=gaps_sorted[int(n * 0.90)],
-            min_gap=gaps_sorted[0],
-            max_gap=gaps_sorted[-1],
+            median=summary["median"],
+            p75=summary["p75"],
+            p90=summary["p90"],
+            min_gap=summary["min"],
+            max_gap=summary["max"],
             suggested_x_tolerance=0.0,
             suggested_space_threshold=None,
         )
 
         stats.suggested_x_tolerance, stats.suggested_space_threshold = cls._calculate_x_tolerance(
-            stats, gaps_sorted
+            stats, gaps
         )
 
         return stats
 
     @staticmethod
-    def _extract_gaps(chars: List[Dict[str, Any]]) -> List[float]:
-        """Извлекает расстояния между соседними символами на одной строке."""
-        chars_sorted = sorted(chars, key=lambda c: (c.get("top", 0), c.get("x0", 0)))
-        gaps = []
-
-        for i in range(1, len(chars_sorted)):
-            prev_char = chars_sorted[i - 1]
-            curr_char = chars_sorted[i]
-            if abs(prev_char.get("top", 0) - curr_char.get("top", 0)) < 5:
-                gap = curr_char.get("x0", 0) - prev_char.get("x1", 0)
-                if 0 < gap < 50:
-                    gaps.append(gap)
-
-        return gaps
+    def _extract_gaps(chars: Any):
+        """Извлекает расстояния между соседними символами на одной строке (массив NumPy)."""
+        table = chars if isinstance(chars, CharArray) else CharArray.from_chars(chars)
+        return table.neighbour_gaps(same_line_tolerance=5.0, min_gap=0.0, max_gap=50.0)
 
     @staticmethod
     def _calculate_x_tolerance(
-        stats: "CharacterGapAnalyzer.GapStatistics", gaps_sorted: List[float]
+        stats: "CharacterGapAnalyzer.GapStatistics", gaps
     ) -> Tuple[float, Optional[float]]:
         """Вычисляет оптимальный x_tolerance и порог пробела."""
         median = stats.median
-        large_gaps = [g for g in gaps_sorted if g > median * 2.5]
+        is_large = gaps > median * 2.5
+        large_gaps = gaps[is_large]
 
-        if large_gaps and len(large_gaps) >= 3:
-            max_letter_gap = max(g for g in gaps_sorted if g <= median * 2.5)
-            min_word_gap = min(large_gaps)
+        if large_gaps.size >= 3:
+            max_letter_gap = float(gaps[~is_large].max())
+            min_word_gap = float(large_gaps.min())
             space_threshold = (max_letter_gap + min_word_gap) / 2
 
             x_tolerance = min(space_threshold * 0.8, min_word_gap * 0.5)
@@ -543,8 +395,9 @@ class TextExtractor:
 
     def extract_from_crop(self, cropped_page, language_hint: Optional[Language] = None) -> str:
         """Извлекает текст из обрезанной страницы PDF."""
-        chars = getattr(cropped_page, "chars", None) or []
-        gap_stats = CharacterGapAnalyzer.analyze_gaps(chars)
+        # Таблица символов строится один раз: для статистики промежутков и реконструкции
+        char_table = CharArray.from_chars(getattr(cropped_page, "chars", None) or [])
+        gap_stats = CharacterGapAnalyzer.analyze_gaps(char_table)
 
         if gap_stats:
             x_tolerance = gap_stats.suggested_x_tolerance
@@ -553,11 +406,14 @@ class TextExtractor:
             x_tolerance = 3.0
             print(f"DEBUG: x_tolerance={x_tolerance:.2f} (default)")
 
-        candidates = self._try_extraction_methods(cropped_page, x_tolerance)
+        if self.options.single_pass:
+            candidates = self._iter_shared_candidates(char_table, cropped_page, x_tolerance)
+        else:
+            candidates = self._try_extraction_methods(cropped_page, x_tolerance)
         best_text = self._select_best_candidate(candidates, language_hint)
 
         if gap_stats and self.quality_analyzer.calculate_average_word_length(best_text) > 20:
-            reconstructed = self._reconstruct_from_chars(chars, gap_stats)
+            reconstructed = self._reconstruct_from_chars(char_table, gap_stats)
             if reconstructed:
                 avg_reconstructed = self.quality_analyzer.calculate_average_word_length(reconstructed)
                 avg_best = self.quality_analyzer.calculate_average_word_length(best_text)
@@ -615,19 +471,47 @@ class TextExtractor:
 
         return candidates
 
-    def _select_best_candidate(self, candidates: List[Tuple[str, str]], language_hint: Optional[Language]) -> str:
-        """Выбирает лучший результат из кандидатов."""
-        if not candidates:
-            return ""
-
-        if language_hint is None:
-            language_hint = LanguageDetector.detect(candidates[0][1])
+    def _iter_shared_candidates(
+        self, char_table: CharArray, cropped_page, x_tolerance: float
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Те же методы, что _try_extraction_methods, но из одной таблицы символов:
+        кластеризация по строкам (y_tolerance=5) считается один раз и общая
+        для всех x_tolerance. Кандидаты выдаются лениво — после раннего
+        принятия в _select_best_candidate остальные не вычисляются.
+        """
+        bbox = tuple(getattr(cropped_page, "bbox", None) or (0, 0, 0, 0))
+
+        strategies: List[Tuple[str, Callable[[], str]]] = [
+            ("adaptive", lambda: char_table.words(x_tolerance, 5).extract_text(5)),
+            ("layout", lambda: char_table.words(3, 5).layout_text(bbox, 5)),
+            ("text_flow", lambda: char_table.words(2, 5, use_text_flow=True).extract_text(5)),
+            ("tight", lambda: char_table.words(0.5, 5).extract_text(5)),
+        ]
+        for method, extract in strategies:
+            try:
+                text = extract()
+            except Exception as e:
+                print(f"DEBUG: Метод '{method}' failed: {e}")
+                continue
+            if not text:
+                continue
+            if method == "layout":
+                text = re.sub(r" +", " ", text)
+                text = re.sub(r"\n\s*\n+", "\n", text)
+            yield method, text
 
+    def _select_best_candidate(self, candidates: Iterable[Tuple[str, str]], language_hint: Optional[Language]) -> str:
+        """Выбирает лучший результат из кандидатов (с ранним принятием по early_accept_score)."""
         best_text = ""
         best_score = float("inf")
         best_method = ""
+        accept_below = self.options.early_accept_score
 
         for method, text in candidates:
+            if language_hint is None:
+                language_hint = LanguageDetector.detect(text)
+
             score = self.quality_analyzer.calculate_quality_score(text, language_hint)
             if _is_garbled_text(text, language_hint.value if language_hint != Language.UNKNOWN else None):
                 score += 100
@@ -637,50 +521,30 @@ class TextExtractor:
                 best_text = text
                 best_method = method
 
+            if accept_below is not None and best_score < accept_below:
+                print(f"DEBUG: Метод '{best_method}' принят досрочно (score={best_score:.1f})")
+                break
+
+        if not best_method:
+            return ""
+
         avg_len = self.quality_analyzer.calculate_average_word_length(best_text)
         print(f"DEBUG: Лучший метод: {best_method}, avg_word_len={avg_len:.1f}, score={best_score:.1f}")
 
         return best_text
 
     def _reconstruct_from_chars(
-        self, chars: List[Dict[str, Any]], gap_stats: "CharacterGapAnalyzer.GapStatistics"
+        self, chars: Any, gap_stats: "CharacterGapAnalyzer.GapStatistics"
     ) -> Optional[str]:
         """Реконструирует текст из символов вручную."""
-        if not chars or not gap_stats.suggested_space_threshold:
+        if chars is None or not len(chars) or not gap_stats.suggested_space_threshold:
             return None
 
         space_threshold = gap_stats.p90
 
-        chars_sorted = sorted(chars, key=lambda c: (c.get("top", 0), c.get("x0", 0)))
-        lines = []
-        current_line = []
-        current_top = None
-        prev_char = None
-
-        for char in chars_sorted:
-            char_text = char.get("text", "")
-            char_top = char.get("top", 0)
-            char_x0 = char.get("x0", 0)
-
-            if current_top is None or abs(char_top - current_top) > 5:
-                if current_line:
-                    lines.append("".join(current_line))
-                current_line = [char_text]
-                current_top = char_top
-                prev_char = char
-                continue
-
-            if prev_char:
-                gap = char_x0 - prev_char.get("x1", char_x0)
-                if gap > space_threshold:
-                    current_line.append(" ")
-
-            current_line.append(char_text)
-            prev_char = char
-
-        if current_line:
-            lines.append("".join(current_line))
-
+        # Строки — по top первого символа (допуск 5pt), символы в порядке (top, x0)
+        table = chars if isinstance(chars, CharArray) else CharArray.from_chars(chars)
+        lines = table.join_rows(y_tolerance=5.0, sort_by_x=False, space_threshold=space_threshold)
         return "\n".join(lines)
 
 
@@ -991,7 +855,7 @@ class PDFTextExtractor:
 
         print(f"DEBUG: Применяем OCR (lang={ocr_lang})")
         try:
-            ocr_text = _ocr_extract_text(page, bbox.to_tuple(), ocr_lang)
+            ocr_text = _ocr_extract_text(page, bbox.to_tuple(), ocr_lang, self.options.ocr_page_mode)
             if ocr_text and ocr_text.strip():
                 print(f"DEBUG: OCR успешно: {ocr_text[:100]}")
                 return ocr_text.strip()
@@ -1208,11 +1072,11 @@ def register_pdf_routes(app, ctx):
             except ValueError:
                 return jsonify({"error": "Недопустимый путь к файлу"}), 400
             
-            # Получаем информацию о PDF через pdfplumber
+            # Получаем информацию о PDF (геометрия страниц берется из кэша разметки)
             try:
-                import pdfplumber
+                from converters.pdf_layout_cache import open_pdf_layout
                 print(f"DEBUG: Открываю PDF: {pdf_path}")
-                with pdfplumber.open(str(pdf_path)) as pdf:
+                with open_pdf_layout(pdf_path) as pdf:
                     pages_info = []
                     for page in pdf.pages:
                         pages_info.append({
@@ -1240,6 +1104,25 @@ def register_pdf_routes(app, ctx):
             return jsonify({"error": f"Ошибка: {str(e)}"}), 500
     
 
+    @app.route("/api/pdf-layout-cache/stats")
+    def api_pdf_layout_cache_stats():
+        """API endpoint со счетчиками кэша разметки PDF (для мониторинга)."""
+        try:
+            from converters.pdf_layout_cache import get_layout_cache_stats
+            from converters.pdf_handle_pool import get_handle_pool
+            from converters.pdf_word_index import get_word_index_stats
+            from converters.pdf_ocr import get_ocr_stats
+        except ImportError:
+            return jsonify({"error": "Кэш разметки PDF недоступен"}), 500
+        return jsonify({
+            "success": True,
+            "stats": get_layout_cache_stats(),
+            "handle_pool": get_handle_pool().stats(),
+            "word_index": get_word_index_stats(),
+            "ocr": get_ocr_stats(),
+        })
+    
+
     @app.route("/api/pdf-image/<path:pdf_filename>")
     def api_pdf_image(pdf_filename: str):
         """API endpoint для получения изображения страницы PDF."""
@@ -1276,32 +1159,54 @@ def register_pdf_routes(app, ctx):
             except ValueError:
                 page_num = 0
             
+            # Необязательные параметры рендера: dpi, format (png/webp/jpeg), quality
+            def _int_arg(name: str) -> Optional[int]:
+                try:
+                    return int(request.args.get(name, ""))
+                except ValueError:
+                    return None
+            
             print(f"DEBUG: Запрос изображения страницы {page_num} из {pdf_filename}")
             
-            # Конвертируем страницу PDF в изображение
+            # Конвертируем страницу PDF в изображение (через дисковый кэш)
             try:
-                from pdf2image import convert_from_path
-                print(f"DEBUG: pdf2image доступен, конвертирую страницу {page_num + 1}")
-                images = convert_from_path(
-                    str(pdf_path),
-                    first_page=page_num + 1,
-                    last_page=page_num + 1,
-                    dpi=150
+                from converters.pdf_image_cache import (
+                    PDF2IMAGE_AVAILABLE,
+                    get_page_image,
+                    load_image_cache_config,
+                    make_page_image_key,
                 )
+                if not PDF2IMAGE_AVAILABLE:
+                    raise ImportError("pdf2image не установлен")
                 
-                if not images:
-                    print(f"ERROR: Не удалось получить изображение для страницы {page_num + 1}")
-                    abort(404)
+                cache_config = load_image_cache_config()
+                key = make_page_image_key(
+                    pdf_path,
+                    page_num,
+                    dpi=_int_arg("dpi"),
+                    image_format=request.args.get("format"),
+                    quality=_int_arg("quality"),
+                    config=cache_config,
+                )
+                if cache_config.max_age > 0:
+                    cache_control = f"private, max-age={cache_config.max_age}"
+                else:
+                    cache_control = "private, no-cache"
                 
-                print(f"DEBUG: Получено изображение размером {images[0].size}")
+                # Браузер уже имеет эту картинку — отвечаем 304 без рендера и чтения файла
+                if request.if_none_match.contains(key.etag):
+                    response = make_response("", 304)
+                    response.set_etag(key.etag)
+                    response.headers["Cache-Control"] = cache_control
+                    return response
                 
-                # Сохраняем изображение во временный буфер
-                from io import BytesIO
-                img_buffer = BytesIO()
-                images[0].save(img_buffer, format='PNG')
-                img_buffer.seek(0)
+                image = get_page_image(pdf_path, page_num, config=cache_config, key=key)
+                print(f"DEBUG: Изображение страницы {page_num + 1}: {len(image.data)} байт ({image.mimetype})")
                 
-                return send_file(img_buffer, mimetype='image/png')
+                response = send_file(io.BytesIO(image.data), mimetype=image.mimetype)
+                response.set_etag(image.etag)
+                response.headers["Cache-Control"] = cache_control
+                return response
             except ImportError as e:
                 print(f"ERROR: pdf2image не установлен: {e}")
                 # Возвращаем пустое изображение 1x1 пиксель вместо ошибки
@@ -1342,6 +1247,74 @@ def register_pdf_routes(app, ctx):
                 abort(500)
     
 
+    @app.route("/api/pdf-thumbnails/<path:pdf_filename>")
+    def api_pdf_thumbnails(pdf_filename: str):
+        """
+        API endpoint со спрайтом миниатюр всех страниц PDF.
+        По умолчанию отдает изображение; с ?layout=1 — JSON с координатами миниатюр.
+        """
+        if ".." in pdf_filename or pdf_filename.startswith("/") or pdf_filename.startswith("\\"):
+            abort(404)
+        
+        session_input_dir = _session_input_dir()
+        pdf_path = session_input_dir / pdf_filename
+        if not pdf_path.exists() or not pdf_path.is_file() or pdf_path.suffix.lower() != ".pdf":
+            abort(404)
+        try:
+            pdf_path.resolve().relative_to(session_input_dir.resolve())
+        except ValueError:
+            abort(404)
+        
+        try:
+            from converters.pdf_image_cache import (
+                PDF2IMAGE_AVAILABLE,
+                get_thumbnail_strip,
+                load_image_cache_config,
+                make_thumbnail_strip_key,
+            )
+        except ImportError:
+            return jsonify({"error": "Модуль кэша изображений недоступен"}), 500
+        if not PDF2IMAGE_AVAILABLE:
+            return jsonify({"error": "pdf2image не установлен"}), 500
+        
+        try:
+            cache_config = load_image_cache_config()
+            try:
+                quality = int(request.args.get("quality", ""))
+            except ValueError:
+                quality = None
+            key = make_thumbnail_strip_key(
+                pdf_path,
+                image_format=request.args.get("format"),
+                quality=quality,
+                config=cache_config,
+            )
+            if cache_config.max_age > 0:
+                cache_control = f"private, max-age={cache_config.max_age}"
+            else:
+                cache_control = "private, no-cache"
+            want_layout = request.args.get("layout", "").lower() in {"1", "true", "yes"}
+            
+            if not want_layout and request.if_none_match.contains(key.etag):
+                response = make_response("", 304)
+                response.set_etag(key.etag)
+                response.headers["Cache-Control"] = cache_control
+                return response
+            
+            image, layout = get_thumbnail_strip(pdf_path, config=cache_config, key=key)
+            if want_layout:
+                return jsonify({"success": True, "pdf_file": pdf_filename, "etag": image.etag, **layout})
+            
+            response = send_file(io.BytesIO(image.data), mimetype=image.mimetype)
+            response.set_etag(image.etag)
+            response.headers["Cache-Control"] = cache_control
+            return response
+        except Exception as e:
+            import traceback
+            print(f"ERROR: Ошибка построения миниатюр: {e}\n{traceback.format_exc()}")
+            return jsonify({"error": f"Ошибка построения миниатюр: {str(e)}"}), 500
+    
+
     @app.route("/api/pdf-extract-text", methods=["POST"])
     def api_pdf_extract_text():
         """API endpoint для извлечения текста из выделенных областей PDF."""
@@ -1378,13 +1351,13 @@ def register_pdf_routes(app, ctx):
             options = ExtractionOptions.from_dict(options_dict)
 
             try:
-                import pdfplumber
+                from converters.pdf_layout_cache import open_pdf_layout
 
                 extractor = PDFTextExtractor(options)
                 extracted = []
 
                 print(f"DEBUG: Открываем PDF: {pdf_path}")
-                with pdfplumber.open(str(pdf_path)) as pdf:
+                with open_pdf_layout(pdf_path) as pdf:
                     print(f"DEBUG: PDF содержит {len(pdf.pages)} страниц")
 
                     for selection in selections:
@@ -8784,6 +8784,76 @@ function placeCaretAtStart(element) {
   selection.addRange(range);
 }
 
+// Чтение потока ответа: ReadableStream (response.body.getReader) и TextDecoder.
+function canReadEventStream() {
+  return typeof window.ReadableStream === "function"
+    && typeof TextDecoder !== "undefined"
+    && typeof Response !== "undefined"
+    && "body" in Response.prototype;
+}
+
+// POST с ответом Server-Sent Events: onEvent(имя, данные) для каждого события.
+// Возвращает false, если браузер не умеет читать поток (тогда нужен обычный запрос);
+// проверка выполняется до запроса, чтобы сервер не обрабатывал текст дважды.
+async function postEventStream(url, payload, onEvent) {
+  if (!canReadEventStream()) {
+    return false;
+  }
+  const response = await fetch(url, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      "Accept": "text/event-stream",
+    },
+    body: JSON.stringify(payload),
+  });
+  if (!response.ok) {
+    throw new Error(`Ошибка HTTP ${response.status}`);
+  }
+  let buffer = "";
+  const dispatch = (block) => {
+    let eventName = "message";
+    const dataLines = [];
+    block.split("\n").forEach((line) => {
+      if (line.startsWith("event:")) eventName = line.slice(6).trim();
+      else if (line.startsWith("data:")) dataLines.push(line.slice(5).trim());
+    });
+    if (!dataLines.length) return;
+    let data = {};
+    try {
+      data = JSON.parse(dataLines.join("\n"));
+    } catch (_) {
+      return;
+    }
+    onEvent(eventName, data);
+  };
+  const dispatchBuffer = () => {
+    let sep = buffer.indexOf("\n\n");
+    while (sep !== -1) {
+      dispatch(buffer.slice(0, sep));
+      buffer = buffer.slice(sep + 2);
+      sep = buffer.indexOf("\n\n");
+    }
+  };
+  if (!response.body || !response.body.getReader) {
+    // Запрос уже выполнен: разбираем ответ целиком, а не повторяем его
+    buffer = (await response.text()).replace(/\r\n/g, "\n");
+    dispatchBuffer();
+    if (buffer.trim()) dispatch(buffer);
+    return true;
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder("utf-8");
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true }).replace(/\r\n/g, "\n");
+    dispatchBuffer();
+  }
+  if (buffer.trim()) dispatch(buffer);
+  return true;
+}
+
 async function processReferencesWithAI(fieldId) {
   const field = document.getElementById(fieldId);
   if (!field) {
@@ -8807,18 +8877,48 @@ async function processReferencesWithAI(fieldId) {
   }
   
   try {
-    const response = await fetch("/process-references-ai", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
+    // Источники показываются по мере готовности чанков (в порядке чанков)
+    const chunkRefs = [];
+    let data = null;
+    const streamed = await postEventStream(
+      "/process-references-ai/stream",
+      { field_id: fieldId, text: rawText },
+      (eventName, payload) => {
+        if (eventName === "start") {
+          if (btn) btn.textContent = `⏳ ИИ: 0/${payload.chunks}`;
+        } else if (eventName === "chunk") {
+          chunkRefs[payload.index - 1] = payload.references || [];
+          field.value = chunkRefs.filter(Boolean).flat().join("\n");
+          if (btn) btn.textContent = `⏳ ИИ: ${payload.completed}/${payload.total}`;
+        } else if (eventName === "progress") {
+          if (btn) btn.textContent = `⏳ ИИ: ${payload.completed}/${payload.total} (${Math.round(payload.elapsed)} с)`;
+        } else if (eventName === "done") {
+          data = { success: true, ...payload };
+        } else if (eventName === "error") {
+          data = { success: false, error: payload.error };
+        }
       },
-      body: JSON.stringify({
-        field_id: fieldId,
-        text: rawText,
-      }),
-    });
-    
-    const data = await response.json();
+    );
+    if (!streamed) {
+      const response = await fetch("/process-references-ai", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({
+          field_id: fieldId,
+          text: rawText,
+        }),
+      });
+      data = await response.json();
+    }
+    if (!data) {
+      data = { success: false, error: "Поток ответа прерван" };
+    }
+    if (!data.success && chunkRefs.length) {
+      // Частичный результат не подменяет исходный текст
+      field.value = rawText;
+    }
     
     if (data.success) {
       field.dataset.aiProcessed = "1";
@@ -8864,20 +8964,35 @@ async function processAnnotationWithAI(fieldId) {
   }
 
   try {
-    const response = await fetch("/process-annotation-ai", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
+    let data = null;
+    const streamed = await postEventStream(
+      "/process-annotation-ai/stream",
+      { field_id: fieldId, text: rawText },
+      (eventName, payload) => {
+        if (eventName === "progress") {
+          if (btn) btn.textContent = `⏳ Обработка ИИ... ${Math.round(payload.elapsed)} с`;
+        } else if (eventName === "done") {
+          data = { success: true, ...payload };
+        } else if (eventName === "error") {
+          data = { success: false, error: payload.error };
+        }
       },
-      body: JSON.stringify({
-        field_id: fieldId,
-        text: rawText,
-      }),
-    });
-
-    const data = await response.json();
-    if (!response.ok || !data.success) {
-      throw new Error(data.error || "Не удалось обработать аннотацию.");
+    );
+    if (!streamed) {
+      const response = await fetch("/process-annotation-ai", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({
+          field_id: fieldId,
+          text: rawText,
+        }),
+      });
+      data = await response.json();
+    }
+    if (!data || !data.success) {
+      throw new Error((data && data.error) || "Не удалось обработать аннотацию.");
     }
 
     const cleaned = String(data.text || "").trim();
@@ -141,6 +141,166 @@ class Config:
                 "smart_columns": True,  # Автоопределение 1/2 колонок при извлечении
                 "two_column_min_words": 10,  # Мин. слов в каждой половине для 2-колоночной страницы
                 "two_column_gutter_ratio": 0.1,  # Центральный зазор (доля ширины) для детекта колонок
+                "ocr_scanned_pages": True,  # Распознавать страницы без текстового слоя перед отправкой в LLM
+                "scanned_page_min_chars": 20,  # Страница с меньшим числом символов считается сканом
+                "ocr_lang": "rus+eng",  # Языки Tesseract для страниц-сканов
+                "adaptive_window": True,  # Читать начало до аннотации/ключевых слов и конец до списка литературы (вместо всех страниц)
+                "adaptive_max_pages": 12,  # Предел страниц адаптивного чтения (0 — без ограничения)
+            },
+            
+            # ----------------------------
+            # Настройки конвертации PDF -> строки/HTML
+            # ----------------------------
+            "pdf_to_html": {
+                "parallel_workers": 0,  # Процессов для постраничного извлечения (0 — по числу ядер, не больше 4; 1 — последовательно). Пул создается один раз на воркер
+                "parallel_min_pages": 16,  # Пул процессов используется только для PDF от стольких страниц
+            },
+            
+            # ----------------------------
+            # Кэш разметки PDF (символы/слова/геометрия страниц)
+            # ----------------------------
+            "pdf_layout_cache": {
+                "enabled": True,  # Использовать общий кэш разметки PDF
+                "cache_dir": "pdf_layout_cache",  # Директория кэша (относительно project_root)
+                "max_size_mb": 512,  # Лимит размера кэша на диске, МБ (LRU по документам)
+                "memory_pages": 32,  # Сколько страниц держать в памяти процесса (в каждом воркере)
+                "budget_check_interval_sec": 300,  # Не чаще проверять размер кэша на диске, сек (или после записи 5% лимита)
+            },
+            
+            # ----------------------------
+            # Выбор движка извлечения текста PDF (converters/pdf_backend.py)
+            # ----------------------------
+            "pdf_backend": {
+                "mode": "pdfplumber",  # pdfplumber | auto (PyMuPDF + pdfplumber для плохих страниц) | pymupdf
+                "max_quality_score": 10.0,  # Порог оценки качества страницы (меньше = лучше), выше — pdfplumber
+                "min_page_chars": 20,  # Страницы с меньшим числом символов перечитываются pdfplumber
+                "report_path": "",  # Журнал выбора движка по страницам, например logs/pdf_backend.jsonl ("" — не писать)
+                "report_max_mb": 10,  # Размер журнала, после которого он переносится в <имя>.1, МБ
+            },
+            
+            # ----------------------------
+            # Пул открытых PDF (pdfplumber) внутри воркера
+            # ----------------------------
+            "pdf_handle_pool": {
+                "max_handles": 8,  # Максимум открытых документов
+                "max_memory_mb": 256,  # Оценочный лимит памяти под открытые документы, МБ
+                "idle_timeout_sec": 600,  # Закрывать документы, не использовавшиеся дольше, сек
+            },
+            
+            # ----------------------------
+            # Кэш изображений страниц PDF (/api/pdf-image)
+            # ----------------------------
+            "pdf_image_cache": {
+                "enabled": True,  # Кэшировать отрендеренные страницы на диске
+                "cache_dir": "pdf_image_cache",  # Директория кэша (относительно project_root)
+                "max_size_mb": 256,  # Лимит размера кэша на диске, МБ (LRU по файлам)
+                "dpi": 150,  # Разрешение рендера по умолчанию
+                "format": "png",  # Формат по умолчанию: png, webp или jpeg
+                "quality": 85,  # Качество для webp/jpeg (1-100)
+                "max_age": 300,  # Cache-Control max-age в секундах (0 — всегда проверять ETag)
+                "thumbnail_width": 120,  # Ширина миниатюры в спрайте, px
+                "thumbnail_columns": 10,  # Колонок в спрайте миниатюр
+                "prerender_on_upload": True,  # Фоновый рендер первых страниц и миниатюр после загрузки архива
+                "prerender_workers": 2,  # Сколько документов рендерить в фоне одновременно
+            },
+            
+            # ----------------------------
+            # OCR областей и страниц PDF (converters/pdf_ocr.py)
+            # ----------------------------
+            "pdf_ocr": {
+                "enabled": True,  # Кэшировать результаты OCR на диске
+                "cache_dir": "pdf_ocr_cache",  # Директория кэша (относительно project_root)
+                "max_size_mb": 128,  # Лимит размера кэша на диске, МБ (LRU по файлам)
+                "workers": 0,  # Процессов Tesseract (0 — по числу ядер)
+                "max_pending": 8,  # Заданий в очереди сверх workers (остальные ждут слот)
+                "timeout_sec": 120,  # Ожидание слота и результата одного задания, сек
+                "dpi": 300,  # Разрешение рендера для OCR
+                "bbox_step": 1.0,  # Шаг округления области для ключа кэша, pt
+                "page_mode": False,  # Распознавать страницу целиком, области — из ее слов
+            },
+            
+            # ----------------------------
+            # Конвейерная обработка архива (services/archive_pipeline.py)
+            # ----------------------------
+            "archive_processing": {
+                "cpu_workers": 0,  # Процессов для чтения и очистки PDF (0 — по числу ядер)
+                "llm_concurrency": 4,  # Одновременных запросов к GPT
+            },
+            
+            # ----------------------------
+            # HTTP-клиенты LLM (services/llm_clients.py)
+            # ----------------------------
+            "llm_clients": {
+                "max_connections": 20,  # Соединений на клиент (api_key, base_url, timeout)
+                "max_keepalive_connections": 10,  # Из них держать открытыми между запросами
+                "keepalive_expiry_sec": 30,  # Закрывать простаивающие соединения через, сек
+                "connect_timeout_sec": 10,  # Таймаут установки соединения, сек
+                "http2": True,  # HTTP/2, если установлен пакет h2
+                "max_retries": 2,  # Повторы запроса в SDK OpenAI
+            },
+            
+            # ----------------------------
+            # Кэш ответов LLM (services/llm_cache.py, SQLite в gpt_extraction.cache_dir)
+            # ----------------------------
+            "llm_cache": {
+                "max_size_mb": 256,  # Бюджет размера ответов (давно не использованные удаляются)
+                "ttl_days": 90,  # Срок жизни записи, дней (0 — без срока)
+                "prompt_version": "1",  # Версия промптов: смена отключает старые ответы
+                "migrate_json": True,  # Перенести файлы <хэш>.json прежнего кэша в базу
+                "near_duplicate": False,  # Отдавать ответ для почти совпадающего текста статьи (SimHash)
+                "near_max_distance": 3,  # Максимум различающихся бит SimHash (из 64)
+                "near_max_length_delta": 0.05,  # Максимальная относительная разница длины текста
+            },
+            
+            # ----------------------------
+            # Объединение одинаковых одновременных запросов к LLM (services/llm_singleflight.py)
+            # ----------------------------
+            "llm_singleflight": {
+                "enabled": True,  # Второй такой же запрос ждет ответ первого из кэша
+                "wait_timeout_sec": 240,  # Максимальное ожидание, сек (затем запрос выполняется сам)
+                "poll_interval_sec": 0.1,  # Интервал проверки блокировки, сек
+            },
+            
+            # ----------------------------
+            # Общий для воркеров лимит запросов к LLM (services/llm_rate_limit.py)
+            # ----------------------------
+            "llm_rate_limit": {
+                "enabled": True,  # Token bucket RPM/TPM перед каждым запросом
+                "state_file": "gpt_cache/llm_rate_limit.sqlite3",  # Состояние корзин (относительно project_root)
+                "limits": {  # провайдер -> модель ("*" — остальные) -> лимиты в минуту (0 — без лимита)
+                    "openai": {"*": {"rpm": 500, "tpm": 200000}},
+                    "mistral": {"*": {"rpm": 60, "tpm": 500000}},
+                },
+                "max_wait_sec": 300,  # Максимальное ожидание лимита, сек (затем запрос уходит без него)
+                "completion_tokens": 1500,  # Ожидаемый размер ответа для оценки TPM
+                "max_retries": 3,  # Повторов при 429, 5xx и ошибках соединения (вместо повторов клиента)
+                "backoff_sec": 2,  # Начальная пауза без заголовка retry-after, сек (удваивается)
+                "max_backoff_sec": 60,  # Максимальная пауза, сек
+            },
+            
+            # ----------------------------
+            # Очередь запросов к LLM: интерактивные раньше пакетных (services/llm_scheduler.py)
+            # ----------------------------
+            "llm_scheduler": {
+                "enabled": True,  # Приоритеты и круговая очередь по сессиям
+                "max_concurrent": 8,  # Одновременных запросов к LLM в воркере
+                "interactive_reserved": 2,  # Мест, недоступных обработке архива
+                "batch_bucket_reserve": 0.2,  # Доля лимитов RPM/TPM, которую обработка архива не берет
+            },
+            
+            # ----------------------------
+            # Бюджет токенов промптов LLM (services/token_budget.py, tiktoken при наличии)
+            # ----------------------------
+            "token_budget": {
+                "encoding": "",  # Кодировка tiktoken (пусто — по модели, для неизвестных o200k_base)
+                "metadata_max_tokens": 24000,  # Токенов текста статьи в промпте метаданных (0 — без ограничения)
+                "metadata_head_ratio": 0.7,  # Доля бюджета на начало статьи (остальное — конец статьи)
+                # Токенов текста в одном запросе нормализации литературы. В config.json
+                # references_ai.chunk_tokens переопределяет значение; прежние ключи
+                # references_ai.max_chunk_chars (переводится в токены: 4 символа на токен)
+                # и references_ai.chunk_size (строк в чанке) продолжают ограничивать чанк
+                "references_chunk_tokens": 1500,
+                "references_chunk_tokens_railway": 800,  # То же на Railway
             },
             
             # ----------------------------
@@ -156,6 +316,7 @@ class Config:
                 "use_cache": True,  # Использовать ли кэширование результатов
                 "extract_abstracts": True,  # Извлекать аннотации
                 "extract_references": True,  # Извлекать списки литературы
+                "max_concurrency": 8,  # Одновременных запросов в асинхронной пакетной обработке
             },
         }
     
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pdf_backend.py
+
+Выбор движка извлечения текста из PDF по страницам.
+
+PyMuPDF в 10-50 раз быстрее pdfplumber, но на части документов (сложная
+верстка, нестандартные шрифты) дает "кашу". В режиме auto каждая страница
+сначала читается через PyMuPDF, результат оценивается эвристиками качества
+(converters.text_quality: TextQualityAnalyzer и is_garbled_text), и только
+плохие страницы повторно читаются через pdfplumber. По умолчанию включен
+режим pdfplumber: auto включается явно, когда пороги подобраны по журналу.
+
+Для каждой страницы записывается выбранный движок, время и оценка
+(get_backend_stats() и JSON Lines в pdf_backend.report_path), чтобы по
+реальным документам подбирать пороги.
+
+extract_pages() читает набор страниц за один вызов; BackendDocument держит
+документ открытым для постраничного чтения (pdf_reader.PDFPageSource).
+
+Режимы (config.py, pdf_backend.mode):
+- auto: PyMuPDF + эскалация плохих страниц в pdfplumber;
+- pdfplumber: только pdfplumber (прежнее поведение, по умолчанию);
+- pymupdf: только PyMuPDF.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
+
+try:
+    import fitz  # type: ignore  # PyMuPDF
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
+try:
+    import pdfplumber  # type: ignore
+    PDFPLUMBER_AVAILABLE = True
+except ImportError:
+    PDFPLUMBER_AVAILABLE = False
+
+from converters.text_quality import LanguageDetector, TextQualityAnalyzer, is_garbled_text
+
+
+BACKEND_MODES = ("auto", "pdfplumber", "pymupdf")
+DEFAULT_MODE = "pdfplumber"
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+# =========================
+# Configuration
+# =========================
+
+@dataclass(frozen=True)
+class PDFBackendConfig:
+    """Настройки выбора движка."""
+    mode: str = DEFAULT_MODE
+    # Страница эскалируется, если оценка TextQualityAnalyzer (меньше = лучше) выше порога
+    max_quality_score: float = 10.0
+    # ... или если PyMuPDF извлек меньше символов (без пробелов)
+    min_page_chars: int = 20
+    # Журнал решений по страницам (JSON Lines); None — не писать
+    report_path: Optional[Path] = None
+    # Размер журнала, после которого он переименовывается в <имя>.1, МБ
+    report_max_mb: float = 10.0
+
+
+def load_backend_config() -> PDFBackendConfig:
+    """Читает настройки из config.py (секция pdf_backend)."""
+    try:
+        from config import get_config
+        cfg = get_config()
+        mode = str(cfg.get("pdf_backend.mode", DEFAULT_MODE) or DEFAULT_MODE).lower()
+        # Относительный путь — от project_root, а не от текущего каталога
+        report_path = cfg.get_path("pdf_backend.report_path") if cfg.get("pdf_backend.report_path") else None
+        return PDFBackendConfig(
+            mode=mode if mode in BACKEND_MODES else DEFAULT_MODE,
+            max_quality_score=float(cfg.get("pdf_backend.max_quality_score", 10.0)),
+            min_page_chars=int(cfg.get("pdf_backend.min_page_chars", 20)),
+            report_path=report_path,
+            report_max_mb=float(cfg.get("pdf_backend.report_max_mb", 10)),
+        )
+    except (ImportError, KeyError, TypeError, ValueError):
+        return PDFBackendConfig()
+
+
+def resolve_mode(config: PDFBackendConfig) -> str:
+    """Фактический режим с учетом установленных библиотек."""
+    if config.mode == "auto":
+        if PYMUPDF_AVAILABLE and PDFPLUMBER_AVAILABLE:
+            return "auto"
+        return "pymupdf" if PYMUPDF_AVAILABLE else "pdfplumber"
+    if config.mode == "pymupdf" and not PYMUPDF_AVAILABLE:
+        return "pdfplumber"
+    if config.mode == "pdfplumber" and not PDFPLUMBER_AVAILABLE and PYMUPDF_AVAILABLE:
+        return "pymupdf"
+    return config.mode
+
+
+# =========================
+# Report
+# =========================
+
+@dataclass
+class PageBackendRecord:
+    """Решение по одной странице."""
+    page: int  # нумерация с 1
+    backend: str
+    seconds: float
+    score: Optional[float] = None
+    garbled: bool = False
+    escalated: bool = False
+    reason: str = ""
+    # Оценка результата pdfplumber после эскалации: если он тоже "плохой",
+    # эскалация была лишней — сигнал для подстройки порогов
+    fallback_score: Optional[float] = None
+    fallback_garbled: Optional[bool] = None
+
+
+@dataclass
+class BackendReport:
+    """Отчет о выборе движка для документа."""
+    source: str
+    purpose: str
+    mode: str
+    pages: List[PageBackendRecord] = field(default_factory=list)
+    total_seconds: float = 0.0
+
+    @property
+    def escalated_pages(self) -> List[int]:
+        return [r.page for r in self.pages if r.escalated]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "purpose": self.purpose,
+            "mode": self.mode,
+            "total_seconds": round(self.total_seconds, 4),
+            "pages": [asdict(r) for r in self.pages],
+        }
+
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {
+    "documents": 0,
+    "pages": {"pymupdf": 0, "pdfplumber": 0},
+    "seconds": {"pymupdf": 0.0, "pdfplumber": 0.0},
+    "escalated": 0,
+}
+
+
+def get_backend_stats() -> Dict[str, Any]:
+    """Счетчики текущего процесса: страницы и время по движкам, число эскалаций."""
+    with _stats_lock:
+        return {
+            "documents": _stats["documents"],
+            "pages": dict(_stats["pages"]),
+            "seconds": {k: round(v, 4) for k, v in _stats["seconds"].items()},
+            "escalated": _stats["escalated"],
+        }
+
+
+_report_lock = threading.Lock()
+
+
+def _rotate_report(config: PDFBackendConfig) -> None:
+    """Журнал больше report_max_mb переименовывается в <имя>.1 (прежний .1 удаляется)."""
+    if config.report_max_mb <= 0:
+        return
+    try:
+        size = config.report_path.stat().st_size
+    except OSError:
+        return
+    if size >= config.report_max_mb * 1024 * 1024:
+        os.replace(config.report_path, config.report_path.with_name(config.report_path.name + ".1"))
+
+
+def _record(report: BackendReport, config: PDFBackendConfig) -> None:
+    with _stats_lock:
+        _stats["documents"] += 1
+        for r in report.pages:
+            _stats["pages"][r.backend] = _stats["pages"].get(r.backend, 0) + 1
+            _stats["seconds"][r.backend] = _stats["seconds"].get(r.backend, 0.0) + r.seconds
+            if r.escalated:
+                _stats["escalated"] += 1
+
+    escalated = report.escalated_pages
+    LOGGER.debug(
+        "pdf_backend %s: %s, страниц %d, в pdfplumber %d, %.2f с",
+        report.mode, Path(report.source).name, len(report.pages), len(escalated), report.total_seconds,
+    )
+
+    if not config.report_path:
+        return
+    try:
+        config.report_path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"ts": datetime.now().isoformat(timespec="seconds"), **report.to_dict()}
+        with _report_lock:
+            _rotate_report(config)
+            with open(config.report_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"WARNING: Не удалось записать отчет pdf_backend: {e}")
+
+
+# =========================
+# Scoring
+# =========================
+
+def score_page_text(text: str, config: PDFBackendConfig) -> Tuple[float, bool, str]:
+    """
+    Оценивает текст страницы: (оценка качества, признак "каши", причина эскалации).
+    Пустая причина — страницу можно оставить за быстрым движком.
+    """
+    stripped = "".join((text or "").split())
+    if len(stripped) < config.min_page_chars:
+        return float("inf"), False, "мало текста"
+
+    language = LanguageDetector.detect(text)
+    score = TextQualityAnalyzer.calculate_quality_score(text, language)
+    lang_hint = language.value if language.value in ("ru", "en") else None
+    garbled = is_garbled_text(text, lang_hint)
+    if garbled:
+        return score, True, "каша"
+    if score > config.max_quality_score:
+        return score, False, "оценка качества"
+    return score, False, ""
+
+
+# =========================
+# Selection
+# =========================
+
+class BackendDocument:
+    """
+    Открытый документ для извлечения страниц выбранным движком по частям.
+    PyMuPDF открывает документ один раз, pdfplumber (кэш разметки) — при
+    первой странице, которую нужно эскалировать; страницы всех вызовов
+    extract() попадают в один отчет, который записывается при закрытии.
+
+    Использование:
+        with BackendDocument(path, fast_page, plumber_page, text_of) as document:
+            first = document.extract([0])
+            last = document.extract([document.page_count - 1])
+    """
+
+    def __init__(
+        self,
+        pdf_path: Union[str, Path],
+        pymupdf_page: Callable[[Any], T],
+        pdfplumber_page: Callable[[Any], T],
+        text_of: Callable[[T], str],
+        config: Optional[PDFBackendConfig] = None,
+        purpose: str = "",
+    ):
+        started = time.perf_counter()
+        self.config = config or load_backend_config()
+        self.mode = resolve_mode(self.config)
+        self.path = Path(pdf_path)
+        self.report = BackendReport(source=str(self.path), purpose=purpose, mode=self.mode)
+        self._pymupdf_page = pymupdf_page
+        self._pdfplumber_page = pdfplumber_page
+        self._text_of = text_of
+        self._records: Dict[int, PageBackendRecord] = {}
+        self._fitz_doc: Any = fitz.open(str(self.path)) if self.mode in ("auto", "pymupdf") else None
+        self._layout_context: Any = None
+        self._layout: Any = None
+        self._closed = False
+        self.report.total_seconds = time.perf_counter() - started
+
+    @property
+    def page_count(self) -> int:
+        if self._fitz_doc is not None:
+            return len(self._fitz_doc)
+        return len(self._open_layout().pages)
+
+    def _open_layout(self) -> Any:
+        if self._layout is None:
+            from converters.pdf_layout_cache import open_pdf_layout
+
+            self._layout_context = open_pdf_layout(self.path)
+            self._layout = self._layout_context.__enter__()
+        return self._layout
+
+    def extract(self, page_indexes: Optional[Sequence[int]] = None) -> Dict[int, T]:
+        """
+        Страницы документа: {индекс страницы (с 0): результат}; None — все.
+        Ошибка чтения страницы оставляет ее без результата.
+        """
+        if self._closed:
+            raise ValueError("Документ pdf_backend уже закрыт")
+        started = time.perf_counter()
+        config = self.config
+        mode = self.mode
+        results: Dict[int, T] = {}
+        records = self._records
+
+        pending: List[int] = []
+        if self._fitz_doc is not None:
+            doc = self._fitz_doc
+            indexes = list(range(len(doc))) if page_indexes is None else list(page_indexes)
+            for i in indexes:
+                t0 = time.perf_counter()
+                try:
+                    result = self._pymupdf_page(doc[i])
+                except Exception as e:
+                    print(f"WARNING: PyMuPDF не прочитал страницу {i + 1}: {e}")
+                    pending.append(i)
+                    continue
+                seconds = time.perf_counter() - t0
+                record = PageBackendRecord(page=i + 1, backend="pymupdf", seconds=round(seconds, 5))
+                results[i] = result
+                records[i] = record
+                if mode == "auto":
+                    score, garbled, reason = score_page_text(self._text_of(result), config)
+                    record.score = None if score == float("inf") else round(score, 3)
+                    record.garbled = garbled
+                    if reason:
+                        record.reason = reason
+                        pending.append(i)
+        else:
+            pending = list(page_indexes) if page_indexes is not None else []
+
+        try:
+            if mode != "pymupdf" and (pending or mode == "pdfplumber"):
+                pdf = self._open_layout()
+                if mode == "pdfplumber" and page_indexes is None:
+                    pending = list(range(len(pdf.pages)))
+                for i in pending:
+                    t0 = time.perf_counter()
+                    try:
+                        result = self._pdfplumber_page(pdf.pages[i])
+                    except Exception as e:
+                        print(f"WARNING: pdfplumber не прочитал страницу {i + 1}: {e}")
+                        continue
+                    seconds = time.perf_counter() - t0
+                    fast = records.get(i) if mode == "auto" else None
+                    results[i] = result
+                    record = PageBackendRecord(
+                        page=i + 1,
+                        backend="pdfplumber",
+                        seconds=round(seconds + (fast.seconds if fast else 0.0), 5),
+                        score=fast.score if fast else None,
+                        garbled=fast.garbled if fast else False,
+                        escalated=mode == "auto",
+                        reason=fast.reason if fast else "",
+                    )
+                    if record.escalated:
+                        score, garbled, _reason = score_page_text(self._text_of(result), config)
+                        record.fallback_score = None if score == float("inf") else round(score, 3)
+                        record.fallback_garbled = garbled
+                    records[i] = record
+        finally:
+            self.report.total_seconds += time.perf_counter() - started
+        return results
+
+    def close(self, record: bool = True) -> None:
+        """Закрывает документ; record — записать отчет (статистика и журнал)."""
+        if self._closed:
+            return
+        self._closed = True
+        started = time.perf_counter()
+        try:
+            if self._layout_context is not None:
+                context, self._layout_context = self._layout_context, None
+                context.__exit__(None, None, None)
+            if self._fitz_doc is not None:
+                doc, self._fitz_doc = self._fitz_doc, None
+                doc.close()
+        finally:
+            self._layout = None
+            self.report.total_seconds += time.perf_counter() - started
+            self.report.pages = [self._records[i] for i in sorted(self._records)]
+            if record:
+                _record(self.report, self.config)
+
+    def __enter__(self) -> "BackendDocument":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        self.close(record=exc_type is None)
+
+
+def extract_pages(
+    pdf_path: Union[str, Path],
+    pymupdf_page: Callable[[Any], T],
+    pdfplumber_page: Callable[[Any], T],
+    text_of: Callable[[T], str],
+    page_indexes: Optional[Sequence[int]] = None,
+    config: Optional[PDFBackendConfig] = None,
+    purpose: str = "",
+) -> Tuple[Dict[int, T], BackendReport]:
+    """
+    Извлекает страницы выбранным движком.
+
+    Args:
+        pdf_path: Путь к PDF
+        pymupdf_page: Извлечение страницы fitz.Page -> результат
+        pdfplumber_page: Извлечение страницы pdfplumber -> результат того же вида
+        text_of: Текст результата (для оценки качества)
+        page_indexes: Индексы страниц (с 0); None — все
+        config: Настройки; None — из config.py
+        purpose: Метка потребителя для отчета
+
+    Returns:
+        ({индекс страницы: результат}, отчет). Ошибки открытия документа
+        пробрасываются; ошибка чтения страницы оставляет ее без результата.
+    """
+    with BackendDocument(pdf_path, pymupdf_page, pdfplumber_page, text_of, config, purpose) as document:
+        results = document.extract(page_indexes)
+    return results, document.report
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pdf_handle_pool.py
+
+Пул открытых документов pdfplumber внутри процесса (воркера gunicorn).
+
+pdfplumber.open разбирает xref и дерево страниц заново при каждом вызове,
+хотя пользователь работает с одним PDF много минут подряд. Пул держит
+открытые pdfplumber.PDF по ключу (путь, mtime, размер) и выдает их
+эксклюзивно: один дескриптор в каждый момент используется одним потоком,
+при конкурентном доступе к тому же файлу открывается дополнительный.
+
+Ограничения пула:
+- max_handles: число открытых дескрипторов (LRU);
+- max_memory_mb: оценка занимаемой памяти (по размеру файлов, см. MEMORY_FACTOR);
+- idle_timeout_sec: дескрипторы, не использовавшиеся дольше, закрываются.
+
+Использование:
+    with checkout_pdf(pdf_path) as pdf:
+        page = pdf.pages[0]
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+try:
+    import pdfplumber
+    PDFPLUMBER_AVAILABLE = True
+except ImportError:
+    PDFPLUMBER_AVAILABLE = False
+
+
+# Во сколько раз разобранный документ pdfminer больше файла на диске (грубая оценка).
+MEMORY_FACTOR = 2.0
+
+HandleKey = Tuple[str, int, int]
+
+
+# =========================
+# Configuration
+# =========================
+
+@dataclass(frozen=True)
+class PDFHandlePoolConfig:
+    """Настройки пула дескрипторов."""
+    max_handles: int = 8
+    max_memory_mb: float = 256.0
+    idle_timeout_sec: float = 600.0
+
+
+def load_handle_pool_config() -> PDFHandlePoolConfig:
+    """Читает настройки из config.py (секция pdf_handle_pool)."""
+    try:
+        from config import get_config
+        cfg = get_config()
+        return PDFHandlePoolConfig(
+            max_handles=int(cfg.get("pdf_handle_pool.max_handles", 8)),
+            max_memory_mb=float(cfg.get("pdf_handle_pool.max_memory_mb", 256)),
+            idle_timeout_sec=float(cfg.get("pdf_handle_pool.idle_timeout_sec", 600)),
+        )
+    except (ImportError, TypeError, ValueError):
+        return PDFHandlePoolConfig()
+
+
+# =========================
+# Pool
+# =========================
+
+@dataclass
+class _IdleHandle:
+    pdf: Any
+    key: HandleKey
+    size_bytes: int
+    last_used: float
+
+
+def handle_key(path: Union[str, Path]) -> HandleKey:
+    """Ключ дескриптора: абсолютный путь + mtime + размер (смена файла = новый ключ)."""
+    p = Path(path).resolve()
+    st = p.stat()
+    return (str(p), st.st_mtime_ns, st.st_size)
+
+
+def _close_quietly(pdf: Any) -> None:
+    try:
+        pdf.close()
+    except Exception:
+        pass
+
+
+class PDFHandlePool:
+    """Потокобезопасный LRU-пул открытых pdfplumber.PDF."""
+
+    def __init__(self, config: Optional[PDFHandlePoolConfig] = None):
+        self.config = config or PDFHandlePoolConfig()
+        self._lock = threading.Lock()
+        self._idle: List[_IdleHandle] = []  # от давно использованных к недавним
+        self._in_use = 0
+        self._stats: Dict[str, int] = {"reused": 0, "opened": 0, "closed": 0}
+
+    def acquire(self, path: Union[str, Path]) -> Tuple[Any, HandleKey]:
+        """Выдает свободный дескриптор для файла (или открывает новый)."""
+        if not PDFPLUMBER_AVAILABLE:
+            raise ImportError("pdfplumber не установлен. Установите: pip install pdfplumber")
+        key = handle_key(path)
+        to_close: List[Any] = []
+        found = None
+        with self._lock:
+            to_close.extend(self._sweep_locked(time.monotonic()))
+            for i in range(len(self._idle) - 1, -1, -1):
+                entry = self._idle[i]
+                if entry.key == key:
+                    found = self._idle.pop(i)
+                    break
+                if entry.key[0] == key[0]:
+                    # Файл изменился — старый дескриптор больше не нужен
+                    to_close.append(self._idle.pop(i).pdf)
+            self._in_use += 1
+            if found is not None:
+                self._stats["reused"] += 1
+            self._stats["closed"] += len(to_close)
+        for pdf in to_close:
+            _close_quietly(pdf)
+        if found is not None:
+            return found.pdf, key
+        try:
+            pdf = pdfplumber.open(key[0])
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+            raise
+        with self._lock:
+            self._stats["opened"] += 1
+        return pdf, key
+
+    def release(self, pdf: Any, key: HandleKey, discard: bool = False) -> None:
+        """Возвращает дескриптор в пул (discard=True — закрыть, например после ошибки)."""
+        # Освобождаем разобранные объекты страниц, xref и дерево страниц остаются
+        for page in getattr(pdf, "_pages", None) or []:
+            try:
+                page.close()
+            except Exception:
+                pass
+        to_close: List[Any] = []
+        with self._lock:
+            self._in_use = max(0, self._in_use - 1)
+            if discard or self.config.max_handles <= 0:
+                to_close.append(pdf)
+            else:
+                self._idle.append(_IdleHandle(pdf=pdf, key=key, size_bytes=key[2], last_used=time.monotonic()))
+                to_close.extend(self._enforce_limits_locked())
+            self._stats["closed"] += len(to_close)
+        for item in to_close:
+            _close_quietly(item)
+
+    @contextmanager
+    def checkout(self, path: Union[str, Path]) -> Iterator[Any]:
+        """Контекстный менеджер: эксклюзивный дескриптор на время блока."""
+        pdf, key = self.acquire(path)
+        failed = False
+        try:
+            yield pdf
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.release(pdf, key, discard=failed)
+
+    def _sweep_locked(self, now: float) -> List[Any]:
+        timeout = self.config.idle_timeout_sec
+        if timeout <= 0:
+            return []
+        expired = [e for e in self._idle if now - e.last_used > timeout]
+        if expired:
+            self._idle = [e for e in self._idle if now - e.last_used <= timeout]
+        return [e.pdf for e in expired]
+
+    def _enforce_limits_locked(self) -> List[Any]:
+        closed = self._sweep_locked(time.monotonic())
+        budget = self.config.max_memory_mb * 1024 * 1024
+        while self._idle and (
+            len(self._idle) > self.config.max_handles
+            or sum(e.size_bytes for e in self._idle) * MEMORY_FACTOR > budget
+        ):
+            closed.append(self._idle.pop(0).pdf)
+        return closed
+
+    def clear(self) -> None:
+        """Закрывает все свободные дескрипторы."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._stats["closed"] += len(idle)
+        for entry in idle:
+            _close_quietly(entry.pdf)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._in_use
+            stats["estimated_mb"] = round(sum(e.size_bytes for e in self._idle) * MEMORY_FACTOR / (1024 * 1024), 2)
+        return stats
+
+
+# =========================
+# Process-wide pool
+# =========================
+
+_pool: Optional[PDFHandlePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_handle_pool() -> PDFHandlePool:
+    """Пул текущего процесса (создается при первом обращении)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PDFHandlePool(load_handle_pool_config())
+        return _pool
+
+
+def checkout_pdf(path: Union[str, Path]):
+    """Сокращение для get_handle_pool().checkout(path)."""
+    return get_handle_pool().checkout(path)
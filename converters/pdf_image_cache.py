@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pdf_image_cache.py
+
+Дисковый кэш отрендеренных страниц PDF.
+
+Ключ кэша — (SHA-256 файла, страница, dpi, формат, качество), поэтому одна
+и та же страница рендерится poppler (pdf2image) один раз. Объем кэша
+ограничен по байтам, при превышении удаляются наименее недавно
+использованные изображения. Для HTTP отдается сильный ETag, вычисляемый
+из того же ключа, что позволяет отвечать 304 без чтения файла.
+
+Дополнительно модуль строит спрайт миниатюр всех страниц документа и умеет
+заранее (в фоне) рендерить первые страницы и миниатюры после загрузки архива.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import math
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+try:
+    from pdf2image import convert_from_path
+    PDF2IMAGE_AVAILABLE = True
+except ImportError:
+    PDF2IMAGE_AVAILABLE = False
+
+try:
+    from PIL import Image, features as pil_features
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+# =========================
+# Constants
+# =========================
+
+# формат -> (формат Pillow, mimetype, расширение файла)
+IMAGE_FORMATS: Dict[str, Tuple[str, str, str]] = {
+    "png": ("PNG", "image/png", "png"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+MIN_DPI = 36
+MAX_DPI = 300
+
+
+# =========================
+# Configuration
+# =========================
+
+@dataclass(frozen=True)
+class PDFImageCacheConfig:
+    """Настройки кэша изображений страниц."""
+    enabled: bool = True
+    cache_dir: Path = Path("pdf_image_cache")
+    max_size_mb: float = 256.0  # Лимит размера кэша на диске (LRU по файлам)
+    dpi: int = 150  # Разрешение по умолчанию
+    image_format: str = "png"  # png, webp или jpeg
+    quality: int = 85  # Качество для webp/jpeg
+    max_age: int = 300  # Cache-Control max-age, секунды (0 — всегда перепроверять по ETag)
+    thumbnail_width: int = 120  # Ширина миниатюры в спрайте, px
+    thumbnail_columns: int = 10  # Колонок в спрайте миниатюр
+    prerender_on_upload: bool = True  # Фоновый рендер после загрузки архива
+    prerender_workers: int = 2  # Сколько документов рендерить одновременно
+
+
+def load_image_cache_config() -> PDFImageCacheConfig:
+    """Читает настройки из config.py (секция pdf_image_cache)."""
+    try:
+        from config import get_config
+        cfg = get_config()
+        return PDFImageCacheConfig(
+            enabled=bool(cfg.get("pdf_image_cache.enabled", True)),
+            cache_dir=cfg.get_path("pdf_image_cache.cache_dir"),
+            max_size_mb=float(cfg.get("pdf_image_cache.max_size_mb", 256)),
+            dpi=int(cfg.get("pdf_image_cache.dpi", 150)),
+            image_format=str(cfg.get("pdf_image_cache.format", "png")),
+            quality=int(cfg.get("pdf_image_cache.quality", 85)),
+            max_age=int(cfg.get("pdf_image_cache.max_age", 300)),
+            thumbnail_width=int(cfg.get("pdf_image_cache.thumbnail_width", 120)),
+            thumbnail_columns=int(cfg.get("pdf_image_cache.thumbnail_columns", 10)),
+            prerender_on_upload=bool(cfg.get("pdf_image_cache.prerender_on_upload", True)),
+            prerender_workers=int(cfg.get("pdf_image_cache.prerender_workers", 2)),
+        )
+    except (ImportError, KeyError, TypeError, ValueError):
+        return PDFImageCacheConfig()
+
+
+# =========================
+# Data Structures
+# =========================
+
+@dataclass(frozen=True)
+class PageImageKey:
+    """Параметры рендера страницы (они же — ключ кэша)."""
+    sha256: str
+    page_index: int  # Нумерация с 0, как в /api/pdf-image
+    dpi: int
+    image_format: str
+    quality: int
+
+    @property
+    def etag(self) -> str:
+        return f"{self.sha256[:32]}-p{self.page_index}-d{self.dpi}-{self.image_format}-q{self.quality}"
+
+    @property
+    def mimetype(self) -> str:
+        return IMAGE_FORMATS[self.image_format][1]
+
+    def cache_path(self, cache_dir: Path) -> Path:
+        ext = IMAGE_FORMATS[self.image_format][2]
+        name = f"p{self.page_index:05d}_d{self.dpi}_q{self.quality}.{ext}"
+        return Path(cache_dir) / self.sha256[:2] / self.sha256 / name
+
+
+@dataclass(frozen=True)
+class ThumbnailStripKey:
+    """Параметры спрайта миниатюр документа (они же — ключ кэша)."""
+    sha256: str
+    width: int
+    columns: int
+    image_format: str
+    quality: int
+
+    @property
+    def etag(self) -> str:
+        return f"{self.sha256[:32]}-strip-w{self.width}-c{self.columns}-{self.image_format}-q{self.quality}"
+
+    @property
+    def mimetype(self) -> str:
+        return IMAGE_FORMATS[self.image_format][1]
+
+    def cache_path(self, cache_dir: Path) -> Path:
+        ext = IMAGE_FORMATS[self.image_format][2]
+        name = f"strip_w{self.width}_c{self.columns}_q{self.quality}.{ext}"
+        return Path(cache_dir) / self.sha256[:2] / self.sha256 / name
+
+    def layout_path(self, cache_dir: Path) -> Path:
+        return self.cache_path(cache_dir).with_suffix(".json")
+
+
+@dataclass(frozen=True)
+class RenderedPageImage:
+    """Готовое изображение страницы."""
+    data: bytes
+    mimetype: str
+    etag: str
+
+
+# =========================
+# Statistics
+# =========================
+
+_lock = threading.Lock()
+_stats: Dict[str, int] = {"hits": 0, "misses": 0, "evicted_files": 0}
+_approx_bytes: Optional[int] = None
+
+
+def get_image_cache_stats() -> Dict[str, Any]:
+    """Возвращает счетчики кэша изображений."""
+    with _lock:
+        stats: Dict[str, Any] = dict(_stats)
+        stats["prerender_pending"] = len(_prerender_pending)
+    total = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / total, 4) if total else 0.0
+    return stats
+
+
+def _count(name: str, value: int = 1) -> None:
+    with _lock:
+        _stats[name] = _stats.get(name, 0) + value
+
+
+# =========================
+# Helpers
+# =========================
+
+def _normalize_format(image_format: Optional[str], default: str) -> str:
+    fmt = (image_format or default or "png").strip().lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in IMAGE_FORMATS:
+        fmt = "png"
+    if fmt == "webp" and PIL_AVAILABLE and not pil_features.check("webp"):
+        fmt = "png"
+    return fmt
+
+
+def make_page_image_key(
+    pdf_path: Union[str, Path],
+    page_index: int,
+    dpi: Optional[int] = None,
+    image_format: Optional[str] = None,
+    quality: Optional[int] = None,
+    config: Optional[PDFImageCacheConfig] = None,
+) -> PageImageKey:
+    """Строит нормализованный ключ рендера (dpi/качество приводятся к допустимым значениям)."""
+    from converters.pdf_layout_cache import file_sha256
+
+    config = config or load_image_cache_config()
+    fmt = _normalize_format(image_format, config.image_format)
+    dpi_value = max(MIN_DPI, min(MAX_DPI, int(dpi or config.dpi)))
+    quality_value = _normalize_quality(quality, fmt, config)
+    return PageImageKey(
+        sha256=file_sha256(pdf_path),
+        page_index=max(0, int(page_index)),
+        dpi=dpi_value,
+        image_format=fmt,
+        quality=quality_value,
+    )
+
+
+def _normalize_quality(quality: Optional[int], fmt: str, config: PDFImageCacheConfig) -> int:
+    return 0 if fmt == "png" else max(1, min(100, int(quality or config.quality)))
+
+
+def _encode_image(img, key) -> bytes:
+    pil_format = IMAGE_FORMATS[key.image_format][0]
+    if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    buffer = io.BytesIO()
+    if pil_format == "PNG":
+        img.save(buffer, format=pil_format)
+    else:
+        img.save(buffer, format=pil_format, quality=key.quality)
+    return buffer.getvalue()
+
+
+def render_page(pdf_path: Union[str, Path], page_index: int, dpi: int):
+    """Рендерит одну страницу в PIL.Image через pdf2image (poppler)."""
+    if not PDF2IMAGE_AVAILABLE:
+        raise ImportError("pdf2image не установлен. Установите: pip install pdf2image")
+    images = convert_from_path(
+        str(pdf_path),
+        first_page=page_index + 1,
+        last_page=page_index + 1,
+        dpi=dpi,
+    )
+    if not images:
+        raise ValueError(f"Не удалось получить изображение для страницы {page_index + 1}")
+    return images[0]
+
+
+def render_thumbnails(pdf_path: Union[str, Path], width: int) -> List[Any]:
+    """Рендерит все страницы документа в миниатюры заданной ширины (один запуск poppler)."""
+    if not PDF2IMAGE_AVAILABLE:
+        raise ImportError("pdf2image не установлен. Установите: pip install pdf2image")
+    return convert_from_path(str(pdf_path), size=(width, None))
+
+
+def _atomic_write_bytes(path: Path, payload: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def enforce_image_budget(config: Optional[PDFImageCacheConfig] = None) -> int:
+    """
+    Удаляет наименее недавно использованные изображения, пока кэш не
+    уложится в 90% от max_size_mb. Возвращает число удаленных файлов.
+    """
+    global _approx_bytes
+    config = config or load_image_cache_config()
+    root = Path(config.cache_dir)
+    files: List[Tuple[float, int, Path]] = []
+    total = 0
+    if root.exists():
+        for path in root.rglob("*"):
+            if not path.is_file() or path.name.startswith("."):
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+    budget = int(config.max_size_mb * 1024 * 1024)
+    removed = 0
+    if total > budget:
+        target = int(budget * 0.9)
+        for _, size, path in sorted(files, key=lambda f: f[0]):
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+    with _lock:
+        _approx_bytes = total
+    if removed:
+        _count("evicted_files", removed)
+    return removed
+
+
+def _account_written(size: int, config: PDFImageCacheConfig) -> None:
+    """Учитывает записанные байты и запускает вытеснение при превышении лимита."""
+    global _approx_bytes
+    over = False
+    with _lock:
+        known = _approx_bytes
+        if known is not None:
+            _approx_bytes = known + size
+            over = _approx_bytes > config.max_size_mb * 1024 * 1024
+    if known is None or over:
+        enforce_image_budget(config)
+
+
+def _read_cached(path: Path) -> Optional[bytes]:
+    """Читает файл кэша и отмечает его как недавно использованный."""
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return data
+
+
+# =========================
+# Public API
+# =========================
+
+def get_page_image(
+    pdf_path: Union[str, Path],
+    page_index: int,
+    dpi: Optional[int] = None,
+    image_format: Optional[str] = None,
+    quality: Optional[int] = None,
+    config: Optional[PDFImageCacheConfig] = None,
+    key: Optional[PageImageKey] = None,
+) -> RenderedPageImage:
+    """
+    Возвращает изображение страницы, рендеря его только при промахе кэша.
+
+    Args:
+        pdf_path: Путь к PDF файлу
+        page_index: Номер страницы (с 0)
+        dpi: Разрешение (по умолчанию из конфигурации)
+        image_format: png, webp или jpeg (по умолчанию из конфигурации)
+        quality: Качество для webp/jpeg
+        config: Настройки кэша. Если None, берутся из config.py.
+        key: Готовый ключ (если уже вычислен вызывающей стороной)
+
+    Returns:
+        RenderedPageImage с байтами изображения, mimetype и ETag
+    """
+    config = config or load_image_cache_config()
+    key = key or make_page_image_key(pdf_path, page_index, dpi, image_format, quality, config)
+    path = key.cache_path(config.cache_dir)
+
+    if config.enabled:
+        data = _read_cached(path)
+        if data:
+            _count("hits")
+            return RenderedPageImage(data=data, mimetype=key.mimetype, etag=key.etag)
+
+    _count("misses")
+    img = render_page(pdf_path, key.page_index, key.dpi)
+    data = _encode_image(img, key)
+
+    if config.enabled:
+        try:
+            _atomic_write_bytes(path, data)
+            _account_written(len(data), config)
+        except OSError as e:
+            print(f"WARNING: Не удалось записать кэш изображения страницы: {e}")
+
+    return RenderedPageImage(data=data, mimetype=key.mimetype, etag=key.etag)
+
+
+def make_thumbnail_strip_key(
+    pdf_path: Union[str, Path],
+    image_format: Optional[str] = None,
+    quality: Optional[int] = None,
+    config: Optional[PDFImageCacheConfig] = None,
+) -> ThumbnailStripKey:
+    """Строит ключ спрайта миниатюр для документа."""
+    from converters.pdf_layout_cache import file_sha256
+
+    config = config or load_image_cache_config()
+    fmt = _normalize_format(image_format, config.image_format)
+    return ThumbnailStripKey(
+        sha256=file_sha256(pdf_path),
+        width=max(16, min(600, int(config.thumbnail_width))),
+        columns=max(1, int(config.thumbnail_columns)),
+        image_format=fmt,
+        quality=_normalize_quality(quality, fmt, config),
+    )
+
+
+def get_thumbnail_strip(
+    pdf_path: Union[str, Path],
+    image_format: Optional[str] = None,
+    quality: Optional[int] = None,
+    config: Optional[PDFImageCacheConfig] = None,
+    key: Optional[ThumbnailStripKey] = None,
+) -> Tuple[RenderedPageImage, Dict[str, Any]]:
+    """
+    Возвращает спрайт миниатюр всех страниц документа и его раскладку.
+
+    Миниатюры уложены сеткой по thumbnail_columns колонок, ячейки одного
+    размера. Раскладка: {"total_pages", "columns", "tile_width", "tile_height",
+    "tiles": [{"page", "x", "y", "width", "height"}, ...]} (page — с 0).
+
+    Returns:
+        (RenderedPageImage, layout)
+    """
+    config = config or load_image_cache_config()
+    key = key or make_thumbnail_strip_key(pdf_path, image_format, quality, config)
+    image_path = key.cache_path(config.cache_dir)
+    layout_path = key.layout_path(config.cache_dir)
+
+    if config.enabled:
+        data = _read_cached(image_path)
+        layout_raw = _read_cached(layout_path)
+        if data and layout_raw:
+            try:
+                layout = json.loads(layout_raw.decode("utf-8"))
+                _count("hits")
+                return RenderedPageImage(data=data, mimetype=key.mimetype, etag=key.etag), layout
+            except ValueError:
+                pass
+
+    _count("misses")
+    thumbs = render_thumbnails(pdf_path, key.width)
+    if not thumbs:
+        raise ValueError(f"Не удалось получить миниатюры страниц: {pdf_path}")
+
+    tile_width = max(img.width for img in thumbs)
+    tile_height = max(img.height for img in thumbs)
+    columns = max(1, min(key.columns, len(thumbs)))
+    rows = math.ceil(len(thumbs) / columns)
+    sheet = Image.new("RGB", (columns * tile_width, rows * tile_height), "white")
+    tiles: List[Dict[str, int]] = []
+    for i, img in enumerate(thumbs):
+        x = (i % columns) * tile_width
+        y = (i // columns) * tile_height
+        sheet.paste(img, (x, y))
+        tiles.append({"page": i, "x": x, "y": y, "width": img.width, "height": img.height})
+    layout: Dict[str, Any] = {
+        "total_pages": len(thumbs),
+        "columns": columns,
+        "tile_width": tile_width,
+        "tile_height": tile_height,
+        "tiles": tiles,
+    }
+    data = _encode_image(sheet, key)
+
+    if config.enabled:
+        try:
+            layout_bytes = json.dumps(layout, ensure_ascii=False).encode("utf-8")
+            _atomic_write_bytes(layout_path, layout_bytes)
+            _atomic_write_bytes(image_path, data)
+            _account_written(len(data) + len(layout_bytes), config)
+        except OSError as e:
+            print(f"WARNING: Не удалось записать кэш миниатюр: {e}")
+
+    return RenderedPageImage(data=data, mimetype=key.mimetype, etag=key.etag), layout
+
+
+# =========================
+# Background pre-rendering
+# =========================
+
+_prerender_queue: "queue.Queue[Tuple[Tuple[str, str], Any, tuple]]" = queue.Queue()
+_prerender_pending: set = set()
+_prerender_threads: List[threading.Thread] = []
+
+
+def _prerender_worker() -> None:
+    while True:
+        task_key, func, args = _prerender_queue.get()
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"WARNING: Фоновый рендер ({task_key[0]}) не удался для {task_key[1]}: {e}")
+        finally:
+            with _lock:
+                _prerender_pending.discard(task_key)
+            _prerender_queue.task_done()
+
+
+def _ensure_prerender_threads(count: int) -> None:
+    with _lock:
+        _prerender_threads[:] = [t for t in _prerender_threads if t.is_alive()]
+        while len(_prerender_threads) < count:
+            thread = threading.Thread(
+                target=_prerender_worker,
+                name=f"pdf-prerender-{len(_prerender_threads)}",
+                daemon=True,
+            )
+            thread.start()
+            _prerender_threads.append(thread)
+
+
+def schedule_prerender(
+    pdf_paths: Sequence[Union[str, Path]],
+    config: Optional[PDFImageCacheConfig] = None,
+) -> int:
+    """
+    Ставит в фоновую очередь рендер первой страницы (с параметрами по умолчанию)
+    и спрайт миниатюр для каждого документа. Сначала идут первые страницы
+    всех документов, затем миниатюры. Одновременно обрабатывается не более
+    prerender_workers задач; уже стоящие в очереди задачи не дублируются.
+
+    Returns:
+        Количество поставленных задач
+    """
+    config = config or load_image_cache_config()
+    if not config.enabled or not PDF2IMAGE_AVAILABLE:
+        return 0
+
+    paths = [Path(p) for p in pdf_paths]
+    tasks = [("first_page", p) for p in paths] + [("thumbnails", p) for p in paths]
+    submitted = 0
+    for kind, path in tasks:
+        task_key = (kind, str(path.resolve()))
+        with _lock:
+            if task_key in _prerender_pending:
+                continue
+            _prerender_pending.add(task_key)
+        if kind == "first_page":
+            _prerender_queue.put((task_key, get_page_image, (path, 0, None, None, None, config)))
+        else:
+            _prerender_queue.put((task_key, get_thumbnail_strip, (path, None, None, config)))
+        submitted += 1
+
+    if submitted:
+        _ensure_prerender_threads(max(1, config.prerender_workers))
+    return submitted
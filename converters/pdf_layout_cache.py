@@ -0,0 +1,675 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pdf_layout_cache.py
+
+Общий кэш разметки PDF: символы, слова и геометрия страниц.
+
+Ключ кэша — SHA-256 содержимого файла и номер страницы, поэтому один и тот же
+PDF разбирается pdfplumber один раз, независимо от того, кто его открывает
+(обработка архива, страница разметки, API выделения областей) и под каким
+путем лежит файл. Данные страницы хранятся на диске в колоночном виде
+(gzip + JSON), последние использованные страницы дополнительно держатся в памяти.
+
+Использование:
+    with open_pdf_layout(pdf_path) as pdf:
+        for page in pdf.pages:
+            words = page.extract_words()
+
+Страницы из кэша повторяют ту часть API pdfplumber.Page, которой пользуется
+проект: chars, width/height/bbox, extract_text, extract_words, crop,
+within_bbox и to_image (рендер идет через исходный файл).
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+try:
+    import pdfplumber
+    from pdfplumber import utils as pdfplumber_utils
+    PDFPLUMBER_AVAILABLE = True
+except ImportError:
+    PDFPLUMBER_AVAILABLE = False
+
+
+# =========================
+# Constants
+# =========================
+
+# Версия формата данных на диске. При изменении старые записи игнорируются.
+CACHE_FORMAT_VERSION = 1
+
+# Поля символов pdfplumber, которые сохраняются в кэше (используются при
+# сегментации слов, извлечении текста и обрезке по bbox).
+_CHAR_NUMERIC_FIELDS = (
+    "x0", "y0", "x1", "y1", "top", "bottom", "doctop", "width", "height", "size", "adv",
+)
+_WORD_NUMERIC_FIELDS = ("x0", "x1", "top", "doctop", "bottom", "height", "width")
+
+BBoxType = Tuple[float, float, float, float]
+
+
+# =========================
+# Configuration
+# =========================
+
+@dataclass(frozen=True)
+class PDFLayoutCacheConfig:
+    """Настройки кэша разметки PDF."""
+    enabled: bool = True
+    cache_dir: Path = Path("pdf_layout_cache")
+    max_size_mb: float = 512.0  # Лимит размера кэша на диске (LRU по документам)
+    memory_pages: int = 32  # Сколько страниц держать в памяти процесса
+    budget_check_interval_sec: float = 300.0  # Не чаще проверять размер кэша на диске, сек
+
+
+def load_layout_cache_config() -> PDFLayoutCacheConfig:
+    """Читает настройки кэша из config.py (секция pdf_layout_cache)."""
+    try:
+        from config import get_config
+        cfg = get_config()
+        return PDFLayoutCacheConfig(
+            enabled=bool(cfg.get("pdf_layout_cache.enabled", True)),
+            cache_dir=cfg.get_path("pdf_layout_cache.cache_dir"),
+            max_size_mb=float(cfg.get("pdf_layout_cache.max_size_mb", 512)),
+            memory_pages=int(cfg.get("pdf_layout_cache.memory_pages", 32)),
+            budget_check_interval_sec=float(cfg.get("pdf_layout_cache.budget_check_interval_sec", 300)),
+        )
+    except (ImportError, KeyError):
+        return PDFLayoutCacheConfig()
+
+
+# =========================
+# Statistics & in-memory LRU
+# =========================
+
+_lock = threading.Lock()
+_stats: Dict[str, int] = {
+    "memory_hits": 0,
+    "disk_hits": 0,
+    "misses": 0,
+    "writes": 0,
+    "evicted_documents": 0,
+}
+_memory_pages: "OrderedDict[Tuple[str, int], Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]" = OrderedDict()
+_hash_memo: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_HASH_MEMO_LIMIT = 1024
+_meta_memo: "OrderedDict[str, List[BBoxType]]" = OrderedDict()
+_META_MEMO_LIMIT = 256
+# Записано на диск с последней проверки размера кэша
+_budget_state: Dict[str, float] = {"bytes": 0, "checked_at": 0.0}
+
+
+def _count(name: str) -> None:
+    with _lock:
+        _stats[name] = _stats.get(name, 0) + 1
+
+
+def get_layout_cache_stats() -> Dict[str, Any]:
+    """Возвращает счетчики попаданий/промахов кэша разметки."""
+    with _lock:
+        stats: Dict[str, Any] = dict(_stats)
+        stats["memory_pages"] = len(_memory_pages)
+    hits = stats["memory_hits"] + stats["disk_hits"]
+    total = hits + stats["misses"]
+    stats["hit_ratio"] = round(hits / total, 4) if total else 0.0
+    return stats
+
+
+def clear_memory_cache() -> None:
+    """Очищает кэш страниц в памяти процесса (диск не трогается)."""
+    with _lock:
+        _memory_pages.clear()
+        _hash_memo.clear()
+        _meta_memo.clear()
+
+
+def _memory_get(key: Tuple[str, int]):
+    with _lock:
+        item = _memory_pages.get(key)
+        if item is not None:
+            _memory_pages.move_to_end(key)
+        return item
+
+
+def _memory_put(key: Tuple[str, int], item, limit: int) -> None:
+    if limit <= 0:
+        return
+    with _lock:
+        _memory_pages[key] = item
+        _memory_pages.move_to_end(key)
+        while len(_memory_pages) > limit:
+            _memory_pages.popitem(last=False)
+
+
+# =========================
+# Hashing
+# =========================
+
+def file_sha256(path: Union[str, Path]) -> str:
+    """
+    SHA-256 содержимого файла.
+
+    Результат запоминается по (путь, mtime, размер), чтобы не перечитывать
+    большой PDF на каждый запрос.
+    """
+    p = Path(path)
+    st = p.stat()
+    memo_key = (str(p.resolve()), st.st_mtime_ns, st.st_size)
+    with _lock:
+        digest = _hash_memo.get(memo_key)
+        if digest is not None:
+            _hash_memo.move_to_end(memo_key)
+            return digest
+
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    with _lock:
+        _hash_memo[memo_key] = digest
+        while len(_hash_memo) > _HASH_MEMO_LIMIT:
+            _hash_memo.popitem(last=False)
+    return digest
+
+
+# =========================
+# Compact (columnar) encoding
+# =========================
+
+def _encode_chars(chars: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Упаковывает список символов в колонки (шрифты — через таблицу)."""
+    fonts: Dict[str, int] = {}
+    data: Dict[str, Any] = {
+        "text": [c.get("text", "") for c in chars],
+        "upright": [1 if c.get("upright", True) else 0 for c in chars],
+        "matrix": [list(c.get("matrix") or ()) for c in chars],
+        "font": [fonts.setdefault(str(c.get("fontname", "")), len(fonts)) for c in chars],
+    }
+    for field in _CHAR_NUMERIC_FIELDS:
+        data[field] = [c.get(field, 0) for c in chars]
+    data["fonts"] = list(fonts)
+    return data
+
+
+def _decode_chars(data: Dict[str, Any], page_number: int) -> List[Dict[str, Any]]:
+    fonts = data.get("fonts") or []
+    columns = [data[field] for field in _CHAR_NUMERIC_FIELDS]
+    chars: List[Dict[str, Any]] = []
+    for i, text in enumerate(data.get("text") or []):
+        char: Dict[str, Any] = {
+            "matrix": tuple(data["matrix"][i]),
+            "fontname": fonts[data["font"][i]] if fonts else "",
+            "upright": bool(data["upright"][i]),
+            "object_type": "char",
+            "page_number": page_number,
+            "text": text,
+        }
+        for field, column in zip(_CHAR_NUMERIC_FIELDS, columns):
+            char[field] = column[i]
+        chars.append(char)
+    return chars
+
+
+def _encode_words(words: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    data: Dict[str, Any] = {
+        "text": [w.get("text", "") for w in words],
+        "upright": [1 if w.get("upright", True) else 0 for w in words],
+        "direction": [w.get("direction", "ltr") for w in words],
+    }
+    for field in _WORD_NUMERIC_FIELDS:
+        data[field] = [w.get(field, 0) for w in words]
+    return data
+
+
+def _decode_words(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Порядок ключей как у pdfplumber.extract_words
+    return [
+        {
+            "text": text,
+            "x0": data["x0"][i],
+            "x1": data["x1"][i],
+            "top": data["top"][i],
+            "doctop": data["doctop"][i],
+            "bottom": data["bottom"][i],
+            "upright": bool(data["upright"][i]),
+            "height": data["height"][i],
+            "width": data["width"][i],
+            "direction": data["direction"][i],
+        }
+        for i, text in enumerate(data.get("text") or [])
+    ]
+
+
+# =========================
+# Disk storage
+# =========================
+
+def _document_dir(config: PDFLayoutCacheConfig, sha256: str) -> Path:
+    return Path(config.cache_dir) / sha256[:2] / sha256
+
+
+def _page_file(doc_dir: Path, page_number: int) -> Path:
+    return doc_dir / f"p{page_number:05d}.json.gz"
+
+
+def _atomic_write_bytes(path: Path, payload: bytes) -> None:
+    """Пишет файл через временный файл и os.replace, чтобы не оставлять обрывков."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def _read_json_gz(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError, EOFError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != CACHE_FORMAT_VERSION:
+        return None
+    return data
+
+
+def _write_json_gz(path: Path, data: Dict[str, Any]) -> int:
+    """Пишет JSON в gzip; возвращает размер файла в байтах."""
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    payload = gzip.compress(raw, compresslevel=6)
+    _atomic_write_bytes(path, payload)
+    return len(payload)
+
+
+def _touch(path: Path) -> None:
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _budget_check_due(written_bytes: int, config: PDFLayoutCacheConfig) -> bool:
+    """
+    Пора ли обходить кэш на диске: записано не меньше 5% бюджета с прошлой
+    проверки или прошло budget_check_interval_sec. Обход всего дерева кэша
+    на каждом закрытии документа слишком дорог.
+    """
+    now = time.monotonic()
+    threshold = max(1024 * 1024, config.max_size_mb * 1024 * 1024 * 0.05)
+    with _lock:
+        _budget_state["bytes"] += written_bytes
+        if (
+            _budget_state["bytes"] < threshold
+            and now - _budget_state["checked_at"] < config.budget_check_interval_sec
+        ):
+            return False
+        _budget_state["bytes"] = 0
+        _budget_state["checked_at"] = now
+        return True
+
+
+def enforce_disk_budget(config: Optional[PDFLayoutCacheConfig] = None) -> int:
+    """
+    Удаляет наименее недавно использованные документы, пока кэш
+    не уложится в max_size_mb. Возвращает число удаленных документов.
+    """
+    config = config or load_layout_cache_config()
+    root = Path(config.cache_dir)
+    if not root.exists():
+        return 0
+
+    entries: List[Tuple[float, int, Path]] = []
+    total = 0
+    for prefix in root.iterdir():
+        if not prefix.is_dir():
+            continue
+        for doc_dir in prefix.iterdir():
+            if not doc_dir.is_dir():
+                continue
+            size = 0
+            for f in doc_dir.iterdir():
+                try:
+                    size += f.stat().st_size
+                except OSError:
+                    continue
+            meta = doc_dir / "meta.json.gz"
+            try:
+                last_used = meta.stat().st_mtime
+            except OSError:
+                last_used = 0.0
+            entries.append((last_used, size, doc_dir))
+            total += size
+
+    budget = int(config.max_size_mb * 1024 * 1024)
+    removed = 0
+    for _, size, doc_dir in sorted(entries, key=lambda e: e[0]):
+        if total <= budget:
+            break
+        shutil.rmtree(doc_dir, ignore_errors=True)
+        try:
+            doc_dir.parent.rmdir()  # удаляем пустой префиксный каталог
+        except OSError:
+            pass
+        total -= size
+        removed += 1
+    if removed:
+        with _lock:
+            _stats["evicted_documents"] += removed
+    return removed
+
+
+# =========================
+# Page & document objects
+# =========================
+
+class CachedPage:
+    """
+    Страница PDF, восстановленная из кэша разметки.
+
+    Поддерживает то же подмножество API pdfplumber.Page, что используется
+    в проекте. Символы подгружаются лениво: для геометрии (width/height)
+    разбор страницы не нужен.
+    """
+
+    def __init__(
+        self,
+        page_number: int,
+        bbox: BBoxType,
+        source_path: Path,
+        loader: Optional[Callable[[int], Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]] = None,
+        chars: Optional[List[Dict[str, Any]]] = None,
+        default_words: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.page_number = page_number
+        self.bbox = tuple(float(v) for v in bbox)
+        self.source_path = source_path
+        self._loader = loader
+        self._chars = chars
+        self._default_words = default_words
+
+    @property
+    def width(self) -> float:
+        return self.bbox[2] - self.bbox[0]
+
+    @property
+    def height(self) -> float:
+        return self.bbox[3] - self.bbox[1]
+
+    @property
+    def chars(self) -> List[Dict[str, Any]]:
+        if self._chars is None:
+            if self._loader is None:
+                self._chars = []
+            else:
+                self._chars, self._default_words = self._loader(self.page_number)
+        return self._chars
+
+    def extract_words(self, **kwargs: Any) -> List[Dict[str, Any]]:
+        chars = self.chars
+        if not kwargs and self._default_words is not None:
+            return [dict(w) for w in self._default_words]
+        return pdfplumber_utils.extract_words(chars, **kwargs)
+
+    def extract_text(self, **kwargs: Any) -> str:
+        defaults: Dict[str, Any] = {"layout_bbox": self.bbox}
+        if "layout_width_chars" not in kwargs:
+            defaults["layout_width"] = self.width
+        if "layout_height_chars" not in kwargs:
+            defaults["layout_height"] = self.height
+        return pdfplumber_utils.chars_to_textmap(self.chars, **{**defaults, **kwargs}).as_string
+
+    def _derive(self, bbox: BBoxType, relative: bool, strict: bool, crop_fn) -> "CachedPage":
+        if relative:
+            x0, top, x1, bottom = bbox
+            bbox = (x0 + self.bbox[0], top + self.bbox[1], x1 + self.bbox[0], bottom + self.bbox[1])
+        if strict:
+            _check_crop_bbox(bbox, self.bbox)
+        return CachedPage(
+            page_number=self.page_number,
+            bbox=bbox,
+            source_path=self.source_path,
+            chars=crop_fn(self.chars, bbox),
+        )
+
+    def crop(self, bbox: BBoxType, relative: bool = False, strict: bool = True) -> "CachedPage":
+        return self._derive(bbox, relative, strict, pdfplumber_utils.crop_to_bbox)
+
+    def within_bbox(self, bbox: BBoxType, relative: bool = False, strict: bool = True) -> "CachedPage":
+        return self._derive(bbox, relative, strict, pdfplumber_utils.within_bbox)
+
+    def to_image(self, **kwargs: Any):
+        """Рендер страницы (или ее области) через исходный PDF."""
+        from converters.pdf_handle_pool import checkout_pdf
+
+        with checkout_pdf(self.source_path) as pdf:
+            page = pdf.pages[self.page_number - 1]
+            if tuple(float(v) for v in page.bbox) != self.bbox:
+                page = page.crop(self.bbox)
+            return page.to_image(**kwargs)
+
+    def __repr__(self) -> str:
+        return f"<CachedPage:{self.page_number}>"
+
+
+def _check_crop_bbox(bbox: BBoxType, parent_bbox: BBoxType) -> None:
+    """Та же проверка, что делает pdfplumber при crop(strict=True)."""
+    bbox_area = pdfplumber_utils.calculate_area(bbox)
+    if bbox_area == 0:
+        raise ValueError(f"Bounding box {bbox} has an area of zero.")
+    overlap = pdfplumber_utils.get_bbox_overlap(bbox, parent_bbox)
+    if overlap is None:
+        raise ValueError(
+            f"Bounding box {bbox} is entirely outside "
+            f"parent page bounding box {parent_bbox}"
+        )
+    if pdfplumber_utils.calculate_area(overlap) < bbox_area:
+        raise ValueError(
+            f"Bounding box {bbox} is not fully within "
+            f"parent page bounding box {parent_bbox}"
+        )
+
+
+class CachedDocument:
+    """
+    PDF-документ, страницы которого читаются из кэша разметки.
+
+    pdfplumber открывается только при промахе и только один раз на объект;
+    дескриптор берется из пула процесса (converters.pdf_handle_pool) и
+    возвращается в него при close(). Используется как контекстный менеджер,
+    аналогично pdfplumber.open().
+    """
+
+    def __init__(self, path: Path, sha256: str, config: PDFLayoutCacheConfig):
+        self.path = path
+        self.sha256 = sha256
+        self.config = config
+        self._doc_dir = _document_dir(config, sha256)
+        self._source = None
+        self._source_key = None
+        self._written_bytes = 0
+        self._pages: Optional[List[CachedPage]] = None
+        self.page_bboxes: List[BBoxType] = self._load_meta()
+
+    # --- source (pdfplumber) ---
+
+    def _open_source(self):
+        if self._source is None:
+            from converters.pdf_handle_pool import get_handle_pool
+
+            self._source, self._source_key = get_handle_pool().acquire(self.path)
+        return self._source
+
+    def _load_meta(self) -> List[BBoxType]:
+        meta_path = self._doc_dir / "meta.json.gz"
+        if self.config.enabled:
+            with _lock:
+                bboxes = _meta_memo.get(self.sha256)
+                if bboxes is not None:
+                    _meta_memo.move_to_end(self.sha256)
+            if bboxes is None:
+                meta = _read_json_gz(meta_path)
+                if meta is not None:
+                    bboxes = [tuple(b) for b in meta.get("pages") or []]
+                    self._remember_meta(bboxes)
+            if bboxes is not None:
+                _touch(meta_path)
+                return bboxes
+
+        pdf = self._open_source()
+        bboxes = [tuple(float(v) for v in page.bbox) for page in pdf.pages]
+        if self.config.enabled:
+            self._remember_meta(bboxes)
+            try:
+                self._written_bytes += _write_json_gz(meta_path, {
+                    "version": CACHE_FORMAT_VERSION,
+                    "sha256": self.sha256,
+                    "source_name": self.path.name,
+                    "pages": [list(b) for b in bboxes],
+                })
+            except OSError as e:
+                print(f"WARNING: Не удалось записать кэш разметки PDF: {e}")
+        return bboxes
+
+    def _remember_meta(self, bboxes: List[BBoxType]) -> None:
+        with _lock:
+            _meta_memo[self.sha256] = bboxes
+            _meta_memo.move_to_end(self.sha256)
+            while len(_meta_memo) > _META_MEMO_LIMIT:
+                _meta_memo.popitem(last=False)
+
+    # --- pages ---
+
+    def _load_page(self, page_number: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        key = (self.sha256, page_number)
+        if self.config.enabled:
+            item = _memory_get(key)
+            if item is not None:
+                _count("memory_hits")
+                return item
+
+            data = _read_json_gz(_page_file(self._doc_dir, page_number))
+            if data is not None:
+                item = (_decode_chars(data["chars"], page_number), _decode_words(data["words"]))
+                _count("disk_hits")
+                _memory_put(key, item, self.config.memory_pages)
+                return item
+
+        _count("misses")
+        page = self._open_source().pages[page_number - 1]
+        chars = list(page.chars)
+        words = page.extract_words()
+        # Нормализуем символы к сохраняемому набору полей: результат из памяти,
+        # с диска и при первом разборе должен быть одинаковым.
+        encoded_chars = _encode_chars(chars)
+        item = (_decode_chars(encoded_chars, page_number), words)
+        page.close()
+
+        if self.config.enabled:
+            try:
+                self._written_bytes += _write_json_gz(_page_file(self._doc_dir, page_number), {
+                    "version": CACHE_FORMAT_VERSION,
+                    "page_number": page_number,
+                    "chars": encoded_chars,
+                    "words": _encode_words(words),
+                })
+                _count("writes")
+            except OSError as e:
+                print(f"WARNING: Не удалось записать кэш разметки PDF: {e}")
+            _memory_put(key, item, self.config.memory_pages)
+        return item
+
+    @property
+    def pages(self) -> List[CachedPage]:
+        if self._pages is None:
+            self._pages = [
+                CachedPage(
+                    page_number=i,
+                    bbox=bbox,
+                    source_path=self.path,
+                    loader=self._load_page,
+                )
+                for i, bbox in enumerate(self.page_bboxes, start=1)
+            ]
+        return self._pages
+
+    def __len__(self) -> int:
+        return len(self.page_bboxes)
+
+    def __iter__(self) -> Iterator[CachedPage]:
+        return iter(self.pages)
+
+    def close(self) -> None:
+        if self._source is not None:
+            from converters.pdf_handle_pool import get_handle_pool
+
+            source, key = self._source, self._source_key
+            self._source = None
+            self._source_key = None
+            get_handle_pool().release(source, key)
+        written, self._written_bytes = self._written_bytes, 0
+        if written and _budget_check_due(written, self.config):
+            try:
+                enforce_disk_budget(self.config)
+            except OSError as e:
+                print(f"WARNING: Ошибка очистки кэша разметки PDF: {e}")
+
+    def __enter__(self) -> "CachedDocument":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def open_pdf_layout(
+    path: Union[str, Path],
+    config: Optional[PDFLayoutCacheConfig] = None,
+) -> CachedDocument:
+    """
+    Открывает PDF через кэш разметки.
+
+    Args:
+        path: Путь к PDF файлу
+        config: Настройки кэша. Если None, берутся из config.py.
+
+    Returns:
+        CachedDocument (контекстный менеджер, совместимый с pdfplumber.open)
+    """
+    if not PDFPLUMBER_AVAILABLE:
+        raise ImportError("pdfplumber не установлен. Установите: pip install pdfplumber")
+    config = config or load_layout_cache_config()
+    p = Path(path)
+    return CachedDocument(p, file_sha256(p), config)
+
+
+# =========================
+# CLI
+# =========================
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) < 2:
+        print("Использование: python converters/pdf_layout_cache.py <путь_к_pdf>")
+        sys.exit(1)
+
+    for attempt in (1, 2):
+        started = time.perf_counter()
+        with open_pdf_layout(sys.argv[1]) as pdf:
+            total_words = sum(len(page.extract_words()) for page in pdf.pages)
+        elapsed = time.perf_counter() - started
+        print(f"Проход {attempt}: {len(pdf)} стр., {total_words} слов, {elapsed:.3f} с")
+    print(get_layout_cache_stats())
@@ -0,0 +1,673 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pdf_layout_engine.py
+
+Движок разметки страницы PDF на массивах NumPy.
+
+page.chars читается один раз и раскладывается в колонки (x0, x1, top, bottom,
+upright, text). Дальше все операции идут над этими массивами:
+- сборка слов (повторяет WordExtractor pdfplumber при keep_blank_chars=False,
+  включая раскрытие лигатур и use_text_flow); кластеризация символов по строкам
+  считается один раз на допуск и общая для разных x_tolerance;
+- обрезка по bbox с семантикой page.crop (пересечение + обрезка координат);
+- поиск границы шапки и определение двух колонок;
+- группировка слов в строки и сборка текста как page.extract_text()
+  (в том числе layout=True).
+
+Общая таблица LayoutTable (основа CharArray и WordArray) дает векторные
+сортировку, группировку строк по допуску top, статистику промежутков между
+соседями и bbox строк — ею пользуются pdf_to_html, анализ промежутков
+в app/routes/pdf_routes.py и metadata_markup.extract_text_from_pdf.
+
+Раньше для двухколоночной страницы слова сегментировались 3-4 раза (вся
+страница, шапка, левая и правая колонки), а каждая обрезка pdfplumber
+копировала словари символов. Теперь это векторные операции над одним массивом.
+
+Использование:
+    chars = CharArray.from_page(page)
+    layout = analyze_page_layout(chars, page.width, page.height)
+    for zone in layout.zones:
+        rows = zone.row_texts()
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+# Значения по умолчанию pdfplumber (extract_words / extract_text)
+DEFAULT_X_TOLERANCE = 3.0
+DEFAULT_Y_TOLERANCE = 3.0
+DEFAULT_X_DENSITY = 7.25
+DEFAULT_Y_DENSITY = 13.0
+
+# Та же таблица, что pdfplumber.utils.text.LIGATURES
+LIGATURES = {
+    "ﬀ": "ff",
+    "ﬃ": "ffi",
+    "ﬄ": "ffl",
+    "ﬁ": "fi",
+    "ﬂ": "fl",
+    "ﬆ": "st",
+    "ﬅ": "st",
+}
+
+BBoxType = Tuple[float, float, float, float]
+
+_get_coords = itemgetter("x0", "x1", "top", "bottom")
+_get_text = itemgetter("text")
+_get_upright = itemgetter("upright")
+
+
+def _require_numpy() -> None:
+    if not NUMPY_AVAILABLE:
+        raise ImportError("numpy не установлен. Установите: pip install numpy")
+
+
+def _floats(objs: Sequence[Dict[str, Any]], key: str, default: float = 0.0) -> "np.ndarray":
+    return np.fromiter(
+        (float(o.get(key, default) or 0) for o in objs),
+        dtype=np.float64,
+        count=len(objs),
+    )
+
+
+def _cluster_ids(values: "np.ndarray", tolerance: float) -> "np.ndarray":
+    """
+    Номер кластера для каждого значения, как в pdfplumber cluster_list:
+    уникальные значения сортируются, новый кластер начинается там,
+    где значение больше предыдущего уникального более чем на tolerance.
+    """
+    if values.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    uniq = np.unique(values)
+    starts = np.empty(uniq.size, dtype=bool)
+    starts[0] = True
+    starts[1:] = uniq[1:] > uniq[:-1] + tolerance
+    return (np.cumsum(starts) - 1)[np.searchsorted(uniq, values)]
+
+
+# =========================
+# Table
+# =========================
+
+@dataclass
+class LayoutTable:
+    """
+    Общая колоночная таблица объектов страницы (символов или слов):
+    text + координаты в массивах NumPy. Порядок строк таблицы — порядок
+    исходного списка; все выборки и сортировки возвращают индексы.
+    """
+    text: List[str]
+    x0: "np.ndarray"
+    x1: "np.ndarray"
+    top: "np.ndarray"
+    bottom: "np.ndarray"
+    upright: "np.ndarray"
+
+    @classmethod
+    def empty(cls):
+        _require_numpy()
+        z = np.zeros(0, dtype=np.float64)
+        return cls([], z, z, z, z, np.zeros(0, dtype=bool))
+
+    @classmethod
+    def from_dicts(cls, objs: Iterable[Dict[str, Any]]):
+        """Из списка словарей pdfplumber (chars / extract_words)."""
+        _require_numpy()
+        objs = list(objs or [])
+        try:
+            # Быстрый путь: все поля на месте — проходы itemgetter без Python-циклов
+            text = list(map(_get_text, objs))
+            upright = np.fromiter(map(_get_upright, objs), dtype=bool, count=len(objs))
+            coords = np.array(list(map(_get_coords, objs)), dtype=np.float64).reshape(-1, 4)
+            if None not in text:
+                return cls(text, coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3], upright)
+        except (KeyError, TypeError, ValueError):
+            pass
+        text = [o.get("text") or "" for o in objs]
+        upright = np.fromiter((o.get("upright", True) for o in objs), dtype=bool, count=len(objs))
+        return cls(
+            text=text,
+            x0=_floats(objs, "x0"),
+            x1=_floats(objs, "x1"),
+            top=_floats(objs, "top"),
+            bottom=_floats(objs, "bottom"),
+            upright=upright,
+        )
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def take(self, index: "np.ndarray"):
+        """Подмножество по маске или индексам (порядок сохраняется)."""
+        idx = np.flatnonzero(index) if index.dtype == bool else index
+        return type(self)(
+            text=[self.text[i] for i in idx.tolist()],
+            x0=self.x0[idx],
+            x1=self.x1[idx],
+            top=self.top[idx],
+            bottom=self.bottom[idx],
+            upright=self.upright[idx],
+        )
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "text": t,
+                "x0": float(x0),
+                "x1": float(x1),
+                "top": float(top),
+                "bottom": float(bottom),
+                "upright": bool(up),
+            }
+            for t, x0, x1, top, bottom, up in zip(
+                self.text,
+                self.x0.tolist(),
+                self.x1.tolist(),
+                self.top.tolist(),
+                self.bottom.tolist(),
+                self.upright.tolist(),
+            )
+        ]
+
+    # --- сортировка и группировка ---
+
+    def reading_order(self) -> "np.ndarray":
+        """Индексы в порядке (top, x0); при равенстве — исходный порядок."""
+        return np.lexsort((self.x0, self.top))
+
+    def rows(self, y_tolerance: float = DEFAULT_Y_TOLERANCE, sort_by_x: bool = True) -> List["np.ndarray"]:
+        """
+        Группирует объекты в строки: сортировка по (top, x0), строка продолжается,
+        пока top отличается от top первого объекта строки не более чем на
+        y_tolerance. При sort_by_x объекты внутри строки упорядочиваются по x0.
+        Возвращает индексы объектов для каждой строки.
+        """
+        n = len(self)
+        if n == 0:
+            return []
+        order = self.reading_order()
+        tops = self.top[order]
+        # Начало следующей строки — первый объект за пределами окна якоря
+        bounds = [0]
+        start = 0
+        while start < n:
+            start = int(np.searchsorted(tops, tops[start] + y_tolerance, side="right"))
+            bounds.append(start)
+        if sort_by_x:
+            row_of = np.repeat(np.arange(len(bounds) - 1), np.diff(bounds))
+            # Стабильная сортировка по x0 внутри строки (при равенстве — порядок по top)
+            order = order[np.lexsort((np.arange(n), self.x0[order], row_of))]
+        return np.split(order, bounds[1:-1])
+
+    def join_rows(
+        self,
+        y_tolerance: float = DEFAULT_Y_TOLERANCE,
+        sort_by_x: bool = True,
+        space_threshold: Optional[float] = None,
+    ) -> List[str]:
+        """
+        Тексты строк из rows() без разделителей; при space_threshold между
+        соседями с промежутком x0 - x1 больше порога вставляется пробел.
+        """
+        out: List[str] = []
+        for row in self.rows(y_tolerance, sort_by_x=sort_by_x):
+            items = row.tolist()
+            if space_threshold is None or row.size < 2:
+                out.append("".join(self.text[i] for i in items))
+                continue
+            spaced = [False, *((self.x0[row][1:] - self.x1[row][:-1]) > space_threshold).tolist()]
+            out.append("".join(
+                (" " + self.text[i]) if space else self.text[i]
+                for i, space in zip(items, spaced)
+            ))
+        return out
+
+    def group_by_rounded_top(self, decimals: int = 1) -> Tuple["np.ndarray", List["np.ndarray"]]:
+        """
+        Точная группировка по округленному top. Возвращает (ключи по возрастанию,
+        индексы каждой группы, упорядоченные по x0).
+        """
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.float64), []
+        keys = np.round(self.top, decimals)
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        order = np.lexsort((self.x0, inverse))
+        bounds = np.flatnonzero(np.diff(inverse[order])) + 1
+        return uniq, np.split(order, bounds)
+
+    def group_bboxes(self, groups: Sequence["np.ndarray"]) -> "np.ndarray":
+        """bbox (x0, top, x1, bottom) каждой группы: массив формы (len(groups), 4)."""
+        if not groups:
+            return np.zeros((0, 4), dtype=np.float64)
+        flat = np.concatenate(groups)
+        starts = np.cumsum([0, *(len(g) for g in groups[:-1])])
+        return np.column_stack((
+            np.minimum.reduceat(self.x0[flat], starts),
+            np.minimum.reduceat(self.top[flat], starts),
+            np.maximum.reduceat(self.x1[flat], starts),
+            np.maximum.reduceat(self.bottom[flat], starts),
+        ))
+
+    # --- промежутки ---
+
+    def neighbour_gaps(
+        self,
+        same_line_tolerance: float = 5.0,
+        min_gap: float = 0.0,
+        max_gap: float = 50.0,
+    ) -> "np.ndarray":
+        """
+        Горизонтальные промежутки x0 - x1 между соседями в порядке (top, x0),
+        если их top отличается меньше чем на same_line_tolerance.
+        Возвращаются промежутки в интервале (min_gap, max_gap).
+        """
+        if len(self) < 2:
+            return np.zeros(0, dtype=np.float64)
+        order = self.reading_order()
+        top = self.top[order]
+        gaps = self.x0[order][1:] - self.x1[order][:-1]
+        same_line = np.abs(top[:-1] - top[1:]) < same_line_tolerance
+        return gaps[same_line & (gaps > min_gap) & (gaps < max_gap)]
+
+
+def gap_summary(gaps: "np.ndarray") -> Optional[Dict[str, float]]:
+    """
+    Статистика промежутков: median/p75/p90 берутся по индексу отсортированного
+    массива (n // 2, int(n * 0.75), int(n * 0.9)), плюс min и max.
+    """
+    n = int(gaps.size)
+    if n == 0:
+        return None
+    ordered = np.sort(gaps)
+    return {
+        "median": float(ordered[n // 2]),
+        "p75": float(ordered[int(n * 0.75)]),
+        "p90": float(ordered[int(n * 0.90)]),
+        "min": float(ordered[0]),
+        "max": float(ordered[-1]),
+    }
+
+
+# =========================
+# Words
+# =========================
+
+@dataclass
+class WordArray(LayoutTable):
+    """Слова страницы (порядок — как у pdfplumber extract_words)."""
+
+    @classmethod
+    def from_words(cls, words: Sequence[Dict[str, Any]]) -> "WordArray":
+        """Из списка словарей extract_words (для старых вызовов)."""
+        return cls.from_dicts(words)
+
+    def row_texts(self, y_tolerance: float = DEFAULT_Y_TOLERANCE) -> List[str]:
+        """Тексты строк из rows(): токены без пробелов по краям через один пробел."""
+        out: List[str] = []
+        for row in self.rows(y_tolerance):
+            tokens = (self.text[i].strip() for i in row.tolist())
+            out.append(" ".join(tok for tok in tokens if tok))
+        return out
+
+    def extract_text(self, y_tolerance: float = DEFAULT_Y_TOLERANCE) -> str:
+        """
+        Текст как у page.extract_text() без layout: слова в порядке извлечения,
+        подряд идущие слова одного кластера top — одна строка.
+        """
+        n = len(self)
+        if n == 0:
+            return ""
+        clusters = _cluster_ids(self.top, y_tolerance)
+        breaks = np.flatnonzero(clusters[1:] != clusters[:-1]) + 1
+        lines = []
+        prev = 0
+        for b in [*breaks.tolist(), n]:
+            lines.append(" ".join(self.text[prev:b]))
+            prev = b
+        return "\n".join(lines)
+
+    def layout_text(
+        self,
+        layout_bbox: BBoxType,
+        y_tolerance: float = DEFAULT_Y_TOLERANCE,
+        x_density: float = DEFAULT_X_DENSITY,
+        y_density: float = DEFAULT_Y_DENSITY,
+    ) -> str:
+        """
+        Текст как у page.extract_text(layout=True) для области layout_bbox:
+        строки те же, что в extract_text(), отступы и пустые строки
+        имитируют положение слов на сетке x_density x y_density.
+        """
+        n = len(self)
+        if n == 0:
+            return ""
+        left, top, right, bottom = (float(v) for v in layout_bbox)
+        width_chars = int(round((right - left) / x_density))
+        height_chars = int(round((bottom - top) / y_density))
+        blank_line = " " * width_chars
+
+        clusters = _cluster_ids(self.top, y_tolerance)
+        breaks = [0, *(np.flatnonzero(clusters[1:] != clusters[:-1]) + 1).tolist(), n]
+        tops = self.top.tolist()
+        x0s = self.x0.tolist()
+
+        out: List[str] = []
+        after_newline = True  # пустой вывод ведет себя как конец строки
+        num_newlines = 0
+        for line_no in range(len(breaks) - 1):
+            start, end = breaks[line_no], breaks[line_no + 1]
+            prepend = max(int(line_no > 0), round((tops[start] - top) / y_density) - num_newlines)
+            for _ in range(prepend):
+                if after_newline:
+                    out.append(blank_line)
+                out.append("\n")
+                after_newline = True
+            num_newlines += prepend
+
+            line_len = 0
+            for i in range(start, end):
+                spaces = max(min(1, line_len), round((x0s[i] - left) / x_density) - line_len)
+                out.append(" " * spaces)
+                out.append(self.text[i])
+                line_len += spaces + len(self.text[i])
+                after_newline = False
+            out.append(" " * (width_chars - line_len))
+
+        append = height_chars - (num_newlines + 1)
+        for i in range(append):
+            if i > 0:
+                out.append(blank_line)
+            out.append("\n")
+        text = "".join(out)
+        return text[:-1] if text.endswith("\n") else text
+
+
+# =========================
+# Chars
+# =========================
+
+@dataclass
+class CharArray(LayoutTable):
+    """Символы страницы (порядок — как в page.chars)."""
+    _words_memo: Dict[Tuple[float, float, bool], WordArray] = field(default_factory=dict, repr=False)
+    _lines_memo: Dict[Tuple[float, Optional[float]], Tuple["np.ndarray", "np.ndarray"]] = field(
+        default_factory=dict, repr=False
+    )
+
+    @classmethod
+    def from_chars(cls, chars: Iterable[Dict[str, Any]]) -> "CharArray":
+        return cls.from_dicts(chars)
+
+    @classmethod
+    def from_page(cls, page: Any) -> "CharArray":
+        """Один проход по page.chars (pdfplumber.Page или страница из кэша разметки)."""
+        try:
+            chars = page.chars or []
+        except Exception:
+            chars = []
+        return cls.from_chars(chars)
+
+    def crop(self, bbox: BBoxType) -> "CharArray":
+        """
+        Аналог page.crop(bbox): символы, пересекающие bbox (включая касание
+        с ненулевой длиной общей границы), с координатами, обрезанными по bbox.
+        """
+        left, top, right, bottom = (float(v) for v in bbox)
+        o_left = np.maximum(self.x0, left)
+        o_right = np.minimum(self.x1, right)
+        o_top = np.maximum(self.top, top)
+        o_bottom = np.minimum(self.bottom, bottom)
+        o_width = o_right - o_left
+        o_height = o_bottom - o_top
+        keep = (o_width >= 0) & (o_height >= 0) & (o_width + o_height > 0)
+        idx = np.flatnonzero(keep)
+        return CharArray(
+            text=[self.text[i] for i in idx.tolist()],
+            x0=o_left[idx],
+            x1=o_right[idx],
+            top=o_top[idx],
+            bottom=o_bottom[idx],
+            upright=self.upright[idx],
+        )
+
+    def words(
+        self,
+        x_tolerance: float = DEFAULT_X_TOLERANCE,
+        y_tolerance: float = DEFAULT_Y_TOLERANCE,
+        use_text_flow: bool = False,
+    ) -> WordArray:
+        """
+        Сборка слов, эквивалентная extract_words(x_tolerance, y_tolerance,
+        keep_blank_chars=False, use_text_flow=use_text_flow). Результат
+        кэшируется на объекте; кластеризация по строкам общая для всех
+        x_tolerance с тем же y_tolerance (если весь текст горизонтальный).
+        """
+        memo_key = (float(x_tolerance), float(y_tolerance), bool(use_text_flow))
+        cached = self._words_memo.get(memo_key)
+        if cached is not None:
+            return cached
+        words = self._assemble_words(memo_key[0], memo_key[1], memo_key[2])
+        self._words_memo[memo_key] = words
+        return words
+
+    def _line_order(self, xt: float, yt: float) -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        Порядок символов по строкам (как WordExtractor.iter_chars_to_lines)
+        и признак начала строки. Для горизонтального текста от x_tolerance
+        не зависит, поэтому ключ кэша — только y_tolerance.
+        """
+        all_upright = bool(self.upright.all())
+        memo_key = (yt, None if all_upright else xt)
+        cached = self._lines_memo.get(memo_key)
+        if cached is not None:
+            return cached
+
+        n = len(self)
+        # pdfplumber группирует подряд идущие символы с одинаковым upright
+        run_starts = np.flatnonzero(np.r_[True, self.upright[1:] != self.upright[:-1]])
+        run_bounds = [*run_starts.tolist(), n]
+        orders: List["np.ndarray"] = []
+        line_starts: List["np.ndarray"] = []
+        for r in range(len(run_bounds) - 1):
+            run = np.arange(run_bounds[r], run_bounds[r + 1])
+            if self.upright[run[0]]:
+                # Строки по top, внутри строки — по x0
+                line_key, line_tol = self.top[run], yt
+                sort1, sort2 = self.x0[run], self.x0[run]
+            else:
+                # Повернутый текст: строки по x0, внутри — сверху вниз
+                line_key, line_tol = self.x0[run], xt
+                sort1, sort2 = self.top[run], self.bottom[run]
+            clusters = _cluster_ids(line_key, line_tol)
+            order = np.lexsort((sort2, sort1, clusters))
+            sorted_clusters = clusters[order]
+            starts = np.r_[True, sorted_clusters[1:] != sorted_clusters[:-1]]
+            orders.append(run[order])
+            line_starts.append(starts)
+
+        result = (np.concatenate(orders), np.concatenate(line_starts))
+        self._lines_memo[memo_key] = result
+        return result
+
+    def _assemble_words(self, xt: float, yt: float, use_text_flow: bool = False) -> WordArray:
+        n = len(self)
+        if n == 0:
+            return WordArray.empty()
+
+        if use_text_flow:
+            # Исходный порядок символов; "строка" — серия с одинаковым upright,
+            # и слова всегда сравниваются как горизонтальный текст
+            order = np.arange(n)
+            new_line = np.r_[True, self.upright[1:] != self.upright[:-1]]
+            horizontal = np.ones(n, dtype=bool)
+        else:
+            order, new_line = self._line_order(xt, yt)
+            horizontal = self.upright[order]
+        upright = self.upright[order]
+        x0, x1 = self.x0[order], self.x1[order]
+        top, bottom = self.top[order], self.bottom[order]
+        text_arr = np.array(self.text, dtype=str)
+        blank = np.char.isspace(text_arr)[order]
+
+        # Сравнение с предыдущим символом (как char_begins_new_word)
+        a = np.where(horizontal, x0, top)
+        b = np.where(horizontal, x1, bottom)
+        cross = np.where(horizontal, top, x0)
+        intra_tol = np.where(horizontal, xt, yt)
+        inter_tol = np.where(horizontal, yt, xt)
+        begins = np.ones(n, dtype=bool)
+        begins[1:] = (
+            (a[1:] < a[:-1])
+            | (a[1:] > b[:-1] + intra_tol[1:])
+            | (np.abs(cross[1:] - cross[:-1]) > inter_tol[1:])
+        )
+        prev_blank = np.r_[True, blank[:-1]]
+        word_start = ~blank & (new_line | prev_blank | begins)
+
+        keep = np.flatnonzero(~blank)
+        if keep.size == 0:
+            return WordArray.empty()
+        starts = np.flatnonzero(word_start[keep])
+        chars_text = [self.text[i] for i in order[keep].tolist()]
+        bounds = [*starts.tolist(), keep.size]
+        texts = [
+            "".join(LIGATURES.get(t, t) for t in chars_text[bounds[i]:bounds[i + 1]])
+            for i in range(len(bounds) - 1)
+        ]
+        return WordArray(
+            text=texts,
+            x0=np.minimum.reduceat(x0[keep], starts),
+            x1=np.maximum.reduceat(x1[keep], starts),
+            top=np.minimum.reduceat(top[keep], starts),
+            bottom=np.maximum.reduceat(bottom[keep], starts),
+            upright=upright[keep][starts],
+        )
+
+
+# =========================
+# Page layout heuristics
+# =========================
+
+def find_header_boundary(tops: "np.ndarray", page_height: float) -> float:
+    """
+    Граница шапки: максимальный вертикальный промежуток (не меньше
+    max(6, 1% высоты)) между уникальными top в верхней половине страницы.
+    """
+    if tops.size == 0 or page_height <= 0:
+        return max(0.0, page_height * 0.2)
+    uniq = np.unique(np.round(tops, 1))
+    if uniq.size < 2:
+        return max(0.0, page_height * 0.2)
+
+    boundary = page_height * 0.2
+    min_gap = max(6.0, page_height * 0.01)
+    # Рассматриваются пары, у которых нижнее значение еще в верхней половине
+    limit = int(np.searchsorted(uniq, page_height * 0.5, side="right"))
+    gaps = np.diff(uniq[:max(limit, 1)])
+    if gaps.size:
+        best = int(np.argmax(gaps))
+        if gaps[best] >= min_gap:
+            boundary = float(uniq[best])
+    return max(0.0, min(page_height * 0.45, boundary))
+
+
+def detect_columns(
+    words: WordArray,
+    width: float,
+    min_words_per_column: int = 10,
+    gutter_ratio: float = 0.1,
+    adaptive_min_words: bool = True,
+    max_gutter_share: Optional[float] = 0.15,
+) -> int:
+    """
+    1 или 2 колонки: слева от гаттера и справа от него должно быть не меньше
+    min_words_per_column слов. adaptive_min_words снижает порог на коротких
+    страницах; при max_gutter_share большая доля слов, начинающихся в гаттере,
+    считается таблицей/плотной версткой (1 колонка).
+    """
+    n = len(words)
+    if n == 0 or width <= 0:
+        return 1
+
+    effective_min_words = int(min_words_per_column)
+    if adaptive_min_words and n < (min_words_per_column * 2):
+        effective_min_words = max(3, n // 4)
+
+    center = width / 2.0
+    gutter = max(0.0, min(0.4, float(gutter_ratio)))
+    left_border = center * (1.0 - gutter)
+    right_border = center * (1.0 + gutter)
+
+    if max_gutter_share is not None:
+        in_gutter = int(np.count_nonzero((words.x0 > left_border) & (words.x0 < right_border)))
+        if in_gutter > n * max_gutter_share:
+            return 1
+
+    left = int(np.count_nonzero(words.x1 <= left_border))
+    right = int(np.count_nonzero(words.x0 >= right_border))
+    if left >= effective_min_words and right >= effective_min_words:
+        return 2
+    return 1
+
+
+@dataclass
+class PageLayout:
+    """Результат разбора страницы: зоны в порядке чтения."""
+    columns: int
+    header_bottom: float
+    body_top: float
+    words: WordArray
+    # columns == 2: [шапка, левая колонка, правая колонка]; иначе [все слова]
+    zones: List[WordArray]
+    zone_bboxes: List[BBoxType]
+
+
+def analyze_page_layout(
+    chars: CharArray,
+    width: float,
+    height: float,
+    x_tolerance: float = DEFAULT_X_TOLERANCE,
+    y_tolerance: float = DEFAULT_Y_TOLERANCE,
+    min_words_per_column: int = 10,
+    gutter_ratio: float = 0.1,
+) -> PageLayout:
+    """
+    Шапка, колонки и слова по зонам за один разбор символов страницы.
+
+    Шапка — до find_header_boundary, тело начинается на y_tolerance ниже;
+    колонки определяются по словам тела. Для двух колонок зоны получаются
+    обрезкой массива символов (page.crop) и повторной сборкой слов.
+    """
+    words = chars.words(x_tolerance, y_tolerance)
+    full_bbox = (0.0, 0.0, float(width), float(height))
+    header_bottom = find_header_boundary(words.top, height)
+    body_top = min(height, header_bottom + y_tolerance)
+    body_words = words.take(words.top > body_top)
+    columns = detect_columns(
+        body_words if len(body_words) else words,
+        width,
+        min_words_per_column=min_words_per_column,
+        gutter_ratio=gutter_ratio,
+    )
+    if columns != 2:
+        return PageLayout(columns, header_bottom, body_top, words, [words], [full_bbox])
+
+    center = width / 2.0
+    bboxes: List[BBoxType] = [
+        (0.0, 0.0, float(width), float(header_bottom)),
+        (0.0, float(body_top), float(center), float(height)),
+        (float(center), float(body_top), float(width), float(height)),
+    ]
+    zones = [chars.crop(bbox).words(x_tolerance, y_tolerance) for bbox in bboxes]
+    return PageLayout(columns, header_bottom, body_top, words, zones, bboxes)
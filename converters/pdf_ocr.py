@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pdf_ocr.py
+
+OCR областей и страниц PDF: ограниченный пул процессов + постоянный кэш.
+
+Раньше каждое "плохое" выделение рендерилось в 300 dpi и распознавалось
+pytesseract синхронно в потоке запроса. Теперь:
+- рендер и Tesseract выполняются в пуле процессов (pdf_ocr.workers), число
+  заданий в очереди ограничено (pdf_ocr.max_pending) — при переполнении
+  запрос ждет свободный слот не дольше timeout_sec;
+- результат кэшируется на диске по ключу (SHA-256 файла, страница,
+  округленный bbox, язык, dpi), повторные запросы Tesseract не вызывают;
+- в постраничном режиме (pdf_ocr.page_mode) страница распознается один раз
+  целиком (image_to_data со словами и их координатами), а текст любой
+  области собирается из слов, попавших в bbox, без второго вызова Tesseract.
+
+Использование:
+    text = ocr_region(pdf_path, page_index, bbox, "rus+eng")
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+try:
+    import pytesseract  # type: ignore
+    PYTESSERACT_AVAILABLE = True
+except ImportError:
+    PYTESSERACT_AVAILABLE = False
+
+
+BBoxType = Tuple[float, float, float, float]
+
+MIN_DPI = 72
+MAX_DPI = 600
+
+
+# =========================
+# Configuration
+# =========================
+
+@dataclass(frozen=True)
+class PDFOCRConfig:
+    """Настройки OCR."""
+    enabled: bool = True
+    cache_dir: Path = Path("pdf_ocr_cache")
+    max_size_mb: float = 128.0  # Лимит размера кэша на диске (LRU по файлам)
+    workers: int = 0  # Процессов Tesseract (0 — по числу ядер)
+    max_pending: int = 8  # Заданий в очереди сверх workers
+    timeout_sec: float = 120.0  # Ожидание слота и результата одного задания
+    dpi: int = 300
+    bbox_step: float = 1.0  # Шаг округления bbox для ключа кэша, pt (наружу)
+    page_mode: bool = False  # OCR страницы целиком, области — из ее слов
+
+
+def load_ocr_config() -> PDFOCRConfig:
+    """Читает настройки из config.py (секция pdf_ocr)."""
+    try:
+        from config import get_config
+        cfg = get_config()
+        return PDFOCRConfig(
+            enabled=bool(cfg.get("pdf_ocr.enabled", True)),
+            cache_dir=cfg.get_path("pdf_ocr.cache_dir"),
+            max_size_mb=float(cfg.get("pdf_ocr.max_size_mb", 128)),
+            workers=int(cfg.get("pdf_ocr.workers", 0)),
+            max_pending=int(cfg.get("pdf_ocr.max_pending", 8)),
+            timeout_sec=float(cfg.get("pdf_ocr.timeout_sec", 120)),
+            dpi=int(cfg.get("pdf_ocr.dpi", 300)),
+            bbox_step=float(cfg.get("pdf_ocr.bbox_step", 1.0)),
+            page_mode=bool(cfg.get("pdf_ocr.page_mode", False)),
+        )
+    except (ImportError, KeyError, TypeError, ValueError):
+        return PDFOCRConfig()
+
+
+# =========================
+# Cache keys
+# =========================
+
+@dataclass(frozen=True)
+class OCRRegionKey:
+    """Параметры распознавания области (они же — ключ кэша)."""
+    sha256: str
+    page_index: int  # Нумерация с 0
+    bbox: BBoxType  # Округленный наружу и обрезанный по странице
+    lang: str
+    dpi: int
+
+    def cache_path(self, cache_dir: Path) -> Path:
+        coords = "_".join(f"{v:g}" for v in self.bbox)
+        name = f"r{self.page_index:05d}_{coords}_{self.lang}_d{self.dpi}.json"
+        return Path(cache_dir) / self.sha256[:2] / self.sha256 / name
+
+
+@dataclass(frozen=True)
+class OCRPageKey:
+    """Параметры распознавания страницы целиком."""
+    sha256: str
+    page_index: int
+    lang: str
+    dpi: int
+
+    def cache_path(self, cache_dir: Path) -> Path:
+        name = f"p{self.page_index:05d}_{self.lang}_d{self.dpi}.json"
+        return Path(cache_dir) / self.sha256[:2] / self.sha256 / name
+
+
+def _normalize_lang(lang: Optional[str]) -> str:
+    value = (lang or "rus+eng").strip()
+    # В имени файла допустимы только буквы, цифры, "+" и "_"
+    return "".join(ch for ch in value if ch.isalnum() or ch in "+_") or "rus+eng"
+
+
+def _normalize_dpi(dpi: Optional[int], config: PDFOCRConfig) -> int:
+    return max(MIN_DPI, min(MAX_DPI, int(dpi or config.dpi)))
+
+
+def round_bbox(bbox: BBoxType, page_bbox: BBoxType, step: float) -> BBoxType:
+    """Округляет bbox наружу до шага step и обрезает по границам страницы."""
+    x0, top, x1, bottom = (float(v) for v in bbox)
+    if step > 0:
+        x0 = math.floor(x0 / step) * step
+        top = math.floor(top / step) * step
+        x1 = math.ceil(x1 / step) * step
+        bottom = math.ceil(bottom / step) * step
+    px0, ptop, px1, pbottom = (float(v) for v in page_bbox)
+    return (
+        round(max(x0, px0), 3),
+        round(max(top, ptop), 3),
+        round(min(x1, px1), 3),
+        round(min(bottom, pbottom), 3),
+    )
+
+
+# =========================
+# Worker tasks (выполняются в процессах пула)
+# =========================
+
+def _render(pdf_path: str, page_index: int, bbox: Optional[BBoxType], dpi: int):
+    from converters.pdf_handle_pool import checkout_pdf
+
+    with checkout_pdf(pdf_path) as pdf:
+        page = pdf.pages[page_index]
+        if bbox is not None:
+            page = page.crop(bbox)
+        return page.to_image(resolution=dpi).original
+
+
+def _ocr_region_task(pdf_path: str, page_index: int, bbox: BBoxType, lang: str, dpi: int, timeout: float) -> str:
+    """Рендер области и image_to_string."""
+    img = _render(pdf_path, page_index, bbox, dpi)
+    return pytesseract.image_to_string(img, lang=lang, timeout=timeout)
+
+
+def _ocr_page_task(pdf_path: str, page_index: int, lang: str, dpi: int, timeout: float) -> Dict[str, Any]:
+    """
+    Рендер страницы и image_to_data: слова с координатами в пунктах PDF
+    (система координат pdfplumber: x0/top от левого верхнего угла страницы).
+    """
+    from converters.pdf_handle_pool import checkout_pdf
+
+    with checkout_pdf(pdf_path) as pdf:
+        page = pdf.pages[page_index]
+        page_bbox = tuple(float(v) for v in page.bbox)
+        img = page.to_image(resolution=dpi).original
+    data = pytesseract.image_to_data(img, lang=lang, timeout=timeout, output_type=pytesseract.Output.DICT)
+
+    scale = 72.0 / dpi
+    words: List[Dict[str, Any]] = []
+    for i, text in enumerate(data.get("text") or []):
+        text = (text or "").strip()
+        if not text:
+            continue
+        try:
+            conf = float(data["conf"][i])
+        except (TypeError, ValueError):
+            conf = -1.0
+        x0 = page_bbox[0] + data["left"][i] * scale
+        top = page_bbox[1] + data["top"][i] * scale
+        words.append({
+            "text": text,
+            "x0": round(x0, 2),
+            "top": round(top, 2),
+            "x1": round(x0 + data["width"][i] * scale, 2),
+            "bottom": round(top + data["height"][i] * scale, 2),
+            "conf": conf,
+            "block": int(data["block_num"][i]),
+            "par": int(data["par_num"][i]),
+            "line": int(data["line_num"][i]),
+        })
+    return {"page_bbox": list(page_bbox), "words": words}
+
+
+# =========================
+# Process pool
+# =========================
+
+class OCRPool:
+    """
+    Пул процессов для OCR с ограниченной очередью: одновременно принимается
+    не больше workers + max_pending заданий, остальные ждут слот.
+    """
+
+    def __init__(self, config: PDFOCRConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(self.workers + max(0, config.max_pending))
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                import multiprocessing
+
+                # spawn: воркер gunicorn и фоновые потоки небезопасно форкать
+                ctx = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+            return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def workers(self) -> int:
+        return self.config.workers if self.config.workers > 0 else (os.cpu_count() or 1)
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Ставит задание в пул (ждет свободный слот не дольше timeout_sec)."""
+        from concurrent.futures.process import BrokenProcessPool
+
+        if not self._slots.acquire(timeout=self.config.timeout_sec):
+            raise TimeoutError("Очередь OCR переполнена")
+        executor = self._get_executor()
+        try:
+            future: Future = executor.submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError):
+            self._slots.release()
+            self._reset(executor)
+            raise
+        future.add_done_callback(lambda _f: self._slots.release())
+        return future
+
+    def result(self, future: Future) -> Any:
+        """Результат задания (не дольше timeout_sec); сломанный пул пересоздается."""
+        from concurrent.futures.process import BrokenProcessPool
+
+        try:
+            return future.result(timeout=self.config.timeout_sec)
+        except BrokenProcessPool:
+            with self._lock:
+                executor = self._executor
+            if executor is not None:
+                self._reset(executor)
+            raise
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Выполняет задание в пуле и ждет результат."""
+        return self.result(self.submit(fn, *args))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: Optional[OCRPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool(config: Optional[PDFOCRConfig] = None) -> OCRPool:
+    """Пул текущего процесса (создается при первом обращении)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OCRPool(config or load_ocr_config())
+        return _pool
+
+
+# =========================
+# Disk cache
+# =========================
+
+_lock = threading.Lock()
+_stats: Dict[str, int] = {"hits": 0, "misses": 0, "page_hits": 0, "page_misses": 0, "evicted_files": 0}
+
+
+def get_ocr_stats() -> Dict[str, int]:
+    """Счетчики кэша OCR текущего процесса."""
+    with _lock:
+        return dict(_stats)
+
+
+def _count(name: str, value: int = 1) -> None:
+    with _lock:
+        _stats[name] = _stats.get(name, 0) + value
+
+
+def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return data if isinstance(data, dict) else None
+
+
+def _write_json(path: Path, data: Dict[str, Any], config: PDFOCRConfig) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    enforce_ocr_budget(config)
+
+
+def enforce_ocr_budget(config: Optional[PDFOCRConfig] = None) -> int:
+    """
+    Удаляет наименее недавно использованные результаты, пока кэш не уложится
+    в 90% от max_size_mb. Возвращает число удаленных файлов. Записи редки
+    (каждая стоит секунды Tesseract), поэтому обход каталога дешев.
+    """
+    config = config or load_ocr_config()
+    root = Path(config.cache_dir)
+    if not root.exists():
+        return 0
+    files: List[Tuple[float, int, Path]] = []
+    total = 0
+    for path in root.rglob("*.json"):
+        if path.name.startswith("."):
+            continue
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        files.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    budget = int(config.max_size_mb * 1024 * 1024)
+    removed = 0
+    if total > budget:
+        target = int(budget * 0.9)
+        for _, size, path in sorted(files, key=lambda f: f[0]):
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+    if removed:
+        _count("evicted_files", removed)
+    return removed
+
+
+# =========================
+# Page words -> region text
+# =========================
+
+def text_from_page_words(words: List[Dict[str, Any]], bbox: BBoxType) -> str:
+    """
+    Текст области из слов распознанной страницы: берутся слова, центр
+    которых лежит в bbox. Строки Tesseract разделяются переводом строки,
+    абзацы — пустой строкой (как в image_to_string).
+    """
+    x0, top, x1, bottom = bbox
+    lines: List[List[str]] = []
+    line_keys: List[Tuple[int, int, int]] = []
+    for w in words:
+        cx = (w["x0"] + w["x1"]) / 2
+        cy = (w["top"] + w["bottom"]) / 2
+        if not (x0 <= cx <= x1 and top <= cy <= bottom):
+            continue
+        key = (w["block"], w["par"], w["line"])
+        if line_keys and line_keys[-1] == key:
+            lines[-1].append(w["text"])
+        else:
+            line_keys.append(key)
+            lines.append([w["text"]])
+
+    parts: List[str] = []
+    for i, line in enumerate(lines):
+        if i > 0:
+            same_par = line_keys[i][:2] == line_keys[i - 1][:2]
+            parts.append("\n" if same_par else "\n\n")
+        parts.append(" ".join(line))
+    return "".join(parts)
+
+
+# =========================
+# Public API
+# =========================
+
+def ocr_page_words(
+    pdf_path: Union[str, Path],
+    page_index: int,
+    lang: Optional[str] = None,
+    dpi: Optional[int] = None,
+    config: Optional[PDFOCRConfig] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Слова распознанной страницы (из кэша или через пул). None — OCR
+    недоступен или не удался.
+    """
+    from converters.pdf_layout_cache import file_sha256
+
+    config = config or load_ocr_config()
+    key = OCRPageKey(
+        sha256=file_sha256(pdf_path),
+        page_index=max(0, int(page_index)),
+        lang=_normalize_lang(lang),
+        dpi=_normalize_dpi(dpi, config),
+    )
+    path = key.cache_path(config.cache_dir)
+    if config.enabled:
+        cached = _read_json(path)
+        if cached is not None and isinstance(cached.get("words"), list):
+            _count("page_hits")
+            return cached["words"]
+    if not PYTESSERACT_AVAILABLE:
+        return None
+
+    _count("page_misses")
+    try:
+        data = get_ocr_pool(config).run(
+            _ocr_page_task, str(pdf_path), key.page_index, key.lang, key.dpi, config.timeout_sec
+        )
+    except Exception as e:
+        print(f"WARNING: OCR страницы {key.page_index + 1} не удался: {e}")
+        return None
+    if config.enabled:
+        try:
+            _write_json(path, data, config)
+        except OSError as e:
+            print(f"WARNING: Не удалось записать кэш OCR: {e}")
+    return data["words"]
+
+
+def ocr_pages_text(
+    pdf_path: Union[str, Path],
+    page_indexes: List[int],
+    lang: Optional[str] = None,
+    dpi: Optional[int] = None,
+    config: Optional[PDFOCRConfig] = None,
+) -> Dict[int, str]:
+    """
+    Текст страниц целиком для ингеста сканов: страницы распознаются
+    параллельно в пуле, слова кэшируются так же, как в ocr_page_words
+    (последующие запросы областей этих страниц Tesseract не вызывают).
+
+    Returns:
+        {индекс страницы: текст}; страницы, которые не удалось
+        распознать, отсутствуют.
+    """
+    from converters.pdf_layout_cache import file_sha256
+
+    config = config or load_ocr_config()
+    sha256 = file_sha256(pdf_path)
+    lang_value = _normalize_lang(lang)
+    dpi_value = _normalize_dpi(dpi, config)
+
+    words_by_page: Dict[int, List[Dict[str, Any]]] = {}
+    pending: Dict[int, Tuple[OCRPageKey, Future]] = {}
+    pool = get_ocr_pool(config)
+    for page_index in page_indexes:
+        key = OCRPageKey(sha256=sha256, page_index=int(page_index), lang=lang_value, dpi=dpi_value)
+        cached = _read_json(key.cache_path(config.cache_dir)) if config.enabled else None
+        if cached is not None and isinstance(cached.get("words"), list):
+            _count("page_hits")
+            words_by_page[key.page_index] = cached["words"]
+            continue
+        if not PYTESSERACT_AVAILABLE:
+            continue
+        _count("page_misses")
+        try:
+            future = pool.submit(_ocr_page_task, str(pdf_path), key.page_index, lang_value, dpi_value, config.timeout_sec)
+        except Exception as e:
+            print(f"WARNING: OCR страницы {key.page_index + 1} не удался: {e}")
+            continue
+        pending[key.page_index] = (key, future)
+
+    for page_index, (key, future) in pending.items():
+        try:
+            data = pool.result(future)
+        except Exception as e:
+            print(f"WARNING: OCR страницы {page_index + 1} не удался: {e}")
+            continue
+        words_by_page[page_index] = data["words"]
+        if config.enabled:
+            try:
+                _write_json(key.cache_path(config.cache_dir), data, config)
+            except OSError as e:
+                print(f"WARNING: Не удалось записать кэш OCR: {e}")
+
+    no_bbox = (float("-inf"), float("-inf"), float("inf"), float("inf"))
+    return {
+        page_index: text_from_page_words(words_by_page[page_index], no_bbox)
+        for page_index in sorted(words_by_page)
+    }
+
+
+def ocr_region(
+    pdf_path: Union[str, Path],
+    page_index: int,
+    bbox: BBoxType,
+    page_bbox: BBoxType,
+    lang: Optional[str] = None,
+    dpi: Optional[int] = None,
+    page_mode: Optional[bool] = None,
+    config: Optional[PDFOCRConfig] = None,
+) -> Optional[str]:
+    """
+    Распознает область страницы.
+
+    Args:
+        pdf_path: Путь к PDF
+        page_index: Индекс страницы (с 0)
+        bbox: Область (x0, top, x1, bottom) в пунктах
+        page_bbox: bbox страницы (для обрезки округленной области)
+        lang: Языки Tesseract ("rus+eng")
+        dpi: Разрешение рендера; None — из конфигурации
+        page_mode: Распознать страницу целиком и взять слова из bbox;
+            None — из конфигурации
+        config: Настройки; None — из config.py
+
+    Returns:
+        Текст или None, если OCR недоступен или не удался.
+    """
+    from converters.pdf_layout_cache import file_sha256
+
+    config = config or load_ocr_config()
+    if page_mode if page_mode is not None else config.page_mode:
+        words = ocr_page_words(pdf_path, page_index, lang, dpi, config)
+        return None if words is None else text_from_page_words(words, bbox)
+
+    key = OCRRegionKey(
+        sha256=file_sha256(pdf_path),
+        page_index=max(0, int(page_index)),
+        bbox=round_bbox(bbox, page_bbox, config.bbox_step),
+        lang=_normalize_lang(lang),
+        dpi=_normalize_dpi(dpi, config),
+    )
+    path = key.cache_path(config.cache_dir)
+    if config.enabled:
+        cached = _read_json(path)
+        if cached is not None and isinstance(cached.get("text"), str):
+            _count("hits")
+            return cached["text"]
+    if not PYTESSERACT_AVAILABLE:
+        return None
+
+    _count("misses")
+    try:
+        text = get_ocr_pool(config).run(
+            _ocr_region_task, str(pdf_path), key.page_index, key.bbox, key.lang, key.dpi, config.timeout_sec
+        )
+    except Exception as e:
+        print(f"WARNING: OCR области не удался: {e}")
+        return None
+    if config.enabled:
+        try:
+            _write_json(path, {"text": text}, config)
+        except OSError as e:
+            print(f"WARNING: Не удалось записать кэш OCR: {e}")
+    return text
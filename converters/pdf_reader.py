@@ -11,7 +11,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, List, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
 import re
 
 # Попытка импорта библиотек для работы с PDF
@@ -67,6 +67,47 @@ class PDFReaderConfig:
     smart_columns: bool = True
     two_column_min_words: int = 10
     two_column_gutter_ratio: float = 0.1
+    ocr_scanned_pages: bool = True  # Распознавать страницы без текстового слоя (converters.pdf_ocr)
+    scanned_page_min_chars: int = 20  # Страница с меньшим числом символов считается сканом
+    ocr_lang: str = "rus+eng"
+    adaptive_window: bool = True  # Читать окно страниц адаптивно (read_pdf_blocks_adaptive)
+    adaptive_max_pages: int = 12  # Предел страниц адаптивного чтения (0 — без ограничения)
+
+
+@dataclass(frozen=True)
+class PDFScanReport:
+    """Классификация PDF по наличию текстового слоя на обрабатываемых страницах."""
+    kind: str  # text, scanned или mixed
+    page_chars: Dict[int, int]  # индекс страницы (с 0) -> символов без пробелов
+    scanned_pages: List[int]
+
+
+def load_reader_config(config: Optional[Any] = None) -> PDFReaderConfig:
+    """
+    Читает настройки секции pdf_reader из объекта конфигурации (по умолчанию
+    — config.py); без config.py — значения по умолчанию.
+    """
+    cfg = config
+    if cfg is None:
+        try:
+            from config import get_config
+            cfg = get_config()
+        except ImportError:
+            return PDFReaderConfig()
+    return PDFReaderConfig(
+        first_pages=cfg.get("pdf_reader.first_pages", 3),
+        last_pages=cfg.get("pdf_reader.last_pages", 3),
+        extract_all_pages=cfg.get("pdf_reader.extract_all_pages", False),
+        clean_text=cfg.get("pdf_reader.clean_text", True),
+        smart_columns=cfg.get("pdf_reader.smart_columns", True),
+        two_column_min_words=cfg.get("pdf_reader.two_column_min_words", 10),
+        two_column_gutter_ratio=cfg.get("pdf_reader.two_column_gutter_ratio", 0.1),
+        ocr_scanned_pages=cfg.get("pdf_reader.ocr_scanned_pages", True),
+        scanned_page_min_chars=cfg.get("pdf_reader.scanned_page_min_chars", 20),
+        ocr_lang=cfg.get("pdf_reader.ocr_lang", "rus+eng"),
+        adaptive_window=cfg.get("pdf_reader.adaptive_window", True),
+        adaptive_max_pages=cfg.get("pdf_reader.adaptive_max_pages", 12),
+    )
 
 
 # =========================
@@ -95,6 +136,15 @@ def _ensure_file(path: Union[str, Path]) -> Path:
     return p
 
 
+def _open_pdfplumber(path: Path):
+    """Открывает PDF через общий кэш разметки (converters.pdf_layout_cache)."""
+    try:
+        from converters.pdf_layout_cache import open_pdf_layout
+    except ImportError:
+        return pdfplumber.open(path)
+    return open_pdf_layout(path)
+
+
 def _clean_text(text: str) -> str:
     """Очищает текст от лишних пробелов и символов."""
     if not text:
@@ -120,31 +170,48 @@ def _normalize_block_text(text: str, clean: bool = True) -> str:
     return text
 
 
-def _detect_columns_pdfplumber(page: Any, config: PDFReaderConfig) -> int:
-    """Detect whether a page is single-column or two-column."""
-    try:
-        words = page.extract_words() or []
-    except Exception:
-        words = []
+def _select_page_indexes(total_pages: int, config: PDFReaderConfig) -> List[int]:
+    """Индексы страниц (с 0) для обработки: все или первые + последние."""
+    if config.extract_all_pages:
+        return list(range(total_pages))
+
+    pages_to_process = []
+    
+    # Первые страницы
+    first_end = min(config.first_pages, total_pages)
+    pages_to_process.extend(range(first_end))
+    
+    # Последние страницы (если они не пересекаются с первыми)
+    if config.last_pages > 0:
+        last_start = max(config.first_pages, total_pages - config.last_pages)
+        # Добавляем последние страницы, исключая те, что уже добавлены
+        for page_num in range(last_start, total_pages):
+            if page_num not in pages_to_process:
+                pages_to_process.append(page_num)
+    
+    # Сортируем для правильного порядка обработки
+    return sorted(set(pages_to_process))
 
-    if not words:
-        return 1
+
+def _detect_columns_pdfplumber(page: Any, config: PDFReaderConfig, chars: Any = None) -> int:
+    """Detect whether a page is single-column or two-column."""
+    from converters.pdf_layout_engine import CharArray, detect_columns
 
     width = float(getattr(page, "width", 0) or 0)
     if width <= 0:
         return 1
-
-    center = width / 2.0
-    gutter = max(0.0, min(0.4, float(config.two_column_gutter_ratio)))
-    left_border = center * (1.0 - gutter)
-    right_border = center * (1.0 + gutter)
-
-    left_words = [w for w in words if float(w.get("x1", 0)) <= left_border]
-    right_words = [w for w in words if float(w.get("x0", width)) >= right_border]
-
-    if len(left_words) >= int(config.two_column_min_words) and len(right_words) >= int(config.two_column_min_words):
-        return 2
-    return 1
+    try:
+        words = (chars if chars is not None else CharArray.from_page(page)).words()
+    except Exception:
+        return 1
+    return detect_columns(
+        words,
+        width,
+        min_words_per_column=int(config.two_column_min_words),
+        gutter_ratio=config.two_column_gutter_ratio,
+        adaptive_min_words=False,
+        max_gutter_share=None,
+    )
 
 
 def _extract_page_text_pdfplumber(page: Any, config: PDFReaderConfig) -> str:
@@ -152,21 +219,23 @@ def _extract_page_text_pdfplumber(page: Any, config: PDFReaderConfig) -> str:
     if not config.smart_columns:
         return page.extract_text() or ""
 
-    columns = _detect_columns_pdfplumber(page, config)
+    from converters.pdf_layout_engine import CharArray
+
+    # Символы страницы читаются один раз: и для определения колонок,
+    # и для текста колонок (эквивалент page.crop(...).extract_text()).
+    chars = CharArray.from_page(page)
+    columns = _detect_columns_pdfplumber(page, config, chars=chars)
     if columns != 2:
-        return page.extract_text() or ""
+        return chars.words().extract_text()
 
     width = float(getattr(page, "width", 0) or 0)
     height = float(getattr(page, "height", 0) or 0)
     if width <= 0 or height <= 0:
-        return page.extract_text() or ""
+        return chars.words().extract_text()
 
     center = width / 2.0
-    left_col = page.crop((0, 0, center, height))
-    right_col = page.crop((center, 0, width, height))
-
-    left_text = left_col.extract_text() or ""
-    right_text = right_col.extract_text() or ""
+    left_text = chars.crop((0, 0, center, height)).words().extract_text()
+    right_text = chars.crop((center, 0, width, height)).words().extract_text()
     return f"{left_text}\n{right_text}".strip()
 
 
@@ -203,25 +272,7 @@ def read_pdf_with_pypdf2(
                 raise PDFReaderError(f"PDF файл не содержит страниц: {p}")
             
             # Определяем диапазон страниц для обработки
-            if config.extract_all_pages:
-                pages_to_process = list(range(total_pages))
-            else:
-                pages_to_process = []
-                
-                # Первые страницы
-                first_end = min(config.first_pages, total_pages)
-                pages_to_process.extend(range(first_end))
-                
-                # Последние страницы (если они не пересекаются с первыми)
-                if config.last_pages > 0:
-                    last_start = max(config.first_pages, total_pages - config.last_pages)
-                    # Добавляем последние страницы, исключая те, что уже добавлены
-                    for page_num in range(last_start, total_pages):
-                        if page_num not in pages_to_process:
-                            pages_to_process.append(page_num)
-                
-                # Сортируем для правильного порядка обработки
-                pages_to_process = sorted(set(pages_to_process))
+            pages_to_process = _select_page_indexes(total_pages, config)
             
             # Извлекаем текст со страниц
             for page_num in pages_to_process:
@@ -276,32 +327,14 @@ def read_pdf_with_pdfplumber(
     order = 0
     
     try:
-        with pdfplumber.open(p) as pdf:
+        with _open_pdfplumber(p) as pdf:
             total_pages = len(pdf.pages)
             
             if total_pages == 0:
                 raise PDFReaderError(f"PDF файл не содержит страниц: {p}")
             
             # Определяем диапазон страниц для обработки
-            if config.extract_all_pages:
-                pages_to_process = list(range(total_pages))
-            else:
-                pages_to_process = []
-                
-                # Первые страницы
-                first_end = min(config.first_pages, total_pages)
-                pages_to_process.extend(range(first_end))
-                
-                # Последние страницы (если они не пересекаются с первыми)
-                if config.last_pages > 0:
-                    last_start = max(config.first_pages, total_pages - config.last_pages)
-                    # Добавляем последние страницы, исключая те, что уже добавлены
-                    for page_num in range(last_start, total_pages):
-                        if page_num not in pages_to_process:
-                            pages_to_process.append(page_num)
-                
-                # Сортируем для правильного порядка обработки
-                pages_to_process = sorted(set(pages_to_process))
+            pages_to_process = _select_page_indexes(total_pages, config)
             
             # Извлекаем текст со страниц
             for page_num in pages_to_process:
@@ -331,6 +364,67 @@ def read_pdf_with_pdfplumber(
         raise PDFReaderError(f"Ошибка чтения PDF: {e}") from e
 
 
+# =========================
+# PDF Reading with backend selection
+# =========================
+
+def read_pdf_with_backend_selection(
+    path: Union[str, Path],
+    config: PDFReaderConfig = PDFReaderConfig()
+) -> List[PDFTextBlock]:
+    """
+    Читает PDF с выбором движка по страницам (converters.pdf_backend):
+    PyMuPDF для всех страниц, pdfplumber — для страниц с плохой оценкой качества.
+    
+    Args:
+        path: Путь к PDF файлу
+        config: Конфигурация чтения
+        
+    Returns:
+        Список блоков текста из PDF
+    """
+    from converters.pdf_backend import PYMUPDF_AVAILABLE, extract_pages
+
+    if not PYMUPDF_AVAILABLE:
+        raise DependencyError("PyMuPDF не установлен. Установите: pip install pymupdf")
+    p = _ensure_file(path)
+
+    try:
+        import fitz  # type: ignore
+        with fitz.open(str(p)) as doc:
+            total_pages = len(doc)
+        if total_pages == 0:
+            raise PDFReaderError(f"PDF файл не содержит страниц: {p}")
+        pages, _report = extract_pages(
+            p,
+            pymupdf_page=lambda page: page.get_text("text") or "",
+            pdfplumber_page=lambda page: _extract_page_text_pdfplumber(page, config),
+            text_of=lambda text: text,
+            page_indexes=_select_page_indexes(total_pages, config),
+            purpose="pdf_reader",
+        )
+    except PDFReaderError:
+        raise
+    except Exception as e:
+        raise PDFReaderError(f"Ошибка чтения PDF: {e}") from e
+
+    blocks: List[PDFTextBlock] = []
+    order = 0
+    for page_num in sorted(pages):
+        text = pages[page_num]
+        if text:
+            text = _normalize_block_text(text, clean=config.clean_text)
+            if text:
+                blocks.append(PDFTextBlock(
+                    text=text,
+                    page_number=page_num + 1,  # Нумерация с 1
+                    block_type="text",
+                    order=order
+                ))
+                order += 1
+    return blocks
+
+
 # =========================
 # Unified API
 # =========================
@@ -352,22 +446,7 @@ def read_pdf_blocks(
         Список блоков текста из PDF
     """
     if config is None:
-        # Пытаемся загрузить конфигурацию из config.py
-        try:
-            from config import get_config
-            cfg = get_config()
-            config = PDFReaderConfig(
-                first_pages=cfg.get("pdf_reader.first_pages", 3),
-                last_pages=cfg.get("pdf_reader.last_pages", 3),
-                extract_all_pages=cfg.get("pdf_reader.extract_all_pages", False),
-                clean_text=cfg.get("pdf_reader.clean_text", True),
-                smart_columns=cfg.get("pdf_reader.smart_columns", True),
-                two_column_min_words=cfg.get("pdf_reader.two_column_min_words", 10),
-                two_column_gutter_ratio=cfg.get("pdf_reader.two_column_gutter_ratio", 0.1),
-            )
-        except ImportError:
-            # Если config.py недоступен, используем значения по умолчанию
-            config = PDFReaderConfig()
+        config = load_reader_config()
     
     p = _ensure_file(path)
     
@@ -375,6 +454,16 @@ def read_pdf_blocks(
     if p.suffix.lower() != ".pdf":
         raise FormatError(f"Ожидается PDF файл, получен: {p.suffix}")
     
+    # Выбор движка по страницам (pdf_backend.mode: auto/pymupdf)
+    if prefer_pdfplumber:
+        from converters.pdf_backend import load_backend_config, resolve_mode
+
+        if resolve_mode(load_backend_config()) in ("auto", "pymupdf"):
+            try:
+                return read_pdf_with_backend_selection(p, config)
+            except PDFReaderError as e:
+                print(f"WARNING: Выбор движка PDF не сработал, используем pdfplumber: {e}")
+
     # Пробуем использовать pdfplumber, если доступен и предпочтителен
     if prefer_pdfplumber and PDFPLUMBER_AVAILABLE:
         try:
@@ -396,6 +485,441 @@ def read_pdf_blocks(
     )
 
 
+# =========================
+# Streaming page reader
+# =========================
+
+class PDFPageSource:
+    """
+    Постраничное чтение PDF тем же порядком движков, что read_pdf_blocks
+    (выбор движка pdf_backend -> pdfplumber -> PyPDF2). Документ открывается
+    один раз, страницы читаются по запросу.
+    
+    Использование:
+        with PDFPageSource(path, config) as source:
+            texts = source.read([0, source.total_pages - 1])
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        config: Optional[PDFReaderConfig] = None,
+        prefer_pdfplumber: bool = True
+    ):
+        self.config = config or load_reader_config()
+        self.path = _ensure_file(path)
+        if self.path.suffix.lower() != ".pdf":
+            raise FormatError(f"Ожидается PDF файл, получен: {self.path.suffix}")
+        self._mode = ""  # backend, pdfplumber или pypdf2
+        self._backend: Any = None  # pdf_backend.BackendDocument
+        self._doc: Any = None
+        self._file: Any = None
+        self._context: Any = None
+        self.total_pages = 0
+
+        if prefer_pdfplumber:
+            from converters.pdf_backend import (
+                PYMUPDF_AVAILABLE, BackendDocument, load_backend_config, resolve_mode
+            )
+
+            backend_config = load_backend_config()
+            if PYMUPDF_AVAILABLE and resolve_mode(backend_config) in ("auto", "pymupdf"):
+                reader_config = self.config
+                try:
+                    self._backend = BackendDocument(
+                        self.path,
+                        pymupdf_page=lambda page: page.get_text("text") or "",
+                        pdfplumber_page=lambda page: _extract_page_text_pdfplumber(page, reader_config),
+                        text_of=lambda text: text,
+                        config=backend_config,
+                        purpose="pdf_reader_stream",
+                    )
+                    self.total_pages = self._backend.page_count
+                    self._mode = "backend"
+                except Exception as e:
+                    self._close_backend(record=False)
+                    print(f"WARNING: Выбор движка PDF не сработал, используем pdfplumber: {e}")
+        if not self._mode:
+            self._open_fallback(prefer_pdfplumber)
+        if self.total_pages == 0:
+            self.close()
+            raise PDFReaderError(f"PDF файл не содержит страниц: {self.path}")
+
+    def _open_fallback(self, prefer_pdfplumber: bool = True) -> None:
+        """Открывает документ через pdfplumber или PyPDF2."""
+        self._mode = ""
+        if prefer_pdfplumber and PDFPLUMBER_AVAILABLE:
+            try:
+                self._context = _open_pdfplumber(self.path)
+                self._doc = self._context.__enter__()
+                self.total_pages = len(self._doc.pages)
+                self._mode = "pdfplumber"
+                return
+            except Exception as e:
+                self._context = None
+                if not PYPDF2_AVAILABLE:
+                    raise PDFReaderError(f"Ошибка чтения PDF с pdfplumber: {e}") from e
+        if not PYPDF2_AVAILABLE:
+            raise DependencyError(
+                "Не установлена ни одна библиотека для работы с PDF. "
+                "Установите одну из: pip install PyPDF2 или pip install pdfplumber"
+            )
+        try:
+            self._file = open(self.path, 'rb')
+            self._doc = PyPDF2.PdfReader(self._file)
+            self.total_pages = len(self._doc.pages)
+            self._mode = "pypdf2"
+        except Exception as e:
+            self.close()
+            raise PDFReaderError(f"Ошибка чтения PDF: {e}") from e
+
+    def read(self, page_indexes: Sequence[int]) -> Dict[int, str]:
+        """
+        Исходный (не нормализованный) текст страниц: {индекс страницы: текст}.
+        Страницы, которые не удалось прочитать, отсутствуют.
+        """
+        indexes = [i for i in page_indexes if 0 <= i < self.total_pages]
+        if not indexes:
+            return {}
+        if self._mode == "backend":
+            try:
+                return self._backend.extract(indexes)
+            except Exception as e:
+                print(f"WARNING: Выбор движка PDF не сработал, используем pdfplumber: {e}")
+                self._close_backend()
+                self._open_fallback()
+
+        texts: Dict[int, str] = {}
+        for page_num in indexes:
+            try:
+                page = self._doc.pages[page_num]
+                if self._mode == "pdfplumber":
+                    texts[page_num] = _extract_page_text_pdfplumber(page, self.config)
+                else:
+                    texts[page_num] = page.extract_text() or ""
+            except Exception:
+                # Пропускаем страницы с ошибками, но продолжаем обработку
+                continue
+        return texts
+
+    def block(self, page_index: int, text: str, order: int = 0) -> Optional[PDFTextBlock]:
+        """Блок страницы из ее текста (None — пустая страница)."""
+        text = _normalize_block_text(text, clean=self.config.clean_text)
+        if not text:
+            return None
+        return PDFTextBlock(text=text, page_number=page_index + 1, block_type="text", order=order)
+
+    def _close_backend(self, record: bool = True) -> None:
+        if self._backend is not None:
+            backend, self._backend = self._backend, None
+            backend.close(record=record)
+
+    def close(self) -> None:
+        self._close_backend()
+        if self._context is not None:
+            context, self._context = self._context, None
+            context.__exit__(None, None, None)
+        if self._file is not None:
+            file, self._file = self._file, None
+            file.close()
+        self._doc = None
+
+    def __enter__(self) -> "PDFPageSource":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def iter_pdf_pages(
+    path: Union[str, Path],
+    config: Optional[PDFReaderConfig] = None,
+    prefer_pdfplumber: bool = True,
+    page_indexes: Optional[Sequence[int]] = None
+) -> Iterator[PDFTextBlock]:
+    """
+    Лениво выдает блоки страниц по одной: следующая страница читается
+    только когда потребитель ее запросил, поэтому чтение можно прервать.
+    
+    Args:
+        path: Путь к PDF файлу
+        config: Конфигурация чтения
+        prefer_pdfplumber: Предпочитать pdfplumber над PyPDF2
+        page_indexes: Индексы страниц (с 0) в нужном порядке; None — страницы,
+            которые выбирает config (first_pages/last_pages/extract_all_pages)
+        
+    Пример:
+        tracker = PDFSectionTracker()
+        for block in iter_pdf_pages(path):
+            tracker.feed(block.page_number - 1, block.text)
+            if tracker.complete:
+                break
+    """
+    with PDFPageSource(path, config, prefer_pdfplumber) as source:
+        if page_indexes is None:
+            page_indexes = _select_page_indexes(source.total_pages, source.config)
+        order = 0
+        for page_index in page_indexes:
+            text = source.read([page_index]).get(page_index)
+            block = source.block(page_index, text or "", order) if text else None
+            if block is not None:
+                order += 1
+                yield block
+
+
+# Заголовки и метки разделов статьи. Заголовок списка литературы ищется
+# отдельной строкой (исходный текст страницы) или, в очищенном тексте без
+# переводов строк, — непосредственно перед первой записью списка ("1." / "[1]").
+# Двуязычный заголовок ("Литература / References") — два названия через / | – —.
+_REFS_HEADER_NAME = (
+    r"(?:(?:пристатейный\s+)?список\s+(?:цитируемой\s+|использованной\s+|рекомендуемой\s+)?литературы"
+    r"|список\s+(?:использованных\s+)?источников(?:\s+и\s+литературы)?"
+    r"|(?:использованная\s+|цитируемая\s+)?литература(?:\s+и\s+источники)?"
+    r"|библиографический\s+список|библиография|источники"
+    r"|references(?:\s+and\s+notes)?|bibliography|literature(?:\s+cited)?|works\s+cited|sources)"
+)
+_REFS_HEADER = rf"{_REFS_HEADER_NAME}(?:\s*[/|–—-]\s*{_REFS_HEADER_NAME})?"
+_RE_REFS_HEADER_LINE = re.compile(rf"(?im)^[ \t]*{_REFS_HEADER}[ \t]*[:.]?[ \t]*$")
+_RE_REFS_HEADER_INLINE = re.compile(
+    rf"(?i){_REFS_HEADER}\s*[:.]?\s*(\[\s*1\s*\]|1\s*\.\s)"
+)
+_RE_ABSTRACT_LABEL = re.compile(r"(?i)\b(аннотация|резюме|abstract)\b")
+_RE_KEYWORDS_LABEL = re.compile(r"(?i)(ключевые\s+слова|key\s*words)")
+
+
+class PDFSectionTracker:
+    """
+    Отмечает разделы статьи, найденные в прочитанных страницах: название
+    (текст первой страницы), аннотацию, ключевые слова и заголовок списка
+    литературы.
+    """
+
+    def __init__(self):
+        self.title = False
+        self.abstract = False
+        self.keywords = False
+        self.references_page: Optional[int] = None  # Индекс страницы (с 0)
+
+    @property
+    def references(self) -> bool:
+        return self.references_page is not None
+
+    @property
+    def front_complete(self) -> bool:
+        """Найдены разделы первых страниц (название, аннотация, ключевые слова)."""
+        return self.title and self.abstract and self.keywords
+
+    @property
+    def complete(self) -> bool:
+        return self.front_complete and self.references
+
+    def feed(self, page_index: int, text: str) -> None:
+        """Учитывает текст страницы (исходный или очищенный)."""
+        if not text or not text.strip():
+            return
+        if page_index == 0:
+            self.title = True
+        if not self.abstract and _RE_ABSTRACT_LABEL.search(text):
+            self.abstract = True
+        if not self.keywords and _RE_KEYWORDS_LABEL.search(text):
+            self.keywords = True
+        if _RE_REFS_HEADER_LINE.search(text) or _RE_REFS_HEADER_INLINE.search(text):
+            # Для нескольких найденных страниц запоминается самая ранняя
+            if self.references_page is None or page_index < self.references_page:
+                self.references_page = page_index
+
+
+def read_pdf_blocks_adaptive(
+    path: Union[str, Path],
+    config: Optional[PDFReaderConfig] = None,
+    prefer_pdfplumber: bool = True,
+    tracker: Optional[PDFSectionTracker] = None
+) -> List[PDFTextBlock]:
+    """
+    Читает начало и конец статьи, не читая документ целиком "на всякий случай":
+    
+    1. Первые страницы (до first_pages) — по одной; чтение останавливается,
+       как только найдены название, аннотация и ключевые слова.
+    2. Последние last_pages страниц; если заголовок списка литературы в них
+       не найден, окно растет к началу документа шагами по last_pages, пока
+       заголовок не найдется, окно не дойдет до прочитанных первых страниц или
+       не будет исчерпан adaptive_max_pages.
+    
+    extract_all_pages здесь не действует: весь документ читается только
+    тогда, когда список литературы так и не найден.
+    
+    Args:
+        path: Путь к PDF файлу
+        config: Конфигурация чтения
+        prefer_pdfplumber: Предпочитать pdfplumber над PyPDF2
+        tracker: Трекер разделов (передается, чтобы узнать, что было найдено)
+        
+    Returns:
+        Список блоков текста в порядке страниц
+    """
+    config = config or load_reader_config()
+    tracker = tracker if tracker is not None else PDFSectionTracker()
+    texts: Dict[int, str] = {}
+
+    with PDFPageSource(path, config, prefer_pdfplumber) as source:
+        total = source.total_pages
+        limit = config.adaptive_max_pages if config.adaptive_max_pages > 0 else total
+
+        def consume(page_texts: Dict[int, str]) -> None:
+            for page_index in sorted(page_texts):
+                texts[page_index] = page_texts[page_index]
+                tracker.feed(page_index, page_texts[page_index])
+
+        # 1. Начало статьи
+        front_end = 0
+        for page_index in range(min(max(config.first_pages, 1), total, limit)):
+            consume(source.read([page_index]))
+            front_end = page_index + 1
+            if tracker.front_complete:
+                break
+
+        # 2. Конец статьи; окно растет, пока не найден список литературы
+        step = max(config.last_pages, 1)
+        window_start = total
+        first_window = config.last_pages > 0
+        while window_start > front_end and len(texts) < limit:
+            if tracker.references and not first_window:
+                break
+            first_window = False
+            start = max(front_end, window_start - step, window_start - (limit - len(texts)))
+            consume(source.read(range(start, window_start)))
+            window_start = start
+
+        blocks: List[PDFTextBlock] = []
+        for page_index in sorted(texts):
+            block = source.block(page_index, texts[page_index], order=len(blocks))
+            if block is not None:
+                blocks.append(block)
+
+    skipped = total - len(texts)
+    print(
+        f"DEBUG: Адаптивное чтение PDF: прочитано страниц {len(texts)} из {total}"
+        f" (пропущено {skipped}), список литературы: "
+        + (f"стр. {tracker.references_page + 1}" if tracker.references else "не найден")
+    )
+    return blocks
+
+
+# =========================
+# Scanned PDF detection & OCR ingestion
+# =========================
+
+def _count_page_chars(path: Path, page_indexes: Optional[List[int]] = None) -> Dict[int, int]:
+    """
+    Число символов без пробелов на страницах. PyMuPDF (если установлен)
+    читает текстовый слой за миллисекунды; иначе — символы из кэша разметки.
+    """
+    from converters.pdf_backend import PYMUPDF_AVAILABLE
+
+    if PYMUPDF_AVAILABLE:
+        import fitz  # type: ignore
+        with fitz.open(str(path)) as doc:
+            indexes = list(range(len(doc))) if page_indexes is None else page_indexes
+            return {i: len("".join(doc[i].get_text("text").split())) for i in indexes}
+
+    _require_pdfplumber()
+    with _open_pdfplumber(path) as pdf:
+        indexes = list(range(len(pdf.pages))) if page_indexes is None else page_indexes
+        return {
+            i: sum(1 for c in pdf.pages[i].chars if not (c.get("text") or "").isspace())
+            for i in indexes
+        }
+
+
+def _count_pages(path: Path) -> int:
+    from converters.pdf_backend import PYMUPDF_AVAILABLE
+
+    if PYMUPDF_AVAILABLE:
+        import fitz  # type: ignore
+        with fitz.open(str(path)) as doc:
+            return len(doc)
+    _require_pdfplumber()
+    with _open_pdfplumber(path) as pdf:
+        return len(pdf.pages)
+
+
+def classify_pdf(
+    path: Union[str, Path],
+    config: Optional[PDFReaderConfig] = None,
+) -> PDFScanReport:
+    """
+    Быстрая проверка текстового слоя на страницах, которые выбирает config
+    (first_pages/last_pages/extract_all_pages): страница с числом символов
+    меньше scanned_page_min_chars считается сканом.
+    
+    Returns:
+        PDFScanReport: kind = text (сканов нет), scanned (только сканы) или mixed
+    """
+    config = config or load_reader_config()
+    p = _ensure_file(path)
+    try:
+        page_indexes = _select_page_indexes(_count_pages(p), config)
+        page_chars = _count_page_chars(p, page_indexes)
+    except PDFReaderError:
+        raise
+    except Exception as e:
+        raise PDFReaderError(f"Ошибка чтения PDF: {e}") from e
+
+    scanned = [i for i in page_indexes if page_chars.get(i, 0) < config.scanned_page_min_chars]
+    if not scanned:
+        kind = "text"
+    elif len(scanned) == len(page_indexes):
+        kind = "scanned"
+    else:
+        kind = "mixed"
+    return PDFScanReport(kind=kind, page_chars=page_chars, scanned_pages=scanned)
+
+
+def read_pdf_blocks_with_ocr(
+    path: Union[str, Path],
+    config: Optional[PDFReaderConfig] = None,
+    scan: Optional[PDFScanReport] = None,
+) -> List[PDFTextBlock]:
+    """
+    Как read_pdf_blocks, но страницы-сканы распознаются OCR (параллельно,
+    в пуле converters.pdf_ocr). Для текстовых PDF — обычное чтение; для
+    полностью отсканированных текстовый слой не читается вовсе.
+    
+    Args:
+        path: Путь к PDF файлу
+        config: Конфигурация чтения
+        scan: Результат classify_pdf (если уже получен)
+        
+    Returns:
+        Список блоков; блоки OCR имеют block_type="ocr"
+    """
+    config = config or load_reader_config()
+    p = _ensure_file(path)
+    scan = scan or classify_pdf(p, config)
+    if scan.kind == "text" or not config.ocr_scanned_pages:
+        return read_pdf_blocks(p, config)
+
+    from converters.pdf_ocr import ocr_pages_text
+
+    scanned = set(scan.scanned_pages)
+    blocks: List[PDFTextBlock] = []
+    if scan.kind == "mixed":
+        blocks = [b for b in read_pdf_blocks(p, config) if b.page_number - 1 not in scanned]
+
+    ocr_texts = ocr_pages_text(p, scan.scanned_pages, lang=config.ocr_lang)
+    print(f"DEBUG: OCR страниц-сканов: {len(ocr_texts)} из {len(scanned)}")
+    for page_index, text in ocr_texts.items():
+        text = _normalize_block_text(text, clean=config.clean_text)
+        if text:
+            blocks.append(PDFTextBlock(text=text, page_number=page_index + 1, block_type="ocr"))
+
+    blocks.sort(key=lambda b: b.page_number)
+    return [
+        PDFTextBlock(text=b.text, page_number=b.page_number, block_type=b.block_type, order=i)
+        for i, b in enumerate(blocks)
+    ]
+
+
 def read_pdf_text(
     path: Union[str, Path],
     config: Optional[PDFReaderConfig] = None,
@@ -17,8 +17,10 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from collections import Counter
+import atexit
 import re
 import os
+import threading
 
 # Попытка импорта библиотек для работы с PDF
 PDFPLUMBER_AVAILABLE = False
@@ -202,17 +204,13 @@ def _is_upper_header_fragment(line: str) -> bool:
     return _upper_ratio(s) >= 0.75
 
 
-def _extract_words_pdfplumber(obj) -> List[Dict[str, object]]:
-    """Единая конфигурация extract_words для всех веток pdfplumber."""
+def _open_pdfplumber(pdf_path: Path):
+    """Открывает PDF через общий кэш разметки (converters.pdf_layout_cache)."""
     try:
-        return obj.extract_words(
-            x_tolerance=PDFPLUMBER_X_TOLERANCE,
-            y_tolerance=PDFPLUMBER_Y_TOLERANCE,
-            keep_blank_chars=False,
-            use_text_flow=False,
-        ) or []
-    except Exception:
-        return []
+        from converters.pdf_layout_cache import open_pdf_layout
+    except ImportError:
+        return pdfplumber.open(pdf_path)
+    return open_pdf_layout(pdf_path)
 
 
 def _find_header_boundary(words: List[Dict[str, object]], page_height: float) -> float:
@@ -220,27 +218,11 @@ def _find_header_boundary(words: List[Dict[str, object]], page_height: float) ->
     Динамически оценивает границу шапки: ищет максимальный вертикальный gap
     в верхней половине страницы.
     """
-    if not words or page_height <= 0:
-        return max(0.0, page_height * 0.2)
+    from converters.pdf_layout_engine import WordArray, find_header_boundary
 
-    tops = sorted({round(float(w.get("top", 0) or 0), 1) for w in words})
-    if len(tops) < 2:
+    if not words or page_height <= 0:
         return max(0.0, page_height * 0.2)
-
-    max_gap = 0.0
-    boundary = page_height * 0.2
-    upper_limit = page_height * 0.5
-    min_gap = max(6.0, page_height * 0.01)
-
-    for i in range(1, len(tops)):
-        if tops[i] > upper_limit:
-            break
-        gap = tops[i] - tops[i - 1]
-        if gap > max_gap and gap >= min_gap:
-            max_gap = gap
-            boundary = tops[i - 1]
-
-    return max(0.0, min(page_height * 0.45, boundary))
+    return find_header_boundary(WordArray.from_words(words).top, page_height)
 
 
 def _is_strict_standalone_metadata(line: str) -> bool:
@@ -879,18 +861,29 @@ def _remove_headers_footers(lines_by_page: List[List[str]]) -> List[str]:
 # Извлечение текста из PDF
 # ----------------------------
 
+def _page_char_array(page):
+    """Символы страницы в массивах NumPy (converters.pdf_layout_engine)."""
+    from converters.pdf_layout_engine import CharArray
+
+    return CharArray.from_page(page)
+
+
 def _detect_columns_pdfplumber_page(
     page,
     min_words_per_column: int = 10,
     gutter_ratio: float = 0.1,
 ) -> int:
     """Detect whether the page uses one or two text columns."""
-    words = _extract_words_pdfplumber(page)
+    from converters.pdf_layout_engine import detect_columns
 
     width = float(getattr(page, "width", 0) or 0)
-    if not words or width <= 0:
+    if width <= 0:
+        return 1
+    try:
+        words = _page_char_array(page).words(PDFPLUMBER_X_TOLERANCE, PDFPLUMBER_Y_TOLERANCE)
+    except Exception:
         return 1
-    return _detect_columns_pdfplumber_words(
+    return detect_columns(
         words,
         width,
         min_words_per_column=min_words_per_column,
@@ -904,64 +897,39 @@ def _detect_columns_pdfplumber_words(
     min_words_per_column: int = 10,
     gutter_ratio: float = 0.1,
 ) -> int:
+    from converters.pdf_layout_engine import WordArray, detect_columns
+
     if not words or width <= 0:
         return 1
+    return detect_columns(
+        WordArray.from_words(words),
+        width,
+        min_words_per_column=min_words_per_column,
+        gutter_ratio=gutter_ratio,
+    )
 
-    effective_min_words = min_words_per_column
-    if len(words) < (min_words_per_column * 2):
-        effective_min_words = max(3, len(words) // 4)
-
-    center = width / 2.0
-    gutter = max(0.0, min(0.4, float(gutter_ratio)))
-    left_border = center * (1.0 - gutter)
-    right_border = center * (1.0 + gutter)
-
-    # Если в гаттере много слов, это скорее таблица/плотная верстка, а не 2 колонки.
-    gutter_words = [
-        w for w in words
-        if left_border < float(w.get("x0", 0) or 0) < right_border
-    ]
-    if len(gutter_words) > len(words) * 0.15:
-        return 1
 
-    left_words = [w for w in words if float(w.get("x1", 0)) <= left_border]
-    right_words = [w for w in words if float(w.get("x0", width)) >= right_border]
-    if len(left_words) >= int(effective_min_words) and len(right_words) >= int(effective_min_words):
-        return 2
-    return 1
+def _split_text_lines(text: str) -> List[str]:
+    out_lines: List[str] = []
+    for ln in text.split("\n"):
+        fixed = _restore_missing_spaces(ln)
+        if fixed:
+            out_lines.append(fixed)
+    return out_lines
 
 
 def _extract_page_lines_pdfplumber_smart(page) -> List[str]:
     """Extract page lines preserving reading order for two-column layouts."""
-    def _lines_from_words(
-        words: List[Dict[str, object]],
-        y_tolerance: float = PDFPLUMBER_Y_TOLERANCE,
-    ) -> List[str]:
-        if not words:
-            return []
-        rows: List[List[Dict[str, object]]] = []
-        for word in sorted(words, key=lambda w: (float(w.get("top", 0) or 0), float(w.get("x0", 0) or 0))):
-            top = float(word.get("top", 0) or 0)
-            if not rows:
-                rows.append([word])
-                continue
-            last_row = rows[-1]
-            last_top = float(last_row[0].get("top", 0) or 0)
-            if abs(top - last_top) <= y_tolerance:
-                last_row.append(word)
-            else:
-                rows.append([word])
+    from converters.pdf_layout_engine import analyze_page_layout
 
+    def _lines_from_words(words) -> List[str]:
         lines: List[str] = []
-        for row in rows:
-            row_sorted = sorted(row, key=lambda w: float(w.get("x0", 0) or 0))
-            tokens = [str(w.get("text") or "").strip() for w in row_sorted]
-            text = _restore_missing_spaces(" ".join(tok for tok in tokens if tok))
+        for row in words.row_texts(PDFPLUMBER_Y_TOLERANCE):
+            text = _restore_missing_spaces(row)
             if text:
                 lines.append(text)
         return lines
 
-    all_words = _extract_words_pdfplumber(page)
     width = float(getattr(page, "width", 0) or 0)
     height = float(getattr(page, "height", 0) or 0)
 
@@ -969,46 +937,27 @@ def _extract_page_lines_pdfplumber_smart(page) -> List[str]:
         text = page.extract_text() or ""
         return [ln.strip() for ln in text.split("\n") if ln.strip()]
 
-    header_height = _find_header_boundary(all_words, height)
-    body_top = min(height, header_height + PDFPLUMBER_Y_TOLERANCE)
-    body_words = [
-        word for word in all_words
-        if float(word.get("top", 0) or 0) > body_top
-    ]
-    columns = _detect_columns_pdfplumber_words(body_words or all_words, width)
+    # Символы читаются один раз; шапка, колонки и слова считаются на массивах
+    layout = analyze_page_layout(
+        _page_char_array(page),
+        width,
+        height,
+        x_tolerance=PDFPLUMBER_X_TOLERANCE,
+        y_tolerance=PDFPLUMBER_Y_TOLERANCE,
+    )
 
-    if columns != 2:
-        words = all_words
-        lines = _lines_from_words(words)
+    if layout.columns != 2:
+        lines = _lines_from_words(layout.words)
         if lines:
             return lines
-        text = page.extract_text() or ""
-        out_lines: List[str] = []
-        for ln in text.split("\n"):
-            fixed = _restore_missing_spaces(ln)
-            if fixed:
-                out_lines.append(fixed)
-        return out_lines
+        return _split_text_lines(page.extract_text() or "")
 
-    header_zone = page.crop((0, 0, width, header_height))
+    header_words, left_words, right_words = layout.zones
+    header_bbox, left_bbox, right_bbox = layout.zone_bboxes
 
-    header_words = _extract_words_pdfplumber(header_zone)
     header_lines = _lines_from_words(header_words)
-
     if not header_lines:
-        header_text = header_zone.extract_text() or ""
-        tmp_lines: List[str] = []
-        for ln in header_text.split("\n"):
-            fixed = _restore_missing_spaces(ln)
-            if fixed:
-                tmp_lines.append(fixed)
-        header_lines = tmp_lines
-
-    center = width / 2.0
-    left_col = page.crop((0, body_top, center, height))
-    right_col = page.crop((center, body_top, width, height))
-    left_words = _extract_words_pdfplumber(left_col)
-    right_words = _extract_words_pdfplumber(right_col)
+        header_lines = _split_text_lines(page.crop(header_bbox).extract_text() or "")
 
     left_lines = _lines_from_words(left_words)
     right_lines = _lines_from_words(right_words)
@@ -1016,29 +965,147 @@ def _extract_page_lines_pdfplumber_smart(page) -> List[str]:
     if merged_lines:
         return merged_lines
 
-    left_text = left_col.extract_text() or ""
-    right_text = right_col.extract_text() or ""
+    left_text = page.crop(left_bbox).extract_text() or ""
+    right_text = page.crop(right_bbox).extract_text() or ""
     header_text = "\n".join(header_lines)
-    merged = f"{header_text}\n{left_text}\n{right_text}"
-    out_lines: List[str] = []
-    for ln in merged.split("\n"):
-        fixed = _restore_missing_spaces(ln)
-        if fixed:
-            out_lines.append(fixed)
-    return out_lines
+    return _split_text_lines(f"{header_text}\n{left_text}\n{right_text}")
+
+
+def _pdfplumber_parallel_settings() -> Tuple[int, int]:
+    """
+    Возвращает (workers, min_pages) для постраничного параллельного извлечения.
+    workers: 0 — по числу ядер (не больше _AUTO_PARALLEL_WORKERS), 1 — последовательный режим.
+    """
+    workers, min_pages = 0, 16
+    try:
+        from config import get_config
+        cfg = get_config()
+        workers = int(cfg.get("pdf_to_html.parallel_workers", workers))
+        min_pages = int(cfg.get("pdf_to_html.parallel_min_pages", min_pages))
+    except (ImportError, TypeError, ValueError):
+        pass
+    if workers <= 0:
+        workers = min(os.cpu_count() or 1, _AUTO_PARALLEL_WORKERS)
+    return workers, min_pages
+
+
+# Предел процессов при parallel_workers = 0: пул живет весь срок воркера gunicorn
+_AUTO_PARALLEL_WORKERS = 4
+
+_page_pool = None
+_page_pool_workers = 0
+_page_pool_lock = threading.Lock()
+
+
+def _get_page_pool(workers: int):
+    """
+    Пул процессов для постраничного извлечения: создается при первом
+    обращении и переиспользуется (запуск интерпретаторов на каждый PDF
+    дороже самого извлечения). Пересоздается при смене числа процессов.
+    """
+    global _page_pool, _page_pool_workers
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    with _page_pool_lock:
+        if _page_pool is not None and _page_pool_workers != workers:
+            _page_pool.shutdown(wait=False, cancel_futures=True)
+            _page_pool = None
+        if _page_pool is None:
+            # spawn: воркер gunicorn и фоновые потоки небезопасно форкать
+            ctx = multiprocessing.get_context("spawn")
+            _page_pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+            _page_pool_workers = workers
+        return _page_pool
+
+
+def _reset_page_pool(pool) -> None:
+    """Убирает сломанный пул (его процесс завершился аварийно)."""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is pool:
+            _page_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
 
+def close_page_pool() -> None:
+    """Останавливает пул процессов извлечения (при выходе воркера)."""
+    global _page_pool
+    with _page_pool_lock:
+        pool, _page_pool = _page_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
 
-def _extract_lines_pdfplumber(pdf_path: Path) -> List[str]:
-    """Извлекает строки из PDF с помощью pdfplumber, возвращает плоский список."""
+
+atexit.register(close_page_pool)
+
+
+def _extract_page_range_pdfplumber(pdf_path: str, page_indexes: List[int]) -> List[List[str]]:
+    """
+    Задача процесса-воркера: извлекает строки для диапазона страниц.
+    Каждый воркер открывает PDF сам (собственный дескриптор pdfplumber).
+    """
+    with _open_pdfplumber(Path(pdf_path)) as pdf:
+        return [_extract_page_lines_pdfplumber_smart(pdf.pages[i]) for i in page_indexes]
+
+
+def _extract_lines_by_page_parallel(pdf_path: Path, total_pages: int, workers: int) -> List[List[str]]:
+    """
+    Раздает страницы процессам пула и собирает результат в исходном порядке.
+    Страницы режутся на последовательные пачки (по ~2 пачки на воркер),
+    чтобы накладные расходы на процесс не съедали выигрыш.
+    """
+    from concurrent.futures.process import BrokenProcessPool
+
+    batches = max(1, min(total_pages, workers * 2))
+    step = -(-total_pages // batches)
+    ranges = [list(range(i, min(i + step, total_pages))) for i in range(0, total_pages, step)]
+
+    pool = _get_page_pool(workers)
+    try:
+        futures = [pool.submit(_extract_page_range_pdfplumber, str(pdf_path), r) for r in ranges]
+        lines_by_page: List[List[str]] = []
+        for future in futures:
+            lines_by_page.extend(future.result())
+    except BrokenProcessPool as e:
+        _reset_page_pool(pool)
+        raise RuntimeError(f"Пул процессов извлечения PDF сломан: {e}") from e
+    return lines_by_page
+
+
+def _extract_lines_pdfplumber(pdf_path: Path, workers: Optional[int] = None) -> List[str]:
+    """
+    Извлекает строки из PDF с помощью pdfplumber, возвращает плоский список.
+
+    Args:
+        pdf_path: Путь к PDF файлу
+        workers: Число процессов для постраничного извлечения. None — из config
+            (pdf_to_html.parallel_workers); 1 — последовательно. Пул используется
+            только для документов от pdf_to_html.parallel_min_pages страниц,
+            результат совпадает с последовательным режимом.
+    """
     if not PDFPLUMBER_AVAILABLE:
         raise ImportError("pdfplumber не установлен. Установите: pip install pdfplumber")
 
+    min_pages = 0
+    if workers is None:
+        workers, min_pages = _pdfplumber_parallel_settings()
+
     lines_by_page: List[List[str]] = []
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                page_lines = _extract_page_lines_pdfplumber_smart(page)
-                lines_by_page.append(page_lines)
+        with _open_pdfplumber(pdf_path) as pdf:
+            total_pages = len(pdf.pages)
+            if workers > 1 and total_pages > 1 and total_pages >= min_pages:
+                try:
+                    lines_by_page = _extract_lines_by_page_parallel(pdf_path, total_pages, workers)
+                except (OSError, ImportError, RuntimeError) as e:
+                    # Пул процессов недоступен (ограничения окружения) — работаем последовательно
+                    print(f"WARNING: Параллельное извлечение недоступно, последовательный режим: {e}")
+                    lines_by_page = []
+            if not lines_by_page:
+                for page in pdf.pages:
+                    page_lines = _extract_page_lines_pdfplumber_smart(page)
+                    lines_by_page.append(page_lines)
     except Exception as e:
         msg = str(e).lower()
         if "encrypted" in msg or "password" in msg:
@@ -1074,18 +1141,9 @@ def _extract_lines_pymupdf(pdf_path: Path) -> List[str]:
     try:
         for i in range(len(doc)):
             try:
-                text = doc[i].get_text("text")
+                lines_by_page.append(_extract_page_lines_pymupdf(doc[i]))
             except Exception as e:
                 raise RuntimeError(f"Ошибка чтения страницы {i + 1} через PyMuPDF: {e}") from e
-            if not text:
-                lines_by_page.append([])
-                continue
-            page_lines: List[str] = []
-            for ln in text.split("\n"):
-                fixed = _restore_missing_spaces(ln)
-                if fixed:
-                    page_lines.append(fixed)
-            lines_by_page.append(page_lines)
     finally:
         doc.close()
     
@@ -1094,6 +1152,65 @@ def _extract_lines_pymupdf(pdf_path: Path) -> List[str]:
     return filtered_lines
 
 
+def _extract_page_lines_pymupdf(page) -> List[str]:
+    """Строки одной страницы PyMuPDF (fitz.Page)."""
+    text = page.get_text("text")
+    if not text:
+        return []
+    return _split_text_lines(text)
+
+
+def _extract_lines_auto(pdf_path: Path) -> List[str]:
+    """
+    Извлекает строки с выбором движка по страницам (converters.pdf_backend):
+    PyMuPDF для всех страниц, pdfplumber — для страниц с плохой оценкой качества.
+    """
+    from converters.pdf_backend import extract_pages
+
+    try:
+        pages, _report = extract_pages(
+            pdf_path,
+            pymupdf_page=_extract_page_lines_pymupdf,
+            pdfplumber_page=_extract_page_lines_pdfplumber_smart,
+            text_of=lambda lines: "\n".join(lines),
+            purpose="pdf_to_html",
+        )
+    except Exception as e:
+        msg = str(e).lower()
+        if "encrypted" in msg or "password" in msg:
+            raise RuntimeError(
+                "PDF зашифрован или защищен паролем. Снимите защиту и повторите попытку."
+            ) from e
+        raise RuntimeError(f"Не удалось прочитать PDF: {e}. Файл может быть поврежден.") from e
+
+    lines_by_page = [pages[i] for i in sorted(pages)]
+    # Удаляем колонтитулы перед объединением
+    return _remove_headers_footers(lines_by_page)
+
+
+def _choose_line_extractor(prefer_pdfplumber: bool = True) -> Optional[Callable[[Path], List[str]]]:
+    """
+    Экстрактор строк по настройке pdf_backend.mode (см. converters.pdf_backend):
+    auto — PyMuPDF с эскалацией плохих страниц в pdfplumber, pdfplumber/pymupdf —
+    только указанный движок. prefer_pdfplumber=False всегда выбирает PyMuPDF,
+    если он установлен. None — нет ни одной библиотеки.
+    """
+    from converters.pdf_backend import load_backend_config, resolve_mode
+
+    if not prefer_pdfplumber and PYMUPDF_AVAILABLE:
+        return _extract_lines_pymupdf
+    mode = resolve_mode(load_backend_config())
+    if mode == "auto":
+        return _extract_lines_auto
+    if mode == "pymupdf" and PYMUPDF_AVAILABLE:
+        return _extract_lines_pymupdf
+    if PDFPLUMBER_AVAILABLE:
+        return _extract_lines_pdfplumber
+    if PYMUPDF_AVAILABLE:
+        return _extract_lines_pymupdf
+    return None
+
+
 # ----------------------------
 # Функции для работы с bbox (bounding box)
 # ----------------------------
@@ -1127,59 +1244,56 @@ def find_text_blocks_with_bbox(
     if search_terms is None:
         search_terms = ["Резюме", "Аннотация", "Abstract", "Annotation", "Ключевые слова", "Keywords"]
     
+    from converters.pdf_layout_cache import _check_crop_bbox
+    from converters.pdf_word_index import get_word_index, normalize_token
+
+    # Один поиск по индексу слов документа на термин
+    index = get_word_index(pdf_path)
+    hits_by_page: Dict[int, List[Tuple[str, int]]] = {}
+    for term in search_terms:
+        for page_index, word_index in index.first_hits(term).items():
+            hits_by_page.setdefault(page_index, []).append((term, word_index))
+    
     results = []
+    if not hits_by_page:
+        return results
     
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages, start=1):
-            # Получаем все слова с их координатами
-            words = page.extract_words()
-            
-            if not words:
-                continue
+    with _open_pdfplumber(pdf_path) as pdf:
+        for page_index in sorted(hits_by_page):
+            page_num = page_index + 1
+            page_width, page_height = index.page_size(page_index)
+            # Таблица символов страницы (из кэша разметки) — одна на все найденные термины
+            chars = _page_char_array(pdf.pages[page_index])
+            page_text: Optional[str] = None
             
-            # Получаем текст страницы для поиска
-            page_text = page.extract_text() or ""
-            page_text_lower = page_text.lower()
-            
-            # Ищем каждое ключевое слово
-            for term in search_terms:
-                term_lower = term.lower()
+            for term, word_index in hits_by_page[page_index]:
+                x0, top, x1, bottom = index.word_bbox(page_index, word_index)
                 
-                # Проверяем, есть ли слово на странице
-                if term_lower not in page_text_lower:
-                    continue
+                # Расширяем bbox для захвата всего блока
+                expanded_x0 = max(0, x0 - expand_bbox[0])
+                expanded_top = max(0, top - expand_bbox[1])
+                expanded_x1 = min(page_width, x1 + expand_bbox[2])
+                expanded_bottom = min(page_height, bottom + expand_bbox[3])
+                expanded = (expanded_x0, expanded_top, expanded_x1, expanded_bottom)
+                
+                # Извлекаем текст из расширенной области (как page.crop(...).extract_text())
+                try:
+                    _check_crop_bbox(expanded, index.page_bboxes[page_index])
+                    block_text = chars.crop(expanded).words().extract_text()
+                except ValueError:
+                    # Если не удалось извлечь из области, используем текст после слова
+                    if page_text is None:
+                        page_text = chars.words().extract_text()
+                    term_pos = page_text.lower().find(normalize_token(term))
+                    block_text = page_text[term_pos + len(term):][:500]
                 
-                # Находим все вхождения слова
-                for word in words:
-                    word_text = word.get("text", "").lower()
-                    if term_lower in word_text:
-                        # Получаем bbox слова
-                        x0, top, x1, bottom = word["x0"], word["top"], word["x1"], word["bottom"]
-                        
-                        # Расширяем bbox для захвата всего блока
-                        expanded_x0 = max(0, x0 - expand_bbox[0])
-                        expanded_top = max(0, top - expand_bbox[1])
-                        expanded_x1 = min(page.width, x1 + expand_bbox[2])
-                        expanded_bottom = min(page.height, bottom + expand_bbox[3])
-                        
-                        # Извлекаем текст из расширенной области
-                        try:
-                            cropped = page.crop((expanded_x0, expanded_top, expanded_x1, expanded_bottom))
-                            block_text = cropped.extract_text() or ""
-                        except Exception:
-                            # Если не удалось извлечь из области, используем текст после слова
-                            block_text = page_text[page_text.lower().find(term_lower) + len(term):][:500]
-                        
-                        results.append({
-                            "term": term,
-                            "page": page_num,
-                            "bbox": (x0, top, x1, bottom),
-                            "expanded_bbox": (expanded_x0, expanded_top, expanded_x1, expanded_bottom),
-                            "text": block_text.strip()
-                        })
-                        
-                        # Находим только первое вхождение каждого термина на странице
-                        break
+                results.append({
+                    "term": term,
+                    "page": page_num,
+                    "bbox": (x0, top, x1, bottom),
+                    "expanded_bbox": expanded,
+                    "text": block_text.strip()
+                })
     
     return results
 
@@ -1340,13 +1454,7 @@ def convert_pdf_to_html_with_mistral(
     
     # Сначала извлекаем текст из PDF стандартным способом
     try:
-        extractor: Optional[Callable[[Path], List[str]]] = None
-        if prefer_pdfplumber and PDFPLUMBER_AVAILABLE:
-            extractor = _extract_lines_pdfplumber
-        elif PYMUPDF_AVAILABLE:
-            extractor = _extract_lines_pymupdf
-        elif PDFPLUMBER_AVAILABLE:
-            extractor = _extract_lines_pdfplumber
+        extractor = _choose_line_extractor(prefer_pdfplumber)
         
         if extractor is None:
             raise ImportError(
@@ -1387,31 +1495,37 @@ def convert_pdf_to_html_with_mistral(
         raise RuntimeError(f"Prompts module unavailable for PDF->HTML: {e}")
     
     try:
-        # Создаем клиент Mistral AI (использует OpenAI-совместимый API)
+        # Клиент Mistral AI (OpenAI-совместимый API) из общего реестра процесса
         # Увеличен таймаут до 180 секунд (3 минуты) для больших документов
-        client = OpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            timeout=180.0  # Таймаут 180 секунд (3 минуты)
+        from services.llm_clients import get_openai_client
+        from services.llm_rate_limit import (
+            call_with_rate_limit, estimate_tokens, provider_for, with_client_retries
         )
+
+        client = get_openai_client(api_key, base_url=base_url, timeout=180.0)
         
         print(f"DEBUG Mistral: Отправляем запрос к API (модель: {model})...")
         
-        # Отправляем запрос
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_message
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.2,  # Низкая температура для более детерминированного результата
-            max_tokens=8000,  # Ограничиваем размер ответа для ускорения
+        # Отправляем запрос (через общий для воркеров ограничитель RPM/TPM)
+        response = call_with_rate_limit(
+            provider_for(base_url),
+            model,
+            estimate_tokens(system_message) + estimate_tokens(prompt),
+            lambda retries: with_client_retries(client, retries).chat.completions.create(
+                model=model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": system_message
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                temperature=0.2,  # Низкая температура для более детерминированного результата
+                max_tokens=8000,  # Ограничиваем размер ответа для ускорения
+            ),
         )
         
         elapsed_time = time.time() - start_time
@@ -1487,13 +1601,7 @@ def convert_pdf_to_html(
     
     warnings: List[str] = []
 
-    extractor: Optional[Callable[[Path], List[str]]] = None
-    if prefer_pdfplumber and PDFPLUMBER_AVAILABLE:
-        extractor = _extract_lines_pdfplumber
-    elif PYMUPDF_AVAILABLE:
-        extractor = _extract_lines_pymupdf
-    elif PDFPLUMBER_AVAILABLE:
-        extractor = _extract_lines_pdfplumber
+    extractor = _choose_line_extractor(prefer_pdfplumber)
 
     if extractor is None:
         raise ImportError(
@@ -1528,6 +1636,30 @@ def convert_pdf_to_html_pymupdf(pdf_path: Path) -> Tuple[str, List[str]]:
 # Обработка списка литературы
 # ----------------------------
 
+def references_quality_score(entries: List[str]) -> float:
+    """
+    Эвристическая оценка качества разбора списка литературы [0..1]: доля
+    записей с годом, со страницами или DOI, без слишком коротких записей и
+    разорванных URL.
+    """
+    if not entries:
+        return 0.0
+    re_year = REFERENCE_BLOCK_REGEX["RE_YEAR"]
+    re_pages = REFERENCE_BLOCK_REGEX["RE_PAGES"]
+    re_doi = REFERENCE_BLOCK_REGEX["RE_DOI"]
+    has_year = sum(1 for e in entries if re_year.search(e))
+    has_pages_or_doi = sum(1 for e in entries if (re_pages.search(e) or re_doi.search(e)))
+    too_short = sum(1 for e in entries if len(e.strip()) < 20)
+    broken_url = sum(1 for e in entries if re.search(r"https?://\S*\s+\S+", e))
+
+    score = 0.0
+    score += (has_year / len(entries)) * 0.45
+    score += (has_pages_or_doi / len(entries)) * 0.35
+    score += max(0.0, 1.0 - too_short / len(entries)) * 0.10
+    score += max(0.0, 1.0 - broken_url / max(1, len(entries))) * 0.10
+    return max(0.0, min(1.0, score))
+
+
 def normalize_references_block(lines: List[str]) -> Tuple[List[str], float]:
     """
     Нормализует блок 'СПИСОК ЛИТЕРАТУРЫ / REFERENCES' после PDF→text:
@@ -1611,21 +1743,6 @@ def normalize_references_block(lines: List[str]) -> Tuple[List[str], float]:
         # Быстрый эвристический фильтр (помогает не "прилипать" к записям)
         return bool(RE_HEADER_FOOTER_HINT.search(line)) and len(line) < 120
 
-    def quality_score(entries: List[str]) -> float:
-        if not entries:
-            return 0.0
-        has_year = sum(1 for e in entries if RE_YEAR.search(e))
-        has_pages_or_doi = sum(1 for e in entries if (RE_PAGES.search(e) or RE_DOI.search(e)))
-        too_short = sum(1 for e in entries if len(e.strip()) < 20)
-        broken_url = sum(1 for e in entries if re.search(r"https?://\S*\s+\S+", e))
-
-        score = 0.0
-        score += (has_year / len(entries)) * 0.45
-        score += (has_pages_or_doi / len(entries)) * 0.35
-        score += max(0.0, 1.0 - too_short / len(entries)) * 0.10
-        score += max(0.0, 1.0 - broken_url / max(1, len(entries))) * 0.10
-        return max(0.0, min(1.0, score))
-
     # -------------------------
     # 3) input cleanup
     # -------------------------
@@ -1792,5 +1909,5 @@ def normalize_references_block(lines: List[str]) -> Tuple[List[str], float]:
         if e2:
             cleaned.append(e2)
 
-    score = quality_score(cleaned)
+    score = references_quality_score(cleaned)
     return cleaned, score
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pdf_word_index.py
+
+Инвертированный индекс слов PDF для поиска блоков по ключевым словам.
+
+find_text_blocks_with_bbox раньше на каждый запрос извлекал слова и текст
+всех страниц и перебирал все слова для каждого термина. Индекс строится
+один раз на документ (по словам из кэша разметки, converters.pdf_layout_cache)
+и отображает нормализованное слово (lower) в позиции (страница, слово).
+Поиск термина — один проход по словарю документа, а не по всем словам
+всех страниц; результат поиска термина запоминается в индексе.
+
+Индекс хранится в памяти процесса (LRU по SHA-256 файла) и на диске рядом
+с кэшем разметки документа (word_index.json.gz), поэтому переживает
+перезапуск и разделяется воркерами.
+
+Использование:
+    index = get_word_index(pdf_path)
+    for page_index, word_index in index.first_hits("abstract").items():
+        x0, top, x1, bottom = index.word_bbox(page_index, word_index)
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from converters.pdf_layout_cache import (
+    CACHE_FORMAT_VERSION,
+    BBoxType,
+    PDFLayoutCacheConfig,
+    _document_dir,
+    _read_json_gz,
+    _write_json_gz,
+    file_sha256,
+    load_layout_cache_config,
+    open_pdf_layout,
+)
+
+
+# Сколько индексов документов держать в памяти процесса
+_INDEX_MEMO_LIMIT = 32
+
+_INDEX_FILE_NAME = "word_index.json.gz"
+
+
+def normalize_token(text: str) -> str:
+    """Нормализация слова и термина для индекса (как в прежнем поиске: lower)."""
+    return (text or "").lower()
+
+
+class PDFWordIndex:
+    """
+    Индекс слов одного документа.
+
+    Позиции слов — индексы страницы (с 0) и слова в page.extract_words()
+    (с параметрами по умолчанию), в порядке возрастания.
+    """
+
+    def __init__(
+        self,
+        sha256: str,
+        page_bboxes: List[BBoxType],
+        word_boxes: List[List[BBoxType]],
+        postings: Dict[str, List[int]],
+    ):
+        self.sha256 = sha256
+        self.page_bboxes = page_bboxes
+        self.word_boxes = word_boxes
+        # token -> [стр, слово, стр, слово, ...] (плоский список, отсортирован)
+        self.postings = postings
+        self._vocabulary = list(postings)
+        self._hits_memo: Dict[str, Dict[int, int]] = {}
+        self._memo_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, pdf: Any, sha256: str) -> "PDFWordIndex":
+        """Строит индекс по открытому документу (CachedDocument или pdfplumber.PDF)."""
+        page_bboxes: List[BBoxType] = []
+        word_boxes: List[List[BBoxType]] = []
+        postings: Dict[str, List[int]] = {}
+        for page_index, page in enumerate(pdf.pages):
+            page_bboxes.append(tuple(float(v) for v in page.bbox))
+            boxes: List[BBoxType] = []
+            for word_index, word in enumerate(page.extract_words()):
+                boxes.append((word["x0"], word["top"], word["x1"], word["bottom"]))
+                postings.setdefault(normalize_token(word.get("text", "")), []).extend((page_index, word_index))
+            word_boxes.append(boxes)
+        return cls(sha256, page_bboxes, word_boxes, postings)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_bboxes)
+
+    def page_size(self, page_index: int) -> Tuple[float, float]:
+        x0, top, x1, bottom = self.page_bboxes[page_index]
+        return x1 - x0, bottom - top
+
+    def word_bbox(self, page_index: int, word_index: int) -> BBoxType:
+        return self.word_boxes[page_index][word_index]
+
+    def first_hits(self, term: str) -> Dict[int, int]:
+        """
+        Первое слово на каждой странице, содержащее термин (подстрока без
+        учета регистра, как в прежнем поиске): {индекс страницы: индекс слова}.
+        """
+        needle = normalize_token(term)
+        with self._memo_lock:
+            cached = self._hits_memo.get(needle)
+        if cached is not None:
+            return cached
+
+        hits: Dict[int, int] = {}
+        if needle:
+            # Словарь документа на порядки меньше числа слов
+            for token in (t for t in self._vocabulary if needle in t):
+                flat = self.postings[token]
+                for i in range(0, len(flat), 2):
+                    page_index, word_index = flat[i], flat[i + 1]
+                    current = hits.get(page_index)
+                    if current is None or word_index < current:
+                        hits[page_index] = word_index
+        hits = dict(sorted(hits.items()))
+        with self._memo_lock:
+            self._hits_memo[needle] = hits
+        return hits
+
+    # --- serialization ---
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": CACHE_FORMAT_VERSION,
+            "sha256": self.sha256,
+            "pages": [list(b) for b in self.page_bboxes],
+            "words": [[list(b) for b in boxes] for boxes in self.word_boxes],
+            "postings": self.postings,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PDFWordIndex":
+        return cls(
+            sha256=data["sha256"],
+            page_bboxes=[tuple(b) for b in data["pages"]],
+            word_boxes=[[tuple(b) for b in boxes] for boxes in data["words"]],
+            postings=data["postings"],
+        )
+
+
+# =========================
+# Process-wide cache
+# =========================
+
+_lock = threading.Lock()
+_memory: "OrderedDict[str, PDFWordIndex]" = OrderedDict()
+_stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "builds": 0}
+
+
+def get_word_index_stats() -> Dict[str, int]:
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_indexes"] = len(_memory)
+    return stats
+
+
+def clear_word_index_cache() -> None:
+    """Очищает индексы в памяти процесса (диск не трогает)."""
+    with _lock:
+        _memory.clear()
+
+
+def _remember(index: PDFWordIndex) -> None:
+    with _lock:
+        _memory[index.sha256] = index
+        _memory.move_to_end(index.sha256)
+        while len(_memory) > _INDEX_MEMO_LIMIT:
+            _memory.popitem(last=False)
+
+
+def get_word_index(
+    path: Union[str, Path],
+    config: Optional[PDFLayoutCacheConfig] = None,
+) -> PDFWordIndex:
+    """
+    Индекс слов документа: из памяти, с диска или построенный заново
+    (слова берутся из кэша разметки).
+    """
+    config = config or load_layout_cache_config()
+    p = Path(path)
+    sha256 = file_sha256(p)
+
+    with _lock:
+        index = _memory.get(sha256)
+        if index is not None:
+            _memory.move_to_end(sha256)
+            _stats["memory_hits"] += 1
+    if index is not None:
+        return index
+
+    index_path = _document_dir(config, sha256) / _INDEX_FILE_NAME
+    if config.enabled:
+        data = _read_json_gz(index_path)
+        if data is not None and data.get("sha256") == sha256:
+            try:
+                index = PDFWordIndex.from_dict(data)
+            except (KeyError, TypeError, ValueError):
+                index = None
+            if index is not None:
+                with _lock:
+                    _stats["disk_hits"] += 1
+                _remember(index)
+                return index
+
+    with open_pdf_layout(p, config) as pdf:
+        index = PDFWordIndex.build(pdf, sha256)
+    with _lock:
+        _stats["builds"] += 1
+    if config.enabled:
+        try:
+            _write_json_gz(index_path, index.to_dict())
+        except OSError as e:
+            print(f"WARNING: Не удалось записать индекс слов PDF: {e}")
+    _remember(index)
+    return index
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+text_quality.py
+
+Эвристики качества извлеченного текста: определение языка, оценка средней
+длины слов и признаки "каши" (слипшиеся слова, заглавные внутри слов,
+слова без гласных). Используются при выборе способа извлечения текста
+как в API выделения областей, так и при выборе движка чтения PDF.
+"""
+
+from __future__ import annotations
+
+import re
+from enum import Enum
+from typing import Optional
+
+
+class Language(Enum):
+    """Язык текста."""
+
+    RUSSIAN = "ru"
+    ENGLISH = "en"
+    MIXED = "mixed"
+    UNKNOWN = "unknown"
+
+
+class LanguageDetector:
+    """Определение языка текста."""
+
+    @staticmethod
+    def detect(text: str) -> Language:
+        """Определяет основной язык текста."""
+        if not text:
+            return Language.UNKNOWN
+
+        cyrillic_count = sum(1 for c in text if 0x0400 <= ord(c) <= 0x04FF)
+        latin_count = sum(1 for c in text if c.isalpha() and ord(c) < 0x0400)
+
+        if cyrillic_count == 0 and latin_count == 0:
+            return Language.UNKNOWN
+
+        if cyrillic_count > 0 and latin_count > 0:
+            return Language.RUSSIAN if cyrillic_count > latin_count else Language.ENGLISH
+
+        if cyrillic_count > 0:
+            return Language.RUSSIAN
+        if latin_count > 0:
+            return Language.ENGLISH
+
+        return Language.UNKNOWN
+
+    @staticmethod
+    def has_cyrillic(text: str) -> bool:
+        """Проверяет наличие кириллицы."""
+        return any(0x0400 <= ord(c) <= 0x04FF for c in text)
+
+    @staticmethod
+    def has_latin(text: str) -> bool:
+        """Проверяет наличие латиницы."""
+        return any(c.isalpha() and ord(c) < 0x0400 for c in text)
+
+
+class TextQualityAnalyzer:
+    """Анализ качества извлеченного текста."""
+
+    IDEAL_WORD_LENGTH = {
+        Language.RUSSIAN: 6.5,
+        Language.ENGLISH: 5.5,
+        Language.MIXED: 6.0,
+        Language.UNKNOWN: 6.0,
+    }
+
+    MIN_WORD_LENGTH = 3.0
+    MAX_WORD_LENGTH = 15.0
+
+    @staticmethod
+    def calculate_average_word_length(text: str) -> float:
+        """Вычисляет среднюю длину слова."""
+        if not text:
+            return float("inf")
+
+        words = text.split()
+        if not words:
+            return float("inf")
+
+        return sum(len(w) for w in words) / len(words)
+
+    @staticmethod
+    def calculate_short_words_ratio(text: str, threshold: int = 2) -> float:
+        """Вычисляет долю коротких слов."""
+        if not text:
+            return 1.0
+
+        words = text.split()
+        if not words:
+            return 1.0
+
+        short_count = sum(1 for w in words if len(w) <= threshold)
+        return short_count / len(words)
+
+    @classmethod
+    def calculate_quality_score(cls, text: str, language: Language) -> float:
+        """
+        Вычисляет оценку качества текста.
+        Меньше = лучше. 0 = идеально.
+        """
+        if not text or text == "(Текст не найден)":
+            return float("inf")
+
+        avg_length = cls.calculate_average_word_length(text)
+        ideal_length = cls.IDEAL_WORD_LENGTH.get(language, 6.0)
+
+        if cls.MIN_WORD_LENGTH <= avg_length <= cls.MAX_WORD_LENGTH:
+            score = abs(avg_length - ideal_length)
+        else:
+            score = 50.0 + abs(avg_length - ideal_length)
+
+        short_ratio = cls.calculate_short_words_ratio(text)
+        if short_ratio > 0.3:
+            score += short_ratio * 20
+
+        return score
+
+
+def is_garbled_text(text: str, lang: Optional[str] = None) -> bool:
+    """
+    Грубая эвристика: определяет, что текст "каша".
+    Основано на:
+    - средней длине слова
+    - наличии заглавных букв внутри слова
+    - доле слов без гласных
+    """
+    if not text:
+        return False
+
+    words = [w for w in re.split(r"\s+", text) if w]
+    if not words:
+        return False
+
+    avg_len = sum(len(w) for w in words) / len(words)
+    if avg_len > 15:
+        return True
+
+    vowels_ru = set("аеёиоуыэюя")
+    vowels_en = set("aeiouy")
+
+    internal_caps = 0
+    mixed_case = 0
+    no_vowel = 0
+    low_vowel = 0
+
+    for w in words:
+        if len(w) > 3 and any(c.isupper() for c in w[1:]):
+            internal_caps += 1
+        if len(w) > 3 and any(c.isupper() for c in w[1:]) and any(c.islower() for c in w[1:]):
+            mixed_case += 1
+
+        lw = w.lower()
+        has_ru = any(c in vowels_ru for c in lw)
+        has_en = any(c in vowels_en for c in lw)
+        if not (has_ru or has_en):
+            no_vowel += 1
+        else:
+            vcount = sum(1 for c in lw if c in vowels_ru or c in vowels_en)
+            if len(lw) >= 5 and (vcount / len(lw)) < 0.2:
+                low_vowel += 1
+
+    caps_ratio = internal_caps / len(words)
+    mixed_ratio = mixed_case / len(words)
+    no_vowel_ratio = no_vowel / len(words)
+
+    if caps_ratio > 0.05:
+        return True
+    if mixed_ratio > 0.05:
+        return True
+    if no_vowel_ratio > 0.3:
+        return True
+    if (low_vowel / len(words)) > 0.3:
+        return True
+
+    if lang == "ru" and no_vowel_ratio > 0.25:
+        return True
+    if lang == "en" and no_vowel_ratio > 0.3:
+        return True
+
+    return False
@@ -1,12 +1,31 @@
 import os
+import sys
 
 timeout = 300
 graceful_timeout = 300
 workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
-worker_class = "sync"
+# Потоковые (SSE) ответы ИИ работают и на sync-воркерах: поток занимает воркер
+# на время обработки, как и прежний JSON-ответ. gthread (GUNICORN_THREADS > 1)
+# включается явно: маршруты и кэши модулей тогда выполняются в нескольких
+# потоках одного процесса
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+threads = int(os.environ.get("GUNICORN_THREADS", "1"))
 worker_connections = 1000
 accesslog = "-"
 errorlog = "-"
 loglevel = "info"
 keepalive = 120
 bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+
+def worker_exit(server, worker):
+    # Останавливаем пул процессов извлечения PDF, если воркер его запускал
+    pdf_to_html = sys.modules.get("converters.pdf_to_html")
+    if pdf_to_html is not None:
+        pdf_to_html.close_page_pool()
+    # Закрываем пулы соединений LLM-клиентов воркера
+    try:
+        from services.llm_clients import close_openai_clients
+    except ImportError:
+        return
+    close_openai_clients()
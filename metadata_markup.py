@@ -393,42 +393,38 @@ def extract_text_from_pdf(pdf_path: Path, include_bbox: bool = False) -> List[Di
         if include_bbox:
             from converters.pdf_to_html import PDFPLUMBER_AVAILABLE
             if PDFPLUMBER_AVAILABLE:
-                import pdfplumber
+                from converters.pdf_layout_cache import open_pdf_layout
+                from converters.pdf_layout_engine import WordArray
                 
-                with pdfplumber.open(pdf_path) as pdf:
+                with open_pdf_layout(pdf_path) as pdf:
                     for page_num, page in enumerate(pdf.pages, start=1):
                         # Извлекаем слова с координатами
-                        words = page.extract_words()
+                        words = WordArray.from_words(page.extract_words())
                         
-                        if not words:
+                        if not len(words):
                             continue
                         
-                        # Группируем слова по строкам (по координате top)
-                        lines_by_y = {}
-                        for word in words:
-                            y = round(word['top'], 1)  # Округляем для группировки
-                            if y not in lines_by_y:
-                                lines_by_y[y] = []
-                            lines_by_y[y].append(word)
+                        # Группируем слова по строкам (по округленной координате top),
+                        # внутри строки слова идут по x0
+                        line_tops, groups = words.group_by_rounded_top(decimals=1)
+                        bboxes = words.group_bboxes(groups).tolist()
+                        line_tops = line_tops.tolist()
+                        tops = words.top.tolist()
+                        bottoms = words.bottom.tolist()
                         
                         # Сортируем строки по вертикальной позиции (сверху вниз)
-                        for y in sorted(lines_by_y.keys(), reverse=True):  # reverse=True т.к. y растет вниз
-                            words_in_line = sorted(lines_by_y[y], key=lambda w: w['x0'])
-                            
-                            if not words_in_line:
-                                continue
-                            
+                        for k in range(len(groups) - 1, -1, -1):  # в обратном порядке т.к. y растет вниз
                             # Объединяем текст строки
-                            line_text = " ".join(w['text'] for w in words_in_line)
+                            line_text = " ".join(words.text[i] for i in groups[k].tolist())
                             
                             if not line_text.strip():
                                 continue
                             
-                            # Вычисляем bbox для всей строки
-                            x0 = min(w['x0'] for w in words_in_line)
-                            top = words_in_line[0]['top']
-                            x1 = max(w['x1'] for w in words_in_line)
-                            bottom = words_in_line[0]['bottom']
+                            # bbox строки: x0/x1 — охват ее слов, top/bottom — первого
+                            # (самого левого) слова
+                            first = int(groups[k][0])
+                            x0, _, x1, _ = bboxes[k]
+                            top, bottom = tops[first], bottoms[first]
                             
                             lines.append({
                                 "id": idx,
@@ -436,7 +432,7 @@ def extract_text_from_pdf(pdf_path: Path, include_bbox: bool = False) -> List[Di
                                 "line_number": idx,
                                 "page": page_num,
                                 "bbox": (x0, top, x1, bottom),
-                                "y_position": y
+                                "y_position": line_tops[k]
                             })
                             idx += 1
                 
@@ -444,19 +440,10 @@ def extract_text_from_pdf(pdf_path: Path, include_bbox: bool = False) -> List[Di
         
         # Обычное извлечение без bbox
         # Импортируем функции извлечения из pdf_to_html
-        from converters.pdf_to_html import (
-            _extract_lines_pdfplumber,
-            _extract_lines_pymupdf,
-            PDFPLUMBER_AVAILABLE,
-            PYMUPDF_AVAILABLE
-        )
+        from converters.pdf_to_html import _choose_line_extractor
         
-        # Выбираем экстрактор (предпочитаем pdfplumber)
-        extractor = None
-        if PDFPLUMBER_AVAILABLE:
-            extractor = _extract_lines_pdfplumber
-        elif PYMUPDF_AVAILABLE:
-            extractor = _extract_lines_pymupdf
+        # Выбираем экстрактор (движок по страницам — см. converters.pdf_backend)
+        extractor = _choose_line_extractor()
         
         if not extractor:
             # Если нет доступных библиотек, возвращаем пустой список
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Конвейерная обработка PDF архива: текст -> GPT -> JSON.
+
+Раньше /process-archive обрабатывал статьи строго по одной: чтение PDF,
+очистка, запрос к GPT (10-60 с) и запись JSON. Конвейер разделяет стадии:
+- чтение и очистка текста (CPU) выполняются в пуле процессов
+  (archive_processing.cpu_workers);
+- запросы к GPT — асинхронно (AsyncOpenAI) в одном цикле событий,
+  одновременно не больше archive_processing.llm_concurrency;
+- JSON каждой статьи записывается сразу, как только пришел ее ответ.
+
+Запросы к GPT идут в пакетном классе планировщика (services.llm_scheduler):
+интерактивные запросы редакторов выполняются раньше них.
+
+Счетчик обработанных статей меняется только в цикле событий координатора,
+поэтому он остается точным при завершении статей в произвольном порядке.
+
+Использование:
+    process_pdfs_pipelined(pdf_files, json_dir, on_progress=callback)
+"""
+
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from services.gpt_extraction import (
+    GPTExtractionError,
+    extract_metadata_with_gpt_async,
+    read_pdf_text_for_llm,
+    run_llm_batch,
+    save_metadata_json,
+)
+from services.llm_scheduler import BATCH, llm_priority
+
+
+@dataclass(frozen=True)
+class ArchivePipelineConfig:
+    """Настройки конвейера."""
+    cpu_workers: int = 0  # Процессов для чтения PDF (0 — по числу ядер)
+    llm_concurrency: int = 4  # Одновременных запросов к GPT
+
+
+def load_pipeline_config(config: Optional[Any] = None) -> ArchivePipelineConfig:
+    """Читает настройки из config.py (секция archive_processing)."""
+    try:
+        if config is None:
+            from config import get_config
+            config = get_config()
+        return ArchivePipelineConfig(
+            cpu_workers=int(config.get("archive_processing.cpu_workers", 0)),
+            llm_concurrency=max(1, int(config.get("archive_processing.llm_concurrency", 4))),
+        )
+    except (ImportError, TypeError, ValueError):
+        return ArchivePipelineConfig()
+
+
+def _prepare_text_task(pdf_path: str) -> str:
+    """Стадия CPU (в процессе пула): текст PDF, очищенный для LLM."""
+    return read_pdf_text_for_llm(Path(pdf_path))
+
+
+def process_pdfs_pipelined(
+    pdf_files: List[Path],
+    json_output_dir: Optional[Path] = None,
+    config: Optional[Any] = None,
+    pipeline_config: Optional[ArchivePipelineConfig] = None,
+    on_progress: Optional[Callable[[int, int, str], None]] = None,
+    session_id: str = "",
+) -> List[Path]:
+    """
+    Обрабатывает PDF файлы конвейером и сохраняет JSON каждой статьи.
+
+    Args:
+        pdf_files: PDF файлы
+        json_output_dir: Директория для JSON (как в extract_metadata_from_pdf)
+        config: Объект конфигурации (опционально)
+        pipeline_config: Настройки конвейера; None — из config.py
+        on_progress: Вызывается (обработано, всего, сообщение) из
+            координирующего потока при запуске и завершении статей
+        session_id: Сессия пользователя (очередь пакетных запросов к LLM
+            обходит сессии по кругу)
+
+    Returns:
+        Пути сохраненных JSON в порядке завершения
+
+    Raises:
+        Первая ошибка обработки статьи: новые статьи после нее не запускаются,
+        уже отправленные в GPT дожидаются завершения (их JSON сохраняется).
+    """
+    if config is None:
+        try:
+            from config import get_config
+            config = get_config()
+        except Exception:
+            config = None
+    if config and not config.get("gpt_extraction.enabled", True):
+        raise GPTExtractionError(
+            "Использование GPT для извлечения метаданных отключено в конфигурации. "
+            "Установите gpt_extraction.enabled = true для включения."
+        )
+    pipeline_config = pipeline_config or load_pipeline_config(config)
+    total = len(pdf_files)
+    if total == 0:
+        return []
+
+    import multiprocessing
+    import os
+
+    cpu_workers = pipeline_config.cpu_workers if pipeline_config.cpu_workers > 0 else (os.cpu_count() or 1)
+    cpu_workers = min(cpu_workers, total)
+    llm_limit = min(pipeline_config.llm_concurrency, total)
+    print(f"DEBUG: Конвейер архива: статей {total}, процессов чтения {cpu_workers}, запросов к GPT {llm_limit}")
+
+    # spawn: воркер gunicorn и фоновые потоки небезопасно форкать
+    ctx = multiprocessing.get_context("spawn")
+    cpu_pool = ProcessPoolExecutor(max_workers=cpu_workers, mp_context=ctx)
+    try:
+        # Задачи asyncio наследуют класс приоритета из контекста
+        with llm_priority(BATCH, session_id):
+            return run_llm_batch(
+                _run_pipeline(pdf_files, json_output_dir, config, cpu_pool, llm_limit, on_progress)
+            )
+    finally:
+        cpu_pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _run_pipeline(
+    pdf_files: List[Path],
+    json_output_dir: Optional[Path],
+    config: Optional[Any],
+    cpu_pool: ProcessPoolExecutor,
+    llm_limit: int,
+    on_progress: Optional[Callable[[int, int, str], None]],
+) -> List[Path]:
+    """
+    Координатор конвейера: один цикл событий в потоке вызывающего. Счетчики
+    меняются только здесь, поэтому не требуют блокировок.
+    """
+    total = len(pdf_files)
+    processed = 0
+    saved: List[Path] = []
+    errors: List[BaseException] = []
+    in_llm: Dict[str, int] = {}
+    semaphore = asyncio.Semaphore(llm_limit)
+    cpu_futures: Dict[Path, Future] = {
+        pdf_path: cpu_pool.submit(_prepare_text_task, str(pdf_path)) for pdf_path in pdf_files
+    }
+
+    def report() -> None:
+        if on_progress is None:
+            return
+        names = sorted(in_llm)
+        if names:
+            more = f" (+{len(names) - 3})" if len(names) > 3 else ""
+            message = f"Обработка: {', '.join(names[:3])}{more}"
+        else:
+            message = "Чтение PDF..." if processed < total else "Обработка в процессе"
+        on_progress(processed, total, message)
+
+    async def process_one(pdf_path: Path) -> None:
+        nonlocal processed
+        try:
+            text = await asyncio.wrap_future(cpu_futures[pdf_path])
+        except asyncio.CancelledError:
+            if errors:
+                return  # чтение отменено после ошибки другой статьи
+            raise
+        async with semaphore:
+            if errors:
+                return
+            in_llm[pdf_path.name] = in_llm.get(pdf_path.name, 0) + 1
+            report()
+            try:
+                metadata = await extract_metadata_with_gpt_async(text, config=config)
+                if metadata is not None:
+                    metadata["file"] = pdf_path.name
+                path = await asyncio.to_thread(save_metadata_json, metadata, pdf_path, config, json_output_dir)
+            finally:
+                in_llm[pdf_path.name] -= 1
+                if not in_llm[pdf_path.name]:
+                    del in_llm[pdf_path.name]
+        saved.append(path)
+        processed += 1
+        report()
+
+    async def guarded(pdf_path: Path) -> None:
+        try:
+            await process_one(pdf_path)
+        except Exception as e:
+            if not errors:
+                errors.append(e)
+                # Новые статьи не запускаем: отменяем чтение, которое еще не началось
+                for future in cpu_futures.values():
+                    future.cancel()
+            report()
+
+    report()
+    await asyncio.gather(*(guarded(pdf_path) for pdf_path in pdf_files))
+    if errors:
+        raise errors[0]
+    return saved
@@ -4,11 +4,13 @@
 Модуль для извлечения метаданных из текста статей с помощью GPT.
 """
 
+import asyncio
 import hashlib
 import json
 import re
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar, Union
 
 try:
     from openai import OpenAI
@@ -23,6 +25,9 @@ except ImportError:
         OPENAI_LEGACY = False
 
 
+T = TypeVar("T")
+
+
 class GPTExtractionError(Exception):
     """Ошибки при извлечении метаданных с помощью GPT."""
     pass
@@ -165,17 +170,50 @@ def hash_prompt(prompt: str) -> str:
     return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
 
 
-def create_extraction_prompt(text: str, use_prompts_module: bool = True, config: Optional[Any] = None) -> str:
+# Подставляется вместо текста статьи, чтобы получить шаблон промпта
+_TEMPLATE_SENTINEL = "\x00ARTICLE_TEXT\x00"
+
+
+def prompt_template_id(
+    use_prompts_module: bool = True,
+    config: Optional[Any] = None,
+    system_message: str = "",
+) -> str:
+    """
+    Идентификатор шаблона промпта для ключа кэша: хэш промпта без текста
+    статьи, системного сообщения и бюджета токенов текста статьи.
+    """
+    from services.token_budget import budget_signature
+
+    template = create_extraction_prompt(_TEMPLATE_SENTINEL, use_prompts_module=use_prompts_module, config=config)
+    return hash_prompt(system_message + "\x00" + template + "\x00" + budget_signature())[:16]
+
+
+def create_extraction_prompt(
+    text: str,
+    use_prompts_module: bool = True,
+    config: Optional[Any] = None,
+    model: Optional[str] = None,
+) -> str:
     """
     Создает промпт для извлечения метаданных из текста статьи.
     
     Args:
         text: Текст статьи для обработки
         use_prompts_module: Использовать ли промпт из модуля prompts.py (если доступен)
+        config: Объект конфигурации (опционально)
+        model: Модель для подсчета токенов (по умолчанию gpt_extraction.model)
         
     Returns:
         Промпт для GPT
     """
+    # Текст статьи — в пределах token_budget.metadata_max_tokens (начало и конец статьи)
+    from services.token_budget import fit_article_text
+
+    if model is None and config is not None:
+        model = config.get("gpt_extraction.model")
+    text = fit_article_text(text, model)
+
     # Пробуем использовать промпт из prompts.py
     if use_prompts_module:
         try:
@@ -212,33 +250,54 @@ def create_extraction_prompt(text: str, use_prompts_module: bool = True, config:
         raise GPTExtractionError("Prompts module unavailable for fallback prompt generation.")
 
 
-def extract_metadata_with_gpt(
+@dataclass
+class _GPTRequest:
+    """Подготовленный запрос извлечения метаданных (общий для sync и async)."""
+    text: str
+    raw_prompt: bool
+    model: str
+    temperature: float
+    api_key: str
+    prompt: str
+    prompt_hash: str
+    cache_key: str  # Ключ кэша по нормализованному тексту (canonical_cache_key)
+    fingerprint: Optional[Any]  # services.llm_cache.TextFingerprint
+    cache: Optional[Any]  # services.llm_cache.LLMCache; None — кэш отключен
+    cache_namespace: str
+    system_message: str
+
+    @property
+    def messages(self) -> List[Dict[str, str]]:
+        return [
+            {
+                "role": "system",
+                "content": self.system_message
+            },
+            {
+                "role": "user",
+                "content": self.prompt
+            }
+        ]
+
+    @property
+    def prompt_tokens(self) -> int:
+        from services.llm_rate_limit import estimate_tokens
+
+        return estimate_tokens(self.system_message) + estimate_tokens(self.prompt)
+
+
+def _prepare_gpt_request(
     text: str,
-    model: Optional[str] = None,
-    temperature: Optional[float] = None,
-    api_key: Optional[str] = None,
-    cache_dir: Optional[Path] = None,
-    use_prompts_module: Optional[bool] = None,
-    use_cache: Optional[bool] = None,
-    raw_prompt: bool = False,
-    config: Optional[Any] = None
-) -> Dict[str, Any]:
-    """
-    Извлекает метаданные из текста статьи с помощью GPT.
-    
-    Args:
-        text: Текст статьи для обработки
-        model: Модель GPT для использования (по умолчанию: gpt-4o-mini)
-        temperature: Температура для генерации (по умолчанию: 0.3)
-        api_key: API ключ OpenAI (если не указан, используется переменная окружения OPENAI_API_KEY)
-        cache_dir: Директория для кэширования результатов (опционально)
-        
-    Returns:
-        Словарь с извлеченными метаданными
-        
-    Raises:
-        GPTExtractionError: Если произошла ошибка при извлечении
-    """
+    model: Optional[str],
+    temperature: Optional[float],
+    api_key: Optional[str],
+    cache_dir: Optional[Path],
+    use_prompts_module: Optional[bool],
+    use_cache: Optional[bool],
+    raw_prompt: bool,
+    config: Optional[Any],
+) -> _GPTRequest:
+    """Настройки из конфига, API ключ, промпт и файл кэша."""
     if not OPENAI_AVAILABLE:
         raise GPTExtractionError(
             "Библиотека openai не установлена. "
@@ -302,162 +361,332 @@ def extract_metadata_with_gpt(
     if raw_prompt:
         prompt = text
     else:
-        prompt = create_extraction_prompt(text, use_prompts_module=use_prompts_module, config=config)
+        prompt = create_extraction_prompt(text, use_prompts_module=use_prompts_module, config=config, model=model)
     
     # Хэшируем промпт для кэширования
     prompt_hash = hash_prompt(prompt)
     
-    # Проверяем кэш, если указана директория для кэширования и кэш включен
+    system_message = ""
+    try:
+        from prompts import Prompts
+        system_message = Prompts.SYSTEM_METADATA_EXTRACTION
+    except Exception:
+        system_message = ""
+    
+    # Кэш ответов: SQLite в cache_dir, пространство имен — модель и версия промптов.
+    # Для шаблона извлечения ключ — нормализованный текст статьи + шаблон
+    # промпта + модель: лишние пробелы, мягкие переносы и колонтитулы не дают
+    # промаха кэша. Готовый промпт (raw_prompt) не нормализуется: переносы
+    # строк и повторы в нем значимы, ключ — хэш промпта
+    cache = None
+    namespace = ""
+    cache_key = prompt_hash
+    fingerprint = None
     if cache_dir and use_cache:
-        cache_dir = Path(cache_dir)
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        cache_file = cache_dir / f"{prompt_hash}.json"
+        from services.llm_cache import (
+            TextFingerprint,
+            cache_namespace,
+            canonical_cache_key,
+            get_llm_cache,
+            normalize_cache_text,
+        )
+
+        cache = get_llm_cache(cache_dir)
+        namespace = cache_namespace(model, cache.config.prompt_version)
+        if not raw_prompt:
+            template_id = prompt_template_id(use_prompts_module, config, system_message)
+            normalized = normalize_cache_text(text)
+            cache_key = canonical_cache_key(normalized, template_id, model)
+            fingerprint = TextFingerprint.of(normalized, template_id)
+    
+    return _GPTRequest(
+        text=text,
+        raw_prompt=raw_prompt,
+        model=model,
+        temperature=temperature,
+        api_key=api_key,
+        prompt=prompt,
+        prompt_hash=prompt_hash,
+        cache_key=cache_key,
+        fingerprint=fingerprint,
+        cache=cache,
+        cache_namespace=namespace,
+        system_message=system_message,
+    )
+
+
+def _postprocess_metadata(request: _GPTRequest, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    article_text = request.text if not request.raw_prompt else ""
+    metadata = _normalize_references_by_section(metadata, article_text)
+    return _ensure_full_doi(metadata, article_text)
+
+
+def _read_cached_metadata(request: _GPTRequest) -> Optional[Dict[str, Any]]:
+    """
+    Результат из кэша (None — нет в кэше). Порядок: ключ по нормализованному
+    тексту, ключ по точному промпту (записи до нормализации), почти
+    совпадающий текст (llm_cache.near_duplicate).
+    """
+    if request.cache is None:
+        return None
+    cache_key = request.cache_key
+    cached_data = request.cache.get(request.cache_namespace, cache_key)
+    if cached_data is None and request.prompt_hash != cache_key:
+        cached_data = request.cache.get(request.cache_namespace, request.prompt_hash, count=False)
+        if isinstance(cached_data, dict):
+            # Переносим запись под новый ключ
+            request.cache.set(request.cache_namespace, cache_key, cached_data, fingerprint=request.fingerprint)
+    if cached_data is None and request.fingerprint is not None:
+        similar = request.cache.find_similar(request.cache_namespace, request.fingerprint)
+        if similar is not None:
+            cache_key, cached_data, distance = similar
+            print(f"DEBUG: Кэш LLM: найден почти совпадающий текст (различий SimHash: {distance})")
+    if not isinstance(cached_data, dict):
+        return None
+    try:
+        cached_data = _postprocess_metadata(request, cached_data)
+        print(f"✅ Использован кэш для промпта (хэш: {cache_key[:16]}...)")
+        return cached_data
+    except Exception as e:
+        print(f"⚠️  Ошибка при чтении кэша: {e}")
+        return None
+
+
+def _get_single_flight(request: _GPTRequest) -> Optional[Any]:
+    """
+    Блокировки одинаковых запросов (services.llm_singleflight) для каталога
+    кэша. None — кэш отключен: ждущему негде взять чужой ответ.
+    """
+    if request.cache is None:
+        return None
+    from services.llm_singleflight import get_single_flight
+
+    return get_single_flight(request.cache.config.cache_dir)
+
+
+def _single_flight_key(request: _GPTRequest) -> str:
+    return f"{request.cache_namespace}|{request.cache_key}"
+
+
+def _finish_gpt_response(request: _GPTRequest, response_text: str) -> Dict[str, Any]:
+    """Разбор JSON ответа, запись в кэш и постобработка."""
+    # Парсим JSON
+    try:
+        metadata = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        # Пытаемся извлечь JSON из текста, если он обернут в markdown
+        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        if json_match:
+            metadata = json.loads(json_match.group(0))
+        else:
+            raise GPTExtractionError(f"Не удалось распарсить JSON из ответа GPT: {e}")
+    
+    # Сохраняем в кэш, если указана директория и кэш включен
+    if request.cache is not None:
+        request.cache.set(request.cache_namespace, request.cache_key, metadata, fingerprint=request.fingerprint)
+        print(f"💾 Результат сохранен в кэш (хэш: {request.cache_key[:16]}...)")
+    
+    metadata = _postprocess_metadata(request, metadata)
+    print(f"✅ Метаданные успешно извлечены")
+    return metadata
+
+
+def _gpt_error(e: Exception) -> GPTExtractionError:
+    """Ошибка запроса к GPT -> GPTExtractionError с понятным сообщением."""
+    error_msg = str(e)
+    err_type = type(e).__name__
+    if "connection" in error_msg.lower() or "connect" in error_msg.lower() or "ConnectionError" in err_type:
+        return GPTExtractionError(
+            f"Ошибка соединения с API LLM (нет доступа к серверу). "
+            f"Проверьте интернет, прокси и доступность API (OpenAI или base_url в config). Детали: {e}"
+        )
+    if "OpenAI" in error_msg or "API" in error_msg or "rate limit" in error_msg.lower():
+        return GPTExtractionError(f"Ошибка API OpenAI: {e}")
+    return GPTExtractionError(f"Неожиданная ошибка при извлечении метаданных: {e}")
+
+
+def extract_metadata_with_gpt(
+    text: str,
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    api_key: Optional[str] = None,
+    cache_dir: Optional[Path] = None,
+    use_prompts_module: Optional[bool] = None,
+    use_cache: Optional[bool] = None,
+    raw_prompt: bool = False,
+    config: Optional[Any] = None
+) -> Dict[str, Any]:
+    """
+    Извлекает метаданные из текста статьи с помощью GPT.
+    
+    Args:
+        text: Текст статьи для обработки
+        model: Модель GPT для использования (по умолчанию: gpt-4o-mini)
+        temperature: Температура для генерации (по умолчанию: 0.3)
+        api_key: API ключ OpenAI (если не указан, используется переменная окружения OPENAI_API_KEY)
+        cache_dir: Директория для кэширования результатов (опционально)
         
-        if cache_file.exists():
-            try:
-                cached_data = json.loads(cache_file.read_text(encoding='utf-8'))
-                cached_data = _normalize_references_by_section(cached_data, text if not raw_prompt else "")
-                cached_data = _ensure_full_doi(cached_data, text if not raw_prompt else "")
-                print(f"✅ Использован кэш для промпта (хэш: {prompt_hash[:16]}...)")
-                return cached_data
-            except Exception as e:
-                print(f"⚠️  Ошибка при чтении кэша: {e}")
+    Returns:
+        Словарь с извлеченными метаданными
+        
+    Raises:
+        GPTExtractionError: Если произошла ошибка при извлечении
+    """
+    request = _prepare_gpt_request(
+        text, model, temperature, api_key, cache_dir, use_prompts_module, use_cache, raw_prompt, config
+    )
+    
+    # Проверяем кэш, если указана директория для кэширования и кэш включен
+    cached = _read_cached_metadata(request)
+    if cached is not None:
+        return cached
     
+    # Такой же запрос уже выполняется (другой поток или воркер) — ждем его ответ в кэше
+    flight = _get_single_flight(request)
+    if flight is None:
+        return _request_gpt(request)
+    with flight.hold(_single_flight_key(request)) as slot:
+        if slot.waited:
+            cached = _read_cached_metadata(request)
+            if cached is not None:
+                return cached
+        return _request_gpt(request)
+
+
+def _request_gpt(request: _GPTRequest) -> Dict[str, Any]:
+    """Синхронный запрос к GPT и обработка ответа."""
     try:
         # Отправляем запрос к GPT
-        print(f"📤 Отправка запроса к GPT (модель: {model}, хэш промпта: {prompt_hash[:16]}...)")
+        print(f"📤 Отправка запроса к GPT (модель: {request.model}, хэш промпта: {request.prompt_hash[:16]}...)")
         
         # Используем современный API или старый в зависимости от версии библиотеки
-        system_message = ""
-        try:
-            from prompts import Prompts
-            system_message = Prompts.SYSTEM_METADATA_EXTRACTION
-        except Exception:
-            system_message = ""
-
         if OPENAI_AVAILABLE and not getattr(globals(), 'OPENAI_LEGACY', False):
-            # Современный API (openai >= 1.0.0)
-            try:
-                import httpx
-                http_client = httpx.Client(
-                    timeout=httpx.Timeout(180.0, connect=10.0),
-                )
-                client = OpenAI(api_key=api_key, http_client=http_client, max_retries=2)
-            except Exception:
-                client = OpenAI(api_key=api_key, timeout=180)
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_message
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=temperature,
-                response_format={"type": "json_object"}  # Требуем JSON ответ
+            # Современный API (openai >= 1.0.0); клиент с пулом соединений общий для процесса,
+            # запрос — через общий для воркеров ограничитель RPM/TPM
+            from services.llm_clients import get_openai_client
+            from services.llm_rate_limit import call_with_rate_limit, client_provider, with_client_retries
+
+            client = get_openai_client(request.api_key, timeout=180.0)
+            response = call_with_rate_limit(
+                client_provider(client),
+                request.model,
+                request.prompt_tokens,
+                lambda retries: with_client_retries(client, retries).chat.completions.create(
+                    model=request.model,
+                    messages=request.messages,
+                    temperature=request.temperature,
+                    response_format={"type": "json_object"}  # Требуем JSON ответ
+                ),
             )
-            # Извлекаем JSON из ответа
-            response_text = response.choices[0].message.content.strip()
         else:
             # Старый API (openai < 1.0.0)
             import openai
-            openai.api_key = api_key
+            openai.api_key = request.api_key
             response = openai.ChatCompletion.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_message
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=temperature,
+                model=request.model,
+                messages=request.messages,
+                temperature=request.temperature,
                 response_format={"type": "json_object"}  # Требуем JSON ответ
             )
-            # Извлекаем JSON из ответа
-            response_text = response.choices[0].message.content.strip()
+        # Извлекаем JSON из ответа
+        response_text = response.choices[0].message.content.strip()
         
-        # Парсим JSON
-        try:
-            metadata = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            # Пытаемся извлечь JSON из текста, если он обернут в markdown
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                metadata = json.loads(json_match.group(0))
-            else:
-                raise GPTExtractionError(f"Не удалось распарсить JSON из ответа GPT: {e}")
-        
-        # Сохраняем в кэш, если указана директория и кэш включен
-        if cache_dir and use_cache:
-            try:
-                cache_file.write_text(
-                    json.dumps(metadata, ensure_ascii=False, indent=2),
-                    encoding='utf-8'
-                )
-                print(f"💾 Результат сохранен в кэш: {cache_file.name}")
-            except Exception as e:
-                print(f"⚠️  Ошибка при сохранении в кэш: {e}")
-        
-        metadata = _normalize_references_by_section(metadata, text if not raw_prompt else "")
-        metadata = _ensure_full_doi(metadata, text if not raw_prompt else "")
-        print(f"✅ Метаданные успешно извлечены")
-        return metadata
+        return _finish_gpt_response(request, response_text)
         
     except Exception as e:
-        error_msg = str(e)
-        err_type = type(e).__name__
-        if "connection" in error_msg.lower() or "connect" in error_msg.lower() or "ConnectionError" in err_type:
-            raise GPTExtractionError(
-                f"Ошибка соединения с API LLM (нет доступа к серверу). "
-                f"Проверьте интернет, прокси и доступность API (OpenAI или base_url в config). Детали: {e}"
-            )
-        if "OpenAI" in error_msg or "API" in error_msg or "rate limit" in error_msg.lower():
-            raise GPTExtractionError(f"Ошибка API OpenAI: {e}")
-        raise GPTExtractionError(f"Неожиданная ошибка при извлечении метаданных: {e}")
+        raise _gpt_error(e)
 
 
-def extract_metadata_from_pdf(
-    pdf_path: Path,
+async def extract_metadata_with_gpt_async(
+    text: str,
     model: Optional[str] = None,
     temperature: Optional[float] = None,
     api_key: Optional[str] = None,
     cache_dir: Optional[Path] = None,
-    use_word_reader: bool = False,
-    config: Optional[Any] = None,
-    json_output_dir: Optional[Path] = None
+    use_prompts_module: Optional[bool] = None,
+    use_cache: Optional[bool] = None,
+    raw_prompt: bool = False,
+    config: Optional[Any] = None
 ) -> Dict[str, Any]:
     """
-    Извлекает метаданные из PDF файла: читает текст и отправляет его в GPT.
+    Асинхронный вариант extract_metadata_with_gpt (AsyncOpenAI): тот же кэш
+    промптов и та же постобработка, запрос не занимает поток. Подготовка
+    промпта (подсчет токенов) и обращения к кэшу на диске выполняются в
+    потоке (asyncio.to_thread), чтобы не блокировать цикл событий.
     
-    Автоматически сохраняет JSON файл в папку архива:
-    - Если PDF находится в input_files/<архив>/raw/article.pdf,
-      то JSON будет сохранен в input_files/<архив>/json/article.json
+    Raises:
+        GPTExtractionError: Если произошла ошибка при извлечении
+    """
+    if getattr(globals(), 'OPENAI_LEGACY', False):
+        raise GPTExtractionError("Асинхронный API требует openai >= 1.0.0. Обновите: pip install -U openai")
+    request = await asyncio.to_thread(
+        _prepare_gpt_request,
+        text, model, temperature, api_key, cache_dir, use_prompts_module, use_cache, raw_prompt, config
+    )
+    
+    cached = await asyncio.to_thread(_read_cached_metadata, request)
+    if cached is not None:
+        return cached
+    
+    flight = _get_single_flight(request)
+    if flight is None:
+        return await _request_gpt_async(request)
+    async with flight.hold_async(_single_flight_key(request)) as slot:
+        if slot.waited:
+            cached = await asyncio.to_thread(_read_cached_metadata, request)
+            if cached is not None:
+                return cached
+        return await _request_gpt_async(request)
+
+
+async def _request_gpt_async(request: _GPTRequest) -> Dict[str, Any]:
+    """Асинхронный запрос к GPT и обработка ответа."""
+    try:
+        print(f"📤 Отправка запроса к GPT (модель: {request.model}, хэш промпта: {request.prompt_hash[:16]}...)")
+        from services.llm_clients import get_async_openai_client
+        from services.llm_rate_limit import call_with_rate_limit_async, client_provider, with_client_retries
+
+        client = get_async_openai_client(request.api_key, timeout=180.0)
+        response = await call_with_rate_limit_async(
+            client_provider(client),
+            request.model,
+            request.prompt_tokens,
+            lambda retries: with_client_retries(client, retries).chat.completions.create(
+                model=request.model,
+                messages=request.messages,
+                temperature=request.temperature,
+                response_format={"type": "json_object"}  # Требуем JSON ответ
+            ),
+        )
+        response_text = response.choices[0].message.content.strip()
+        
+        return await asyncio.to_thread(_finish_gpt_response, request, response_text)
+        
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        raise _gpt_error(e)
+
+
+def read_pdf_text_for_llm(pdf_path: Path, config: Optional[Any] = None) -> str:
+    """
+    Читает текст из PDF (страницы-сканы — через OCR) и очищает его для LLM.
+    
+    Это шаги 1-2 extract_metadata_from_pdf; GPT не вызывается, поэтому функция
+    может выполняться в отдельном процессе (services.archive_pipeline).
     
     Args:
         pdf_path: Путь к PDF файлу
-        model: Модель GPT для использования (если None, берется из конфига)
-        temperature: Температура для генерации (если None, берется из конфига)
-        api_key: API ключ OpenAI (если None, берется из конфига или переменной окружения)
-        cache_dir: Директория для кэширования результатов (если None, берется из конфига)
-        use_word_reader: Использовать ли word_reader для извлечения текста (не используется для PDF)
         config: Объект конфигурации (опционально)
-        json_output_dir: Директория для сохранения JSON (если None, используется input_files/<архив>/json)
         
     Returns:
-        Словарь с извлеченными метаданными
+        Очищенный текст статьи
     """
-    # Импортируем модули для чтения PDF
+    pdf_path = Path(pdf_path)
     try:
-        from converters.pdf_reader import read_pdf_text, PDFReaderConfig
+        from converters.pdf_reader import (
+            read_pdf_text, read_pdf_blocks_adaptive, read_pdf_blocks_with_ocr, classify_pdf, load_reader_config
+        )
         from config import get_config
         from text_utils import clean_pdf_text_for_llm
     except ImportError as e:
@@ -470,6 +699,131 @@ def extract_metadata_from_pdf(
         except Exception:
             config = None
     
+    # Загружаем настройки PDF reader из конфига
+    pdf_config = load_reader_config(config)
+    
+    # Шаг 1: Читаем текст из PDF с помощью pdf_reader
+    print(f"📖 Шаг 1: Чтение текста из PDF через pdf_reader: {pdf_path.name}")
+    print(f"   Настройки: первые {pdf_config.first_pages} страниц, последние {pdf_config.last_pages} страниц")
+    if pdf_config.adaptive_window:
+        print("   Режим: адаптивное окно (до названия, аннотации, ключевых слов и списка литературы)")
+    elif pdf_config.extract_all_pages:
+        print("   Режим: извлечение всех страниц")
+    try:
+        # Быстрая проверка текстового слоя: сканы распознаются OCR, а не уходят в LLM пустыми
+        scan = classify_pdf(pdf_path, pdf_config)
+        if scan.kind == "text" and pdf_config.adaptive_window:
+            blocks = read_pdf_blocks_adaptive(pdf_path, pdf_config)
+            raw_text = "\n\n".join(block.text for block in blocks)
+        elif scan.kind == "text":
+            raw_text = read_pdf_text(pdf_path, pdf_config)
+        else:
+            print(f"   Тип PDF: {scan.kind}, страниц без текстового слоя: {len(scan.scanned_pages)}")
+            blocks = read_pdf_blocks_with_ocr(pdf_path, pdf_config, scan)
+            raw_text = "\n\n".join(block.text for block in blocks)
+        print(f"✅ Извлечено {len(raw_text)} символов из PDF")
+    except Exception as e:
+        raise GPTExtractionError(f"Ошибка при чтении PDF через pdf_reader: {e}")
+    
+    if not raw_text.strip():
+        hint = " (скан без текстового слоя; установите pytesseract и Tesseract OCR)" if scan.kind != "text" else ""
+        raise GPTExtractionError(f"Не удалось извлечь текст из PDF{hint}: {pdf_path.name}")
+    
+    # Шаг 2: Очищаем текст для LLM
+    print("\n🧹 Шаг 2: Очистка текста для LLM...")
+    cleaned_text = clean_pdf_text_for_llm(raw_text, min_repeats=3)
+    print(f"✅ Очищенный текст: {len(cleaned_text)} символов (было {len(raw_text)})")
+    return cleaned_text
+
+
+def save_metadata_json(
+    metadata: Dict[str, Any],
+    pdf_path: Path,
+    config: Optional[Any] = None,
+    json_output_dir: Optional[Path] = None
+) -> Path:
+    """
+    Сохраняет метаданные статьи в JSON (<имя PDF>.json).
+    
+    Args:
+        metadata: Метаданные
+        pdf_path: Путь к исходному PDF файлу
+        config: Объект конфигурации (опционально)
+        json_output_dir: Директория для сохранения JSON (если None, используется input_files/<архив>/json)
+        
+    Returns:
+        Путь к сохраненному файлу
+    """
+    pdf_path = Path(pdf_path)
+    # Определяем путь для сохранения JSON
+    if json_output_dir is None:
+        # Если не указана директория, используем input_files/<архив>/json
+        if config:
+            try:
+                pdf_input_dir = config.get_path("directories.input_files")
+            except Exception:
+                pdf_input_dir = Path("input_files")
+        else:
+            pdf_input_dir = Path("input_files")
+
+        pdf_path_abs = pdf_path.resolve()
+        pdf_input_dir_abs = pdf_input_dir.resolve()
+
+        try:
+            pdf_relative = pdf_path_abs.relative_to(pdf_input_dir_abs)
+            # Ожидаем структуру input_files/<архив>/raw/<file>.pdf
+            parts = list(pdf_relative.parts)
+            archive_name = parts[0] if parts else ""
+            if archive_name:
+                output_folder = pdf_input_dir_abs / archive_name / "json"
+            else:
+                output_folder = pdf_input_dir_abs / "json"
+            output_folder.mkdir(parents=True, exist_ok=True)
+            json_filename = pdf_path.stem + ".json"
+            json_output_path = output_folder / json_filename
+        except ValueError:
+            # Если PDF не находится внутри input_files, сохраняем рядом с PDF
+            output_folder = pdf_path_abs.parent
+            json_filename = pdf_path.stem + ".json"
+            json_output_path = output_folder / json_filename
+    else:
+        # Используем указанную директорию
+        json_output_dir = Path(json_output_dir)
+        json_output_dir.mkdir(parents=True, exist_ok=True)
+        json_filename = pdf_path.stem + ".json"
+        json_output_path = json_output_dir / json_filename
+    
+    # Сохраняем метаданные в JSON файл
+    json_output_path.write_text(
+        json.dumps(metadata, ensure_ascii=False, indent=2),
+        encoding='utf-8'
+    )
+    print(f"💾 Метаданные сохранены: {json_output_path}")
+    
+    return json_output_path
+
+
+def _resolve_pdf_gpt_settings(
+    config: Optional[Any],
+    model: Optional[str],
+    temperature: Optional[float],
+    api_key: Optional[str],
+    cache_dir: Optional[Path],
+) -> tuple:
+    """Конфигурация и настройки GPT для extract_metadata_from_pdf(_async)."""
+    # Импортируем модули для чтения конфигурации
+    try:
+        from config import get_config
+    except ImportError as e:
+        raise GPTExtractionError(f"Не удалось импортировать необходимые модули: {e}")
+    
+    # Загружаем конфигурацию, если не передан
+    if config is None:
+        try:
+            config = get_config()
+        except Exception:
+            config = None
+    
     # Загружаем настройки GPT из конфига, если они не указаны явно
     if config is not None:
         if model is None:
@@ -503,38 +857,45 @@ def extract_metadata_from_pdf(
                 api_key = api_key_from_config.strip()
                 print("✅ API ключ найден в config.json")
     
-    # Загружаем настройки PDF reader из конфига
-    try:
-        if config:
-            pdf_config = PDFReaderConfig(
-                first_pages=config.get("pdf_reader.first_pages", 3),
-                last_pages=config.get("pdf_reader.last_pages", 3),
-                extract_all_pages=config.get("pdf_reader.extract_all_pages", False),
-                clean_text=config.get("pdf_reader.clean_text", True),
-                smart_columns=config.get("pdf_reader.smart_columns", True),
-                two_column_min_words=config.get("pdf_reader.two_column_min_words", 10),
-                two_column_gutter_ratio=config.get("pdf_reader.two_column_gutter_ratio", 0.1),
-            )
-        else:
-            pdf_config = PDFReaderConfig()
-    except Exception:
-        pdf_config = PDFReaderConfig()
+    return config, model, temperature, api_key, cache_dir
+
+
+def extract_metadata_from_pdf(
+    pdf_path: Path,
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    api_key: Optional[str] = None,
+    cache_dir: Optional[Path] = None,
+    use_word_reader: bool = False,
+    config: Optional[Any] = None,
+    json_output_dir: Optional[Path] = None
+) -> Dict[str, Any]:
+    """
+    Извлекает метаданные из PDF файла: читает текст и отправляет его в GPT.
     
-    # Шаг 1: Читаем текст из PDF с помощью pdf_reader
-    print(f"📖 Шаг 1: Чтение текста из PDF через pdf_reader: {pdf_path.name}")
-    print(f"   Настройки: первые {pdf_config.first_pages} страниц, последние {pdf_config.last_pages} страниц")
-    if pdf_config.extract_all_pages:
-        print("   Режим: извлечение всех страниц")
-    try:
-        raw_text = read_pdf_text(pdf_path, pdf_config)
-        print(f"✅ Извлечено {len(raw_text)} символов из PDF")
-    except Exception as e:
-        raise GPTExtractionError(f"Ошибка при чтении PDF через pdf_reader: {e}")
+    Автоматически сохраняет JSON файл в папку архива:
+    - Если PDF находится в input_files/<архив>/raw/article.pdf,
+      то JSON будет сохранен в input_files/<архив>/json/article.json
     
-    # Шаг 2: Очищаем текст для LLM
-    print("\n🧹 Шаг 2: Очистка текста для LLM...")
-    cleaned_text = clean_pdf_text_for_llm(raw_text, min_repeats=3)
-    print(f"✅ Очищенный текст: {len(cleaned_text)} символов (было {len(raw_text)})")
+    Args:
+        pdf_path: Путь к PDF файлу
+        model: Модель GPT для использования (если None, берется из конфига)
+        temperature: Температура для генерации (если None, берется из конфига)
+        api_key: API ключ OpenAI (если None, берется из конфига или переменной окружения)
+        cache_dir: Директория для кэширования результатов (если None, берется из конфига)
+        use_word_reader: Использовать ли word_reader для извлечения текста (не используется для PDF)
+        config: Объект конфигурации (опционально)
+        json_output_dir: Директория для сохранения JSON (если None, используется input_files/<архив>/json)
+        
+    Returns:
+        Словарь с извлеченными метаданными
+    """
+    config, model, temperature, api_key, cache_dir = _resolve_pdf_gpt_settings(
+        config, model, temperature, api_key, cache_dir
+    )
+    
+    # Шаги 1-2: чтение текста из PDF и очистка для LLM
+    cleaned_text = read_pdf_text_for_llm(pdf_path, config)
     
     # Проверяем, включено ли использование GPT
     if config and not config.get("gpt_extraction.enabled", True):
@@ -563,54 +924,127 @@ def extract_metadata_from_pdf(
         metadata["file"] = pdf_path.name
         print(f"📄 Имя исходного файла добавлено в метаданные: {pdf_path.name}")
     
-    # Определяем путь для сохранения JSON
-    if json_output_dir is None:
-        # Если не указана директория, используем input_files/<архив>/json
-        if config:
-            try:
-                pdf_input_dir = config.get_path("directories.input_files")
-            except Exception:
-                pdf_input_dir = Path("input_files")
-        else:
-            pdf_input_dir = Path("input_files")
+    save_metadata_json(metadata, pdf_path, config, json_output_dir)
+    
+    return metadata
 
-        pdf_path_abs = pdf_path.resolve()
-        pdf_input_dir_abs = pdf_input_dir.resolve()
 
-        try:
-            pdf_relative = pdf_path_abs.relative_to(pdf_input_dir_abs)
-            # Ожидаем структуру input_files/<архив>/raw/<file>.pdf
-            parts = list(pdf_relative.parts)
-            archive_name = parts[0] if parts else ""
-            if archive_name:
-                output_folder = pdf_input_dir_abs / archive_name / "json"
-            else:
-                output_folder = pdf_input_dir_abs / "json"
-            output_folder.mkdir(parents=True, exist_ok=True)
-            json_filename = pdf_path.stem + ".json"
-            json_output_path = output_folder / json_filename
-        except ValueError:
-            # Если PDF не находится внутри input_files, сохраняем рядом с PDF
-            output_folder = pdf_path_abs.parent
-            json_filename = pdf_path.stem + ".json"
-            json_output_path = output_folder / json_filename
-    else:
-        # Используем указанную директорию
-        json_output_dir = Path(json_output_dir)
-        json_output_dir.mkdir(parents=True, exist_ok=True)
-        json_filename = pdf_path.stem + ".json"
-        json_output_path = json_output_dir / json_filename
+async def extract_metadata_from_pdf_async(
+    pdf_path: Path,
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    api_key: Optional[str] = None,
+    cache_dir: Optional[Path] = None,
+    config: Optional[Any] = None,
+    json_output_dir: Optional[Path] = None
+) -> Dict[str, Any]:
+    """
+    Асинхронный вариант extract_metadata_from_pdf: чтение PDF и запись JSON
+    выполняются в потоке (asyncio.to_thread), запрос к GPT — через AsyncOpenAI.
+    """
+    pdf_path = Path(pdf_path)
+    config, model, temperature, api_key, cache_dir = _resolve_pdf_gpt_settings(
+        config, model, temperature, api_key, cache_dir
+    )
     
-    # Сохраняем метаданные в JSON файл
-    json_output_path.write_text(
-        json.dumps(metadata, ensure_ascii=False, indent=2),
-        encoding='utf-8'
+    cleaned_text = await asyncio.to_thread(read_pdf_text_for_llm, pdf_path, config)
+    
+    if config and not config.get("gpt_extraction.enabled", True):
+        raise GPTExtractionError(
+            "Использование GPT для извлечения метаданных отключено в конфигурации. "
+            "Установите gpt_extraction.enabled = true для включения."
+        )
+    
+    metadata = await extract_metadata_with_gpt_async(
+        cleaned_text,
+        model=model,
+        temperature=temperature,
+        api_key=api_key,
+        cache_dir=cache_dir,
+        config=config
     )
-    print(f"💾 Метаданные сохранены: {json_output_path}")
+    if metadata is not None:
+        metadata["file"] = pdf_path.name
     
+    await asyncio.to_thread(save_metadata_json, metadata, pdf_path, config, json_output_dir)
     return metadata
 
 
+def default_llm_concurrency(config: Optional[Any] = None) -> int:
+    """Число одновременных запросов к LLM (gpt_extraction.max_concurrency)."""
+    if config is None:
+        try:
+            from config import get_config
+            config = get_config()
+        except Exception:
+            return 8
+    try:
+        return max(1, int(config.get("gpt_extraction.max_concurrency", 8)))
+    except (TypeError, ValueError):
+        return 8
+
+
+async def gather_limited(
+    factories: Iterable[Callable[[], Awaitable[T]]],
+    limit: int,
+    return_exceptions: bool = True
+) -> List[Union[T, BaseException]]:
+    """
+    Выполняет корутины (фабрики без аргументов), одновременно не больше limit.
+    Результаты — в порядке фабрик; при return_exceptions ошибки возвращаются
+    на месте результата, иначе первая ошибка пробрасывается.
+    """
+    semaphore = asyncio.Semaphore(max(1, int(limit)))
+
+    async def run(factory: Callable[[], Awaitable[T]]) -> T:
+        async with semaphore:
+            return await factory()
+
+    return await asyncio.gather(*(run(f) for f in factories), return_exceptions=return_exceptions)
+
+
+async def extract_metadata_from_pdfs_async(
+    pdf_paths: Iterable[Path],
+    concurrency: Optional[int] = None,
+    config: Optional[Any] = None,
+    json_output_dir: Optional[Path] = None,
+    **kwargs: Any
+) -> List[Union[Dict[str, Any], BaseException]]:
+    """
+    Обрабатывает N PDF одним потоком: не больше concurrency запросов к GPT
+    одновременно (по умолчанию gpt_extraction.max_concurrency).
+    
+    Returns:
+        Метаданные или исключение для каждого PDF (в порядке pdf_paths)
+    """
+    limit = concurrency or default_llm_concurrency(config)
+    return await gather_limited(
+        [
+            (lambda p=Path(p): extract_metadata_from_pdf_async(
+                p, config=config, json_output_dir=json_output_dir, **kwargs
+            ))
+            for p in pdf_paths
+        ],
+        limit,
+    )
+
+
+def run_llm_batch(coro: Awaitable[T]) -> T:
+    """
+    Запускает корутину в новом цикле событий из синхронного кода и закрывает
+    асинхронные клиенты LLM этого цикла по завершении.
+    """
+    from services.llm_clients import close_async_openai_clients
+
+    async def main() -> T:
+        try:
+            return await coro
+        finally:
+            await close_async_openai_clients()
+
+    return asyncio.run(main())
+
+
 if __name__ == "__main__":
     import argparse
     import sys
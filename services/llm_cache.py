@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Кэш ответов LLM в одном файле SQLite.
+
+Раньше кэш GPT был набором файлов <sha256 промпта>.json в
+gpt_extraction.cache_dir: без ограничения размера и срока жизни, без
+сведений о модели и версии промпта, а одновременная запись из нескольких
+воркеров могла оставить неполный файл. Хранилище:
+- атомарные записи (транзакции SQLite, журнал WAL — читатели не блокируются,
+  воркеры gunicorn разделяют один файл);
+- пространства имен "модель|версия промпта" (llm_cache.prompt_version):
+  смена модели или версии промптов не отдает старые ответы;
+- срок жизни записей (llm_cache.ttl_days);
+- бюджет размера (llm_cache.max_size_mb): при превышении удаляются давно
+  не использованные записи;
+- счетчики попаданий текущего процесса и суммарные по базе (get_llm_cache_stats).
+
+Файлы прежнего формата переносятся в базу при первом открытии (в
+пространство имен текущей модели) и удаляются.
+
+Ключ записи — canonical_cache_key: хэш нормализованного текста статьи
+(колонтитулы, мягкие переносы, пробелы) вместе с идентификатором шаблона
+промпта и моделью, поэтому повторная загрузка того же PDF после мелких
+изменений извлечения текста попадает в кэш. Для каждой записи хранится
+SimHash текста (TextFingerprint): find_similar находит ответ для слегка
+измененной статьи (llm_cache.near_duplicate).
+
+Использование:
+    cache = get_llm_cache(cache_dir)
+    namespace = cache_namespace(model)
+    normalized = normalize_cache_text(text)
+    key = canonical_cache_key(normalized, template_id, model)
+    value = cache.get(namespace, key)
+    if value is None:
+        cache.set(namespace, key, value, fingerprint=TextFingerprint.of(normalized, template_id))
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+
+DB_FILE_NAME = "llm_cache.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    expires_at REAL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    template TEXT NOT NULL,
+    simhash INTEGER NOT NULL,
+    text_len INTEGER NOT NULL,
+    b0 INTEGER NOT NULL,
+    b1 INTEGER NOT NULL,
+    b2 INTEGER NOT NULL,
+    b3 INTEGER NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS fingerprints_b0 ON fingerprints (namespace, template, b0);
+CREATE INDEX IF NOT EXISTS fingerprints_b1 ON fingerprints (namespace, template, b1);
+CREATE INDEX IF NOT EXISTS fingerprints_b2 ON fingerprints (namespace, template, b2);
+CREATE INDEX IF NOT EXISTS fingerprints_b3 ON fingerprints (namespace, template, b3);
+CREATE TRIGGER IF NOT EXISTS entries_delete_fingerprint AFTER DELETE ON entries BEGIN
+    DELETE FROM fingerprints WHERE namespace = old.namespace AND key = old.key;
+END;
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+@dataclass(frozen=True)
+class LLMCacheConfig:
+    """Настройки кэша ответов LLM."""
+    cache_dir: Path = Path("gpt_cache")
+    max_size_mb: float = 256.0  # Бюджет размера ответов в базе
+    ttl_days: float = 90.0  # Срок жизни записи (0 — без срока)
+    prompt_version: str = "1"  # Версия промптов (часть пространства имен)
+    migrate_json: bool = True  # Перенести файлы <хэш>.json прежнего формата
+    near_duplicate: bool = False  # Искать ответ для почти совпадающего текста (SimHash)
+    near_max_distance: int = 3  # Максимум различающихся бит SimHash из 64
+    near_max_length_delta: float = 0.05  # Максимальная относительная разница длины текста
+
+    @property
+    def db_path(self) -> Path:
+        return Path(self.cache_dir) / DB_FILE_NAME
+
+
+def load_cache_config(cache_dir: Optional[Union[str, Path]] = None) -> LLMCacheConfig:
+    """
+    Читает настройки из config.py (секция llm_cache). Каталог — cache_dir
+    или gpt_extraction.cache_dir.
+    """
+    try:
+        from config import get_config
+        cfg = get_config()
+        if cache_dir is None:
+            cache_dir = cfg.get_path("gpt_extraction.cache_dir")
+        return LLMCacheConfig(
+            cache_dir=Path(cache_dir),
+            max_size_mb=float(cfg.get("llm_cache.max_size_mb", 256)),
+            ttl_days=float(cfg.get("llm_cache.ttl_days", 90)),
+            prompt_version=str(cfg.get("llm_cache.prompt_version", "1") or "1"),
+            migrate_json=bool(cfg.get("llm_cache.migrate_json", True)),
+            near_duplicate=bool(cfg.get("llm_cache.near_duplicate", False)),
+            near_max_distance=int(cfg.get("llm_cache.near_max_distance", 3)),
+            near_max_length_delta=float(cfg.get("llm_cache.near_max_length_delta", 0.05)),
+        )
+    except (ImportError, KeyError, TypeError, ValueError):
+        return LLMCacheConfig(cache_dir=Path(cache_dir or "gpt_cache"))
+
+
+def cache_namespace(model: str, prompt_version: Optional[str] = None) -> str:
+    """Пространство имен записей: модель и версия промптов."""
+    if prompt_version is None:
+        prompt_version = load_cache_config().prompt_version
+    return f"{model or ''}|{prompt_version}"
+
+
+# =========================
+# Canonical keys & fingerprints
+# =========================
+
+_RE_INVISIBLE = re.compile(r"[\u00AD\u200B-\u200F\u2060\uFEFF]")
+_RE_WORD_BREAK = re.compile(r"(\w)-[ \t]*\n\s*(\w)")
+_RE_WORD = re.compile(r"\w+")
+
+# Слов в шингле SimHash
+_SHINGLE_WORDS = 3
+
+
+def normalize_cache_text(text: str) -> str:
+    """
+    Текст для ключа кэша: без колонтитулов (clean_pdf_text_for_llm), мягких
+    переносов и невидимых символов, с восстановленными переносами слов и
+    схлопнутыми пробелами. В LLM по-прежнему уходит исходный текст.
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    text = _RE_INVISIBLE.sub("", text)
+    try:
+        from text_utils import clean_pdf_text_for_llm
+        text = clean_pdf_text_for_llm(text, min_repeats=3)
+    except ImportError:
+        pass
+    text = _RE_WORD_BREAK.sub(r"\1\2", text)
+    return " ".join(text.split())
+
+
+def canonical_cache_key(normalized_text: str, template_id: str, model: str) -> str:
+    """Ключ записи: SHA-256 модели, шаблона промпта и нормализованного текста."""
+    h = hashlib.sha256()
+    for part in (model or "", template_id or "", normalized_text or ""):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def simhash64(text: str) -> int:
+    """SimHash (64 бита) по шинглам из трех слов текста в нижнем регистре."""
+    words = _RE_WORD.findall((text or "").lower())
+    if len(words) >= _SHINGLE_WORDS:
+        shingles = [" ".join(words[i:i + _SHINGLE_WORDS]) for i in range(len(words) - _SHINGLE_WORDS + 1)]
+    else:
+        shingles = [" ".join(words)] if words else []
+    if not shingles:
+        return 0
+    digests = b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)
+    # Бит результата = 1, если в большинстве шинглов этот бит равен 1
+    majority = (bits.sum(axis=0) * 2 > len(shingles)).astype(np.uint8)
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+
+def _to_signed64(value: int) -> int:
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+@dataclass(frozen=True)
+class TextFingerprint:
+    """Отпечаток текста записи для поиска почти совпадающих статей."""
+    template: str
+    simhash: int
+    length: int
+
+    @classmethod
+    def of(cls, normalized_text: str, template_id: str) -> "TextFingerprint":
+        return cls(template=template_id, simhash=simhash64(normalized_text), length=len(normalized_text))
+
+    @property
+    def bands(self) -> List[int]:
+        # Четыре полосы по 16 бит: при расстоянии <= 3 хотя бы одна совпадает
+        return [(self.simhash >> (16 * i)) & 0xFFFF for i in range(4)]
+
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {
+    "hits": 0, "near_hits": 0, "misses": 0, "expired": 0, "writes": 0, "evicted": 0, "errors": 0,
+}
+
+
+def _count(name: str, value: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] = _stats.get(name, 0) + value
+
+
+class LLMCache:
+    """Кэш в файле SQLite; соединения — по одному на поток."""
+
+    def __init__(self, config: LLMCacheConfig):
+        self.config = config
+        self.path = config.db_path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    # --- connection ---
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Транзакции управляются явно (BEGIN IMMEDIATE), ожидание блокировки
+        # другим воркером — до 30 с
+        conn = sqlite3.connect(str(self.path), timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._init_lock:
+            if not self._initialized:
+                conn.executescript(_SCHEMA)
+                if self.config.migrate_json:
+                    self._migrate_json_files(conn)
+                self._initialized = True
+        self._local.conn = conn
+        return conn
+
+    def _expires_at(self, now: float) -> Optional[float]:
+        return now + self.config.ttl_days * 86400 if self.config.ttl_days > 0 else None
+
+    # --- API ---
+
+    def get(self, namespace: str, key: str, count: bool = True) -> Optional[Any]:
+        """
+        Значение записи или None (нет, истек срок или ошибка базы).
+        count=False — повторный поиск для того же запроса, без счетчиков
+        попаданий и промахов.
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                if count:
+                    _count("misses")
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+                _count("expired")
+                if count:
+                    _count("misses")
+                return None
+            conn.execute(
+                "UPDATE entries SET accessed_at = ?, hits = hits + 1 WHERE namespace = ? AND key = ?",
+                (now, namespace, key),
+            )
+            data = json.loads(value)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"WARNING: Кэш LLM недоступен: {e}")
+            _count("errors")
+            return None
+        if count:
+            _count("hits")
+        return data
+
+    def set(
+        self,
+        namespace: str,
+        key: str,
+        value: Any,
+        fingerprint: Optional[TextFingerprint] = None,
+    ) -> None:
+        """Записывает значение (атомарно) и укладывает базу в бюджет размера."""
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries "
+                    "(namespace, key, value, size, created_at, accessed_at, expires_at, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                    (namespace, key, payload, len(payload.encode("utf-8")), now, now, self._expires_at(now)),
+                )
+                if fingerprint is not None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO fingerprints "
+                        "(namespace, key, template, simhash, text_len, b0, b1, b2, b3) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (namespace, key, fingerprint.template, _to_signed64(fingerprint.simhash),
+                         fingerprint.length, *fingerprint.bands),
+                    )
+                evicted = self._enforce_budget_locked(conn, now)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"WARNING: Не удалось записать кэш LLM: {e}")
+            _count("errors")
+            return
+        _count("writes")
+        if evicted:
+            _count("evicted", evicted)
+
+    def find_similar(
+        self,
+        namespace: str,
+        fingerprint: TextFingerprint,
+    ) -> Optional[Tuple[str, Any, int]]:
+        """
+        Запись того же шаблона с почти совпадающим текстом: SimHash отличается
+        не больше чем на near_max_distance бит, длина — не больше чем на
+        near_max_length_delta. Returns: (ключ, значение, расстояние) или None.
+        """
+        if not self.config.near_duplicate or not fingerprint.length:
+            return None
+        now = time.time()
+        b0, b1, b2, b3 = fingerprint.bands
+        try:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT f.key, f.simhash, f.text_len FROM fingerprints f "
+                "JOIN entries e ON e.namespace = f.namespace AND e.key = f.key "
+                "WHERE f.namespace = ? AND f.template = ? "
+                "AND (f.b0 = ? OR f.b1 = ? OR f.b2 = ? OR f.b3 = ?) "
+                "AND (e.expires_at IS NULL OR e.expires_at > ?)",
+                (namespace, fingerprint.template, b0, b1, b2, b3, now),
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"WARNING: Кэш LLM недоступен: {e}")
+            _count("errors")
+            return None
+
+        best: Optional[Tuple[int, str]] = None
+        for key, simhash, text_len in rows:
+            if abs(text_len - fingerprint.length) > self.config.near_max_length_delta * fingerprint.length:
+                continue
+            distance = bin(_to_unsigned64(simhash) ^ fingerprint.simhash).count("1")
+            if distance <= self.config.near_max_distance and (best is None or distance < best[0]):
+                best = (distance, key)
+        if best is None:
+            return None
+        value = self.get(namespace, best[1], count=False)
+        if value is None:
+            return None
+        _count("near_hits")
+        return best[1], value, best[0]
+
+    def _enforce_budget_locked(self, conn: sqlite3.Connection, now: float) -> int:
+        """Удаляет истекшие записи и давно не использованные сверх 90% бюджета."""
+        removed = conn.execute(
+            "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        ).rowcount
+        budget = int(self.config.max_size_mb * 1024 * 1024)
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= budget:
+            return removed
+        target = int(budget * 0.9)
+        rows = conn.execute("SELECT namespace, key, size FROM entries ORDER BY accessed_at").fetchall()
+        for namespace, key, size in rows:
+            if total <= target:
+                break
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        """Удаляет записи (все или одного пространства имен)."""
+        conn = self._connect()
+        if namespace is None:
+            return conn.execute("DELETE FROM entries").rowcount
+        return conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,)).rowcount
+
+    def db_stats(self) -> Dict[str, Any]:
+        """Записи, размер и попадания по пространствам имен (по всей базе)."""
+        conn = self._connect()
+        namespaces = {
+            namespace: {"entries": entries, "bytes": size, "hits": hits}
+            for namespace, entries, size, hits in conn.execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) "
+                "FROM entries GROUP BY namespace"
+            )
+        }
+        return {
+            "path": str(self.path),
+            "entries": sum(n["entries"] for n in namespaces.values()),
+            "bytes": sum(n["bytes"] for n in namespaces.values()),
+            "max_bytes": int(self.config.max_size_mb * 1024 * 1024),
+            "namespaces": namespaces,
+        }
+
+    # --- migration ---
+
+    def _migrate_json_files(self, conn: sqlite3.Connection) -> None:
+        """
+        Переносит <sha256>.json прежнего кэша в пространство имен текущей
+        модели (прежний кэш не различал модели) и удаляет перенесенные файлы.
+        """
+        cache_dir = Path(self.config.cache_dir)
+        files = [p for p in cache_dir.glob("*.json") if len(p.stem) == 64]
+        if not files:
+            return
+        try:
+            from config import get_config
+            model = get_config().get("gpt_extraction.model", "gpt-4o-mini")
+        except Exception:
+            model = "gpt-4o-mini"
+        namespace = cache_namespace(model, self.config.prompt_version)
+
+        migrated = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for path in files:
+                try:
+                    value = json.loads(path.read_text(encoding="utf-8"))
+                    mtime = path.stat().st_mtime
+                except (OSError, ValueError):
+                    continue  # неполный или поврежденный файл не переносим
+                payload = json.dumps(value, ensure_ascii=False)
+                conn.execute(
+                    "INSERT OR IGNORE INTO entries "
+                    "(namespace, key, value, size, created_at, accessed_at, expires_at, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                    (namespace, path.stem, payload, len(payload.encode("utf-8")), mtime, mtime,
+                     self._expires_at(mtime)),
+                )
+                migrated.append(path)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        for path in migrated:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        print(f"DEBUG: Кэш LLM: перенесено {len(migrated)} из {len(files)} файлов в {self.path.name}")
+
+
+_caches: Dict[Path, LLMCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_llm_cache(
+    cache_dir: Optional[Union[str, Path]] = None,
+    config: Optional[LLMCacheConfig] = None,
+) -> LLMCache:
+    """Кэш для каталога (один объект на файл базы в процессе)."""
+    config = config or load_cache_config(cache_dir)
+    path = config.db_path.resolve()
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = LLMCache(config)
+            _caches[path] = cache
+        return cache
+
+
+def get_llm_cache_stats(cache_dir: Optional[Union[str, Path]] = None) -> Dict[str, Any]:
+    """Счетчики текущего процесса (с долей попаданий) и сводка по базе."""
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_stats)
+    # Поиск почти совпадающего текста идет после промаха по ключу: near_hits
+    # входят в misses, но экономят запрос к LLM так же, как hits
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["hits"] + stats["near_hits"]) / lookups, 4) if lookups else None
+    try:
+        stats["db"] = get_llm_cache(cache_dir).db_stats()
+    except sqlite3.Error as e:
+        stats["db"] = {"error": str(e)}
+    return stats
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Общие клиенты OpenAI-совместимых API (OpenAI, Mistral) внутри процесса.
+
+Раньше каждый запрос к LLM создавал новый httpx.Client и OpenAI и не закрывал
+их: каждый запрос платил за TCP+TLS рукопожатие, а пулы соединений утекали.
+Реестр держит один клиент на ключ (api_key, base_url, timeout) с keep-alive
+соединениями, HTTP/2 (если установлен пакет h2) и ограничениями пула из
+config.py (секция llm_clients). Клиенты закрываются при выходе процесса
+(atexit и хук worker_exit в gunicorn.conf.py).
+
+Асинхронные клиенты (AsyncOpenAI) используют те же настройки; они привязаны
+к циклу событий, поэтому хранятся отдельно для каждого цикла и закрываются
+через close_async_openai_clients() перед его завершением.
+
+Использование:
+    client = get_openai_client(api_key, base_url=None, timeout=180.0)
+    response = client.chat.completions.create(...)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import importlib.util
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from openai import AsyncOpenAI, OpenAI
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+try:
+    import httpx  # type: ignore
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+H2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+@dataclass(frozen=True)
+class LLMClientConfig:
+    """Настройки HTTP-клиентов LLM."""
+    max_connections: int = 20  # Соединений на клиент
+    max_keepalive_connections: int = 10  # Из них держать открытыми между запросами
+    keepalive_expiry_sec: float = 30.0  # Закрывать простаивающие соединения через, сек
+    connect_timeout_sec: float = 10.0
+    http2: bool = True  # HTTP/2, если установлен пакет h2
+    max_retries: int = 2
+
+
+def load_client_config() -> LLMClientConfig:
+    """Читает настройки из config.py (секция llm_clients)."""
+    try:
+        from config import get_config
+        cfg = get_config()
+        return LLMClientConfig(
+            max_connections=int(cfg.get("llm_clients.max_connections", 20)),
+            max_keepalive_connections=int(cfg.get("llm_clients.max_keepalive_connections", 10)),
+            keepalive_expiry_sec=float(cfg.get("llm_clients.keepalive_expiry_sec", 30)),
+            connect_timeout_sec=float(cfg.get("llm_clients.connect_timeout_sec", 10)),
+            http2=bool(cfg.get("llm_clients.http2", True)),
+            max_retries=int(cfg.get("llm_clients.max_retries", 2)),
+        )
+    except (ImportError, TypeError, ValueError):
+        return LLMClientConfig()
+
+
+# (api_key, base_url, timeout)
+ClientKey = Tuple[str, str, float]
+
+
+def _client_key(api_key: str, base_url: Optional[str], timeout: float) -> ClientKey:
+    return (api_key or "", (base_url or "").rstrip("/"), float(timeout))
+
+
+def _http_client_kwargs(timeout: float, config: LLMClientConfig) -> Dict[str, Any]:
+    return {
+        "timeout": httpx.Timeout(timeout, connect=min(config.connect_timeout_sec, timeout)),
+        "limits": httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry_sec,
+        ),
+        "http2": config.http2 and H2_AVAILABLE,
+    }
+
+
+def _client_kwargs(key: ClientKey, config: LLMClientConfig) -> Dict[str, Any]:
+    api_key, base_url, timeout = key
+    kwargs: Dict[str, Any] = {"api_key": api_key, "max_retries": config.max_retries}
+    if base_url:
+        kwargs["base_url"] = base_url
+    if not HTTPX_AVAILABLE:
+        # Без httpx клиент SDK создает свой пул; он тоже переиспользуется реестром
+        kwargs["timeout"] = timeout
+    return kwargs
+
+
+def _close_quietly(client: Any) -> None:
+    try:
+        client.close()
+    except Exception:
+        pass
+
+
+class LLMClientRegistry:
+    """Синхронные клиенты процесса: один на ключ (api_key, base_url, timeout)."""
+
+    def __init__(self, config: Optional[LLMClientConfig] = None):
+        self.config = config or load_client_config()
+        self._lock = threading.Lock()
+        self._clients: Dict[ClientKey, Any] = {}
+        self._created = 0
+
+    def get(self, api_key: str, base_url: Optional[str] = None, timeout: float = 180.0) -> Any:
+        if not OPENAI_AVAILABLE:
+            raise ImportError("Библиотека openai не установлена. Установите её: pip install openai")
+        key = _client_key(api_key, base_url, timeout)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                kwargs = _client_kwargs(key, self.config)
+                if HTTPX_AVAILABLE:
+                    kwargs["http_client"] = httpx.Client(**_http_client_kwargs(key[2], self.config))
+                client = OpenAI(**kwargs)
+                self._clients[key] = client
+                self._created += 1
+            return client
+
+    def close(self) -> None:
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            _close_quietly(client)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "created": self._created,
+                "http2": self.config.http2 and H2_AVAILABLE,
+            }
+
+
+_registry: Optional[LLMClientRegistry] = None
+_registry_lock = threading.Lock()
+
+# Асинхронные клиенты: цикл событий -> {ключ: AsyncOpenAI}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[ClientKey, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+_async_lock = threading.Lock()
+
+
+def get_client_registry() -> LLMClientRegistry:
+    """Реестр текущего процесса (создается при первом обращении)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = LLMClientRegistry()
+        return _registry
+
+
+def get_openai_client(api_key: str, base_url: Optional[str] = None, timeout: float = 180.0) -> Any:
+    """Общий OpenAI клиент для ключа, base_url и таймаута."""
+    return get_client_registry().get(api_key, base_url, timeout)
+
+
+def get_async_openai_client(api_key: str, base_url: Optional[str] = None, timeout: float = 180.0) -> Any:
+    """
+    Общий AsyncOpenAI клиент текущего цикла событий (настройки — как у
+    синхронных клиентов). Вызывается изнутри корутины.
+    """
+    if not OPENAI_AVAILABLE:
+        raise ImportError("Библиотека openai не установлена. Установите её: pip install openai")
+    loop = asyncio.get_running_loop()
+    config = get_client_registry().config
+    key = _client_key(api_key, base_url, timeout)
+    with _async_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            kwargs = _client_kwargs(key, config)
+            if HTTPX_AVAILABLE:
+                kwargs["http_client"] = httpx.AsyncClient(**_http_client_kwargs(key[2], config))
+            client = AsyncOpenAI(**kwargs)
+            clients[key] = client
+        return client
+
+
+async def close_async_openai_clients() -> None:
+    """Закрывает асинхронные клиенты текущего цикла событий."""
+    loop = asyncio.get_running_loop()
+    with _async_lock:
+        clients = _async_clients.pop(loop, {})
+    for client in clients.values():
+        try:
+            await client.close()
+        except Exception:
+            pass
+
+
+def close_openai_clients() -> None:
+    """Закрывает синхронные клиенты процесса (при выходе воркера)."""
+    with _registry_lock:
+        registry = _registry
+    if registry is not None:
+        registry.close()
+
+
+def get_client_stats() -> Dict[str, Any]:
+    """Счетчики клиентов текущего процесса (ключи API не раскрываются)."""
+    stats = get_client_registry().stats()
+    with _async_lock:
+        stats["async_loops"] = len(_async_clients)
+    return stats
+
+
+atexit.register(close_openai_clients)
@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Общий для воркеров ограничитель частоты запросов к LLM (token bucket).
+
+Воркеры gunicorn (WEB_CONCURRENCY) и фоновые потоки обращались к
+OpenAI/Mistral, не зная о запросах друг друга: под нагрузкой API отвечал
+429, а повторы клиента (max_retries) только умножали такие ответы. Теперь
+перед каждым запросом вызывающий берет из общих корзин:
+- RPM — один запрос;
+- TPM — оценку токенов запроса (промпт + ожидаемый ответ); после ответа
+  оценка заменяется фактическим usage.total_tokens.
+
+Корзины хранятся в одном файле SQLite (llm_rate_limit.state_file, журнал
+WAL) для каждой пары провайдер|модель; лимиты — llm_rate_limit.limits
+(0 — без ограничения). Ответ 429 закрывает корзину для всех воркеров на
+время из заголовков retry-after-ms / retry-after (без заголовка —
+экспоненциальная пауза). Повторы при 429, 5xx и ошибках соединения
+выполняет call_with_rate_limit — каждый снова через ограничитель, а
+собственные повторы клиента для этого вызова отключаются. После корзины
+запрос получает место в очереди процесса (services.llm_scheduler):
+ожидание корзины не занимает место, нужное интерактивным запросам.
+
+Использование:
+    response = call_with_rate_limit(
+        "openai", model, estimate_tokens(prompt),
+        lambda retries: with_client_retries(client, retries).chat.completions.create(...),
+    )
+"""
+
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+try:
+    import openai
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+from services.llm_scheduler import BATCH, LLMScheduler, current_priority, get_llm_scheduler
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    bucket TEXT PRIMARY KEY,
+    requests REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0,
+    penalties INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Максимальная пауза между проверками корзины, сек
+_MAX_SLEEP_SEC = 5.0
+
+
+def _default_limits() -> Dict[str, Dict[str, Dict[str, int]]]:
+    return {
+        "openai": {"*": {"rpm": 500, "tpm": 200000}},
+        "mistral": {"*": {"rpm": 60, "tpm": 500000}},
+    }
+
+
+@dataclass(frozen=True)
+class RateLimitConfig:
+    """Настройки ограничителя."""
+    enabled: bool = True
+    state_file: Path = Path("gpt_cache") / "llm_rate_limit.sqlite3"
+    # провайдер -> модель ("*" — остальные модели) -> {"rpm": ..., "tpm": ...}
+    limits: Dict[str, Dict[str, Dict[str, int]]] = field(default_factory=_default_limits)
+    max_wait_sec: float = 300.0  # Максимальное ожидание корзины (затем запрос уходит без нее)
+    completion_tokens: int = 1500  # Ожидаемый размер ответа для оценки TPM
+    max_retries: int = 3  # Повторов при 429, 5xx и ошибках соединения
+    backoff_sec: float = 2.0  # Начальная пауза без заголовка retry-after (удваивается)
+    max_backoff_sec: float = 60.0
+
+
+def load_rate_limit_config() -> RateLimitConfig:
+    """Читает настройки из config.py (секция llm_rate_limit)."""
+    try:
+        from config import get_config
+        cfg = get_config()
+        limits = cfg.get("llm_rate_limit.limits")
+        return RateLimitConfig(
+            enabled=bool(cfg.get("llm_rate_limit.enabled", True)),
+            state_file=cfg.get_path("llm_rate_limit.state_file"),
+            limits=dict(limits) if isinstance(limits, dict) else _default_limits(),
+            max_wait_sec=float(cfg.get("llm_rate_limit.max_wait_sec", 300)),
+            completion_tokens=int(cfg.get("llm_rate_limit.completion_tokens", 1500)),
+            max_retries=max(0, int(cfg.get("llm_rate_limit.max_retries", 3))),
+            backoff_sec=float(cfg.get("llm_rate_limit.backoff_sec", 2)),
+            max_backoff_sec=float(cfg.get("llm_rate_limit.max_backoff_sec", 60)),
+        )
+    except (ImportError, KeyError, TypeError, ValueError):
+        return RateLimitConfig()
+
+
+def provider_for(base_url: Optional[str]) -> str:
+    """Провайдер по base_url клиента: openai, mistral или имя хоста."""
+    if not base_url:
+        return "openai"
+    host = base_url.split("://", 1)[-1].split("/", 1)[0].lower()
+    if "mistral" in host:
+        return "mistral"
+    if host.endswith("openai.com"):
+        return "openai"
+    return host
+
+
+def client_provider(client: Any) -> str:
+    """Провайдер по base_url клиента OpenAI SDK (в том числе заданному через OPENAI_BASE_URL)."""
+    base_url = getattr(client, "base_url", None)
+    return provider_for(str(base_url) if base_url else None)
+
+
+def estimate_tokens(text: str) -> int:
+    """Токены текста для лимита TPM (services.token_budget: tiktoken или оценка по символам)."""
+    from services.token_budget import count_tokens
+
+    return count_tokens(text or "") + 1
+
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, float] = {"acquired": 0, "waits": 0, "wait_sec": 0.0, "throttled": 0, "retries": 0, "errors": 0}
+
+
+def _count(name: str, value: float = 1) -> None:
+    with _stats_lock:
+        _stats[name] = _stats.get(name, 0) + value
+
+
+class RateLimiter:
+    """Корзины в файле SQLite; соединения — по одному на поток."""
+
+    def __init__(self, config: RateLimitConfig):
+        self.config = config
+        self.path = Path(config.state_file)
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._init_lock:
+            if not self._initialized:
+                conn.executescript(_SCHEMA)
+                self._initialized = True
+        self._local.conn = conn
+        return conn
+
+    def limits_for(self, provider: str, model: str) -> Tuple[int, int]:
+        """(RPM, TPM) для провайдера и модели; 0 — без ограничения."""
+        models = self.config.limits.get(provider) or {}
+        limits = models.get(model) or models.get("*") or {}
+        return int(limits.get("rpm", 0) or 0), int(limits.get("tpm", 0) or 0)
+
+    def _try_take(self, provider: str, model: str, tokens: int, reserve: float = 0.0) -> float:
+        """
+        Берет запрос и токены из корзины, оставляя в ней долю reserve (запас
+        для интерактивных запросов). Returns: 0 — взято, иначе сколько ждать, сек.
+        """
+        rpm, tpm = self.limits_for(provider, model)
+        if not rpm and not tpm:
+            return 0.0
+        # Запрос больше емкости корзины ждал бы вечно
+        tokens = min(tokens, tpm * (1 - reserve)) if tpm else 0
+        keep_requests = rpm * reserve
+        keep_tokens = tpm * reserve
+        bucket = f"{provider}|{model}"
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT requests, tokens, updated_at, blocked_until FROM buckets WHERE bucket = ?", (bucket,)
+            ).fetchone()
+            if row is None:
+                requests_left, tokens_left, updated_at, blocked_until = float(rpm), float(tpm), now, 0.0
+            else:
+                requests_left, tokens_left, updated_at, blocked_until = row
+            # Пополнение: лимит в минуту, не больше емкости корзины
+            elapsed = max(0.0, now - updated_at)
+            if rpm:
+                requests_left = min(float(rpm), requests_left + elapsed * rpm / 60.0)
+            if tpm:
+                tokens_left = min(float(tpm), tokens_left + elapsed * tpm / 60.0)
+
+            wait = 0.0
+            if blocked_until > now:
+                wait = blocked_until - now
+            else:
+                if rpm and requests_left - keep_requests < 1:
+                    wait = max(wait, (1 + keep_requests - requests_left) * 60.0 / rpm)
+                if tpm and tokens_left - keep_tokens < tokens:
+                    wait = max(wait, (tokens + keep_tokens - tokens_left) * 60.0 / tpm)
+            if wait <= 0:
+                if rpm:
+                    requests_left -= 1
+                tokens_left -= tokens
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (bucket, requests, tokens, updated_at, blocked_until, penalties) "
+                "VALUES (?, ?, ?, ?, ?, COALESCE((SELECT penalties FROM buckets WHERE bucket = ?), 0))",
+                (bucket, requests_left, tokens_left, now, blocked_until, bucket),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def _take(self, provider: str, model: str, tokens: int, reserve: float) -> Optional[float]:
+        """_try_take; None — файл корзин недоступен (запрос идет без ограничителя)."""
+        try:
+            return self._try_take(provider, model, tokens, reserve)
+        except sqlite3.Error as e:
+            print(f"WARNING: Ограничитель запросов LLM недоступен: {e}")
+            _count("errors")
+            return None
+
+    def _next_sleep(
+        self, provider: str, model: str, wait: Optional[float], started: float, first: bool
+    ) -> Optional[float]:
+        """
+        Пауза перед следующей попыткой взять из корзины (общая для sync и
+        async); None — больше не ждать: взято, ограничитель недоступен или
+        ожидание превысило max_wait_sec.
+        """
+        if wait is None:
+            return None
+        if wait <= 0:
+            _count("acquired")
+            return None
+        waited = time.monotonic() - started
+        if waited + wait > self.config.max_wait_sec:
+            print(
+                f"WARNING: Ожидание лимита {provider}|{model} превысило "
+                f"{self.config.max_wait_sec:g} с, запрос отправляется без него"
+            )
+            _count("errors")
+            return None
+        if first:
+            _count("waits")
+            print(f"DEBUG: Лимит запросов {provider}|{model}: ожидание {wait:.1f} с")
+        step = min(wait, _MAX_SLEEP_SEC)
+        _count("wait_sec", step)
+        return step
+
+    def acquire(self, provider: str, model: str, tokens: int, reserve: float = 0.0) -> None:
+        """Ждет, пока в корзинах есть запрос и tokens токенов (сверх доли reserve), и берет их."""
+        if not self.config.enabled:
+            return
+        started = time.monotonic()
+        first = True
+        while True:
+            wait = self._take(provider, model, tokens, reserve)
+            step = self._next_sleep(provider, model, wait, started, first)
+            if step is None:
+                return
+            first = False
+            time.sleep(step)
+
+    async def acquire_async(self, provider: str, model: str, tokens: int, reserve: float = 0.0) -> None:
+        """
+        Асинхронный вариант acquire: транзакция SQLite (BEGIN IMMEDIATE может
+        ждать блокировку до 30 с) выполняется в потоке, ожидание — asyncio.sleep.
+        """
+        if not self.config.enabled:
+            return
+        started = time.monotonic()
+        first = True
+        while True:
+            wait = await asyncio.to_thread(self._take, provider, model, tokens, reserve)
+            step = self._next_sleep(provider, model, wait, started, first)
+            if step is None:
+                return
+            first = False
+            await asyncio.sleep(step)
+
+    def settle(self, provider: str, model: str, reserved: int, actual: int) -> None:
+        """Заменяет оценку токенов запроса фактическим расходом."""
+        _, tpm = self.limits_for(provider, model)
+        if not self.config.enabled or not tpm or actual <= 0:
+            return
+        delta = min(reserved, tpm) - actual
+        if not delta:
+            return
+        try:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE buckets SET tokens = MIN(?, tokens + ?) WHERE bucket = ?",
+                (float(tpm), float(delta), f"{provider}|{model}"),
+            )
+        except sqlite3.Error as e:
+            print(f"WARNING: Ограничитель запросов LLM недоступен: {e}")
+            _count("errors")
+
+    def penalize(self, provider: str, model: str, delay: float) -> None:
+        """Закрывает корзину для всех воркеров на delay секунд (ответ 429)."""
+        if not self.config.enabled or delay <= 0:
+            return
+        _count("throttled")
+        until = time.time() + delay
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO buckets (bucket, requests, tokens, updated_at, blocked_until, penalties) "
+                "VALUES (?, 0, 0, ?, ?, 1) "
+                "ON CONFLICT(bucket) DO UPDATE SET blocked_until = MAX(blocked_until, excluded.blocked_until), "
+                "penalties = penalties + 1",
+                (f"{provider}|{model}", time.time(), until),
+            )
+        except sqlite3.Error as e:
+            print(f"WARNING: Ограничитель запросов LLM недоступен: {e}")
+            _count("errors")
+
+    def reset_penalties(self, provider: str, model: str) -> None:
+        try:
+            self._connect().execute(
+                "UPDATE buckets SET penalties = 0 WHERE bucket = ? AND penalties > 0", (f"{provider}|{model}",)
+            )
+        except sqlite3.Error:
+            pass
+
+    def penalties(self, provider: str, model: str) -> int:
+        """Число 429 подряд (для экспоненциальной паузы без retry-after)."""
+        try:
+            row = self._connect().execute(
+                "SELECT penalties FROM buckets WHERE bucket = ?", (f"{provider}|{model}",)
+            ).fetchone()
+        except sqlite3.Error:
+            return 0
+        return int(row[0]) if row else 0
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Ограничитель текущего процесса (создается при первом обращении)."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(load_rate_limit_config())
+        return _limiter
+
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    """Счетчики текущего процесса: ожидания, 429, повторы."""
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_stats)
+    stats["wait_sec"] = round(stats["wait_sec"], 1)
+    return stats
+
+
+# =========================
+# Calls with retries
+# =========================
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Пауза из заголовков ответа retry-after-ms / retry-after (None — нет)."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def with_client_retries(client: Any, retries: Optional[int]) -> Any:
+    """Клиент с max_retries для одного вызова (None — без изменений)."""
+    return client if retries is None else client.with_options(max_retries=retries)
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _is_connection_error(error: BaseException) -> bool:
+    return OPENAI_AVAILABLE and isinstance(error, openai.APIConnectionError)
+
+
+def _usage_tokens(response: Any) -> int:
+    usage = getattr(response, "usage", None)
+    return int(getattr(usage, "total_tokens", 0) or 0)
+
+
+def _retry_delay(
+    limiter: RateLimiter, provider: str, model: str, error: BaseException, attempt: int
+) -> Optional[float]:
+    """
+    Пауза перед повтором или None (ошибку не повторяем). 429 закрывает
+    корзину для всех воркеров; 5xx и ошибки соединения ждут только здесь.
+    """
+    config = limiter.config
+    if attempt >= config.max_retries:
+        return None
+    status = _status_code(error)
+    if status == 429:
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = config.backoff_sec * (2 ** min(limiter.penalties(provider, model), 10))
+        delay = min(delay, config.max_backoff_sec)
+        limiter.penalize(provider, model, delay)
+        # Пауза — в корзине: повтор снова проходит через acquire
+        return 0.0
+    if (status is not None and status >= 500) or _is_connection_error(error):
+        delay = config.backoff_sec * (2 ** attempt)
+        return min(delay, config.max_backoff_sec) * random.uniform(0.5, 1.0)
+    return None
+
+
+def _settle_response(limiter: RateLimiter, provider: str, model: str, reserved: int, response: Any) -> None:
+    """Успешный ответ: сброс счетчика 429 и фактический расход токенов."""
+    limiter.reset_penalties(provider, model)
+    limiter.settle(provider, model, reserved, _usage_tokens(response))
+
+
+def _bucket_reserve(scheduler: LLMScheduler, priority: str) -> float:
+    """Доля корзины, которую пакетные запросы оставляют интерактивным."""
+    return scheduler.config.batch_bucket_reserve if priority == BATCH else 0.0
+
+
+def call_with_rate_limit(
+    provider: str,
+    model: str,
+    tokens: int,
+    call: Callable[[Optional[int]], Any],
+) -> Any:
+    """
+    Выполняет запрос к LLM через ограничитель.
+
+    Args:
+        provider: Провайдер (provider_for(base_url) или client_provider(client))
+        model: Модель
+        tokens: Оценка токенов промпта (ожидаемый ответ добавляется сам)
+        call: Выполняет запрос; аргумент — max_retries для клиента (0 — повторы
+            выполняет ограничитель; None — ограничитель отключен)
+
+    Returns:
+        Ответ call
+    """
+    limiter = get_rate_limiter()
+    scheduler = get_llm_scheduler()
+    if not limiter.config.enabled:
+        with scheduler.slot():
+            return call(None)
+    reserved = tokens + limiter.config.completion_tokens
+    attempt = 0
+    while True:
+        try:
+            # Корзина (общая для воркеров), затем место в очереди процесса:
+            # пока запрос ждет корзину, место достается другим запросам
+            limiter.acquire(provider, model, reserved, _bucket_reserve(scheduler, current_priority()[0]))
+            with scheduler.slot():
+                response = call(0)
+        except Exception as e:
+            delay = _retry_delay(limiter, provider, model, e, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            _count("retries")
+            print(f"WARNING: Запрос к {provider}|{model} не выполнен ({_status_code(e) or type(e).__name__}), повтор {attempt}")
+            time.sleep(delay)
+            continue
+        _settle_response(limiter, provider, model, reserved, response)
+        return response
+
+
+async def call_with_rate_limit_async(
+    provider: str,
+    model: str,
+    tokens: int,
+    call: Callable[[Optional[int]], Awaitable[Any]],
+) -> Any:
+    """Асинхронный вариант call_with_rate_limit (call возвращает корутину)."""
+    limiter = get_rate_limiter()
+    scheduler = get_llm_scheduler()
+    if not limiter.config.enabled:
+        async with scheduler.slot_async():
+            return await call(None)
+    reserved = tokens + limiter.config.completion_tokens
+    attempt = 0
+    while True:
+        try:
+            await limiter.acquire_async(provider, model, reserved, _bucket_reserve(scheduler, current_priority()[0]))
+            async with scheduler.slot_async():
+                response = await call(0)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # penalize и счетчик 429 обращаются к SQLite — в потоке
+            delay = await asyncio.to_thread(_retry_delay, limiter, provider, model, e, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            _count("retries")
+            print(f"WARNING: Запрос к {provider}|{model} не выполнен ({_status_code(e) or type(e).__name__}), повтор {attempt}")
+            await asyncio.sleep(delay)
+            continue
+        await asyncio.to_thread(_settle_response, limiter, provider, model, reserved, response)
+        return response
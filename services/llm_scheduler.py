@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Очередь запросов к LLM с приоритетами: интерактивные раньше пакетных.
+
+Интерактивные запросы (/process-references-ai, /process-annotation-ai)
+делили квоту OpenAI с фоновой обработкой архива: пока выпуск
+обрабатывался, редактор мог минутами ждать очистку одного списка
+литературы. Планировщик процесса выдает места для запросов к LLM:
+- классы приоритета: interactive (по умолчанию) раньше batch;
+- пакетные запросы занимают не больше max_concurrent - interactive_reserved
+  мест, поэтому интерактивному запросу не нужно ждать окончания пакетных;
+- внутри класса очередь обходит сессии по кругу: один большой архив не
+  задерживает архивы других сессий;
+- глубина очереди, занятые места и время ожидания — по классам
+  (get_scheduler_stats).
+
+Класс и сессия запроса задаются контекстом (llm_priority или декоратор
+with_llm_priority) и наследуются задачами asyncio. Между воркерами
+gunicorn приоритет обеспечивает ограничитель (services.llm_rate_limit):
+пакетным запросам нужен запас llm_scheduler.batch_bucket_reserve корзины.
+
+Использование:
+    with llm_priority(BATCH, session_id):
+        process_pdfs_pipelined(...)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Порядок выдачи мест
+PRIORITY_CLASSES = (INTERACTIVE, BATCH)
+
+# (класс, сессия) текущего запроса
+_current: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar(
+    "llm_priority", default=(INTERACTIVE, "")
+)
+
+
+@dataclass(frozen=True)
+class SchedulerConfig:
+    """Настройки планировщика."""
+    enabled: bool = True
+    max_concurrent: int = 8  # Одновременных запросов к LLM в процессе
+    interactive_reserved: int = 2  # Из них недоступны пакетным запросам
+    batch_bucket_reserve: float = 0.2  # Доля корзин RPM/TPM, которую пакетные запросы не берут
+
+
+def load_scheduler_config() -> SchedulerConfig:
+    """Читает настройки из config.py (секция llm_scheduler)."""
+    try:
+        from config import get_config
+        cfg = get_config()
+        max_concurrent = max(1, int(cfg.get("llm_scheduler.max_concurrent", 8)))
+        return SchedulerConfig(
+            enabled=bool(cfg.get("llm_scheduler.enabled", True)),
+            max_concurrent=max_concurrent,
+            interactive_reserved=min(
+                max_concurrent - 1, max(0, int(cfg.get("llm_scheduler.interactive_reserved", 2)))
+            ),
+            batch_bucket_reserve=min(0.9, max(0.0, float(cfg.get("llm_scheduler.batch_bucket_reserve", 0.2)))),
+        )
+    except (ImportError, TypeError, ValueError):
+        return SchedulerConfig()
+
+
+def current_priority() -> Tuple[str, str]:
+    """(класс, сессия) текущего контекста."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def llm_priority(priority: str, session: str = "") -> Iterator[None]:
+    """Задает класс и сессию для запросов к LLM внутри блока."""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Неизвестный класс приоритета: {priority}")
+    token = _current.set((priority, session or ""))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def with_llm_priority(priority: str, session_getter: Optional[Callable[[], str]] = None):
+    """Декоратор обработчика: запросы к LLM внутри него — в классе priority."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            session = ""
+            if session_getter is not None:
+                try:
+                    session = session_getter() or ""
+                except Exception:
+                    session = ""
+            with llm_priority(priority, session):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _Ticket:
+    """Ожидающий места запрос (поток или задача asyncio)."""
+
+    def __init__(self, priority: str, session: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.session = session
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self._event = threading.Event() if loop is None else None
+        self._loop = loop
+        self._future: Optional[asyncio.Future] = loop.create_future() if loop is not None else None
+
+    def grant(self) -> bool:
+        """Будит ожидающего. False — его цикл событий уже закрыт."""
+        if self._event is not None:
+            self.granted = True
+            self._event.set()
+            return True
+        try:
+            self._loop.call_soon_threadsafe(self._resolve)
+        except RuntimeError:
+            return False
+        self.granted = True
+        return True
+
+    def _resolve(self) -> None:
+        if not self._future.done():
+            self._future.set_result(None)
+
+
+class LLMScheduler:
+    """Места для запросов к LLM в процессе: приоритет классов, круг по сессиям."""
+
+    def __init__(self, config: Optional[SchedulerConfig] = None):
+        self.config = config or load_scheduler_config()
+        self._lock = threading.Lock()
+        # класс -> сессия -> очередь запросов (порядок сессий — круговой)
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Ticket]]"] = {
+            priority: OrderedDict() for priority in PRIORITY_CLASSES
+        }
+        self._running: Dict[str, int] = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._granted: Dict[str, int] = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._wait_sec: Dict[str, float] = {priority: 0.0 for priority in PRIORITY_CLASSES}
+        self._max_wait_sec: Dict[str, float] = {priority: 0.0 for priority in PRIORITY_CLASSES}
+
+    def _limit(self, priority: str) -> int:
+        if priority == BATCH:
+            return self.config.max_concurrent - self.config.interactive_reserved
+        return self.config.max_concurrent
+
+    def _enqueue_locked(self, ticket: _Ticket) -> None:
+        sessions = self._queues[ticket.priority]
+        queue = sessions.get(ticket.session)
+        if queue is None:
+            queue = deque()
+            sessions[ticket.session] = queue
+        queue.append(ticket)
+        self._dispatch_locked()
+
+    def _dispatch_locked(self) -> None:
+        """Выдает свободные места: сначала interactive, внутри класса — по кругу сессий."""
+        total_running = sum(self._running.values())
+        for priority in PRIORITY_CLASSES:
+            sessions = self._queues[priority]
+            while sessions and total_running < self.config.max_concurrent:
+                # Места класса считаются вместе с более приоритетными
+                if total_running >= self._limit(priority):
+                    break
+                session, queue = next(iter(sessions.items()))
+                ticket = queue.popleft()
+                sessions.pop(session)
+                if queue:
+                    sessions[session] = queue  # в конец круга
+                if not ticket.grant():
+                    continue
+                self._running[priority] += 1
+                total_running += 1
+                waited = time.monotonic() - ticket.enqueued_at
+                self._granted[priority] += 1
+                self._wait_sec[priority] += waited
+                self._max_wait_sec[priority] = max(self._max_wait_sec[priority], waited)
+
+    def _remove_locked(self, ticket: _Ticket) -> None:
+        sessions = self._queues[ticket.priority]
+        queue = sessions.get(ticket.session)
+        if queue is not None:
+            with contextlib.suppress(ValueError):
+                queue.remove(ticket)
+            if not queue:
+                sessions.pop(ticket.session, None)
+
+    def _release(self, priority: str) -> None:
+        with self._lock:
+            self._running[priority] -= 1
+            self._dispatch_locked()
+
+    @contextlib.contextmanager
+    def slot(self) -> Iterator[str]:
+        """Место для одного запроса (класс и сессия — из контекста)."""
+        priority, session = current_priority()
+        if not self.config.enabled:
+            yield priority
+            return
+        ticket = _Ticket(priority, session)
+        with self._lock:
+            self._enqueue_locked(ticket)
+        ticket._event.wait()
+        try:
+            yield priority
+        finally:
+            self._release(priority)
+
+    @contextlib.asynccontextmanager
+    async def slot_async(self) -> AsyncIterator[str]:
+        """Асинхронный вариант slot: ожидание не блокирует цикл событий."""
+        priority, session = current_priority()
+        if not self.config.enabled:
+            yield priority
+            return
+        ticket = _Ticket(priority, session, asyncio.get_running_loop())
+        with self._lock:
+            self._enqueue_locked(ticket)
+        try:
+            await ticket._future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = ticket.granted
+                if not granted:
+                    self._remove_locked(ticket)
+            if granted:
+                self._release(priority)
+            raise
+        try:
+            yield priority
+        finally:
+            self._release(priority)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result: Dict[str, Any] = {}
+            for priority in PRIORITY_CLASSES:
+                sessions = self._queues[priority]
+                granted = self._granted[priority]
+                result[priority] = {
+                    "queued": sum(len(queue) for queue in sessions.values()),
+                    "queued_sessions": len(sessions),
+                    "running": self._running[priority],
+                    "limit": self._limit(priority),
+                    "granted": granted,
+                    "avg_wait_sec": round(self._wait_sec[priority] / granted, 3) if granted else None,
+                    "max_wait_sec": round(self._max_wait_sec[priority], 3),
+                }
+            return result
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Планировщик текущего процесса (создается при первом обращении)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
+
+
+def get_scheduler_stats() -> Dict[str, Any]:
+    """Очереди и занятые места по классам приоритета."""
+    return get_llm_scheduler().stats()
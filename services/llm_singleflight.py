@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Объединение одинаковых одновременных запросов к LLM (single-flight).
+
+Если две вкладки или два пользователя одновременно запускают обработку
+одного и того же текста, оба запроса промахиваются мимо кэша и оба уходят в
+OpenAI. Перед запросом вызывающий занимает блокировку ключа кэша:
+- внутри процесса — threading.Lock на ключ;
+- между воркерами gunicorn — flock на файл <cache_dir>/locks/<хэш>.lock
+  (на системах без fcntl — только внутри процесса).
+
+Первый вызывающий выполняет запрос и записывает ответ в кэш; остальные ждут
+освобождения блокировки и читают ответ из кэша. Ожидание ограничено
+llm_singleflight.wait_timeout_sec: по его истечении ожидающий выполняет
+запрос сам. Если первый запрос завершился ошибкой, следующий ожидающий
+получает блокировку и пробует сам.
+
+Использование:
+    flight = get_single_flight(cache_dir)
+    with flight.hold(key) as slot:
+        if slot.waited:
+            ...  # перечитать кэш
+        ...  # запрос к LLM
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+@dataclass(frozen=True)
+class SingleFlightConfig:
+    """Настройки объединения запросов."""
+    enabled: bool = True
+    wait_timeout_sec: float = 240.0  # Сколько ждать чужой запрос, сек
+    poll_interval_sec: float = 0.1  # Интервал проверки блокировки, сек
+
+
+def load_single_flight_config() -> SingleFlightConfig:
+    """Читает настройки из config.py (секция llm_singleflight)."""
+    try:
+        from config import get_config
+        cfg = get_config()
+        return SingleFlightConfig(
+            enabled=bool(cfg.get("llm_singleflight.enabled", True)),
+            wait_timeout_sec=max(0.0, float(cfg.get("llm_singleflight.wait_timeout_sec", 240))),
+            poll_interval_sec=max(0.01, float(cfg.get("llm_singleflight.poll_interval_sec", 0.1))),
+        )
+    except (ImportError, TypeError, ValueError):
+        return SingleFlightConfig()
+
+
+@dataclass
+class FlightSlot:
+    """Результат ожидания блокировки ключа."""
+    waited: bool = False  # Ключ был занят: ответ, возможно, уже в кэше
+    acquired: bool = True  # False — ожидание истекло, блокировка не получена
+
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"leaders": 0, "waits": 0, "timeouts": 0}
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+class _Flight:
+    """Одна попытка занять ключ: блокировка потока и файловая блокировка."""
+
+    def __init__(self, owner: "SingleFlight", key: str):
+        self.owner = owner
+        self.key = key
+        self.path = owner.lock_dir / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}.lock"
+        self.thread_lock = owner._ref_lock(key)
+        self._fd: Optional[int] = None
+        self._locked = False
+
+    def try_acquire(self) -> bool:
+        if not self.thread_lock.acquire(blocking=False):
+            return False
+        if FCNTL_AVAILABLE:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            except OSError as e:
+                # Без каталога блокировок объединяем запросы только внутри процесса
+                print(f"WARNING: Блокировка запросов LLM недоступна: {e}")
+            else:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    self.thread_lock.release()
+                    return False
+                self._fd = fd
+        self._locked = True
+        return True
+
+    def release(self) -> None:
+        if self._locked:
+            if self._fd is not None:
+                # Файл удаляется под блокировкой: тот, кто ждет на старом файле,
+                # после его освобождения найдет ответ в кэше
+                with contextlib.suppress(OSError):
+                    os.unlink(self.path)
+                with contextlib.suppress(OSError):
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
+            self._locked = False
+            self.thread_lock.release()
+        self.owner._unref_lock(self.key)
+
+
+class SingleFlight:
+    """Блокировки ключей запросов для одного каталога кэша."""
+
+    def __init__(self, lock_dir: Union[str, Path], config: Optional[SingleFlightConfig] = None):
+        self.config = config or load_single_flight_config()
+        self.lock_dir = Path(lock_dir)
+        with contextlib.suppress(OSError):
+            self.lock_dir.mkdir(parents=True, exist_ok=True)
+        self._locks_guard = threading.Lock()
+        # ключ -> [блокировка, число пользователей]
+        self._locks: Dict[str, List[Any]] = {}
+
+    def _ref_lock(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = [threading.Lock(), 0]
+                self._locks[key] = entry
+            entry[1] += 1
+            return entry[0]
+
+    def _unref_lock(self, key: str) -> None:
+        with self._locks_guard:
+            entry = self._locks.get(key)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._locks[key]
+
+    def _on_wait(self, key: str, slot: FlightSlot) -> None:
+        if not slot.waited:
+            slot.waited = True
+            _count("waits")
+            print(f"DEBUG: Такой же запрос к LLM уже выполняется, ожидание (ключ: {key[-16:]})")
+
+    def _on_timeout(self, key: str, slot: FlightSlot) -> None:
+        slot.acquired = False
+        _count("timeouts")
+        print(
+            f"WARNING: Ожидание запроса к LLM превысило {self.config.wait_timeout_sec:g} с "
+            f"(ключ: {key[-16:]}), выполняем запрос сами"
+        )
+
+    @contextlib.contextmanager
+    def hold(self, key: str) -> Iterator[FlightSlot]:
+        """Занимает ключ (ожидая чужой запрос не дольше wait_timeout_sec)."""
+        slot = FlightSlot()
+        if not self.config.enabled:
+            yield slot
+            return
+        flight = _Flight(self, key)
+        try:
+            deadline = time.monotonic() + self.config.wait_timeout_sec
+            while not flight.try_acquire():
+                self._on_wait(key, slot)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._on_timeout(key, slot)
+                    break
+                time.sleep(min(self.config.poll_interval_sec, remaining))
+            if slot.acquired and not slot.waited:
+                _count("leaders")
+            yield slot
+        finally:
+            flight.release()
+
+    @contextlib.asynccontextmanager
+    async def hold_async(self, key: str) -> AsyncIterator[FlightSlot]:
+        """Асинхронный вариант hold: ожидание не блокирует цикл событий."""
+        slot = FlightSlot()
+        if not self.config.enabled:
+            yield slot
+            return
+        flight = _Flight(self, key)
+        try:
+            deadline = time.monotonic() + self.config.wait_timeout_sec
+            while not flight.try_acquire():
+                self._on_wait(key, slot)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._on_timeout(key, slot)
+                    break
+                await asyncio.sleep(min(self.config.poll_interval_sec, remaining))
+            if slot.acquired and not slot.waited:
+                _count("leaders")
+            yield slot
+        finally:
+            flight.release()
+
+
+_flights: Dict[Path, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_single_flight(cache_dir: Union[str, Path]) -> SingleFlight:
+    """Объект блокировок для каталога кэша (один на каталог в процессе)."""
+    lock_dir = (Path(cache_dir) / "locks").resolve()
+    with _flights_lock:
+        flight = _flights.get(lock_dir)
+        if flight is None:
+            flight = SingleFlight(lock_dir)
+            _flights[lock_dir] = flight
+        return flight
+
+
+def get_single_flight_stats() -> Dict[str, Any]:
+    """Счетчики текущего процесса: выполненные, дождавшиеся и истекшие ожидания."""
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_stats)
+    stats["cross_process"] = FCNTL_AVAILABLE
+    return stats
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бюджет токенов для промптов LLM: подсчет, сокращение текста, упаковка чанков.
+
+Раньше размер промпта оценивался как len(prompt) // 4, а чанки списка
+литературы нарезались по числу строк и символов. Для английского текста
+это дробит запросы сильнее нужного, для кириллицы (символ — часто больше
+токена) — слабее. Сервис считает токены локально:
+- tiktoken (кодировка модели, для неизвестных моделей — o200k_base);
+- без tiktoken или без файла кодировки — оценка по символам отдельно для
+  кириллицы, латиницы и цифр/знаков.
+
+Использование:
+    count_tokens(prompt, model)
+    fit_article_text(text, model)  # начало и конец статьи в metadata_max_tokens
+    pack_lines(lines, 1500, model, can_break=starts_entry)
+"""
+
+from __future__ import annotations
+
+import functools
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Кодировка для моделей, которых tiktoken не знает (Mistral, новые модели)
+_DEFAULT_ENCODING = "o200k_base"
+
+# Вставляется на месте сокращенной середины текста статьи
+TRUNCATION_MARKER = "\n\n[...]\n\n"
+
+_RE_CYRILLIC = re.compile(r"[А-Яа-яЁё]")
+_RE_LATIN = re.compile(r"[A-Za-z]")
+_RE_SPACE = re.compile(r"\s")
+
+
+@dataclass(frozen=True)
+class TokenBudgetConfig:
+    """Настройки бюджета токенов."""
+    encoding: str = ""  # Кодировка tiktoken; пусто — по модели
+    metadata_max_tokens: int = 24000  # Токенов текста статьи в промпте метаданных
+    metadata_head_ratio: float = 0.7  # Доля бюджета на начало статьи (остальное — конец)
+    references_chunk_tokens: int = 1500  # Токенов текста в одном запросе нормализации литературы
+    references_chunk_tokens_railway: int = 800  # То же на Railway (строже лимит времени запроса)
+
+
+def load_token_budget_config() -> TokenBudgetConfig:
+    """Читает настройки из config.py (секция token_budget)."""
+    try:
+        from config import get_config
+        cfg = get_config()
+        return TokenBudgetConfig(
+            encoding=str(cfg.get("token_budget.encoding", "") or ""),
+            metadata_max_tokens=max(0, int(cfg.get("token_budget.metadata_max_tokens", 24000))),
+            metadata_head_ratio=min(1.0, max(0.0, float(cfg.get("token_budget.metadata_head_ratio", 0.7)))),
+            references_chunk_tokens=max(100, int(cfg.get("token_budget.references_chunk_tokens", 1500))),
+            references_chunk_tokens_railway=max(
+                100, int(cfg.get("token_budget.references_chunk_tokens_railway", 800))
+            ),
+        )
+    except (ImportError, TypeError, ValueError):
+        return TokenBudgetConfig()
+
+
+_config: Optional[TokenBudgetConfig] = None
+_config_lock = threading.Lock()
+
+
+def get_token_budget_config() -> TokenBudgetConfig:
+    """Настройки текущего процесса (читаются при первом обращении)."""
+    global _config
+    with _config_lock:
+        if _config is None:
+            _config = load_token_budget_config()
+        return _config
+
+
+@functools.lru_cache(maxsize=16)
+def _get_encoding(model: str, encoding: str) -> Optional[Any]:
+    """Кодировка tiktoken; None — считать по символам (результат кэшируется)."""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        if encoding:
+            return tiktoken.get_encoding(encoding)
+        if model:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                pass
+        return tiktoken.get_encoding(_DEFAULT_ENCODING)
+    except Exception as e:
+        # Файл кодировки скачивается при первом использовании: без сети его нет
+        print(f"WARNING: Токенизатор tiktoken недоступен ({e}), токены оцениваются по символам")
+        return None
+
+
+def _encoding_for(model: Optional[str]) -> Optional[Any]:
+    return _get_encoding(model or "", get_token_budget_config().encoding)
+
+
+def _estimate_tokens(text: str) -> int:
+    """Оценка без токенизатора: ~2.5 символа кириллицы, ~4 латиницы, ~2 цифр/знаков на токен."""
+    if not text:
+        return 0
+    cyrillic = len(_RE_CYRILLIC.findall(text))
+    latin = len(_RE_LATIN.findall(text))
+    spaces = len(_RE_SPACE.findall(text))
+    other = len(text) - cyrillic - latin - spaces
+    return int(cyrillic / 2.5 + latin / 4 + other / 2) + 1
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Число токенов текста для модели."""
+    if not text:
+        return 0
+    enc = _encoding_for(model)
+    if enc is None:
+        return _estimate_tokens(text)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def _estimated_chars(text: str, max_tokens: int, total: int) -> int:
+    """
+    Символов на max_tokens по оценке без токенизатора (пропорционально; +1
+    оценки приходится на каждый отрезок, а не на символы).
+    """
+    return int(len(text) * max(0, max_tokens - 1) / max(1, total - 1))
+
+
+def _head_chars(text: str, max_tokens: int, model: Optional[str]) -> int:
+    """Сколько символов с начала текста укладывается в max_tokens."""
+    enc = _encoding_for(model)
+    if enc is not None:
+        tokens = enc.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return len(text)
+        return len(enc.decode(tokens[:max_tokens]))
+    total = _estimate_tokens(text)
+    if total <= max_tokens:
+        return len(text)
+    return _estimated_chars(text, max_tokens, total)
+
+
+def _tail_chars(text: str, max_tokens: int, model: Optional[str]) -> int:
+    """Сколько символов с конца текста укладывается в max_tokens."""
+    enc = _encoding_for(model)
+    if enc is not None:
+        tokens = enc.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return len(text)
+        return len(enc.decode(tokens[len(tokens) - max_tokens:]))
+    total = _estimate_tokens(text)
+    if total <= max_tokens:
+        return len(text)
+    return _estimated_chars(text, max_tokens, total)
+
+
+def truncate_middle(text: str, max_tokens: int, model: Optional[str] = None, head_ratio: float = 0.7) -> str:
+    """
+    Сокращает текст до max_tokens, удаляя середину: начало (head_ratio
+    бюджета) и конец остаются, разрез — по границам строк, если граница
+    есть в последних 20% отрезка.
+
+    Returns:
+        Исходный текст, если он укладывается в бюджет, иначе
+        начало + TRUNCATION_MARKER + конец
+    """
+    if not text or max_tokens <= 0 or count_tokens(text, model) <= max_tokens:
+        return text
+    head_tokens = int(max_tokens * head_ratio)
+    tail_tokens = max_tokens - head_tokens
+
+    head_end = _head_chars(text, head_tokens, model) if head_tokens > 0 else 0
+    newline = text.rfind("\n", 0, head_end)
+    if newline >= head_end * 0.8:
+        head_end = newline
+    head = text[:head_end].rstrip()
+
+    rest = text[head_end:]
+    tail_len = _tail_chars(rest, tail_tokens, model) if tail_tokens > 0 else 0
+    tail_start = len(rest) - tail_len
+    newline = rest.find("\n", tail_start)
+    if 0 <= newline - tail_start <= tail_len * 0.2:
+        tail_start = newline
+    tail = rest[tail_start:].lstrip() if tail_len else ""
+
+    return head + TRUNCATION_MARKER + tail if tail else head + TRUNCATION_MARKER.rstrip()
+
+
+def fit_article_text(text: str, model: Optional[str] = None) -> str:
+    """
+    Текст статьи для промпта метаданных в пределах token_budget.metadata_max_tokens:
+    при превышении сохраняются начало статьи (название, авторы, аннотация,
+    ключевые слова) и конец (список литературы, сведения об авторах).
+    """
+    cfg = get_token_budget_config()
+    if cfg.metadata_max_tokens <= 0:
+        return text
+    fitted = truncate_middle(text, cfg.metadata_max_tokens, model, cfg.metadata_head_ratio)
+    if fitted is not text:
+        print(
+            f"DEBUG: Текст статьи сокращен до {cfg.metadata_max_tokens} токенов "
+            f"({len(text)} -> {len(fitted)} символов)"
+        )
+    return fitted
+
+
+def budget_signature() -> str:
+    """Настройки, от которых зависит сокращенный текст (для ключа кэша)."""
+    cfg = get_token_budget_config()
+    return f"{cfg.encoding}:{cfg.metadata_max_tokens}:{cfg.metadata_head_ratio:g}"
+
+
+def pack_lines(
+    lines: List[str],
+    max_tokens: int,
+    model: Optional[str] = None,
+    can_break: Optional[Callable[[str], bool]] = None,
+    max_lines: int = 0,
+) -> List[str]:
+    """
+    Упаковывает строки в чанки по max_tokens токенов.
+
+    Args:
+        lines: Строки в исходном порядке
+        max_tokens: Бюджет токенов чанка
+        model: Модель (кодировка tiktoken)
+        can_break: Можно ли начать чанк с этой строки (например, начало
+            записи списка литературы); чанк, который не удается закончить
+            на такой строке, растет не больше чем до 2 * max_tokens
+            (и 2 * max_lines)
+        max_lines: Не больше строк в чанке (0 — без ограничения)
+
+    Returns:
+        Чанки — строки, соединенные переводами строк
+    """
+    chunks: List[str] = []
+    cur: List[str] = []
+    cur_tokens = 0
+    for line in lines:
+        tokens = count_tokens(line, model) + 1  # + перевод строки
+        over = cur_tokens + tokens > max_tokens or (max_lines > 0 and len(cur) >= max_lines)
+        hard = cur_tokens + tokens > max_tokens * 2 or (max_lines > 0 and len(cur) >= max_lines * 2)
+        if cur and over and (can_break is None or can_break(line) or hard):
+            chunks.append("\n".join(cur))
+            cur = []
+            cur_tokens = 0
+        cur.append(line)
+        cur_tokens += tokens
+    if cur:
+        chunks.append("\n".join(cur))
+    return chunks
+
+
+def split_text_by_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """Делит текст без переводов строк на части по max_tokens, по возможности — после точки."""
+    text = text.strip()
+    chunks: List[str] = []
+    while text:
+        cut = _head_chars(text, max_tokens, model)
+        if cut >= len(text):
+            chunks.append(text)
+            break
+        dot = text.rfind(".", 0, cut)
+        cut = dot + 1 if dot >= int(cut * 0.6) else max(cut, 1)
+        chunks.append(text[:cut].strip())
+        text = text[cut:].lstrip()
+    return chunks
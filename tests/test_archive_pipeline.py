@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from services import archive_pipeline
+from services.archive_pipeline import ArchivePipelineConfig, process_pdfs_pipelined
+from services.gpt_extraction import GPTExtractionError
+from services.llm_scheduler import BATCH, current_priority
+
+
+class FakeConfig:
+    def __init__(self, **values):
+        self.values = values
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+
+class ThreadCPUPool(ThreadPoolExecutor):
+    """Пул чтения PDF в потоках (без запуска интерпретаторов)."""
+
+    def __init__(self, max_workers=None, mp_context=None):
+        super().__init__(max_workers=max_workers)
+
+
+class FakeStages:
+    """Стадии конвейера: чтение PDF, запрос к GPT (с задержкой по имени файла) и запись JSON."""
+
+    def __init__(self, delays, fail=None):
+        self.delays = delays
+        self.fail = fail
+        self.lock = threading.Lock()
+        self.started = []
+        self.completed = []
+        self.saved = []
+        self.running = 0
+        self.max_running = 0
+        self.priorities = set()
+
+    def prepare(self, pdf_path):
+        return f"text of {Path(pdf_path).name}"
+
+    async def gpt(self, text, config=None):
+        name = text.removeprefix("text of ")
+        self.started.append(name)
+        self.priorities.add(current_priority())
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delays[name])
+            if name == self.fail:
+                raise GPTExtractionError(f"ошибка GPT для {name}")
+        finally:
+            self.running -= 1
+        self.completed.append(name)
+        return {"title": name}
+
+    def save(self, metadata, pdf_path, config=None, json_output_dir=None):
+        path = Path(json_output_dir) / (Path(pdf_path).stem + ".json")
+        with self.lock:
+            self.saved.append(metadata["file"])
+        return path
+
+
+@pytest.fixture()
+def stages(monkeypatch):
+    def install(delays, fail=None):
+        fake = FakeStages(delays, fail)
+        monkeypatch.setattr(archive_pipeline, "ProcessPoolExecutor", ThreadCPUPool)
+        monkeypatch.setattr(archive_pipeline, "_prepare_text_task", fake.prepare)
+        monkeypatch.setattr(archive_pipeline, "extract_metadata_with_gpt_async", fake.gpt)
+        monkeypatch.setattr(archive_pipeline, "save_metadata_json", fake.save)
+        return fake
+
+    return install
+
+
+def _run(tmp_path, names, llm_concurrency=2, fake=None, cpu_workers=2):
+    progress = []
+
+    def on_progress(processed, total, message):
+        progress.append((processed, total, message))
+        # Счетчик — завершенные статьи: их JSON уже записан
+        assert processed <= len(fake.saved)
+
+    paths = process_pdfs_pipelined(
+        [tmp_path / name for name in names],
+        tmp_path / "json",
+        config=FakeConfig(),
+        pipeline_config=ArchivePipelineConfig(cpu_workers=cpu_workers, llm_concurrency=llm_concurrency),
+        on_progress=on_progress,
+        session_id="archive-session",
+    )
+    return paths, progress
+
+
+def test_progress_counts_completed_articles_out_of_order(tmp_path, stages):
+    names = ["a.pdf", "b.pdf", "c.pdf", "d.pdf"]
+    fake = stages({"a.pdf": 0.3, "b.pdf": 0.1, "c.pdf": 0.05, "d.pdf": 0.05})
+    paths, progress = _run(tmp_path, names, fake=fake)
+
+    # JSON — в порядке завершения; самая долгая статья — последней
+    assert [p.name for p in paths] == [Path(n).stem + ".json" for n in fake.completed]
+    assert fake.completed[-1] == "a.pdf" and fake.completed != names
+    assert sorted(fake.saved) == names
+
+    counts = [processed for processed, _, _ in progress]
+    assert counts[0] == 0 and counts[-1] == 4
+    assert all(0 <= b - a <= 1 for a, b in zip(counts, counts[1:]))
+    assert {total for _, total, _ in progress} == {4}
+    assert progress[-1] == (4, 4, "Обработка в процессе")
+    # Сообщения при запуске перечисляют статьи, ожидающие GPT
+    assert any(message.startswith("Обработка: ") and "a.pdf" in message for _, _, message in progress)
+
+    assert fake.max_running == 2
+    assert fake.priorities == {(BATCH, "archive-session")}
+
+
+def test_concurrency_limit(tmp_path, stages):
+    names = [f"{i}.pdf" for i in range(6)]
+    fake = stages(dict.fromkeys(names, 0.02))
+    _run(tmp_path, names, llm_concurrency=3, fake=fake)
+    assert fake.max_running == 3
+    assert sorted(fake.completed) == names
+
+
+def test_first_error_stops_new_articles(tmp_path, stages):
+    names = ["slow.pdf", "bad.pdf", "later1.pdf", "later2.pdf"]
+    fake = stages({"slow.pdf": 0.2, "bad.pdf": 0.02, "later1.pdf": 0.01, "later2.pdf": 0.01}, fail="bad.pdf")
+
+    # Один поток чтения: тексты готовы в порядке списка, в GPT первыми уходят slow и bad
+    with pytest.raises(GPTExtractionError, match="bad.pdf"):
+        _run(tmp_path, names, llm_concurrency=2, fake=fake, cpu_workers=1)
+
+    # Статья, уже отправленная в GPT, дожидается ответа и сохраняется;
+    # после ошибки новые статьи не запускаются
+    assert set(fake.started) == {"slow.pdf", "bad.pdf"}
+    assert fake.saved == ["slow.pdf"]
+
+
+def test_disabled_gpt_and_empty_archive(tmp_path, stages):
+    stages({})
+    with pytest.raises(GPTExtractionError, match="отключено"):
+        process_pdfs_pipelined([tmp_path / "a.pdf"], config=FakeConfig(**{"gpt_extraction.enabled": False}))
+    assert process_pdfs_pipelined([], config=FakeConfig()) == []
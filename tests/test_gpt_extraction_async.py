@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+
+from services import gpt_extraction, llm_clients, llm_rate_limit, llm_scheduler
+from services.gpt_extraction import (
+    GPTExtractionError,
+    extract_metadata_from_pdfs_async,
+    extract_metadata_with_gpt,
+    extract_metadata_with_gpt_async,
+    gather_limited,
+)
+from services.llm_rate_limit import RateLimitConfig, RateLimiter
+from services.llm_scheduler import LLMScheduler, SchedulerConfig
+
+ARTICLE = "УДК 631.4\nИванов И.И. Почвы степной зоны\nDOI: 10.1234/soil.2001.5\nАннотация. Текст статьи."
+
+
+class FakeConfig:
+    def __init__(self, **values):
+        self.values = values
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def get_path(self, key):
+        return Path(self.values[key])
+
+
+def _response(content: str):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class FakeSyncClient:
+    def __init__(self, content: str):
+        self.content = content
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    def with_options(self, **kwargs):
+        return self
+
+    def create(self, **kwargs):
+        self.calls += 1
+        return _response(self.content)
+
+
+class FakeAsyncClient:
+    """Асинхронный клиент: считает одновременные запросы, ответ — по тексту статьи."""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    def with_options(self, **kwargs):
+        return self
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("API недоступен")
+            prompt = kwargs["messages"][-1]["content"]
+            title = "Почвы" if "Почвы" in prompt else "Другое"
+            return _response(json.dumps({"title": title, "doi": "10.1234/soil.2001.5"}))
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture(autouse=True)
+def no_limits(monkeypatch):
+    """Без ограничителя RPM/TPM и без мест планировщика: лимит задает только семафор."""
+    monkeypatch.setattr(llm_rate_limit, "_limiter", RateLimiter(RateLimitConfig(enabled=False)))
+    monkeypatch.setattr(llm_scheduler, "_scheduler", LLMScheduler(SchedulerConfig(enabled=False)))
+
+
+def _install_async(monkeypatch, client: FakeAsyncClient) -> FakeAsyncClient:
+    monkeypatch.setattr(llm_clients, "get_async_openai_client", lambda *args, **kwargs: client)
+    return client
+
+
+def test_async_result_matches_sync_and_shares_cache(tmp_path, monkeypatch):
+    content = json.dumps({"title": "Почвы", "doi": "10.1234/soil.2001.5"})
+    sync_client = FakeSyncClient(content)
+    monkeypatch.setattr(llm_clients, "get_openai_client", lambda *args, **kwargs: sync_client)
+    async_client = _install_async(monkeypatch, FakeAsyncClient())
+
+    # Без кэша: тот же ответ — те же метаданные после постобработки
+    sync_result = extract_metadata_with_gpt(ARTICLE, api_key="test-key", use_cache=False)
+    async_result = asyncio.run(extract_metadata_with_gpt_async(ARTICLE, api_key="test-key", use_cache=False))
+    assert async_result == sync_result
+    assert sync_client.calls == 1 and async_client.calls == 1
+
+    # Ответ синхронного запроса в кэше — асинхронный не обращается к API
+    cache_dir = tmp_path / "gpt_cache"
+    first = extract_metadata_with_gpt(ARTICLE, api_key="test-key", cache_dir=cache_dir)
+    cached = asyncio.run(extract_metadata_with_gpt_async(ARTICLE, api_key="test-key", cache_dir=cache_dir))
+    assert cached == first
+    assert sync_client.calls == 2 and async_client.calls == 1
+
+
+def test_async_api_error_becomes_gpt_extraction_error(monkeypatch):
+    _install_async(monkeypatch, FakeAsyncClient(fail=True))
+    with pytest.raises(GPTExtractionError):
+        asyncio.run(extract_metadata_with_gpt_async(ARTICLE, api_key="test-key", use_cache=False))
+
+
+def test_gather_limited_bounds_concurrency_and_keeps_order():
+    state = {"running": 0, "max": 0}
+
+    def factory(index: int):
+        async def run():
+            state["running"] += 1
+            state["max"] = max(state["max"], state["running"])
+            await asyncio.sleep(0.01 * (5 - index))
+            state["running"] -= 1
+            if index == 3:
+                raise ValueError("сбой")
+            return index
+
+        return run
+
+    results = asyncio.run(gather_limited([factory(i) for i in range(5)], limit=2))
+
+    assert state["max"] == 2
+    assert results[:3] == [0, 1, 2] and results[4] == 4
+    assert isinstance(results[3], ValueError)
+
+    with pytest.raises(ValueError):
+        asyncio.run(gather_limited([factory(3)], limit=1, return_exceptions=False))
+
+
+def test_pdfs_fan_out_respects_concurrency(tmp_path, monkeypatch):
+    client = _install_async(monkeypatch, FakeAsyncClient(delay=0.02))
+    saved = []
+
+    def read_text(pdf_path, config=None):
+        if pdf_path.stem == "broken":
+            raise GPTExtractionError("Не удалось прочитать PDF")
+        return ARTICLE
+
+    monkeypatch.setattr(gpt_extraction, "read_pdf_text_for_llm", read_text)
+    monkeypatch.setattr(
+        gpt_extraction, "save_metadata_json", lambda metadata, pdf_path, *args: saved.append(pdf_path.name)
+    )
+    config = FakeConfig(**{"gpt_extraction.use_cache": False, "gpt_extraction.max_concurrency": 2})
+    paths = [tmp_path / f"article{i}.pdf" for i in range(5)]
+    paths.insert(2, tmp_path / "broken.pdf")
+
+    results = asyncio.run(extract_metadata_from_pdfs_async(paths, config=config, api_key="test-key"))
+
+    # Лимит — gpt_extraction.max_concurrency; ошибка одного PDF не останавливает остальные
+    assert client.max_in_flight == 2
+    assert client.calls == 5
+    assert isinstance(results[2], GPTExtractionError)
+    ok = [r for i, r in enumerate(results) if i != 2]
+    assert [r["file"] for r in ok] == [p.name for i, p in enumerate(paths) if i != 2]
+    assert all(r["title"] == "Почвы" for r in ok)
+    assert sorted(saved) == sorted(r["file"] for r in ok)
+
+    # Явный concurrency важнее конфига
+    client.max_in_flight = 0
+    asyncio.run(extract_metadata_from_pdfs_async(paths[:3], concurrency=1, config=config, api_key="test-key"))
+    assert client.max_in_flight == 1
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from services import llm_cache
+from services.llm_cache import (
+    LLMCache,
+    LLMCacheConfig,
+    TextFingerprint,
+    cache_namespace,
+    canonical_cache_key,
+    normalize_cache_text,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_cache, "time", fake)
+    return fake
+
+
+def _cache(tmp_path: Path, **overrides) -> LLMCache:
+    values = dict(cache_dir=tmp_path / "gpt_cache")
+    values.update(overrides)
+    return LLMCache(LLMCacheConfig(**values))
+
+
+def _legacy_file(cache_dir: Path, prompt: str, value) -> Path:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}.json"
+    path.write_text(json.dumps(value, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def _legacy_namespace() -> str:
+    from config import get_config
+
+    return cache_namespace(get_config().get("gpt_extraction.model", "gpt-4o-mini"), "1")
+
+
+# =========================
+# Перенос файлов прежнего формата
+# =========================
+
+def test_migrates_legacy_json_files(tmp_path):
+    cache_dir = tmp_path / "gpt_cache"
+    first = _legacy_file(cache_dir, "prompt 1", {"title": "Первая"})
+    second = _legacy_file(cache_dir, "prompt 2", {"title": "Вторая"})
+    broken = cache_dir / ("b" * 64 + ".json")
+    broken.write_text('{"title": ', encoding="utf-8")
+    other = cache_dir / "settings.json"
+    other.write_text("{}", encoding="utf-8")
+
+    cache = _cache(tmp_path)
+    namespace = _legacy_namespace()
+
+    assert cache.get(namespace, first.stem) == {"title": "Первая"}
+    assert cache.get(namespace, second.stem) == {"title": "Вторая"}
+    # Перенесенные файлы удалены, поврежденный и посторонний — остались
+    assert not first.exists() and not second.exists()
+    assert broken.exists() and other.exists()
+    assert cache.db_stats()["entries"] == 2
+
+
+def test_failed_migration_keeps_legacy_files(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "gpt_cache"
+    files = [_legacy_file(cache_dir, f"prompt {i}", {"n": i}) for i in range(3)]
+    real_dumps = llm_cache.json.dumps
+    calls = []
+
+    def failing_dumps(value, **kwargs):
+        calls.append(value)
+        if len(calls) == 2:
+            raise sqlite3.OperationalError("disk I/O error")
+        return real_dumps(value, **kwargs)
+
+    monkeypatch.setattr(llm_cache.json, "dumps", failing_dumps)
+    cache = _cache(tmp_path)
+    assert cache.get(_legacy_namespace(), files[0].stem) is None
+    assert all(path.exists() for path in files)
+
+    # Следующее открытие переносит файлы заново
+    monkeypatch.setattr(llm_cache.json, "dumps", real_dumps)
+    cache = _cache(tmp_path)
+    assert cache.get(_legacy_namespace(), files[0].stem) == {"n": 0}
+    assert not any(path.exists() for path in files)
+
+
+def test_migration_can_be_disabled(tmp_path):
+    legacy = _legacy_file(tmp_path / "gpt_cache", "prompt", {"n": 1})
+    cache = _cache(tmp_path, migrate_json=False)
+    assert cache.get(_legacy_namespace(), legacy.stem) is None
+    assert legacy.exists()
+
+
+# =========================
+# Срок жизни и бюджет размера
+# =========================
+
+def test_entry_expires_after_ttl(tmp_path, clock):
+    cache = _cache(tmp_path, ttl_days=1)
+    cache.set("m|1", "key", {"v": 1})
+
+    clock.now += 86400 - 1
+    assert cache.get("m|1", "key") == {"v": 1}
+    expired = llm_cache._stats["expired"]
+
+    clock.now += 1
+    assert cache.get("m|1", "key") is None
+    assert llm_cache._stats["expired"] == expired + 1
+    assert cache.db_stats()["entries"] == 0
+
+
+def test_zero_ttl_never_expires(tmp_path, clock):
+    cache = _cache(tmp_path, ttl_days=0)
+    cache.set("m|1", "key", {"v": 1})
+    clock.now += 10 * 365 * 86400
+    assert cache.get("m|1", "key") == {"v": 1}
+
+
+def test_namespaces_are_separate(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set(cache_namespace("gpt-4o-mini", "1"), "key", {"v": 1})
+    assert cache.get(cache_namespace("gpt-4o", "1"), "key") is None
+    assert cache.get(cache_namespace("gpt-4o-mini", "2"), "key") is None
+
+
+def test_budget_evicts_least_recently_used(tmp_path, clock):
+    value = {"text": "x" * 300}
+    size = len(json.dumps(value))
+    # Бюджет — на три записи; при превышении база сокращается до 90%
+    cache = _cache(tmp_path, max_size_mb=(size * 3.5) / (1024 * 1024))
+    for key in ("a", "b", "c"):
+        cache.set("m|1", key, value)
+        clock.now += 1
+    # "a" использована недавно, давнее всех — "b"
+    assert cache.get("m|1", "a") == value
+    clock.now += 1
+
+    cache.set("m|1", "d", value)
+
+    assert cache.get("m|1", "b", count=False) is None
+    for key in ("a", "c", "d"):
+        assert cache.get("m|1", key, count=False) == value
+    assert cache.db_stats()["bytes"] <= cache.db_stats()["max_bytes"]
+
+
+# =========================
+# Ключи по нормализованному тексту
+# =========================
+
+def _key(text: str, template: str = "tpl", model: str = "gpt-4o-mini") -> str:
+    return canonical_cache_key(normalize_cache_text(text), template, model)
+
+
+ARTICLE = (
+    "Влияние климата на почвы степной зоны. Исследование проведено в Ростове-на-Дону "
+    "в 2019-2021 гг. Показано, что содержание гумуса снижается при аридизации."
+)
+
+
+@pytest.mark.parametrize(
+    "variant",
+    [
+        ARTICLE.replace(" ", "  "),
+        ARTICLE.replace(". ", ".\n"),
+        "  " + ARTICLE + "\n\n",
+        ARTICLE.replace("Исследование", "Иссле\u00adдование"),
+        ARTICLE.replace("Исследование", "Иссле-\nдование"),
+        ARTICLE.replace("почвы", "поч\u200bвы"),
+        ARTICLE.replace("Показано", "Пока-  \n  зано"),
+    ],
+)
+def test_formatting_differences_share_key(variant):
+    assert _key(variant) == _key(ARTICLE)
+
+
+def test_running_headers_do_not_change_key():
+    header = "Вестник МГУ. Серия 17. Почвоведение. 2021. № 3"
+    pages = [f"Строка {i} текста статьи о почвах и климате степной зоны." for i in range(9)]
+    plain = "\n".join(pages)
+    with_headers = "\n".join(
+        f"{header}\n" + "\n".join(pages[i:i + 3]) for i in range(0, len(pages), 3)
+    )
+    assert _key(with_headers) == _key(plain)
+
+
+@pytest.mark.parametrize(
+    "other",
+    [
+        ARTICLE.replace("2019-2021", "2018-2021"),
+        ARTICLE.replace("Ростове-на-Дону", "Ростовена Дону"),
+        ARTICLE.replace("снижается", "растет"),
+        ARTICLE[:-1],
+    ],
+)
+def test_content_differences_change_key(other):
+    assert _key(other) != _key(ARTICLE)
+
+
+def test_template_and_model_are_part_of_key():
+    assert _key(ARTICLE, template="a") != _key(ARTICLE, template="b")
+    assert _key(ARTICLE, model="gpt-4o") != _key(ARTICLE, model="gpt-4o-mini")
+    # Части ключа разделены: перенос символов между ними дает другой ключ
+    assert canonical_cache_key("xy", "tpl", "m") != canonical_cache_key("y", "tplx", "m")
+
+
+def test_find_similar_matches_near_duplicate_text(tmp_path):
+    cache = _cache(tmp_path, near_duplicate=True)
+    text = " ".join(f"Предложение {i} текста статьи о свойствах почв и климате." for i in range(40))
+    normalized = normalize_cache_text(text)
+    key = canonical_cache_key(normalized, "tpl", "m")
+    cache.set("m|1", key, {"title": "Статья"}, fingerprint=TextFingerprint.of(normalized, "tpl"))
+
+    edited = normalize_cache_text(text.replace("Предложение 7 ", "Предложение семь "))
+    found = cache.find_similar("m|1", TextFingerprint.of(edited, "tpl"))
+    assert found is not None
+    assert found[0] == key and found[1] == {"title": "Статья"}
+    assert found[2] <= cache.config.near_max_distance
+
+    # Другой шаблон промпта и другой текст не совпадают
+    assert cache.find_similar("m|1", TextFingerprint.of(edited, "other")) is None
+    different = normalize_cache_text(" ".join(f"Completely unrelated sentence {i} about rivers." for i in range(40)))
+    assert cache.find_similar("m|1", TextFingerprint.of(different, "tpl")) is None
+
+
+def test_find_similar_disabled_by_default(tmp_path):
+    cache = _cache(tmp_path)
+    normalized = normalize_cache_text(ARTICLE)
+    cache.set("m|1", "k", {"v": 1}, fingerprint=TextFingerprint.of(normalized, "tpl"))
+    assert cache.find_similar("m|1", TextFingerprint.of(normalized, "tpl")) is None
+
+
+# =========================
+# Готовый промпт (raw_prompt) — ключ по точному тексту
+# =========================
+
+RAW_PROMPT = "Разбей список на записи, верни JSON.\n\n1. Иванов И.И. Почвы.\n2. Петров П.П. Климат."
+
+
+class _RecordingClient:
+    def __init__(self):
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=self)
+
+    def with_options(self, **kwargs):
+        return self
+
+    def create(self, **kwargs):
+        self.prompts.append(kwargs["messages"][-1]["content"])
+        message = SimpleNamespace(content=json.dumps({"call": len(self.prompts)}))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.mark.parametrize(
+    "other",
+    [
+        RAW_PROMPT.replace("\n", " "),
+        RAW_PROMPT.replace("\n\n", "\n"),
+        RAW_PROMPT + "\nстр. 1\nстр. 1\nстр. 1",
+    ],
+    ids=["newlines", "paragraphs", "repeated-lines"],
+)
+def test_raw_prompts_differing_in_layout_do_not_share_entry(tmp_path, monkeypatch, other):
+    pytest.importorskip("openai")
+    from services import gpt_extraction, llm_clients, llm_rate_limit
+    from services.llm_rate_limit import RateLimitConfig, RateLimiter
+
+    client = _RecordingClient()
+    monkeypatch.setattr(llm_clients, "get_openai_client", lambda *args, **kwargs: client)
+    monkeypatch.setattr(llm_rate_limit, "_limiter", RateLimiter(RateLimitConfig(enabled=False)))
+    # Нормализация схлопывает эти различия — для готового промпта она не применяется
+    assert _key(other) == _key(RAW_PROMPT)
+
+    def extract(prompt):
+        return gpt_extraction.extract_metadata_with_gpt(
+            prompt, api_key="test-key", cache_dir=tmp_path / "gpt_cache", raw_prompt=True, use_cache=True
+        )
+
+    assert extract(RAW_PROMPT) == {"call": 1}
+    assert extract(other) == {"call": 2}
+    assert client.prompts == [RAW_PROMPT, other]
+    # Тот же промпт — из кэша
+    assert extract(RAW_PROMPT) == {"call": 1}
+    assert len(client.prompts) == 2
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("openai")
+
+from services import llm_clients
+from services.llm_clients import LLMClientConfig, LLMClientRegistry
+
+
+@pytest.fixture()
+def registry(monkeypatch):
+    registry = LLMClientRegistry(LLMClientConfig(max_retries=5))
+    monkeypatch.setattr(llm_clients, "_registry", registry)
+    yield registry
+    registry.close()
+
+
+def test_client_is_reused_per_key(registry):
+    client = llm_clients.get_openai_client("key-1", "https://api.example.com/v1/", timeout=60)
+
+    assert llm_clients.get_openai_client("key-1", "https://api.example.com/v1", timeout=60.0) is client
+    assert llm_clients.get_openai_client("key-1", "https://api.example.com/v1", timeout=30) is not client
+    assert llm_clients.get_openai_client("key-2", "https://api.example.com/v1", timeout=60) is not client
+    assert llm_clients.get_openai_client("key-1", None, timeout=60) is not client
+
+    assert str(client.base_url).rstrip("/") == "https://api.example.com/v1"
+    assert client.max_retries == 5
+    stats = registry.stats()
+    assert (stats["clients"], stats["created"]) == (4, 4)
+    assert "key-1" not in repr(stats)
+
+
+def test_concurrent_first_use_creates_one_client(registry):
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        clients = list(pool.map(lambda _: llm_clients.get_openai_client("key", None, 60), range(32)))
+    assert len({id(client) for client in clients}) == 1
+    assert registry.stats()["created"] == 1
+
+
+def test_close_releases_clients(registry):
+    first = llm_clients.get_openai_client("key", None, 60)
+    llm_clients.close_openai_clients()
+
+    assert first.is_closed()
+    assert registry.stats()["clients"] == 0
+    # После закрытия (например, в новом воркере) клиент создается заново
+    second = llm_clients.get_openai_client("key", None, 60)
+    assert second is not first and not second.is_closed()
+    assert registry.stats()["created"] == 2
+
+
+def test_async_clients_are_per_event_loop(registry):
+    async def two_clients():
+        first = llm_clients.get_async_openai_client("key", None, 60)
+        second = llm_clients.get_async_openai_client("key", None, 60)
+        assert first is second
+        await llm_clients.close_async_openai_clients()
+        assert first.is_closed()
+        # Закрытые клиенты убраны: следующий вызов в том же цикле создает новый
+        third = llm_clients.get_async_openai_client("key", None, 60)
+        assert third is not first
+        return third
+
+    async def one_client():
+        return llm_clients.get_async_openai_client("key", None, 60)
+
+    third = asyncio.run(two_clients())
+    other_loop = asyncio.run(one_client())
+    assert other_loop is not third
+
+
+def test_run_llm_batch_closes_loop_clients(registry):
+    from services.gpt_extraction import run_llm_batch
+
+    async def batch():
+        return llm_clients.get_async_openai_client("key", None, 60)
+
+    client = run_llm_batch(batch())
+    assert client.is_closed()
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from services import llm_rate_limit
+from services.llm_rate_limit import RateLimitConfig, RateLimiter
+
+
+class FakeClock:
+    """Подмена модуля time в llm_rate_limit: sleep сдвигает часы."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_rate_limit, "time", fake)
+    return fake
+
+
+def _limiter(tmp_path, rpm=0, tpm=0, **overrides) -> RateLimiter:
+    values = dict(
+        state_file=tmp_path / "limits.sqlite3",
+        limits={"openai": {"*": {"rpm": rpm, "tpm": tpm}}},
+        completion_tokens=0,
+        backoff_sec=1.0,
+    )
+    values.update(overrides)
+    return RateLimiter(RateLimitConfig(**values))
+
+
+def test_request_bucket_refills_over_time(clock, tmp_path):
+    limiter = _limiter(tmp_path, rpm=60)
+    for _ in range(60):
+        assert limiter._try_take("openai", "m", 0) == 0
+    assert limiter._try_take("openai", "m", 0) == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert limiter._try_take("openai", "m", 0) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter._try_take("openai", "m", 0) == 0
+
+
+def test_token_bucket_and_reserve(clock, tmp_path):
+    limiter = _limiter(tmp_path, tpm=6000)
+    assert limiter._try_take("openai", "m", 4000) == 0
+    # Пакетный запрос оставляет половину корзины интерактивным
+    assert limiter._try_take("openai", "m", 1000, reserve=0.5) == pytest.approx(20.0)
+    assert limiter._try_take("openai", "m", 1000) == 0
+
+
+def test_acquire_sleeps_until_refill(clock, tmp_path):
+    limiter = _limiter(tmp_path, rpm=6)
+    for _ in range(6):
+        limiter.acquire("openai", "m", 0)
+    assert clock.sleeps == []
+
+    limiter.acquire("openai", "m", 0)
+    assert sum(clock.sleeps) == pytest.approx(10.0)
+    assert max(clock.sleeps) <= llm_rate_limit._MAX_SLEEP_SEC
+
+
+def test_penalty_blocks_bucket_for_all_callers(clock, tmp_path):
+    limiter = _limiter(tmp_path, rpm=600)
+    limiter.penalize("openai", "m", 7.0)
+
+    # Второй экземпляр — другой воркер с тем же файлом корзин
+    other = _limiter(tmp_path, rpm=600)
+    assert other._try_take("openai", "m", 0) == pytest.approx(7.0)
+    assert other.penalties("openai", "m") == 1
+
+    clock.now += 7.0
+    assert other._try_take("openai", "m", 0) == 0
+    other.reset_penalties("openai", "m")
+    assert limiter.penalties("openai", "m") == 0
+
+
+def test_call_retries_429_after_retry_after(clock, tmp_path, monkeypatch):
+    limiter = _limiter(tmp_path, rpm=600, tpm=10000)
+    monkeypatch.setattr(llm_rate_limit, "_limiter", limiter)
+    calls = []
+
+    def call(retries):
+        calls.append((retries, clock.now))
+        if len(calls) == 1:
+            raise FakeHTTPError(429, {"retry-after": "3"})
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=100))
+
+    llm_rate_limit.call_with_rate_limit("openai", "m", 1000, call)
+
+    assert [retries for retries, _ in calls] == [0, 0]
+    # Повтор ждал паузу из retry-after в корзине
+    assert calls[1][1] - calls[0][1] == pytest.approx(3.0)
+    assert limiter.penalties("openai", "m") == 0
+    # 10000 - 1000 (первая попытка) + 500 (пополнение за 3 с) - 1000 (повтор),
+    # затем оценка 1000 токенов заменена фактическими 100
+    row = limiter._connect().execute("SELECT tokens FROM buckets").fetchone()
+    assert row[0] == pytest.approx(9400)
+
+
+def test_call_without_retry_after_uses_exponential_backoff(clock, tmp_path, monkeypatch):
+    limiter = _limiter(tmp_path, rpm=600, max_retries=2)
+    monkeypatch.setattr(llm_rate_limit, "_limiter", limiter)
+    attempts = []
+
+    def call(retries):
+        attempts.append(clock.now)
+        raise FakeHTTPError(429)
+
+    with pytest.raises(FakeHTTPError):
+        llm_rate_limit.call_with_rate_limit("openai", "m", 10, call)
+
+    assert len(attempts) == 3
+    gaps = [b - a for a, b in zip(attempts, attempts[1:])]
+    assert gaps == [pytest.approx(1.0), pytest.approx(2.0)]
+
+
+def test_async_acquire_runs_sqlite_in_thread(tmp_path, monkeypatch):
+    limiter = _limiter(tmp_path, rpm=600)
+    monkeypatch.setattr(llm_rate_limit, "_limiter", limiter)
+    threads = []
+    real_try_take = limiter._try_take
+
+    def recording_try_take(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return real_try_take(*args, **kwargs)
+
+    monkeypatch.setattr(limiter, "_try_take", recording_try_take)
+
+    async def call(retries):
+        return SimpleNamespace(usage=None)
+
+    asyncio.run(llm_rate_limit.call_with_rate_limit_async("openai", "m", 10, call))
+
+    assert threads and threading.main_thread() not in threads
+
+
+def test_provider_follows_client_base_url():
+    assert llm_rate_limit.client_provider(SimpleNamespace()) == "openai"
+    assert llm_rate_limit.client_provider(SimpleNamespace(base_url="https://api.openai.com/v1/")) == "openai"
+    assert llm_rate_limit.client_provider(SimpleNamespace(base_url="https://api.mistral.ai/v1")) == "mistral"
+    assert llm_rate_limit.client_provider(SimpleNamespace(base_url="http://llm.local:8000/v1")) == "llm.local:8000"
+
+
+def test_gpt_extraction_buckets_by_client_provider(tmp_path, monkeypatch):
+    pytest.importorskip("openai")
+    from services import gpt_extraction, llm_clients
+
+    limiter = _limiter(tmp_path, limits={"llm.local:8000": {"*": {"rpm": 60}}})
+    monkeypatch.setattr(llm_rate_limit, "_limiter", limiter)
+
+    class Client:
+        base_url = "http://llm.local:8000/v1/"
+
+        def __init__(self):
+            self.chat = SimpleNamespace(completions=self)
+
+        def with_options(self, **kwargs):
+            return self
+
+        def create(self, **kwargs):
+            message = SimpleNamespace(content='{"title": "T"}')
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    monkeypatch.setattr(llm_clients, "get_openai_client", lambda *args, **kwargs: Client())
+    gpt_extraction.extract_metadata_with_gpt("Текст статьи", model="m", api_key="test-key", use_cache=False)
+
+    buckets = [row[0] for row in limiter._connect().execute("SELECT bucket FROM buckets")]
+    assert buckets == ["llm.local:8000|m"]
+
+
+def test_bucket_wait_does_not_hold_scheduler_slot(clock, tmp_path, monkeypatch):
+    from services.llm_scheduler import BATCH, LLMScheduler, SchedulerConfig, llm_priority
+
+    limiter = _limiter(tmp_path, rpm=600)
+    scheduler = LLMScheduler(SchedulerConfig(max_concurrent=2, interactive_reserved=1, batch_bucket_reserve=0.5))
+    monkeypatch.setattr(llm_rate_limit, "_limiter", limiter)
+    monkeypatch.setattr(llm_rate_limit, "get_llm_scheduler", lambda: scheduler)
+    seen = []
+    real_acquire = limiter.acquire
+
+    def recording_acquire(provider, model, tokens, reserve=0.0):
+        stats = scheduler.stats()
+        seen.append((stats["interactive"]["running"] + stats["batch"]["running"], reserve))
+        real_acquire(provider, model, tokens, reserve)
+
+    monkeypatch.setattr(limiter, "acquire", recording_acquire)
+
+    def call(retries):
+        seen.append((scheduler.stats()["batch"]["running"], None))
+        return SimpleNamespace(usage=None)
+
+    with llm_priority(BATCH, "archive"):
+        llm_rate_limit.call_with_rate_limit("openai", "m", 10, call)
+
+    # Корзина — без места в очереди (с запасом для интерактивных), запрос — с местом
+    assert seen == [(0, 0.5), (1, None)]
+
+    async def async_call(retries):
+        seen.append((scheduler.stats()["batch"]["running"], None))
+        return SimpleNamespace(usage=None)
+
+    async def acquire_async(provider, model, tokens, reserve=0.0):
+        recording_acquire(provider, model, tokens, reserve)
+
+    monkeypatch.setattr(limiter, "acquire_async", acquire_async)
+    seen.clear()
+
+    async def main():
+        with llm_priority(BATCH, "archive"):
+            await llm_rate_limit.call_with_rate_limit_async("openai", "m", 10, async_call)
+
+    asyncio.run(main())
+    assert seen == [(0, 0.5), (1, None)]
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Optional
+
+import pytest
+
+from services.llm_scheduler import BATCH, INTERACTIVE, LLMScheduler, SchedulerConfig, llm_priority
+
+
+def _scheduler(max_concurrent: int, interactive_reserved: int = 0) -> LLMScheduler:
+    return LLMScheduler(SchedulerConfig(max_concurrent=max_concurrent, interactive_reserved=interactive_reserved))
+
+
+def _wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "условие не выполнено"
+        time.sleep(0.005)
+
+
+class FakeSession:
+    """Запросы одной сессии: каждый — поток, который берет место и записывает свою метку."""
+
+    def __init__(self, scheduler: LLMScheduler, name: str, priority: str = BATCH):
+        self.scheduler = scheduler
+        self.name = name
+        self.priority = priority
+        self.threads = []
+
+    def request(self, log: list, hold: Optional[threading.Event] = None) -> None:
+        """
+        Ставит запрос и ждет, пока он окажется в очереди или получит место
+        (порядок постановки детерминирован).
+        """
+        queued = self._queued()
+        entered = log.count(self.name)
+
+        def run():
+            with llm_priority(self.priority, self.name):
+                with self.scheduler.slot():
+                    log.append(self.name)
+                    if hold is not None:
+                        hold.wait(5)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+        _wait_until(lambda: self._queued() > queued or log.count(self.name) > entered)
+
+    def _queued(self) -> int:
+        return self.scheduler.stats()[self.priority]["queued"]
+
+    def join(self) -> None:
+        for thread in self.threads:
+            thread.join(5)
+
+
+def test_batch_requests_leave_reserved_slots_to_interactive():
+    scheduler = _scheduler(max_concurrent=3, interactive_reserved=1)
+    release = threading.Event()
+    running = []
+    batch = FakeSession(scheduler, "archive")
+    for _ in range(2):
+        batch.request(running, hold=release)
+    batch.request(running, hold=release)  # третий пакетный ждет
+
+    stats = scheduler.stats()
+    assert stats[BATCH]["running"] == 2 and stats[BATCH]["limit"] == 2
+    assert stats[BATCH]["queued"] == 1
+
+    # Интерактивный запрос получает зарезервированное место сразу
+    editor = FakeSession(scheduler, "editor", INTERACTIVE)
+    editor.request(running, hold=release)
+    assert running == ["archive", "archive", "editor"]
+    assert scheduler.stats()[INTERACTIVE]["running"] == 1
+
+    release.set()
+    batch.join()
+    editor.join()
+    assert running.count("archive") == 3
+    assert scheduler.stats()[BATCH]["running"] == 0
+
+
+def test_interactive_is_granted_before_earlier_batch():
+    scheduler = _scheduler(max_concurrent=1)
+    release = threading.Event()
+    order = []
+    holder = FakeSession(scheduler, "holder", INTERACTIVE)
+    holder.request(order, hold=release)
+
+    batch = FakeSession(scheduler, "batch")
+    batch.request(order)
+    editor = FakeSession(scheduler, "editor", INTERACTIVE)
+    editor.request(order)
+
+    release.set()
+    for session in (holder, batch, editor):
+        session.join()
+    assert order == ["holder", "editor", "batch"]
+
+
+def test_sessions_are_served_round_robin():
+    scheduler = _scheduler(max_concurrent=1)
+    release = threading.Event()
+    order = []
+    holder = FakeSession(scheduler, "holder")
+    holder.request(order, hold=release)
+
+    big, small, single = (FakeSession(scheduler, name) for name in ("big", "small", "single"))
+    for session, count in ((big, 3), (small, 2), (single, 1)):
+        for _ in range(count):
+            session.request(order)
+    assert scheduler.stats()[BATCH]["queued_sessions"] == 3
+
+    release.set()
+    for session in (holder, big, small, single):
+        session.join()
+    # Большой архив не задерживает остальные сессии
+    assert order == ["holder", "big", "small", "single", "big", "small", "big"]
+
+
+def test_disabled_scheduler_does_not_limit():
+    scheduler = LLMScheduler(SchedulerConfig(enabled=False, max_concurrent=1))
+    with scheduler.slot():
+        with scheduler.slot() as priority:
+            assert priority == INTERACTIVE
+    assert scheduler.stats()[INTERACTIVE]["granted"] == 0
+
+
+def test_async_slots_follow_priority():
+    scheduler = _scheduler(max_concurrent=1)
+    order = []
+
+    async def request(name, priority):
+        with llm_priority(priority, name):
+            async with scheduler.slot_async():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+    async def main():
+        first = asyncio.create_task(request("first", BATCH))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(request(name, BATCH)) for name in ("b1", "b2")]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("editor", INTERACTIVE)))
+        await asyncio.gather(first, *tasks)
+
+    asyncio.run(main())
+    assert order == ["first", "editor", "b1", "b2"]
+
+
+def test_cancel_while_queued_removes_ticket():
+    scheduler = _scheduler(max_concurrent=1)
+    entered = []
+
+    async def waiter():
+        async with scheduler.slot_async():
+            entered.append(True)
+
+    async def main():
+        with scheduler.slot():
+            task = asyncio.create_task(waiter())
+            await asyncio.sleep(0)
+            assert scheduler.stats()[INTERACTIVE]["queued"] == 1
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert scheduler.stats()[INTERACTIVE]["queued"] == 0
+
+    asyncio.run(main())
+    assert entered == []
+    assert scheduler.stats()[INTERACTIVE]["running"] == 0
+
+
+def test_cancel_after_grant_releases_slot():
+    scheduler = _scheduler(max_concurrent=1)
+    entered = []
+
+    async def waiter():
+        async with scheduler.slot_async():
+            entered.append(True)
+
+    async def main():
+        holder = scheduler.slot()
+        holder.__enter__()
+        task = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        # Освобождение выдает место ожидающему (пробуждение запланировано
+        # в цикле событий), а задача отменяется раньше, чем проснулась
+        holder.__exit__(None, None, None)
+        assert scheduler.stats()[INTERACTIVE]["running"] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # Место вернулось: следующий запрос не ждет
+        async def next_request():
+            async with scheduler.slot_async():
+                return scheduler.stats()[INTERACTIVE]["running"]
+
+        assert await asyncio.wait_for(next_request(), timeout=1) == 1
+
+    asyncio.run(main())
+    assert entered == []
+    stats = scheduler.stats()[INTERACTIVE]
+    assert stats["running"] == 0 and stats["queued"] == 0
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from services import llm_singleflight
+from services.llm_singleflight import SingleFlight, SingleFlightConfig
+
+
+def _flight(tmp_path: Path, timeout: float = 0.2) -> SingleFlight:
+    return SingleFlight(tmp_path / "locks", SingleFlightConfig(wait_timeout_sec=timeout, poll_interval_sec=0.01))
+
+
+def _hold_in_thread(flight: SingleFlight, key: str, release: threading.Event) -> threading.Thread:
+    held = threading.Event()
+
+    def run():
+        with flight.hold(key):
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert held.wait(5)
+    return thread
+
+
+def test_waiter_gets_lock_after_leader(tmp_path):
+    flight = _flight(tmp_path, timeout=5)
+    release = threading.Event()
+    thread = _hold_in_thread(flight, "k", release)
+    threading.Timer(0.1, release.set).start()
+
+    with flight.hold("k") as slot:
+        assert slot.waited and slot.acquired
+    thread.join()
+
+
+def test_wait_timeout_runs_request_without_lock(tmp_path):
+    flight = _flight(tmp_path, timeout=0.2)
+    release = threading.Event()
+    thread = _hold_in_thread(flight, "k", release)
+    timeouts = llm_singleflight.get_single_flight_stats()["timeouts"]
+    try:
+        started = time.monotonic()
+        with flight.hold("k") as slot:
+            assert slot.waited and not slot.acquired
+        assert 0.2 <= time.monotonic() - started < 2
+        assert llm_singleflight.get_single_flight_stats()["timeouts"] == timeouts + 1
+
+        # Другой ключ не ждет
+        with flight.hold("other") as slot:
+            assert not slot.waited and slot.acquired
+    finally:
+        release.set()
+        thread.join()
+
+    # Истекшее ожидание не оставляет блокировку занятой
+    with flight.hold("k") as slot:
+        assert not slot.waited and slot.acquired
+
+
+def test_async_wait_timeout(tmp_path):
+    flight = _flight(tmp_path, timeout=0.2)
+    release = threading.Event()
+    thread = _hold_in_thread(flight, "k", release)
+
+    async def wait_for_key():
+        started = time.monotonic()
+        async with flight.hold_async("k") as slot:
+            return slot, time.monotonic() - started
+
+    try:
+        slot, elapsed = asyncio.run(wait_for_key())
+    finally:
+        release.set()
+        thread.join()
+    assert slot.waited and not slot.acquired
+    assert elapsed >= 0.2
+
+
+# =========================
+# Маршруты ИИ: одинаковые одновременные запросы -> один запрос к API
+# =========================
+
+class _FakeCompletions:
+    def __init__(self, content: str):
+        self.content = content
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.5)
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class _FakeClient:
+    def __init__(self, content: str):
+        self.chat = SimpleNamespace(completions=_FakeCompletions(content))
+
+    def with_options(self, **kwargs):
+        return self
+
+
+@pytest.fixture()
+def ai_app(tmp_path, monkeypatch):
+    pytest.importorskip("openai")
+    flask = pytest.importorskip("flask")
+    import config as config_module
+    from app.routes.markup_routes import register_markup_routes
+    from services import llm_clients, llm_rate_limit
+    from services.llm_rate_limit import RateLimitConfig, RateLimiter
+
+    config_file = tmp_path / "config.json"
+    config_file.write_text(
+        json.dumps({"gpt_extraction": {"cache_dir": str(tmp_path / "gpt_cache")}}), encoding="utf-8"
+    )
+    cfg = config_module.Config(config_file)
+    monkeypatch.setattr(config_module, "get_config", lambda *args, **kwargs: cfg)
+    monkeypatch.setattr(llm_rate_limit, "_limiter", RateLimiter(RateLimitConfig(enabled=False)))
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    # Маршруты читают config.json из текущего каталога
+    monkeypatch.chdir(tmp_path)
+
+    clients = {}
+
+    def install(content: str) -> _FakeCompletions:
+        client = _FakeClient(content)
+        clients["client"] = client
+        return client.chat.completions
+
+    monkeypatch.setattr(llm_clients, "get_openai_client", lambda *args, **kwargs: clients["client"])
+
+    app = flask.Flask(__name__)
+    app.secret_key = "test"
+    register_markup_routes(app, {})
+    return app, install
+
+
+def _post_concurrently(app, url: str, payload: dict, count: int = 2) -> list:
+    results = [None] * count
+
+    def run(index: int):
+        results[index] = app.test_client().post(url, json=payload).get_json()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    return results
+
+
+@pytest.mark.parametrize(
+    ("url", "payload", "content", "check"),
+    [
+        (
+            "/process-annotation-ai",
+            {"field_id": "annotation", "text": "Аннотация. Текст  аннотации\nс переносом."},
+            json.dumps({"text": "Текст аннотации с переносом."}, ensure_ascii=False),
+            lambda result: result["text"] == "Текст аннотации с переносом.",
+        ),
+        (
+            "/process-references-ai",
+            {"field_id": "references_en", "text": "Smith J. First title. Journal, 2001.\nDoe A. Second title. 2003."},
+            json.dumps({"references": ["Smith J. First title. Journal, 2001.", "Doe A. Second title. 2003."]}),
+            lambda result: result["count"] == 2,
+        ),
+    ],
+    ids=["annotation", "references"],
+)
+def test_concurrent_identical_ai_requests_call_api_once(ai_app, url, payload, content, check):
+    app, install = ai_app
+    completions = install(content)
+
+    results = _post_concurrently(app, url, payload)
+
+    assert all(result and result["success"] for result in results), results
+    assert all(check(result) for result in results)
+    assert completions.calls == 1
@@ -0,0 +1,438 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+flask = pytest.importorskip("flask")
+
+from app.routes.markup_routes import _deterministic_references
+
+
+class FakeCompletions:
+    """Ответы LLM по запросам: reply(prompt) -> содержимое ответа (JSON)."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def create(self, **kwargs):
+        prompt = kwargs["messages"][-1]["content"]
+        with self._lock:
+            self.prompts.append(prompt)
+        message = SimpleNamespace(content=self.reply(prompt))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class FakeClient:
+    def __init__(self, completions: FakeCompletions):
+        self.chat = SimpleNamespace(completions=completions)
+
+    def with_options(self, **kwargs):
+        return self
+
+
+@pytest.fixture()
+def ai_app(tmp_path, monkeypatch):
+    """
+    Приложение с маршрутами разметки; install(reply, **references_ai) задает
+    ответы LLM и секцию references_ai в config.json.
+    """
+    import config as config_module
+    from app.routes.markup_routes import register_markup_routes
+    from services import llm_clients, llm_rate_limit
+    from services.llm_rate_limit import RateLimitConfig, RateLimiter
+
+    gpt_section = {"cache_dir": str(tmp_path / "gpt_cache"), "use_cache": False}
+    (tmp_path / "config.json").write_text(json.dumps({"gpt_extraction": gpt_section}), encoding="utf-8")
+    cfg = config_module.Config(tmp_path / "config.json")
+    monkeypatch.setattr(config_module, "get_config", lambda *args, **kwargs: cfg)
+    monkeypatch.setattr(llm_rate_limit, "_limiter", RateLimiter(RateLimitConfig(enabled=False)))
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    # Маршруты читают config.json из текущего каталога
+    monkeypatch.chdir(tmp_path)
+
+    clients = {}
+    monkeypatch.setattr(llm_clients, "get_openai_client", lambda *args, **kwargs: clients["client"])
+
+    def install(reply, **references_ai) -> FakeCompletions:
+        settings = {"gpt_extraction": gpt_section, "references_ai": references_ai}
+        (tmp_path / "config.json").write_text(json.dumps(settings), encoding="utf-8")
+        completions = FakeCompletions(reply)
+        clients["client"] = FakeClient(completions)
+        return completions
+
+    app = flask.Flask(__name__)
+    app.secret_key = "test"
+    register_markup_routes(app, {})
+    return app, install
+
+
+def _references_reply(*references: str):
+    return lambda prompt: json.dumps({"references": list(references)}, ensure_ascii=False)
+
+
+# =========================
+# Разбор списка литературы без LLM (references_ai.deterministic_first)
+# =========================
+
+def _marker(text: str, number: int, marker: str) -> str:
+    """Заменяет маркер "N." записи number в начале строки на marker."""
+    return re.sub(rf"(?m)^{number}\. ", marker + " ", text)
+
+
+NUMBERED = (
+    "1. Иванов И.И. Почвы степной зоны // Почвоведение. 2001. № 3. С. 10–20.\n"
+    "2. Petrov P. Soil biblio-\n"
+    "graphy. Moscow: Nauka, 2003. pp. 1-200.\n"
+    "3. Smith J. A study of the soils. J. Soil, 2005, vol. 3, pp. 1-10. doi:\n"
+    "10.1000/xyz"
+)
+
+NUMBERED_ENTRIES = [
+    "Иванов И.И. Почвы степной зоны // Почвоведение. 2001. № 3. С. 10–20.",
+    "Petrov P. Soil bibliography. Moscow: Nauka, 2003. pp. 1-200.",
+    "Smith J. A study of the soils. J. Soil, 2005, vol. 3, pp. 1-10. doi: 10.1000/xyz",
+]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        NUMBERED,
+        _marker(_marker(_marker(NUMBERED, 1, "1)"), 2, "2)"), 3, "3)"),
+        _marker(_marker(_marker(NUMBERED, 1, "[1]"), 2, "[2]"), 3, "[3]"),
+    ],
+    ids=["dot", "paren", "brackets"],
+)
+def test_numbered_list_is_split_confidently(text):
+    entries, confidence = _deterministic_references(text)
+    assert entries == NUMBERED_ENTRIES
+    assert confidence >= 0.8
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # "1)" и "[1]" в одном списке
+        _marker(_marker(NUMBERED, 1, "1)"), 3, "[3]"),
+        # пропуск номера
+        _marker(NUMBERED, 3, "4."),
+        # номер тома перенесен в начало строки внутри записи
+        NUMBERED.replace("№ 3. С. 10–20.", "Т.\n3. С. 10–20."),
+        # ненумерованный список
+        "\n".join(NUMBERED_ENTRIES),
+        # ненумерованное начало записи "Автор 2001 —" среди нумерованных
+        NUMBERED.replace("graphy.", "graphy.\nSidorov 2004 — Rivers. pp. 3-7."),
+        # без года, страниц и DOI
+        "1. Foo\n2. Bar\n3. Baz",
+    ],
+    ids=["mixed-styles", "gap", "wrapped-number", "unnumbered", "author-year", "low-score"],
+)
+def test_uncertain_lists_are_not_split(text):
+    _entries, confidence = _deterministic_references(text)
+    assert confidence < 0.8
+
+
+def test_confident_list_skips_llm(ai_app):
+    app, install = ai_app
+    completions = install(_references_reply("LLM"))
+
+    result = app.test_client().post(
+        "/process-references-ai", json={"field_id": "references_ru", "text": NUMBERED}
+    ).get_json()
+
+    assert result["success"]
+    assert completions.prompts == []
+    assert result["text"].split("\n") == NUMBERED_ENTRIES
+    assert result["deterministic_chunks"] == result["chunks"] == 1
+
+
+@pytest.mark.parametrize(
+    "text",
+    [_marker(NUMBERED, 3, "4."), "\n".join(NUMBERED_ENTRIES)],
+    ids=["gap", "unnumbered"],
+)
+def test_uncertain_list_falls_back_to_llm(ai_app, text):
+    app, install = ai_app
+    completions = install(_references_reply("Первая запись, 2001.", "Вторая запись, 2002."))
+
+    result = app.test_client().post(
+        "/process-references-ai", json={"field_id": "references_ru", "text": text}
+    ).get_json()
+
+    assert result["success"]
+    assert len(completions.prompts) == 1
+    assert result["text"] == "Первая запись, 2001.\nВторая запись, 2002."
+    assert result["deterministic_chunks"] == 0
+
+
+def test_fast_path_can_be_disabled(ai_app):
+    app, install = ai_app
+    completions = install(
+        _references_reply("Первая запись, 2001.", "Вторая запись, 2002."), deterministic_first=False
+    )
+
+    result = app.test_client().post(
+        "/process-references-ai", json={"field_id": "references_ru", "text": NUMBERED}
+    ).get_json()
+
+    assert result["success"]
+    assert len(completions.prompts) == 1
+
+
+# =========================
+# Размер чанков: бюджет токенов и прежние ключи references_ai
+# =========================
+
+def _numbered_lines(count: int, width: int = 1) -> str:
+    body = "Автор А.А. Название статьи о почвах и климате степной зоны. Журнал. 2001. С. 1–10. " * width
+    return "\n".join(f"{i}. {body.strip()}" for i in range(1, count + 1))
+
+
+def _post_references(app, text: str) -> dict:
+    result = app.test_client().post(
+        "/process-references-ai", json={"field_id": "references_ru", "text": text}
+    ).get_json()
+    assert result["success"], result
+    return result
+
+
+def test_legacy_chunk_size_limits_lines_per_chunk(ai_app):
+    app, install = ai_app
+    reply = _references_reply("Первая запись, 2001.", "Вторая запись, 2002.")
+
+    install(reply, deterministic_first=False)
+    assert _post_references(app, _numbered_lines(6))["chunks"] == 1
+
+    completions = install(reply, deterministic_first=False, chunk_size=2)
+    assert _post_references(app, _numbered_lines(6))["chunks"] == 3
+    assert all(len(prompt.rstrip().split("\n")) >= 2 for prompt in completions.prompts)
+
+
+def test_legacy_max_chunk_chars_caps_token_budget(ai_app):
+    app, install = ai_app
+    reply = _references_reply("Первая запись, 2001.", "Вторая запись, 2002.")
+    text = _numbered_lines(12, width=3)
+
+    install(reply, deterministic_first=False)
+    default_chunks = _post_references(app, text)["chunks"]
+
+    # 2000 символов -> 500 токенов на чанк
+    install(reply, deterministic_first=False, max_chunk_chars=2000)
+    assert _post_references(app, text)["chunks"] > default_chunks
+
+    # Явный chunk_tokens меньше прежнего ограничения — действует он
+    install(reply, deterministic_first=False, chunk_tokens=200)
+    small_chunks = _post_references(app, text)["chunks"]
+    install(reply, deterministic_first=False, max_chunk_chars=100000, chunk_tokens=200)
+    assert _post_references(app, text)["chunks"] == small_chunks > default_chunks
+
+
+# =========================
+# Параллельные чанки (references_ai.max_parallel_chunks)
+# =========================
+
+def _entries(count: int) -> str:
+    return "\n".join(f"{i}. Entry-{i} Автор А.А. Статья. Журнал. 2001. С. 1–10." for i in range(1, count + 1))
+
+
+def _entry_numbers(prompt: str) -> list[int]:
+    return [int(n) for n in re.findall(r"Entry-(\d+)", prompt)]
+
+
+def test_parallel_chunks_keep_source_order_and_dedupe(ai_app):
+    app, install = ai_app
+    started = threading.Barrier(4)
+    finished_events = {n: threading.Event() for n in range(1, 5)}
+    finished = []
+
+    def reply(prompt):
+        (n,) = _entry_numbers(prompt)
+        # Все четыре чанка выполняются одновременно, а заканчиваются в обратном порядке
+        started.wait(5)
+        if n < 4:
+            assert finished_events[n + 1].wait(5)
+        finished.append(n)
+        finished_events[n].set()
+        shared = "Общий источник. 2020. doi:10.1000/shared"
+        return json.dumps({"references": [f"Источник {n}. 2001.", shared]}, ensure_ascii=False)
+
+    install(reply, deterministic_first=False, chunk_size=1, max_parallel_chunks=4)
+    result = _post_references(app, _entries(4))
+
+    assert finished == [4, 3, 2, 1]
+    assert result["chunks"] == 4
+    # Итог — в исходном порядке чанков, повтор между чанками — один раз
+    assert result["text"].split("\n") == [
+        "Источник 1. 2001.",
+        "Общий источник. 2020. doi:10.1000/shared",
+        "Источник 2. 2001.",
+        "Источник 3. 2001.",
+        "Источник 4. 2001.",
+    ]
+
+
+def test_failing_chunk_fails_request(ai_app):
+    app, install = ai_app
+
+    def reply(prompt):
+        if _entry_numbers(prompt) == [2]:
+            raise RuntimeError("upstream failure")
+        return json.dumps({"references": ["Источник. 2001."]}, ensure_ascii=False)
+
+    install(reply, deterministic_first=False, chunk_size=1, max_parallel_chunks=2)
+    response = app.test_client().post(
+        "/process-references-ai", json={"field_id": "references_ru", "text": _entries(3)}
+    )
+
+    assert response.status_code == 500
+    result = response.get_json()
+    assert not result["success"]
+    assert "upstream failure" in result["error"]
+
+
+def test_chunk_threads_inherit_priority_and_session(ai_app):
+    from app.session_utils import SESSION_ID_KEY
+    from services.llm_scheduler import INTERACTIVE, current_priority
+
+    app, install = ai_app
+    seen = []
+    lock = threading.Lock()
+
+    def reply(prompt):
+        with lock:
+            seen.append((current_priority(), threading.current_thread().name))
+        return json.dumps({"references": [f"Источник {_entry_numbers(prompt)[0]}. 2001."]}, ensure_ascii=False)
+
+    install(reply, deterministic_first=False, chunk_size=1, max_parallel_chunks=3)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess[SESSION_ID_KEY] = "editor-session"
+    result = client.post(
+        "/process-references-ai", json={"field_id": "references_ru", "text": _entries(3)}
+    ).get_json()
+
+    assert result["success"]
+    assert len(seen) == 3
+    assert {priority for priority, _ in seen} == {(INTERACTIVE, "editor-session")}
+    assert all(name.startswith("references-ai") for _, name in seen)
+
+
+# =========================
+# Потоковые ответы (Server-Sent Events)
+# =========================
+
+def _sse_events(response) -> list[tuple[str, dict]]:
+    assert response.mimetype == "text/event-stream"
+    events = []
+    for block in response.get_data(as_text=True).split("\n\n"):
+        if not block.strip():
+            continue
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_references_stream_sends_start_chunks_done(ai_app, monkeypatch):
+    from app.routes import markup_routes
+
+    monkeypatch.setattr(markup_routes, "_SSE_PROGRESS_INTERVAL_SEC", 0.05)
+    app, install = ai_app
+
+    def reply(prompt):
+        time.sleep(0.2)
+        return json.dumps({"references": [f"Источник {_entry_numbers(prompt)[0]}. 2001."]}, ensure_ascii=False)
+
+    install(reply, deterministic_first=False, chunk_size=1, max_parallel_chunks=2)
+    response = app.test_client().post(
+        "/process-references-ai/stream", json={"field_id": "references_ru", "text": _entries(2)}
+    )
+    events = _sse_events(response)
+    names = [name for name, _ in events]
+
+    assert names[0] == "start" and events[0][1]["chunks"] == 2
+    assert names[-1] == "done"
+    assert "progress" in names
+    chunks = [payload for name, payload in events if name == "chunk"]
+    assert sorted(chunk["index"] for chunk in chunks) == [1, 2]
+    assert [chunk["completed"] for chunk in chunks] == [1, 2]
+    assert all(chunk["total"] == 2 and chunk["count"] == 1 for chunk in chunks)
+    # Все чанки — до итога
+    assert names.index("done") > max(i for i, name in enumerate(names) if name == "chunk")
+    assert events[-1][1]["text"] == "Источник 1. 2001.\nИсточник 2. 2001."
+
+
+@pytest.mark.parametrize(
+    ("text", "status", "message"),
+    [("   ", 400, "пуст"), (None, 500, "upstream failure")],
+    ids=["empty", "llm-error"],
+)
+def test_references_stream_reports_error_event(ai_app, text, status, message):
+    app, install = ai_app
+
+    def reply(prompt):
+        raise RuntimeError("upstream failure")
+
+    install(reply, deterministic_first=False)
+    response = app.test_client().post(
+        "/process-references-ai/stream",
+        json={"field_id": "references_ru", "text": _entries(2) if text is None else text},
+    )
+
+    assert response.status_code == 200
+    events = _sse_events(response)
+    assert events[-1][0] == "error"
+    assert events[-1][1]["status"] == status
+    assert message in events[-1][1]["error"]
+    assert "done" not in [name for name, _ in events]
+
+
+def test_annotation_stream_sends_start_done(ai_app, monkeypatch):
+    from app.routes import markup_routes
+
+    monkeypatch.setattr(markup_routes, "_SSE_PROGRESS_INTERVAL_SEC", 0.05)
+    app, install = ai_app
+
+    def reply(prompt):
+        time.sleep(0.2)
+        return json.dumps({"text": "Очищенная аннотация."}, ensure_ascii=False)
+
+    install(reply)
+    response = app.test_client().post(
+        "/process-annotation-ai/stream", json={"field_id": "annotation", "text": "Аннотация. Текст\nаннотации."}
+    )
+    events = _sse_events(response)
+    names = [name for name, _ in events]
+
+    assert names[0] == "start" and events[0][1]["field_id"] == "annotation"
+    assert "progress" in names
+    assert names[-1] == "done"
+    assert events[-1][1]["text"] == "Очищенная аннотация."
+
+
+@pytest.mark.parametrize(
+    ("field_id", "status"),
+    [("title", 400), ("annotation", 500)],
+    ids=["bad-field", "llm-error"],
+)
+def test_annotation_stream_reports_error_event(ai_app, field_id, status):
+    app, install = ai_app
+
+    def reply(prompt):
+        raise RuntimeError("upstream failure")
+
+    install(reply)
+    response = app.test_client().post(
+        "/process-annotation-ai/stream", json={"field_id": field_id, "text": "Текст аннотации."}
+    )
+    events = _sse_events(response)
+
+    assert [name for name, _ in events] == ["start", "error"]
+    assert events[-1][1]["status"] == status
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+fitz = pytest.importorskip("fitz")
+pdfplumber = pytest.importorskip("pdfplumber")
+
+from converters import pdf_layout_cache
+from metadata_markup import extract_text_from_pdf
+
+
+def _reference_lines(pages):
+    """Прежняя группировка слов по строкам (словарь по round(top, 1))."""
+    lines = []
+    for page_num, words in enumerate(pages, start=1):
+        lines_by_y = {}
+        for word in words:
+            lines_by_y.setdefault(round(word["top"], 1), []).append(word)
+        for y in sorted(lines_by_y, reverse=True):
+            words_in_line = sorted(lines_by_y[y], key=lambda w: w["x0"])
+            lines.append({
+                "text": " ".join(w["text"] for w in words_in_line).strip(),
+                "page": page_num,
+                "bbox": (
+                    min(w["x0"] for w in words_in_line),
+                    words_in_line[0]["top"],
+                    max(w["x1"] for w in words_in_line),
+                    words_in_line[0]["bottom"],
+                ),
+                "y_position": y,
+            })
+    return lines
+
+
+def _strip_ids(lines):
+    return [{k: v for k, v in line.items() if k not in ("id", "line_number")} for line in lines]
+
+
+class FakePage:
+    def __init__(self, words):
+        self.words = words
+
+    def extract_words(self):
+        return [dict(word) for word in self.words]
+
+
+def _word(text, x0, top, x1, bottom):
+    return {"text": text, "x0": x0, "top": top, "x1": x1, "bottom": bottom}
+
+
+def test_line_bbox_takes_top_bottom_from_first_word(monkeypatch):
+    # Слова одной строки (top округляется до 100.0) разной высоты:
+    # top/bottom строки — у самого левого слова, а не охват строки
+    pages = [[
+        _word("tall", 80.0, 99.96, 100.0, 114.0),
+        _word("first", 10.0, 100.04, 40.0, 110.0),
+        _word("low", 45.0, 100.01, 70.0, 111.5),
+        _word("Next", 10.0, 130.0, 50.0, 140.0),
+    ]]
+
+    @contextmanager
+    def fake_open(path, config=None):
+        yield type("FakeDoc", (), {"pages": [FakePage(words) for words in pages]})()
+
+    monkeypatch.setattr(pdf_layout_cache, "open_pdf_layout", fake_open)
+    lines = extract_text_from_pdf(Path("fake.pdf"), include_bbox=True)
+
+    assert _strip_ids(lines) == _reference_lines(pages)
+    assert lines[1]["text"] == "first low tall"
+    assert lines[1]["bbox"] == (10.0, 100.04, 100.0, 110.0)
+    assert [line["id"] for line in lines] == [1, 2]
+
+
+def test_line_bboxes_match_previous_grouping(tmp_path, monkeypatch):
+    cache_config = pdf_layout_cache.PDFLayoutCacheConfig(cache_dir=tmp_path / "cache")
+    monkeypatch.setattr(pdf_layout_cache, "load_layout_cache_config", lambda: cache_config)
+    path = tmp_path / "sample.pdf"
+    doc = fitz.open()
+    for page_no in range(2):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 60), f"Title of page {page_no}", fontsize=14)
+        for i in range(15):
+            y = 100 + i * 14
+            page.insert_text((60, y), f"Line {i}", fontsize=9)
+            page.insert_text((120, y), "BIG", fontsize=12)
+            page.insert_text((200, y), "small words", fontsize=7)
+    doc.save(path)
+
+    with pdfplumber.open(path) as pdf:
+        expected = _reference_lines([page.extract_words() for page in pdf.pages])
+
+    assert _strip_ids(extract_text_from_pdf(path, include_bbox=True)) == expected
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("pdfplumber")
+
+import config as config_module
+from converters import pdf_backend, pdf_layout_cache, pdf_to_html
+
+
+@pytest.fixture()
+def use_config(tmp_path, monkeypatch):
+    """Подставляет config.json с указанной секцией pdf_backend (None — без секции)."""
+
+    def install(section):
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps({} if section is None else {"pdf_backend": section}), encoding="utf-8")
+        cfg = config_module.Config(path)
+        if section is None:
+            cfg._config.pop("pdf_backend", None)
+        monkeypatch.setattr(config_module, "get_config", lambda *args, **kwargs: cfg)
+
+    return install
+
+
+@pytest.fixture()
+def sample_pdf(tmp_path, monkeypatch) -> Path:
+    cache_config = pdf_layout_cache.PDFLayoutCacheConfig(cache_dir=tmp_path / "layout_cache")
+    monkeypatch.setattr(pdf_layout_cache, "load_layout_cache_config", lambda: cache_config)
+    path = tmp_path / "sample.pdf"
+    doc = fitz.open()
+    for page_no in range(3):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 60), f"Article title, page {page_no + 1}", fontsize=14)
+        for i in range(10):
+            page.insert_text((72, 100 + i * 14), f"Body text line {i} of the sample document.", fontsize=10)
+    doc.save(path)
+    return path
+
+
+@pytest.mark.parametrize(
+    "section",
+    [None, {}, {"mode": ""}, {"mode": "unknown"}, {"mode": "PDFPlumber"}],
+    ids=["no-section", "no-mode", "empty", "unknown", "case"],
+)
+def test_default_mode_is_pdfplumber(use_config, section):
+    use_config(section)
+    assert pdf_backend.PDFBackendConfig().mode == "pdfplumber"
+    assert pdf_backend.load_backend_config().mode == "pdfplumber"
+    assert pdf_backend.resolve_mode(pdf_backend.load_backend_config()) == "pdfplumber"
+    assert pdf_to_html._choose_line_extractor() is pdf_to_html._extract_lines_pdfplumber
+
+
+def test_auto_mode_is_opt_in(use_config):
+    use_config({"mode": "auto"})
+    assert pdf_backend.load_backend_config().mode == "auto"
+    assert pdf_to_html._choose_line_extractor() is pdf_to_html._extract_lines_auto
+
+
+def test_default_mode_reads_pages_with_pdfplumber_only(use_config, sample_pdf, monkeypatch):
+    use_config(None)
+
+    def no_pymupdf(*args, **kwargs):
+        raise AssertionError("PyMuPDF не должен открываться в режиме pdfplumber")
+
+    monkeypatch.setattr(pdf_backend.fitz, "open", no_pymupdf)
+    pages, report = pdf_backend.extract_pages(
+        sample_pdf,
+        pymupdf_page=no_pymupdf,
+        pdfplumber_page=lambda page: page.extract_text(),
+        text_of=lambda text: text,
+    )
+
+    import pdfplumber
+
+    with pdfplumber.open(sample_pdf) as pdf:
+        expected = {i: page.extract_text() for i, page in enumerate(pdf.pages)}
+    assert pages == expected
+    assert [(r.backend, r.escalated) for r in report.pages] == [("pdfplumber", False)] * 3
+
+
+def test_record_logs_instead_of_printing(use_config, sample_pdf, capsys, caplog):
+    use_config(None)
+    with caplog.at_level(logging.DEBUG, logger=pdf_backend.__name__):
+        pdf_backend.extract_pages(
+            sample_pdf,
+            pymupdf_page=lambda page: "",
+            pdfplumber_page=lambda page: page.extract_text(),
+            text_of=lambda text: text,
+        )
+
+    assert "pdf_backend" not in capsys.readouterr().out
+    messages = [record.getMessage() for record in caplog.records if record.name == pdf_backend.__name__]
+    assert any("pdf_backend pdfplumber: sample.pdf, страниц 3" in message for message in messages)
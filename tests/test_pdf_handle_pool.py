@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pdfplumber")
+
+from converters import pdf_handle_pool
+from converters.pdf_handle_pool import PDFHandlePool, PDFHandlePoolConfig
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakePDF:
+    def __init__(self, path):
+        self.path = Path(path).name
+        self.closed = False
+        self._pages = [FakePage()]
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture()
+def opened(monkeypatch):
+    """Подменяет pdfplumber.open: возвращает FakePDF и запоминает открытые документы."""
+    documents = []
+
+    def fake_open(path):
+        pdf = FakePDF(path)
+        documents.append(pdf)
+        return pdf
+
+    monkeypatch.setattr(pdf_handle_pool.pdfplumber, "open", fake_open)
+    return documents
+
+
+def _files(tmp_path, *sizes):
+    paths = []
+    for i, size in enumerate(sizes):
+        path = tmp_path / f"doc{i}.pdf"
+        path.write_bytes(b"x" * size)
+        paths.append(path)
+    return paths
+
+
+def test_handle_is_reused_between_checkouts(tmp_path, opened):
+    pool = PDFHandlePool()
+    (path,) = _files(tmp_path, 100)
+
+    with pool.checkout(path) as first:
+        page = first._pages[0]
+    with pool.checkout(path) as second:
+        pass
+
+    assert second is first and not first.closed
+    assert page.closed  # страницы освобождаются при возврате
+    assert len(opened) == 1
+    stats = pool.stats()
+    assert (stats["opened"], stats["reused"], stats["idle"], stats["in_use"]) == (1, 1, 1, 0)
+
+
+def test_concurrent_checkouts_get_separate_handles(tmp_path, opened):
+    pool = PDFHandlePool()
+    (path,) = _files(tmp_path, 100)
+
+    with pool.checkout(path) as first:
+        with pool.checkout(path) as second:
+            assert second is not first
+            assert pool.stats()["in_use"] == 2
+    assert pool.stats()["idle"] == 2
+    with pool.checkout(path) as again:
+        assert again in (first, second)
+
+
+def test_changed_file_gets_new_handle(tmp_path, opened):
+    pool = PDFHandlePool()
+    (path,) = _files(tmp_path, 100)
+    with pool.checkout(path) as old:
+        pass
+
+    path.write_bytes(b"y" * 200)
+    with pool.checkout(path) as new:
+        assert new is not old
+    assert old.closed
+    assert pool.stats()["idle"] == 1
+
+
+def test_lru_limit_closes_least_recently_used(tmp_path, opened):
+    pool = PDFHandlePool(PDFHandlePoolConfig(max_handles=2))
+    paths = _files(tmp_path, 10, 10, 10)
+    for path in paths:
+        with pool.checkout(path):
+            pass
+
+    assert [(pdf.path, pdf.closed) for pdf in opened] == [("doc0.pdf", True), ("doc1.pdf", False), ("doc2.pdf", False)]
+    assert pool.stats()["idle"] == 2
+
+    # doc1 использован недавно — при следующем открытии закрывается doc2
+    with pool.checkout(paths[1]):
+        pass
+    with pool.checkout(paths[0]):
+        pass
+    assert [pdf.closed for pdf in opened[1:3]] == [False, True]
+
+
+def test_memory_budget_limits_idle_handles(tmp_path, opened):
+    # Оценка памяти — размер файла * MEMORY_FACTOR
+    pool = PDFHandlePool(PDFHandlePoolConfig(max_memory_mb=3 * 1024 / (1024 * 1024)))
+    small, large = _files(tmp_path, 1024, 2048)
+    with pool.checkout(small):
+        pass
+    with pool.checkout(large):
+        pass
+
+    assert [pdf.closed for pdf in opened] == [True, True]
+    assert pool.stats()["idle"] == 0
+
+
+def test_idle_timeout(tmp_path, opened, monkeypatch):
+    clock = [1000.0]
+
+    class FakeTime:
+        @staticmethod
+        def monotonic():
+            return clock[0]
+
+    monkeypatch.setattr(pdf_handle_pool, "time", FakeTime)
+    pool = PDFHandlePool(PDFHandlePoolConfig(idle_timeout_sec=60))
+    first, second = _files(tmp_path, 10, 10)
+    with pool.checkout(first):
+        pass
+
+    clock[0] += 61
+    with pool.checkout(second):
+        pass
+    assert opened[0].closed and not opened[1].closed
+    with pool.checkout(first) as again:
+        assert again is not opened[0]
+
+
+def test_error_in_block_discards_handle(tmp_path, opened):
+    pool = PDFHandlePool()
+    (path,) = _files(tmp_path, 10)
+    with pytest.raises(ValueError):
+        with pool.checkout(path):
+            raise ValueError("ошибка разбора")
+
+    assert opened[0].closed
+    assert pool.stats()["idle"] == 0 and pool.stats()["in_use"] == 0
+
+
+def test_clear_closes_idle_handles(tmp_path, opened):
+    pool = PDFHandlePool()
+    for path in _files(tmp_path, 10, 10):
+        with pool.checkout(path):
+            pass
+    pool.clear()
+    assert all(pdf.closed for pdf in opened)
+    assert pool.stats()["closed"] == 2
+
+
+def test_open_error_does_not_leak_slot(tmp_path, monkeypatch):
+    def broken(path):
+        raise ValueError("не PDF")
+
+    monkeypatch.setattr(pdf_handle_pool.pdfplumber, "open", broken)
+    pool = PDFHandlePool()
+    (path,) = _files(tmp_path, 10)
+    with pytest.raises(ValueError):
+        pool.acquire(path)
+    assert pool.stats()["in_use"] == 0
+
+
+def test_layout_documents_share_pooled_handle(tmp_path, monkeypatch):
+    fitz = pytest.importorskip("fitz")
+    from converters import pdf_layout_cache
+
+    path = tmp_path / "article.pdf"
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Pooled document", fontsize=12)
+    doc.save(path)
+    pool = PDFHandlePool()
+    monkeypatch.setattr(pdf_handle_pool, "_pool", pool)
+    config = pdf_layout_cache.PDFLayoutCacheConfig(enabled=False)
+
+    for _ in range(3):
+        with pdf_layout_cache.open_pdf_layout(path, config) as pdf:
+            assert pdf.pages[0].extract_text() == "Pooled document"
+
+    stats = pool.stats()
+    assert (stats["opened"], stats["reused"], stats["idle"], stats["in_use"]) == (1, 2, 1, 0)
+    pool.clear()
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import io
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from converters import pdf_image_cache
+from converters.pdf_image_cache import PDFImageCacheConfig, get_image_cache_stats, get_page_image
+
+
+class FakeRenderer:
+    """Рендер без poppler: страница — однотонное изображение, размер зависит от dpi."""
+
+    def __init__(self):
+        self.calls = []
+
+    def page(self, pdf_path, page_index, dpi):
+        self.calls.append((Path(pdf_path).name, page_index, dpi))
+        return Image.new("RGB", (dpi, dpi * 3 // 2), (page_index * 40 % 256, 90, 160))
+
+
+@pytest.fixture()
+def renderer(monkeypatch):
+    fake = FakeRenderer()
+    monkeypatch.setattr(pdf_image_cache, "render_page", fake.page)
+    # Учет объема кэша — с чистого листа для каждого теста
+    monkeypatch.setattr(pdf_image_cache, "_approx_bytes", None)
+    return fake
+
+
+@pytest.fixture()
+def pdf_file(tmp_path) -> Path:
+    path = tmp_path / "article.pdf"
+    path.write_bytes(b"%PDF-1.4 fake document")
+    return path
+
+
+def _config(tmp_path, **overrides) -> PDFImageCacheConfig:
+    return PDFImageCacheConfig(cache_dir=tmp_path / "images", **overrides)
+
+
+def _delta(before, name):
+    return get_image_cache_stats()[name] - before[name]
+
+
+def test_second_request_is_served_from_disk(tmp_path, pdf_file, renderer):
+    config = _config(tmp_path)
+    before = get_image_cache_stats()
+
+    first = get_page_image(pdf_file, 1, dpi=100, config=config)
+    second = get_page_image(pdf_file, 1, dpi=100, config=config)
+
+    assert renderer.calls == [("article.pdf", 1, 100)]
+    assert second == first
+    assert first.mimetype == "image/png"
+    assert Image.open(io.BytesIO(first.data)).size == (100, 150)
+    assert _delta(before, "misses") == 1 and _delta(before, "hits") == 1
+
+    # Другие параметры рендера — отдельная запись и отдельный ETag
+    other = get_page_image(pdf_file, 1, dpi=120, config=config)
+    assert other.etag != first.etag
+    assert len(renderer.calls) == 2
+
+
+def test_key_is_normalized(tmp_path, pdf_file):
+    config = _config(tmp_path, dpi=150, quality=70)
+    key = pdf_image_cache.make_page_image_key(pdf_file, -3, dpi=1000, image_format="JPG", config=config)
+    assert (key.page_index, key.dpi, key.image_format, key.quality) == (0, pdf_image_cache.MAX_DPI, "jpeg", 70)
+    assert key.mimetype == "image/jpeg"
+
+    png = pdf_image_cache.make_page_image_key(pdf_file, 2, image_format="bmp", quality=10, config=config)
+    assert (png.dpi, png.image_format, png.quality) == (150, "png", 0)
+    assert png.etag == pdf_image_cache.make_page_image_key(pdf_file, 2, config=config).etag
+
+
+def test_disabled_cache_always_renders(tmp_path, pdf_file, renderer):
+    config = _config(tmp_path, enabled=False)
+    get_page_image(pdf_file, 0, config=config)
+    get_page_image(pdf_file, 0, config=config)
+    assert len(renderer.calls) == 2
+    assert not (tmp_path / "images").exists()
+
+
+def test_writes_over_budget_evict_least_recently_used(tmp_path, pdf_file, renderer):
+    probe = get_page_image(pdf_file, 0, dpi=100, config=_config(tmp_path, enabled=False))
+    size = len(probe.data)
+    # Помещаются два изображения; после вытеснения кэш не больше 90% лимита
+    config = _config(tmp_path, max_size_mb=2.5 * size / (1024 * 1024))
+
+    def cached(page_index):
+        return pdf_image_cache.make_page_image_key(pdf_file, page_index, dpi=100, config=config).cache_path(
+            config.cache_dir
+        )
+
+    now = time.time()
+    for page_index in (0, 1):
+        get_page_image(pdf_file, page_index, dpi=100, config=config)
+        os.utime(cached(page_index), (now - 60 + page_index * 10, now - 60 + page_index * 10))
+    # Чтение страницы 0 делает ее недавно использованной
+    renderer.calls.clear()
+    get_page_image(pdf_file, 0, dpi=100, config=config)
+    assert renderer.calls == []
+
+    before = get_image_cache_stats()
+    get_page_image(pdf_file, 2, dpi=100, config=config)
+
+    assert _delta(before, "evicted_files") == 1
+    assert [cached(i).exists() for i in range(3)] == [True, False, True]
+    # Вытесненная страница рендерится заново
+    get_page_image(pdf_file, 1, dpi=100, config=config)
+    assert renderer.calls[-1] == ("article.pdf", 1, 100)
+
+
+def test_enforce_budget_trims_to_ninety_percent(tmp_path, pdf_file, renderer):
+    config = _config(tmp_path)
+    for page_index in range(5):
+        get_page_image(pdf_file, page_index, dpi=100, config=config)
+    files = sorted((config.cache_dir).rglob("*.png"))
+    size = files[0].stat().st_size
+    for age, path in enumerate(reversed(files)):
+        os.utime(path, (time.time() - age * 10, time.time() - age * 10))
+
+    # Лимит — 4 файла; 90% от него — 3.6, поэтому остаются 3 самых новых
+    tight = _config(tmp_path, max_size_mb=4 * size / (1024 * 1024))
+    assert pdf_image_cache.enforce_image_budget(tight) == 2
+    assert sorted(p for p in files if p.exists()) == files[2:]
+    assert pdf_image_cache.enforce_image_budget(tight) == 0
+
+
+# =========================
+# Спрайт миниатюр и фоновый рендер
+# =========================
+
+def _thumbnails(calls):
+    def render(pdf_path, width):
+        calls.append(("thumbnails", Path(pdf_path).name))
+        return [Image.new("RGB", (width, width + 10 * i), "gray") for i in range(3)]
+
+    return render
+
+
+def test_thumbnail_strip_layout_and_cache(tmp_path, pdf_file, monkeypatch):
+    calls = []
+    monkeypatch.setattr(pdf_image_cache, "render_thumbnails", _thumbnails(calls))
+    monkeypatch.setattr(pdf_image_cache, "_approx_bytes", None)
+    config = _config(tmp_path, thumbnail_width=40, thumbnail_columns=2)
+
+    image, layout = pdf_image_cache.get_thumbnail_strip(pdf_file, config=config)
+
+    assert (layout["total_pages"], layout["columns"]) == (3, 2)
+    assert (layout["tile_width"], layout["tile_height"]) == (40, 60)
+    assert [(t["page"], t["x"], t["y"], t["height"]) for t in layout["tiles"]] == [
+        (0, 0, 0, 40), (1, 40, 0, 50), (2, 0, 60, 60),
+    ]
+    assert Image.open(io.BytesIO(image.data)).size == (80, 120)
+
+    assert pdf_image_cache.get_thumbnail_strip(pdf_file, config=config) == (image, layout)
+    assert calls == [("thumbnails", "article.pdf")]
+
+
+@pytest.fixture()
+def prerender(monkeypatch):
+    """Отдельная очередь фонового рендера: потоки других тестов ее не видят."""
+    import queue
+
+    monkeypatch.setattr(pdf_image_cache, "_prerender_queue", queue.Queue())
+    monkeypatch.setattr(pdf_image_cache, "_prerender_pending", set())
+    monkeypatch.setattr(pdf_image_cache, "_prerender_threads", [])
+    monkeypatch.setattr(pdf_image_cache, "_approx_bytes", None)
+    calls = []
+    monkeypatch.setattr(pdf_image_cache, "render_thumbnails", _thumbnails(calls))
+    monkeypatch.setattr(
+        pdf_image_cache, "render_page",
+        lambda path, page_index, dpi: calls.append(("first_page", Path(path).name)) or Image.new("RGB", (30, 40)),
+    )
+    # Фоновые потоки — демоны; после теста они ждут на своей пустой очереди
+    return calls
+
+
+def _documents(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"doc{i}.pdf"
+        path.write_bytes(f"%PDF-1.4 document {i}".encode())
+        paths.append(path)
+    return paths
+
+
+def test_prerender_renders_first_pages_before_thumbnails(tmp_path, prerender):
+    config = _config(tmp_path, prerender_workers=1)
+    paths = _documents(tmp_path, 3)
+
+    assert pdf_image_cache.schedule_prerender(paths, config) == 6
+    pdf_image_cache._prerender_queue.join()
+
+    assert prerender == [("first_page", p.name) for p in paths] + [("thumbnails", p.name) for p in paths]
+    assert get_image_cache_stats()["prerender_pending"] == 0
+
+    # Открытие документа после загрузки — попадание в кэш
+    before = get_image_cache_stats()
+    for path in paths:
+        get_page_image(path, 0, config=config)
+        pdf_image_cache.get_thumbnail_strip(path, config=config)
+    assert _delta(before, "hits") == 6 and _delta(before, "misses") == 0
+
+
+def test_prerender_skips_queued_tasks_and_survives_errors(tmp_path, prerender, monkeypatch):
+    import threading
+
+    config = _config(tmp_path, prerender_workers=1)
+    broken, ok = _documents(tmp_path, 2)
+    release = threading.Event()
+    real_render = pdf_image_cache.render_page
+
+    def render(path, page_index, dpi):
+        release.wait(5)
+        if Path(path) == broken:
+            raise ValueError("битый PDF")
+        return real_render(path, page_index, dpi)
+
+    monkeypatch.setattr(pdf_image_cache, "render_page", render)
+    assert pdf_image_cache.schedule_prerender([broken, ok], config) == 4
+    # Задачи еще в очереди — повторная загрузка их не дублирует
+    assert pdf_image_cache.schedule_prerender([ok], config) == 0
+    assert len(pdf_image_cache._prerender_threads) == 1
+
+    release.set()
+    pdf_image_cache._prerender_queue.join()
+    assert prerender == [("first_page", "doc1.pdf"), ("thumbnails", "doc0.pdf"), ("thumbnails", "doc1.pdf")]
+    # После выполнения задачи снова можно поставить
+    assert pdf_image_cache.schedule_prerender([ok], config) == 2
+    pdf_image_cache._prerender_queue.join()
+
+
+def test_prerender_disabled_with_cache(tmp_path, prerender):
+    config = _config(tmp_path, enabled=False)
+    assert pdf_image_cache.schedule_prerender(_documents(tmp_path, 2), config) == 0
+    assert pdf_image_cache._prerender_threads == []
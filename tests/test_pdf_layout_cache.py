@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pdfplumber = pytest.importorskip("pdfplumber")
+
+from converters import pdf_handle_pool, pdf_layout_cache
+from converters.pdf_layout_cache import PDFLayoutCacheConfig, get_layout_cache_stats, open_pdf_layout
+
+
+def _make_pdf(path: Path, title: str = "SOIL SCIENCE ARTICLE") -> Path:
+    doc = fitz.open()
+    for page_no in range(2):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 60), f"{title} {page_no + 1}", fontsize=14)
+        page.insert_text((72, 80), "Иванов И.И., Петров П.П.  Почвенный институт", fontsize=10, fontname="helv")
+        for i in range(20):
+            page.insert_text((60, 120 + i * 14), f"Left column line {i} with words", fontsize=9)
+            page.insert_text((320, 120 + i * 14), f"Right column line {i}, more text", fontsize=9)
+    doc.save(path)
+    return path
+
+
+@pytest.fixture()
+def cache_config(tmp_path) -> PDFLayoutCacheConfig:
+    pdf_layout_cache.clear_memory_cache()
+    yield PDFLayoutCacheConfig(cache_dir=tmp_path / "cache", memory_pages=8)
+    pdf_layout_cache.clear_memory_cache()
+
+
+def _delta(before, name):
+    return get_layout_cache_stats()[name] - before[name]
+
+
+def _layout(path: Path, config: PDFLayoutCacheConfig):
+    with open_pdf_layout(path, config) as pdf:
+        return [
+            (
+                page.bbox,
+                page.extract_words(),
+                page.extract_words(x_tolerance=1.5, keep_blank_chars=True),
+                page.extract_text(),
+                page.crop((50, 100, 300, 300)).extract_text(),
+                page.within_bbox((300, 100, 595, 400)).extract_words(),
+            )
+            for page in pdf.pages
+        ]
+
+
+def _pdfplumber_layout(path: Path):
+    with pdfplumber.open(path) as pdf:
+        return [
+            (
+                tuple(float(v) for v in page.bbox),
+                page.extract_words(),
+                page.extract_words(x_tolerance=1.5, keep_blank_chars=True),
+                page.extract_text(),
+                page.crop((50, 100, 300, 300)).extract_text(),
+                page.within_bbox((300, 100, 595, 400)).extract_words(),
+            )
+            for page in pdf.pages
+        ]
+
+
+def test_round_trip_matches_pdfplumber(tmp_path, cache_config, monkeypatch):
+    path = _make_pdf(tmp_path / "article.pdf")
+    expected = _pdfplumber_layout(path)
+
+    before = get_layout_cache_stats()
+    assert _layout(path, cache_config) == expected
+    assert _delta(before, "misses") == 2 and _delta(before, "writes") == 2
+
+    # Повторное чтение — из памяти процесса
+    before = get_layout_cache_stats()
+    assert _layout(path, cache_config) == expected
+    assert _delta(before, "memory_hits") == 2 and _delta(before, "misses") == 0
+
+    # Новый процесс: только диск, pdfplumber не открывается
+    pdf_layout_cache.clear_memory_cache()
+
+    def no_source(*args, **kwargs):
+        raise AssertionError("pdfplumber не должен открываться при попадании в кэш")
+
+    monkeypatch.setattr(pdf_handle_pool, "get_handle_pool", no_source)
+    before = get_layout_cache_stats()
+    assert _layout(path, cache_config) == expected
+    assert _delta(before, "disk_hits") == 2 and _delta(before, "misses") == 0
+
+
+def test_cache_key_is_file_content(tmp_path, cache_config):
+    path = _make_pdf(tmp_path / "article.pdf")
+    _layout(path, cache_config)
+    copy = tmp_path / "uploads" / "renamed.pdf"
+    copy.parent.mkdir()
+    shutil.copy(path, copy)
+
+    before = get_layout_cache_stats()
+    assert _layout(copy, cache_config) == _pdfplumber_layout(path)
+    assert _delta(before, "misses") == 0
+
+    # Другой файл по тому же пути — новый разбор
+    _make_pdf(path, title="ANOTHER ARTICLE")
+    before = get_layout_cache_stats()
+    with open_pdf_layout(path, cache_config) as pdf:
+        assert pdf.pages[0].extract_words()[0]["text"] == "ANOTHER"
+    assert _delta(before, "misses") == 1
+
+
+def test_disabled_cache_writes_nothing(tmp_path, cache_config):
+    config = PDFLayoutCacheConfig(enabled=False, cache_dir=cache_config.cache_dir)
+    path = _make_pdf(tmp_path / "article.pdf")
+    assert _layout(path, config) == _pdfplumber_layout(path)
+    assert not Path(config.cache_dir).exists()
+
+
+def test_disk_budget_evicts_least_recently_used(tmp_path, cache_config):
+    old = _make_pdf(tmp_path / "old.pdf", title="OLD")
+    new = _make_pdf(tmp_path / "new.pdf", title="NEW")
+    _layout(old, cache_config)
+    _layout(new, cache_config)
+
+    def doc_dir(path):
+        return pdf_layout_cache._document_dir(cache_config, pdf_layout_cache.file_sha256(path))
+
+    past = doc_dir(new).joinpath("meta.json.gz").stat().st_mtime - 100
+    os.utime(doc_dir(old) / "meta.json.gz", (past, past))
+    new_size = sum(f.stat().st_size for f in doc_dir(new).iterdir())
+    config = PDFLayoutCacheConfig(cache_dir=cache_config.cache_dir, max_size_mb=new_size / (1024 * 1024))
+
+    assert pdf_layout_cache.enforce_disk_budget(config) == 1
+    assert not doc_dir(old).exists() and doc_dir(new).exists()
+    assert pdf_layout_cache.enforce_disk_budget(config) == 0
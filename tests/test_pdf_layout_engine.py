@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+fitz = pytest.importorskip("fitz")
+pdfplumber = pytest.importorskip("pdfplumber")
+
+from converters.pdf_layout_engine import CharArray, analyze_page_layout
+
+
+def _make_pdf(path: Path) -> Path:
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_text((72, 60), "SOIL SCIENCE ARTICLE TITLE", fontsize=14, fontname="helv")
+    page.insert_text((72, 80), "Ivanov I.I., Petrov P.P.  Moscow State University", fontsize=10)
+    for i in range(25):
+        y = 120 + i * 14
+        page.insert_text((60, y), f"Left column line {i} with words", fontsize=9)
+        page.insert_text((320, y), f"Right column line {i}, more text", fontsize=9)
+    page.insert_text((60, 500), "Tight  spacing:a,b ; c  -  d (e) [f]", fontsize=9)
+    page.insert_text((300, 520), "offset words at mixed positions", fontsize=7)
+    doc.save(path)
+    return path
+
+
+@pytest.fixture()
+def pdf_page(tmp_path: Path):
+    pdf = pdfplumber.open(_make_pdf(tmp_path / "sample.pdf"))
+    try:
+        yield pdf.pages[0]
+    finally:
+        pdf.close()
+
+
+def _word_tuples(words):
+    return [(w["text"], round(w["x0"], 3), round(w["top"], 3), round(w["x1"], 3)) for w in words]
+
+
+def _array_tuples(words):
+    return [
+        (text, round(x0, 3), round(top, 3), round(x1, 3))
+        for text, x0, top, x1 in zip(words.text, words.x0.tolist(), words.top.tolist(), words.x1.tolist())
+    ]
+
+
+@pytest.mark.parametrize("x_tolerance", [1.0, 1.5, 3.0])
+def test_words_match_pdfplumber(pdf_page, x_tolerance):
+    chars = CharArray.from_page(pdf_page)
+    expected = pdf_page.extract_words(x_tolerance=x_tolerance, y_tolerance=3)
+    assert _array_tuples(chars.words(x_tolerance, 3)) == _word_tuples(expected)
+
+
+def test_extract_text_matches_pdfplumber(pdf_page):
+    words = CharArray.from_page(pdf_page).words()
+    assert words.extract_text() == pdf_page.extract_text()
+
+
+def test_layout_text_matches_pdfplumber(pdf_page):
+    words = CharArray.from_page(pdf_page).words()
+    assert words.layout_text(pdf_page.bbox) == pdf_page.extract_text(layout=True)
+
+
+def test_crop_matches_pdfplumber(pdf_page):
+    bbox = (0, 100, pdf_page.width / 2, pdf_page.height)
+    cropped = CharArray.from_page(pdf_page).crop(bbox)
+    expected = pdf_page.crop(bbox)
+    assert _array_tuples(cropped.words()) == _word_tuples(expected.extract_words())
+    assert cropped.words().extract_text() == expected.extract_text()
+
+
+def test_two_column_layout_detected(pdf_page):
+    layout = analyze_page_layout(CharArray.from_page(pdf_page), pdf_page.width, pdf_page.height)
+    assert layout.columns == 2
+    header_words, left_words, right_words = layout.zones
+    assert "TITLE" in header_words.text
+    assert all("Right" not in t for t in left_words.text)
+    assert any("Right" in t for t in right_words.text)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import textwrap
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("pdfplumber")
+
+from converters import pdf_ocr
+
+# Подменяет pytesseract и в процессах пула: spawn передает дочерним процессам
+# sys.path и окружение родителя, поэтому они импортируют этот модуль.
+FAKE_PYTESSERACT = textwrap.dedent(
+    '''
+    import os
+    import time
+
+
+    class Output:
+        DICT = "dict"
+
+
+    def _log(name):
+        with open(os.environ["FAKE_TESSERACT_LOG"], "a", encoding="utf-8") as f:
+            f.write(name + "\\n")
+
+
+    def image_to_string(img, lang="eng", timeout=0):
+        _log("image_to_string")
+        if lang == "slow":
+            time.sleep(3)
+        return "region %dx%d" % img.size
+
+
+    def image_to_data(img, lang="eng", timeout=0, output_type=None):
+        _log("image_to_data")
+        # Два слова в одной строке: слева и справа (координаты в пикселях 300 dpi)
+        return {
+            "text": ["Left", "Right", ""],
+            "conf": ["95", "90", "-1"],
+            "left": [300, 1500, 0],
+            "top": [300, 300, 0],
+            "width": [200, 250, 0],
+            "height": [50, 50, 0],
+            "block_num": [1, 1, 0],
+            "par_num": [1, 1, 0],
+            "line_num": [1, 1, 0],
+        }
+    '''
+)
+
+
+@pytest.fixture()
+def fake_tesseract(tmp_path: Path, monkeypatch):
+    module_dir = tmp_path / "fake_modules"
+    module_dir.mkdir()
+    (module_dir / "pytesseract.py").write_text(FAKE_PYTESSERACT, encoding="utf-8")
+    monkeypatch.syspath_prepend(str(module_dir))
+    log_path = tmp_path / "tesseract_calls.log"
+    log_path.touch()
+    monkeypatch.setenv("FAKE_TESSERACT_LOG", str(log_path))
+
+    # В sys.modules текущего процесса подделку не кладем
+    spec = spec_from_file_location("pytesseract", module_dir / "pytesseract.py")
+    fake = module_from_spec(spec)
+    spec.loader.exec_module(fake)
+    monkeypatch.setattr(pdf_ocr, "pytesseract", fake, raising=False)
+    monkeypatch.setattr(pdf_ocr, "PYTESSERACT_AVAILABLE", True)
+    monkeypatch.setattr(pdf_ocr, "_pool", None)
+    monkeypatch.setattr(pdf_ocr, "_stats", dict.fromkeys(pdf_ocr._stats, 0))
+    yield lambda: log_path.read_text(encoding="utf-8").split()
+    if pdf_ocr._pool is not None:
+        pdf_ocr._pool.shutdown()
+
+
+@pytest.fixture()
+def sample_pdf(tmp_path: Path) -> Path:
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_text((72, 100), "Scanned text", fontsize=12)
+    path = tmp_path / "scan.pdf"
+    doc.save(path)
+    return path
+
+
+def _config(tmp_path: Path, **overrides) -> pdf_ocr.PDFOCRConfig:
+    values = dict(cache_dir=tmp_path / "ocr_cache", workers=1, max_pending=2, timeout_sec=60, dpi=72)
+    values.update(overrides)
+    return pdf_ocr.PDFOCRConfig(**values)
+
+
+PAGE_BBOX = (0.0, 0.0, 595.0, 842.0)
+
+
+def test_region_runs_in_pool_and_is_cached(fake_tesseract, sample_pdf, tmp_path):
+    config = _config(tmp_path)
+    bbox = (10.2, 20.7, 110.1, 60.3)
+
+    first = pdf_ocr.ocr_region(sample_pdf, 0, bbox, PAGE_BBOX, "eng", config=config)
+    # Тот же bbox после округления наружу — попадание в кэш без Tesseract
+    second = pdf_ocr.ocr_region(sample_pdf, 0, (10.5, 20.9, 110.9, 60.1), PAGE_BBOX, "eng", config=config)
+
+    assert first == second
+    assert first.startswith("region ")
+    assert fake_tesseract() == ["image_to_string"]
+    stats = pdf_ocr.get_ocr_stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert list((tmp_path / "ocr_cache").rglob("r00000_*.json"))
+
+
+def test_page_mode_recognizes_page_once(fake_tesseract, sample_pdf, tmp_path):
+    config = _config(tmp_path, dpi=300)
+
+    left = pdf_ocr.ocr_region(sample_pdf, 0, (0, 0, 297, 842), PAGE_BBOX, "eng", page_mode=True, config=config)
+    right = pdf_ocr.ocr_region(sample_pdf, 0, (297, 0, 595, 842), PAGE_BBOX, "eng", page_mode=True, config=config)
+    whole = pdf_ocr.ocr_pages_text(sample_pdf, [0], "eng", config=config)
+
+    assert (left, right) == ("Left", "Right")
+    assert whole == {0: "Left Right"}
+    assert fake_tesseract() == ["image_to_data"]
+    stats = pdf_ocr.get_ocr_stats()
+    assert stats["page_misses"] == 1
+    assert stats["page_hits"] == 2
+
+
+def test_timeout_returns_none_and_is_not_cached(fake_tesseract, sample_pdf, tmp_path):
+    config = _config(tmp_path, timeout_sec=0.5)
+
+    assert pdf_ocr.ocr_region(sample_pdf, 0, (0, 0, 100, 100), PAGE_BBOX, "slow", config=config) is None
+    assert not list((tmp_path / "ocr_cache").rglob("*.json"))
+
+
+def test_unavailable_tesseract_uses_cache_only(fake_tesseract, sample_pdf, tmp_path, monkeypatch):
+    config = _config(tmp_path)
+    bbox = (0, 0, 100, 100)
+    text = pdf_ocr.ocr_region(sample_pdf, 0, bbox, PAGE_BBOX, "eng", config=config)
+
+    monkeypatch.setattr(pdf_ocr, "PYTESSERACT_AVAILABLE", False)
+    assert pdf_ocr.ocr_region(sample_pdf, 0, bbox, PAGE_BBOX, "eng", config=config) == text
+    assert pdf_ocr.ocr_region(sample_pdf, 0, (0, 200, 100, 300), PAGE_BBOX, "eng", config=config) is None
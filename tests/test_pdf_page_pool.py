@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("pdfplumber")
+
+from converters import pdf_layout_cache, pdf_to_html
+
+
+@pytest.fixture()
+def sample_pdf(tmp_path, monkeypatch) -> Path:
+    cache_config = pdf_layout_cache.PDFLayoutCacheConfig(cache_dir=tmp_path / "layout_cache")
+    monkeypatch.setattr(pdf_layout_cache, "load_layout_cache_config", lambda: cache_config)
+    path = tmp_path / "sample.pdf"
+    doc = fitz.open()
+    for page_no in range(5):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 40), "Journal of Soil Science", fontsize=8)
+        page.insert_text((72, 80), f"Section {page_no + 1}", fontsize=14)
+        for i in range(12):
+            page.insert_text((72, 110 + i * 14), f"Page {page_no + 1} body line {i} of the article.", fontsize=10)
+        page.insert_text((290, 800), str(page_no + 1), fontsize=8)
+    doc.save(path)
+    return path
+
+
+@pytest.fixture()
+def page_pool():
+    pdf_to_html.close_page_pool()
+    yield
+    pdf_to_html.close_page_pool()
+
+
+def test_parallel_lines_match_sequential(sample_pdf, page_pool):
+    expected = pdf_to_html._extract_lines_pdfplumber(sample_pdf, workers=1)
+    assert "Page 5 body line 11 of the article." in expected
+    assert pdf_to_html._page_pool is None
+    assert pdf_to_html._extract_lines_pdfplumber(sample_pdf, workers=2) == expected
+
+
+def test_pool_is_reused_and_closed(sample_pdf, page_pool):
+    first = pdf_to_html._extract_lines_pdfplumber(sample_pdf, workers=2)
+    pool = pdf_to_html._page_pool
+    processes = set(pool._processes)
+    assert processes
+
+    # Повторный вызов — тот же пул и те же процессы
+    assert pdf_to_html._extract_lines_pdfplumber(sample_pdf, workers=2) == first
+    assert pdf_to_html._page_pool is pool
+    assert set(pool._processes) == processes
+
+    # Другое число процессов — новый пул, старый остановлен
+    assert pdf_to_html._extract_lines_pdfplumber(sample_pdf, workers=3) == first
+    resized = pdf_to_html._page_pool
+    assert resized is not pool
+    with pytest.raises(RuntimeError):
+        pool.submit(len, "")
+
+    pdf_to_html.close_page_pool()
+    assert pdf_to_html._page_pool is None
+    assert not resized._processes
+    pdf_to_html.close_page_pool()  # повторное закрытие безопасно
+
+    # После закрытия пул создается заново
+    assert pdf_to_html._extract_lines_pdfplumber(sample_pdf, workers=2) == first
+    assert pdf_to_html._page_pool not in (None, pool, resized)
+
+
+def test_small_documents_stay_sequential(sample_pdf, page_pool, monkeypatch):
+    monkeypatch.setattr(pdf_to_html, "_pdfplumber_parallel_settings", lambda: (2, 10))
+    pdf_to_html._extract_lines_pdfplumber(sample_pdf)
+    assert pdf_to_html._page_pool is None
+
+
+def test_broken_pool_falls_back_to_sequential(sample_pdf, page_pool, monkeypatch):
+    from concurrent.futures.process import BrokenProcessPool
+
+    expected = pdf_to_html._extract_lines_pdfplumber(sample_pdf, workers=1)
+    pdf_to_html._extract_lines_pdfplumber(sample_pdf, workers=2)
+    pool = pdf_to_html._page_pool
+
+    def broken(*args, **kwargs):
+        raise BrokenProcessPool("worker died")
+
+    monkeypatch.setattr(pool, "submit", broken)
+    assert pdf_to_html._extract_lines_pdfplumber(sample_pdf, workers=2) == expected
+    # Сломанный пул убран: следующий вызов создает новый
+    assert pdf_to_html._page_pool is None
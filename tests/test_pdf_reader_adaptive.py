@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("pdfplumber")
+
+from converters import pdf_backend
+from converters.pdf_reader import (
+    PDFPageSource,
+    PDFReaderConfig,
+    PDFSectionTracker,
+    read_pdf_blocks_adaptive,
+)
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        "Список литературы",
+        "СПИСОК ИСПОЛЬЗОВАННОЙ ЛИТЕРАТУРЫ",
+        "Список источников",
+        "Список использованных источников",
+        "Литература / References",
+        "Литература | References",
+        "References / Список литературы",
+        "Библиографический список:",
+        "Bibliography",
+        "Literature Cited",
+    ],
+)
+def test_references_header_variants(header):
+    tracker = PDFSectionTracker()
+    tracker.feed(5, f"Заключение статьи.\n{header}\n1. Иванов И.И. Почвы. М., 2001.")
+    assert tracker.references_page == 5
+
+
+def test_references_word_inside_sentence_is_not_header():
+    tracker = PDFSectionTracker()
+    tracker.feed(1, "Как показывает литература последних лет, источники\nданных различаются.")
+    assert not tracker.references
+
+
+def _make_pdf(path: Path, pages: int, references_page: int = -1) -> Path:
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 100), f"Body text of page {i + 1}", fontsize=11)
+        if i == references_page:
+            page.insert_text((72, 140), "References", fontsize=11)
+            page.insert_text((72, 160), "1. Ivanov I.I. Soils. Moscow, 2001.", fontsize=11)
+    doc.save(path)
+    return path
+
+
+@pytest.fixture()
+def backend_mode(monkeypatch):
+    config = pdf_backend.PDFBackendConfig(mode="pymupdf")
+    monkeypatch.setattr(pdf_backend, "load_backend_config", lambda: config)
+    opened = []
+    real_open = pdf_backend.fitz.open
+
+    def counting_open(*args, **kwargs):
+        if args:
+            opened.append(args[0])
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr(pdf_backend.fitz, "open", counting_open)
+    return opened
+
+
+def test_page_source_opens_backend_document_once(backend_mode, tmp_path):
+    path = _make_pdf(tmp_path / "doc.pdf", pages=4)
+    documents = pdf_backend.get_backend_stats()["documents"]
+
+    with PDFPageSource(path, PDFReaderConfig()) as source:
+        texts = {}
+        for page_index in range(source.total_pages):
+            texts.update(source.read([page_index]))
+
+    assert sorted(texts) == [0, 1, 2, 3]
+    assert "page 3" in texts[2]
+    assert len(backend_mode) == 1
+    # Один отчет на документ, а не на каждое чтение страницы
+    assert pdf_backend.get_backend_stats()["documents"] == documents + 1
+
+
+def test_adaptive_window_stops_at_page_limit(backend_mode, tmp_path):
+    path = _make_pdf(tmp_path / "long.pdf", pages=30)
+    config = PDFReaderConfig(first_pages=2, last_pages=2, adaptive_max_pages=8)
+    tracker = PDFSectionTracker()
+
+    blocks = read_pdf_blocks_adaptive(path, config, tracker=tracker)
+
+    assert len(blocks) == 8
+    assert not tracker.references
+
+
+def test_adaptive_window_grows_to_references(backend_mode, tmp_path):
+    path = _make_pdf(tmp_path / "refs.pdf", pages=20, references_page=13)
+    config = PDFReaderConfig(first_pages=1, last_pages=2, adaptive_max_pages=12)
+    tracker = PDFSectionTracker()
+
+    blocks = read_pdf_blocks_adaptive(path, config, tracker=tracker)
+
+    assert tracker.references_page == 13
+    # Окно растет шагами по last_pages: 19-20, 17-18, 15-16, 13-14
+    assert [b.page_number for b in blocks] == [1] + list(range(13, 21))
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("pdfplumber")
+
+from converters import pdf_backend, pdf_layout_cache, pdf_ocr, pdf_reader
+from converters.pdf_reader import PDFReaderConfig, classify_pdf, read_pdf_blocks_with_ocr
+
+
+TEXT = "Soil organic carbon in the forest-steppe zone of Russia."
+
+
+def _make_pdf(path: Path, layout: str) -> Path:
+    """layout: по символу на страницу, t — текстовый слой, s — скан (без текста)."""
+    doc = fitz.open()
+    for page_no, kind in enumerate(layout, start=1):
+        page = doc.new_page(width=595, height=842)
+        if kind == "t":
+            page.insert_text((72, 100), f"Page {page_no}. {TEXT}", fontsize=11)
+        else:
+            # Скан: только изображение, текстового слоя нет
+            page.draw_rect(fitz.Rect(72, 72, 520, 770), color=(0.5, 0.5, 0.5), fill=(0.9, 0.9, 0.9))
+    doc.save(path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def layout_cache(tmp_path, monkeypatch):
+    config = pdf_layout_cache.PDFLayoutCacheConfig(cache_dir=tmp_path / "layout_cache")
+    monkeypatch.setattr(pdf_layout_cache, "load_layout_cache_config", lambda: config)
+
+
+@pytest.fixture()
+def ocr_calls(monkeypatch):
+    """Подменяет OCR страниц: текст "OCR page N", вызовы записываются."""
+    calls = []
+
+    def fake_ocr(path, page_indexes, lang=None, dpi=None, config=None):
+        calls.append((list(page_indexes), lang))
+        return {i: f"OCR page {i + 1} text" for i in page_indexes}
+
+    monkeypatch.setattr(pdf_ocr, "ocr_pages_text", fake_ocr)
+    return calls
+
+
+def _config(**overrides) -> PDFReaderConfig:
+    values = dict(first_pages=2, last_pages=1, adaptive_window=False, ocr_lang="rus")
+    values.update(overrides)
+    return PDFReaderConfig(**values)
+
+
+@pytest.mark.parametrize("pymupdf", [True, False], ids=["pymupdf", "layout-cache"])
+@pytest.mark.parametrize(
+    ("layout", "kind", "scanned"),
+    [
+        ("ttttt", "text", []),
+        ("sssss", "scanned", [0, 1, 4]),
+        ("tsttt", "mixed", [1]),
+        # Страницы вне first_pages/last_pages не проверяются
+        ("ttsst", "text", []),
+    ],
+)
+def test_classify_selected_pages(tmp_path, monkeypatch, pymupdf, layout, kind, scanned):
+    monkeypatch.setattr(pdf_backend, "PYMUPDF_AVAILABLE", pymupdf)
+    report = classify_pdf(_make_pdf(tmp_path / "doc.pdf", layout), _config())
+
+    assert (report.kind, report.scanned_pages) == (kind, scanned)
+    assert sorted(report.page_chars) == [0, 1, 4]
+    text_chars = len("".join(f"Page 1. {TEXT}".split()))
+    assert all(report.page_chars[i] in (0, text_chars) for i in report.page_chars)
+
+
+def test_min_chars_threshold(tmp_path):
+    path = _make_pdf(tmp_path / "doc.pdf", "tt")
+    assert classify_pdf(path, _config(scanned_page_min_chars=20)).kind == "text"
+    assert classify_pdf(path, _config(scanned_page_min_chars=1000)).kind == "scanned"
+
+
+def test_text_pdf_is_not_recognized(tmp_path, ocr_calls):
+    path = _make_pdf(tmp_path / "doc.pdf", "ttt")
+    blocks = read_pdf_blocks_with_ocr(path, _config())
+    assert ocr_calls == []
+    assert blocks and all(b.block_type != "ocr" for b in blocks)
+
+
+def test_mixed_pdf_recognizes_only_scanned_pages(tmp_path, ocr_calls):
+    path = _make_pdf(tmp_path / "doc.pdf", "tsttts")
+    blocks = read_pdf_blocks_with_ocr(path, _config())
+
+    # Выбраны страницы 1, 2 и 6; OCR — только сканы 2 и 6
+    assert ocr_calls == [([1, 5], "rus")]
+    assert [(b.page_number, b.block_type == "ocr") for b in blocks] == [(1, False), (2, True), (6, True)]
+    assert blocks[0].text.startswith("Page 1.")
+    assert blocks[1].text == "OCR page 2 text"
+    assert [b.order for b in blocks] == [0, 1, 2]
+
+
+def test_scanned_pdf_skips_text_layer(tmp_path, ocr_calls, monkeypatch):
+    def no_text_layer(*args, **kwargs):
+        raise AssertionError("текстовый слой скана не читается")
+
+    monkeypatch.setattr(pdf_reader, "read_pdf_blocks", no_text_layer)
+    path = _make_pdf(tmp_path / "doc.pdf", "sss")
+    blocks = read_pdf_blocks_with_ocr(path, _config())
+    assert ocr_calls == [([0, 1, 2], "rus")]
+    assert [b.text for b in blocks] == [f"OCR page {i} text" for i in (1, 2, 3)]
+
+
+def test_ocr_can_be_disabled(tmp_path, ocr_calls):
+    path = _make_pdf(tmp_path / "doc.pdf", "tst")
+    blocks = read_pdf_blocks_with_ocr(path, _config(ocr_scanned_pages=False))
+    assert ocr_calls == []
+    assert {b.page_number for b in blocks} == {1, 3}
+
+
+def _reader_settings(tmp_path, **pdf_reader_section):
+    import json
+
+    import config as config_module
+
+    path = tmp_path / "config.json"
+    section = dict(first_pages=2, last_pages=1, adaptive_window=False, **pdf_reader_section)
+    path.write_text(json.dumps({"pdf_reader": section}), encoding="utf-8")
+    return config_module.Config(path)
+
+
+def test_llm_text_includes_ocr_pages(tmp_path, ocr_calls):
+    from services.gpt_extraction import read_pdf_text_for_llm
+
+    path = _make_pdf(tmp_path / "doc.pdf", "ts")
+    text = read_pdf_text_for_llm(path, _reader_settings(tmp_path))
+    assert "Page 1." in text and "OCR page 2 text" in text
+    assert ocr_calls == [([1], "rus+eng")]
+
+
+def test_unrecognized_scan_fails_before_llm(tmp_path, monkeypatch):
+    from services import gpt_extraction
+
+    monkeypatch.setattr(pdf_ocr, "ocr_pages_text", lambda *args, **kwargs: {})
+    path = _make_pdf(tmp_path / "scan.pdf", "ss")
+    with pytest.raises(gpt_extraction.GPTExtractionError, match="скан без текстового слоя"):
+        gpt_extraction.read_pdf_text_for_llm(path, _reader_settings(tmp_path))
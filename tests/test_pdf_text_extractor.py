@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+fitz = pytest.importorskip("fitz")
+pdfplumber = pytest.importorskip("pdfplumber")
+
+from app.routes.pdf_routes import ExtractionOptions, TextExtractor
+from converters.pdf_layout_engine import CharArray
+
+
+def _make_pdf(path: Path) -> Path:
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_text((72, 60), "SOIL SCIENCE ARTICLE TITLE", fontsize=14)
+    page.insert_text((72, 80), "Ivanov I.I., Petrov P.P.  Moscow State University", fontsize=10)
+    for i in range(12):
+        y = 120 + i * 14
+        page.insert_text((60, y), f"Left column line {i} with words", fontsize=9)
+        page.insert_text((320, y), f"Right column line {i}, more text", fontsize=9)
+    page.insert_text((60, 320), "Tight  spacing:a,b ; c  -  d (e) [f]", fontsize=9)
+    page.insert_text((300, 340), "offset words at mixed positions", fontsize=7)
+    page.insert_text((60, 400), "Аннотация. Почвы лесостепи изучены в 2019 году.", fontsize=10, fontname="helv")
+    doc.save(path)
+    return path
+
+
+CROPS = [
+    (50, 40, 560, 360),  # обе колонки и заголовок
+    (55, 110, 300, 300),  # левая колонка
+    (290, 300, 560, 360),  # строки с разными отступами
+    (55, 390, 400, 410),  # одна строка
+]
+
+
+@pytest.fixture(scope="module")
+def page(tmp_path_factory):
+    pdf = pdfplumber.open(_make_pdf(tmp_path_factory.mktemp("pdf") / "sample.pdf"))
+    try:
+        yield pdf.pages[0]
+    finally:
+        pdf.close()
+
+
+@pytest.mark.parametrize("bbox", CROPS)
+@pytest.mark.parametrize("x_tolerance", [0.8, 3.0])
+def test_shared_candidates_match_extract_text(page, bbox, x_tolerance):
+    cropped = page.crop(bbox)
+    extractor = TextExtractor(ExtractionOptions())
+    shared = list(extractor._iter_shared_candidates(CharArray.from_chars(cropped.chars), cropped, x_tolerance))
+    assert shared == extractor._try_extraction_methods(cropped, x_tolerance)
+    assert [method for method, _ in shared] == ["adaptive", "layout", "text_flow", "tight"]
+
+
+@pytest.mark.parametrize("bbox", CROPS)
+def test_single_pass_selects_same_text(page, bbox):
+    cropped = page.crop(bbox)
+    single = TextExtractor(ExtractionOptions(single_pass=True, early_accept_score=None))
+    separate = TextExtractor(ExtractionOptions(single_pass=False, early_accept_score=None))
+    assert single.extract_from_crop(cropped) == separate.extract_from_crop(cropped)
+
+
+def test_early_accept_stops_candidate_generation():
+    pulled = []
+
+    def candidates():
+        for method, text in [
+            ("adaptive", "Clean readable text of the selected region."),
+            ("layout", "never computed"),
+        ]:
+            pulled.append(method)
+            yield method, text
+
+    early = TextExtractor(ExtractionOptions())
+    assert early._select_best_candidate(candidates(), None) == "Clean readable text of the selected region."
+    assert pulled == ["adaptive"]
+
+    pulled.clear()
+    TextExtractor(ExtractionOptions(early_accept_score=None))._select_best_candidate(candidates(), None)
+    assert pulled == ["adaptive", "layout"]
+
+
+def test_options_from_dict():
+    options = ExtractionOptions.from_dict({"single_pass": False, "early_accept_score": None})
+    assert (options.single_pass, options.early_accept_score) == (False, None)
+    assert ExtractionOptions.from_dict({"early_accept_score": "2.5"}).early_accept_score == 2.5
+    assert (ExtractionOptions.from_dict({}).single_pass, ExtractionOptions().early_accept_score) == (True, 1.0)
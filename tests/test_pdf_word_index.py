@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+fitz = pytest.importorskip("fitz")
+pdfplumber = pytest.importorskip("pdfplumber")
+
+from converters import pdf_layout_cache, pdf_word_index
+from converters.pdf_to_html import find_text_blocks_with_bbox
+from converters.pdf_word_index import get_word_index, get_word_index_stats
+
+
+PAGES = [
+    [
+        "SOIL PROPERTIES OF THE FOREST-STEPPE",
+        "Abstract. Soil samples were collected in 2019.",
+        "The abstract-level summary and Keywords: soil, humus.",
+    ],
+    [
+        "Introduction and annotation of methods",
+        "Keywords follow the ANNOTATION section.",
+        "Second Abstract mention on this page.",
+    ],
+    ["Results without any search terms on this page."],
+    ["Annotation: final notes near the edge of the page."],
+]
+
+
+def _make_pdf(path: Path, pages=PAGES) -> Path:
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page(width=595, height=842)
+        for i, line in enumerate(lines):
+            page.insert_text((10 if "edge" in line else 72, 80 + i * 40), line, fontsize=11)
+    doc.save(path)
+    return path
+
+
+@pytest.fixture()
+def cache_config(tmp_path, monkeypatch):
+    config = pdf_layout_cache.PDFLayoutCacheConfig(cache_dir=tmp_path / "cache")
+    monkeypatch.setattr(pdf_layout_cache, "load_layout_cache_config", lambda: config)
+    monkeypatch.setattr(pdf_word_index, "load_layout_cache_config", lambda: config)
+    pdf_layout_cache.clear_memory_cache()
+    pdf_word_index.clear_word_index_cache()
+    yield config
+    pdf_layout_cache.clear_memory_cache()
+    pdf_word_index.clear_word_index_cache()
+
+
+def _reference_blocks(pdf_path, search_terms, expand_bbox):
+    """Прежний поиск: перебор всех слов каждой страницы для каждого термина."""
+    results = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_num, page in enumerate(pdf.pages, start=1):
+            words = page.extract_words()
+            page_text_lower = (page.extract_text() or "").lower()
+            for term in search_terms:
+                if term.lower() not in page_text_lower:
+                    continue
+                for word in words:
+                    if term.lower() in word.get("text", "").lower():
+                        x0, top, x1, bottom = word["x0"], word["top"], word["x1"], word["bottom"]
+                        expanded = (
+                            max(0, x0 - expand_bbox[0]),
+                            max(0, top - expand_bbox[1]),
+                            min(page.width, x1 + expand_bbox[2]),
+                            min(page.height, bottom + expand_bbox[3]),
+                        )
+                        results.append({
+                            "term": term,
+                            "page": page_num,
+                            "bbox": (x0, top, x1, bottom),
+                            "expanded_bbox": expanded,
+                            "text": (page.crop(expanded).extract_text() or "").strip(),
+                        })
+                        break
+    return results
+
+
+def test_first_hits_groups_first_word_per_page(tmp_path, cache_config):
+    index = get_word_index(_make_pdf(tmp_path / "article.pdf"))
+
+    # Подстрока без учета регистра; на странице — первое слово
+    assert index.first_hits("ABSTRACT") == {0: 5, 1: 11}
+    assert index.first_hits("annotation") == {1: 2, 3: 0}
+    assert index.first_hits("Ключевые слова") == {}
+    assert index.first_hits("") == {}
+
+    with pdfplumber.open(tmp_path / "article.pdf") as pdf:
+        words = pdf.pages[1].extract_words()
+    assert words[11]["text"] == "Abstract"
+    assert index.word_bbox(1, 11) == (words[11]["x0"], words[11]["top"], words[11]["x1"], words[11]["bottom"])
+    assert index.page_count == 4 and index.page_size(0) == (595.0, 842.0)
+
+
+@pytest.mark.parametrize(
+    "expand_bbox",
+    [(0, 0, 0, 0), (20, 5, 300, 60), (100, 100, 100, 100)],
+    ids=["word", "block", "clipped-at-edge"],
+)
+def test_blocks_match_previous_search(tmp_path, cache_config, expand_bbox):
+    path = _make_pdf(tmp_path / "article.pdf")
+    terms = ["Резюме", "Аннотация", "Abstract", "Annotation", "Ключевые слова", "Keywords"]
+
+    expected = _reference_blocks(path, terms, expand_bbox)
+    assert [(r["page"], r["term"]) for r in expected] == [
+        (1, "Abstract"), (1, "Keywords"), (2, "Abstract"), (2, "Annotation"), (2, "Keywords"), (4, "Annotation"),
+    ]
+    assert find_text_blocks_with_bbox(path, terms, expand_bbox) == expected
+
+
+def test_index_is_cached_in_memory_and_on_disk(tmp_path, cache_config):
+    path = _make_pdf(tmp_path / "article.pdf")
+    before = get_word_index_stats()
+    built = get_word_index(path)
+    assert get_word_index(path) is built
+
+    pdf_word_index.clear_word_index_cache()
+    from_disk = get_word_index(path)
+    assert from_disk is not built
+    assert from_disk.first_hits("keywords") == built.first_hits("keywords")
+    assert from_disk.to_dict() == built.to_dict()
+
+    stats = get_word_index_stats()
+    assert stats["builds"] - before["builds"] == 1
+    assert stats["memory_hits"] - before["memory_hits"] == 1
+    assert stats["disk_hits"] - before["disk_hits"] == 1
+
+    # Измененный файл — новый индекс
+    _make_pdf(path, [["Only Keywords here."]])
+    assert get_word_index(path).first_hits("abstract") == {}
+    assert get_word_index_stats()["builds"] - before["builds"] == 2
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import pytest
+
+from services import token_budget
+from services.token_budget import count_tokens, pack_lines, split_text_by_tokens
+
+
+@pytest.fixture(autouse=True)
+def char_counter(monkeypatch):
+    """Подсчет без tiktoken: оценка по символам (детерминирована и без сети)."""
+    monkeypatch.setattr(token_budget, "TIKTOKEN_AVAILABLE", False)
+    token_budget._get_encoding.cache_clear()
+    yield
+    token_budget._get_encoding.cache_clear()
+
+
+def test_fallback_counts_scripts_separately():
+    assert count_tokens("") == 0
+    # ~4 символа латиницы, ~2.5 кириллицы, ~2 цифр и знаков на токен (+1)
+    assert count_tokens("abcdefgh") == 3
+    assert count_tokens("абвгдежзик") == 5
+    assert count_tokens("2001-2002.") == 6
+    assert count_tokens("Почвы soil 2001.") == 6
+    # Пробелы не считаются
+    assert count_tokens("ab  cd") == count_tokens("abcd")
+    # Кириллица дороже латиницы той же длины
+    assert count_tokens("а" * 40) > count_tokens("a" * 40)
+
+
+def test_fallback_when_encoding_cannot_load(monkeypatch):
+    monkeypatch.setattr(token_budget, "TIKTOKEN_AVAILABLE", True)
+
+    class BrokenTiktoken:
+        @staticmethod
+        def encoding_for_model(model):
+            raise OSError("no network")
+
+        get_encoding = encoding_for_model
+
+    monkeypatch.setattr(token_budget, "tiktoken", BrokenTiktoken, raising=False)
+    token_budget._get_encoding.cache_clear()
+    assert count_tokens("abcdefgh", "gpt-4o-mini") == 3
+
+
+# "abcd" — 2 токена + 1 за перевод строки
+LINE = "abcd"
+LINE_TOKENS = 3
+
+
+@pytest.mark.parametrize(
+    ("max_tokens", "sizes"),
+    [
+        (3 * LINE_TOKENS, [3, 3, 1]),  # ровно бюджет — строки в одном чанке
+        (3 * LINE_TOKENS - 1, [2, 2, 2, 1]),  # на токен меньше — строка уходит в следующий
+        (100, [7]),
+        (1, [1] * 7),  # строка больше бюджета — отдельный чанк
+    ],
+)
+def test_pack_lines_budget_boundaries(max_tokens, sizes):
+    chunks = pack_lines([LINE] * 7, max_tokens)
+    assert [len(chunk.split("\n")) for chunk in chunks] == sizes
+    assert "\n".join(chunks) == "\n".join([LINE] * 7)
+
+
+def test_pack_lines_waits_for_entry_start_up_to_double_budget():
+    starts = {"1. abcd", "2. abcd"}
+    lines = ["1. abcd"] + ["abcd"] * 9 + ["2. abcd"]
+
+    chunks = pack_lines(lines, 4 * LINE_TOKENS, can_break=lambda line: line in starts)
+
+    # Запись не делится, пока чанк не больше 2 * max_tokens; затем граница
+    # ставится на любой строке
+    sizes = [len(chunk.split("\n")) for chunk in chunks]
+    assert sizes == [7, 3, 1]
+    assert sum(count_tokens(line) + 1 for line in chunks[0].split("\n")) <= 2 * 4 * LINE_TOKENS
+    # Следующий чанк снова ждет начала записи
+    assert chunks[2] == "2. abcd"
+
+
+def test_pack_lines_breaks_at_entry_start_once_over_budget():
+    lines = ["1. abcd", "abcd", "abcd", "2. abcd", "abcd", "3. abcd"]
+    chunks = pack_lines(lines, 2 * LINE_TOKENS, can_break=lambda line: line[0].isdigit())
+    assert chunks == ["1. abcd\nabcd\nabcd", "2. abcd\nabcd", "3. abcd"]
+
+
+def test_pack_lines_max_lines():
+    assert [len(c.split("\n")) for c in pack_lines([LINE] * 5, 1000, max_lines=2)] == [2, 2, 1]
+    lines = ["1. abcd", "abcd", "abcd", "abcd", "abcd", "2. abcd"]
+    chunks = pack_lines(lines, 1000, can_break=lambda line: line[0].isdigit(), max_lines=2)
+    # Без начала записи чанк растет до 2 * max_lines строк
+    assert [len(c.split("\n")) for c in chunks] == [4, 2]
+
+
+def test_split_text_by_tokens_prefers_sentence_end():
+    sentence = "Abcd efgh ijkl mnop. "
+    text = sentence * 10
+    chunks = split_text_by_tokens(text, 20)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 20 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert " ".join(chunks) == text.strip()
+
+
+def test_split_text_by_tokens_cuts_long_sentence():
+    text = "abcd " * 100
+    chunks = split_text_by_tokens(text, 10)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 10 for chunk in chunks)
+    assert "".join(chunks).replace(" ", "") == text.replace(" ", "")
+    assert split_text_by_tokens("short.", 10) == ["short."]